@@ -40,6 +40,9 @@ from packages.server.src.database import db
 from packages.server.src.models import User, Organization
 from packages.webapp.src.routes import register_blueprints
 from packages.webapp.src.api import register_api_blueprints
+from packages.webapp.src.utils import (
+    balance_snapshots, change_tracking, incremental_backup, jobs, metrics_cache, recurring_invoices
+)
 
 def create_app(config_name='development'):
     """Application factory pattern"""
@@ -52,6 +55,25 @@ def create_app(config_name='development'):
     app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///bigcapitalpy.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['WTF_CSRF_ENABLED'] = False # Consider enabling CSRF protection for production
+    app.config['RECONCILIATION_DATE_TOLERANCE_DAYS'] = int(os.environ.get('RECONCILIATION_DATE_TOLERANCE_DAYS', 3))
+    app.config['BANK_IMPORT_CHUNK_SIZE'] = int(os.environ.get('BANK_IMPORT_CHUNK_SIZE', 1000))
+    app.config['DOCUMENT_SEQUENCE_BLOCK_SIZE'] = int(os.environ.get('DOCUMENT_SEQUENCE_BLOCK_SIZE', 1))
+    app.config['JOURNAL_BATCH_MAX_ENTRIES'] = int(os.environ.get('JOURNAL_BATCH_MAX_ENTRIES', 10000))
+    app.config['JOURNAL_BATCH_CHUNK_SIZE'] = int(os.environ.get('JOURNAL_BATCH_CHUNK_SIZE', 500))
+    app.config['INVOICE_BATCH_MAX_INVOICES'] = int(os.environ.get('INVOICE_BATCH_MAX_INVOICES', 5000))
+    app.config['INVOICE_BATCH_CHUNK_SIZE'] = int(os.environ.get('INVOICE_BATCH_CHUNK_SIZE', 500))
+    app.config['RECURRING_INVOICE_BATCH_SIZE'] = int(os.environ.get('RECURRING_INVOICE_BATCH_SIZE', 200))
+    app.config['SYNC_SETTLE_SECONDS'] = int(os.environ.get('SYNC_SETTLE_SECONDS', 2))
+    app.config['JOB_EXECUTOR'] = os.environ.get('JOB_EXECUTOR', 'thread')  # thread or process
+    app.config['JOB_MAX_WORKERS'] = int(os.environ.get('JOB_MAX_WORKERS', 2))
+    app.config['JOB_FILES_DIR'] = os.environ.get('JOB_FILES_DIR', os.path.join(os.getcwd(), 'jobs_temp'))
+    app.config['JOB_STALE_SECONDS'] = int(os.environ.get('JOB_STALE_SECONDS', 1800))  # running jobs without a heartbeat this long are interrupted
+    app.config['BACKUP_PAGES_PER_STEP'] = int(os.environ.get('BACKUP_PAGES_PER_STEP', 1024))
+    app.config['BACKUP_COMPRESSION_WORKERS'] = int(os.environ.get('BACKUP_COMPRESSION_WORKERS', min(4, os.cpu_count() or 1)))
+    app.config['INCREMENTAL_BACKUP_DIR'] = os.environ.get('INCREMENTAL_BACKUP_DIR', os.path.join(os.getcwd(), 'backups_incremental'))
+    app.config['INCREMENTAL_BACKUP_MAX_CHAIN'] = int(os.environ.get('INCREMENTAL_BACKUP_MAX_CHAIN', 24))
+    app.config['METRICS_CACHE_URL'] = os.environ.get('METRICS_CACHE_URL', os.environ.get('REDIS_URL'))  # in-process when unset
+    app.config['METRICS_CACHE_TTL'] = int(os.environ.get('METRICS_CACHE_TTL', 300))
 
     # Initialize extensions
     db.init_app(app)
@@ -61,6 +83,24 @@ def create_app(config_name='development'):
     login_manager.login_view = 'auth.login'
     csrf = CSRFProtect(app) # CSRFProtect needs app passed to it
 
+    # Keep the daily account balance snapshots in step with the journal
+    balance_snapshots.init_app(app)
+
+    # Record tombstones for the sync API
+    change_tracking.init_app(app)
+
+    # Run long tasks on the background job pool
+    jobs.init_app(app)
+
+    # Incremental backup and restore commands
+    incremental_backup.init_app(app)
+
+    # Cache dashboard metrics until the underlying records change
+    metrics_cache.init_app(app)
+
+    # Generate recurring invoices from the command line (run daily from cron)
+    recurring_invoices.init_app(app)
+
     # Register custom Jinja2 filter after app is created
     # Note: The datetimeformat filter was defined twice, removed the first redundant one.
     def datetimeformat(value, format='%Y-%m-%d %H:%M'):
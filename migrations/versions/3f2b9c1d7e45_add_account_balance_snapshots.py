@@ -0,0 +1,83 @@
+"""Add account_balance_snapshots table
+
+Revision ID: 3f2b9c1d7e45
+Revises: 0a534948f728
+Create Date: 2026-10-18 09:12:40.214537
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2b9c1d7e45'
+down_revision = '0a534948f728'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('account_balance_snapshots',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('snapshot_date', sa.Date(), nullable=False),
+        sa.Column('debit_total', sa.Numeric(precision=15, scale=2), nullable=False),
+        sa.Column('credit_total', sa.Numeric(precision=15, scale=2), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('organization_id', sa.Integer(), nullable=False),
+        sa.Column('account_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['account_id'], ['accounts.id'], ),
+        sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('organization_id', 'account_id', 'snapshot_date',
+                            name='uq_account_balance_snapshots_org_account_date')
+    )
+
+    # Snapshot existing ledgers: running totals per account at each day with activity
+    bind = op.get_bind()
+    journal_entries = sa.table(
+        'journal_entries',
+        sa.column('id', sa.Integer), sa.column('organization_id', sa.Integer),
+        sa.column('date', sa.Date), sa.column('status', sa.String)
+    )
+    journal_line_items = sa.table(
+        'journal_line_items',
+        sa.column('journal_entry_id', sa.Integer), sa.column('account_id', sa.Integer),
+        sa.column('debit', sa.Numeric(15, 2)), sa.column('credit', sa.Numeric(15, 2))
+    )
+    snapshots = sa.table(
+        'account_balance_snapshots',
+        sa.column('organization_id', sa.Integer), sa.column('account_id', sa.Integer),
+        sa.column('snapshot_date', sa.Date), sa.column('debit_total', sa.Numeric(15, 2)),
+        sa.column('credit_total', sa.Numeric(15, 2)), sa.column('updated_at', sa.DateTime)
+    )
+    daily = sa.select(
+        journal_entries.c.organization_id,
+        journal_line_items.c.account_id,
+        journal_entries.c.date,
+        sa.func.coalesce(sa.func.sum(journal_line_items.c.debit), 0).label('debit'),
+        sa.func.coalesce(sa.func.sum(journal_line_items.c.credit), 0).label('credit')
+    ).select_from(
+        journal_line_items.join(journal_entries, journal_line_items.c.journal_entry_id == journal_entries.c.id)
+    ).where(
+        journal_entries.c.status.is_distinct_from('reversed')
+    ).group_by(
+        journal_entries.c.organization_id, journal_line_items.c.account_id, journal_entries.c.date
+    ).subquery()
+    partition = (daily.c.organization_id, daily.c.account_id)
+    bind.execute(snapshots.insert().from_select(
+        ['organization_id', 'account_id', 'snapshot_date', 'debit_total', 'credit_total', 'updated_at'],
+        sa.select(
+            daily.c.organization_id,
+            daily.c.account_id,
+            daily.c.date,
+            sa.func.sum(daily.c.debit).over(partition_by=partition, order_by=daily.c.date),
+            sa.func.sum(daily.c.credit).over(partition_by=partition, order_by=daily.c.date),
+            sa.literal(datetime.utcnow())
+        )
+    ))
+
+
+def downgrade():
+    op.drop_table('account_balance_snapshots')
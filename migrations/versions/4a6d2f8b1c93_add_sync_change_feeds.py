@@ -0,0 +1,48 @@
+"""Add tombstones and (organization_id, updated_at, id) indexes for the sync API
+
+Revision ID: 4a6d2f8b1c93
+Revises: 7b3c9e2d5f10
+Create Date: 2026-10-18 15:12:44.803127
+
+Rows without updated_at take their created_at so change feeds pick them up.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4a6d2f8b1c93'
+down_revision = '7b3c9e2d5f10'
+branch_labels = None
+depends_on = None
+
+SYNCED_TABLES = (
+    'tax_codes', 'accounts', 'customers', 'vendors', 'items',
+    'invoices', 'journal_entries', 'bank_transactions', 'payments',
+)
+
+
+def upgrade():
+    op.create_table('tombstones',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('resource', sa.String(length=50), nullable=False),
+        sa.Column('record_id', sa.Integer(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=False),
+        sa.Column('organization_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_tombstones_org_resource', 'tombstones', ['organization_id', 'resource', 'id'], unique=False)
+
+    for table_name in SYNCED_TABLES:
+        op.execute(f'UPDATE {table_name} SET updated_at = created_at WHERE updated_at IS NULL')
+        op.create_index(f'ix_{table_name}_org_updated', table_name, ['organization_id', 'updated_at', 'id'], unique=False)
+
+
+def downgrade():
+    for table_name in reversed(SYNCED_TABLES):
+        op.drop_index(f'ix_{table_name}_org_updated', table_name=table_name)
+
+    op.drop_index('ix_tombstones_org_resource', table_name='tombstones')
+    op.drop_table('tombstones')
@@ -0,0 +1,69 @@
+"""Add document_sequences and scope document numbers to their organization
+
+Revision ID: 7b3c9e2d5f10
+Revises: e2f8a61c4b97
+Create Date: 2026-10-18 14:37:19.508216
+
+Counters are created on first use from the highest number already issued, so
+no backfill is needed.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b3c9e2d5f10'
+down_revision = 'e2f8a61c4b97'
+branch_labels = None
+depends_on = None
+
+# Name SQLite gives the reflected single-column unique constraints in batch mode
+naming_convention = {
+    'uq': 'uq_%(table_name)s_%(column_0_name)s',
+}
+
+
+def _single_column_unique(table_name, column_name):
+    """Name of the existing unique constraint on one column"""
+    for constraint in sa.inspect(op.get_bind()).get_unique_constraints(table_name):
+        if constraint['column_names'] == [column_name]:
+            return constraint['name'] or f'uq_{table_name}_{column_name}'
+    return None
+
+
+def _scope_to_organization(table_name, column_name, constraint_name):
+    existing = _single_column_unique(table_name, column_name)
+    with op.batch_alter_table(table_name, schema=None, naming_convention=naming_convention) as batch_op:
+        if existing:
+            batch_op.drop_constraint(existing, type_='unique')
+        batch_op.create_unique_constraint(constraint_name, ['organization_id', column_name])
+
+
+def _unscope(table_name, column_name, constraint_name):
+    with op.batch_alter_table(table_name, schema=None) as batch_op:
+        batch_op.drop_constraint(constraint_name, type_='unique')
+        batch_op.create_unique_constraint(f'uq_{table_name}_{column_name}', [column_name])
+
+
+def upgrade():
+    op.create_table('document_sequences',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('prefix', sa.String(length=20), nullable=False),
+        sa.Column('next_value', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('organization_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('organization_id', 'prefix', name='uq_document_sequences_org_prefix')
+    )
+
+    _scope_to_organization('invoices', 'invoice_number', 'uq_invoices_org_number')
+    _scope_to_organization('payments', 'payment_number', 'uq_payments_org_number')
+
+
+def downgrade():
+    _unscope('payments', 'payment_number', 'uq_payments_org_number')
+    _unscope('invoices', 'invoice_number', 'uq_invoices_org_number')
+
+    op.drop_table('document_sequences')
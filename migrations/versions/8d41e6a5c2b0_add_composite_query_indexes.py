@@ -0,0 +1,68 @@
+"""Add composite indexes for organization/date/status queries
+
+Revision ID: 8d41e6a5c2b0
+Revises: 3f2b9c1d7e45
+Create Date: 2026-10-18 10:03:27.551902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d41e6a5c2b0'
+down_revision = '3f2b9c1d7e45'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_tax_codes_org_type', 'tax_codes', ['organization_id', 'tax_type'], unique=False)
+    op.create_index('ix_accounts_org_type', 'accounts', ['organization_id', 'type'], unique=False)
+    op.create_index('ix_customers_org_active', 'customers', ['organization_id', 'is_active'], unique=False)
+    op.create_index('ix_vendors_org_active', 'vendors', ['organization_id', 'is_active'], unique=False)
+    op.create_index('ix_items_org_active', 'items', ['organization_id', 'is_active'], unique=False)
+    op.create_index('ix_invoices_org_date', 'invoices', ['organization_id', 'invoice_date'], unique=False)
+    op.create_index('ix_invoices_org_status', 'invoices', ['organization_id', 'status'], unique=False)
+    op.create_index('ix_invoices_customer', 'invoices', ['customer_id'], unique=False)
+    op.create_index('ix_invoice_line_items_invoice', 'invoice_line_items', ['invoice_id'], unique=False)
+    op.create_index('ix_journal_entries_org_date', 'journal_entries', ['organization_id', 'date'], unique=False)
+    op.create_index('ix_journal_entries_org_source', 'journal_entries', ['organization_id', 'source_type', 'source_id'], unique=False)
+    op.create_index('ix_journal_line_items_entry', 'journal_line_items', ['journal_entry_id'], unique=False)
+    op.create_index('ix_journal_line_items_account', 'journal_line_items', ['account_id', 'journal_entry_id'], unique=False)
+    op.create_index('ix_bank_transactions_account_date', 'bank_transactions', ['account_id', 'transaction_date'], unique=False)
+    op.create_index('ix_bank_transactions_account_status', 'bank_transactions', ['account_id', 'status'], unique=False)
+    op.create_index('ix_bank_transactions_org_date', 'bank_transactions', ['organization_id', 'transaction_date'], unique=False)
+    op.create_index('ix_reconciliation_matches_reconciliation', 'reconciliation_matches', ['reconciliation_id'], unique=False)
+    op.create_index('ix_reconciliation_matches_bank_transaction', 'reconciliation_matches', ['bank_transaction_id'], unique=False)
+    op.create_index('ix_reconciliation_matches_journal_line', 'reconciliation_matches', ['journal_line_item_id'], unique=False)
+    op.create_index('ix_payments_org_date', 'payments', ['organization_id', 'payment_date'], unique=False)
+    op.create_index('ix_payments_customer', 'payments', ['customer_id'], unique=False)
+    op.create_index('ix_payment_allocations_payment', 'payment_allocations', ['payment_id'], unique=False)
+    op.create_index('ix_payment_allocations_invoice', 'payment_allocations', ['invoice_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_payment_allocations_invoice', table_name='payment_allocations')
+    op.drop_index('ix_payment_allocations_payment', table_name='payment_allocations')
+    op.drop_index('ix_payments_customer', table_name='payments')
+    op.drop_index('ix_payments_org_date', table_name='payments')
+    op.drop_index('ix_reconciliation_matches_journal_line', table_name='reconciliation_matches')
+    op.drop_index('ix_reconciliation_matches_bank_transaction', table_name='reconciliation_matches')
+    op.drop_index('ix_reconciliation_matches_reconciliation', table_name='reconciliation_matches')
+    op.drop_index('ix_bank_transactions_org_date', table_name='bank_transactions')
+    op.drop_index('ix_bank_transactions_account_status', table_name='bank_transactions')
+    op.drop_index('ix_bank_transactions_account_date', table_name='bank_transactions')
+    op.drop_index('ix_journal_line_items_account', table_name='journal_line_items')
+    op.drop_index('ix_journal_line_items_entry', table_name='journal_line_items')
+    op.drop_index('ix_journal_entries_org_source', table_name='journal_entries')
+    op.drop_index('ix_journal_entries_org_date', table_name='journal_entries')
+    op.drop_index('ix_invoice_line_items_invoice', table_name='invoice_line_items')
+    op.drop_index('ix_invoices_customer', table_name='invoices')
+    op.drop_index('ix_invoices_org_status', table_name='invoices')
+    op.drop_index('ix_invoices_org_date', table_name='invoices')
+    op.drop_index('ix_items_org_active', table_name='items')
+    op.drop_index('ix_vendors_org_active', table_name='vendors')
+    op.drop_index('ix_customers_org_active', table_name='customers')
+    op.drop_index('ix_accounts_org_type', table_name='accounts')
+    op.drop_index('ix_tax_codes_org_type', table_name='tax_codes')
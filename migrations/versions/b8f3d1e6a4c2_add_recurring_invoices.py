@@ -0,0 +1,84 @@
+"""Add recurring invoice templates and their run log
+
+Revision ID: b8f3d1e6a4c2
+Revises: 9c1e4b7a2d06
+Create Date: 2026-10-18 17:12:44.903115
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8f3d1e6a4c2'
+down_revision = '9c1e4b7a2d06'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('recurring_invoices',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=200), nullable=False),
+        sa.Column('customer_id', sa.Integer(), nullable=False),
+        sa.Column('frequency', sa.String(length=20), nullable=False),
+        sa.Column('interval', sa.Integer(), nullable=False),
+        sa.Column('start_date', sa.Date(), nullable=False),
+        sa.Column('end_date', sa.Date(), nullable=True),
+        sa.Column('next_run_date', sa.Date(), nullable=False),
+        sa.Column('last_run_date', sa.Date(), nullable=True),
+        sa.Column('due_days', sa.Integer(), nullable=False),
+        sa.Column('auto_send', sa.Boolean(), nullable=True),
+        sa.Column('reference', sa.String(length=100), nullable=True),
+        sa.Column('discount_amount', sa.Numeric(precision=15, scale=2), nullable=True),
+        sa.Column('currency', sa.String(length=3), nullable=True),
+        sa.Column('terms', sa.Text(), nullable=True),
+        sa.Column('notes', sa.Text(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('organization_id', sa.Integer(), nullable=False),
+        sa.Column('created_by', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['created_by'], ['users.id'], ),
+        sa.ForeignKeyConstraint(['customer_id'], ['customers.id'], ),
+        sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_recurring_invoices_active_next_run', 'recurring_invoices',
+                    ['is_active', 'next_run_date'], unique=False)
+
+    op.create_table('recurring_invoice_line_items',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('recurring_invoice_id', sa.Integer(), nullable=False),
+        sa.Column('item_id', sa.Integer(), nullable=True),
+        sa.Column('description', sa.String(length=500), nullable=True),
+        sa.Column('quantity', sa.Numeric(precision=15, scale=2), nullable=False),
+        sa.Column('rate', sa.Numeric(precision=15, scale=2), nullable=True),
+        sa.Column('tax_rate', sa.Numeric(precision=5, scale=2), nullable=True),
+        sa.ForeignKeyConstraint(['item_id'], ['items.id'], ),
+        sa.ForeignKeyConstraint(['recurring_invoice_id'], ['recurring_invoices.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_recurring_invoice_line_items_template', 'recurring_invoice_line_items',
+                    ['recurring_invoice_id'], unique=False)
+
+    op.create_table('recurring_invoice_runs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('recurring_invoice_id', sa.Integer(), nullable=False),
+        sa.Column('period_key', sa.String(length=20), nullable=False),
+        sa.Column('run_date', sa.Date(), nullable=False),
+        sa.Column('invoice_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['invoice_id'], ['invoices.id'], ),
+        sa.ForeignKeyConstraint(['recurring_invoice_id'], ['recurring_invoices.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('recurring_invoice_id', 'period_key', name='uq_recurring_invoice_runs_period')
+    )
+
+
+def downgrade():
+    op.drop_table('recurring_invoice_runs')
+    op.drop_index('ix_recurring_invoice_line_items_template', table_name='recurring_invoice_line_items')
+    op.drop_table('recurring_invoice_line_items')
+    op.drop_index('ix_recurring_invoices_active_next_run', table_name='recurring_invoices')
+    op.drop_table('recurring_invoices')
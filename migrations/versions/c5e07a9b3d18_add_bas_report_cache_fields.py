@@ -0,0 +1,30 @@
+"""Add generated report cache fields to bas_reports
+
+Revision ID: c5e07a9b3d18
+Revises: 8d41e6a5c2b0
+Create Date: 2026-10-18 11:26:05.734120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e07a9b3d18'
+down_revision = '8d41e6a5c2b0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('bas_reports', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('report_data', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('ledger_watermark', sa.String(length=255), nullable=True))
+        batch_op.create_unique_constraint('uq_bas_reports_org_period', ['organization_id', 'period_start', 'period_end'])
+
+
+def downgrade():
+    with op.batch_alter_table('bas_reports', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_bas_reports_org_period', type_='unique')
+        batch_op.drop_column('ledger_watermark')
+        batch_op.drop_column('report_data')
@@ -0,0 +1,40 @@
+"""Add heartbeat to jobs
+
+Revision ID: d4a7c2e9f813
+Revises: b8f3d1e6a4c2
+Create Date: 2026-10-18 18:21:37.640912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4a7c2e9f813'
+down_revision = 'b8f3d1e6a4c2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('jobs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    # Existing jobs were last touched when they finished, started or were queued
+    jobs = sa.table(
+        'jobs',
+        sa.column('created_at', sa.DateTime), sa.column('started_at', sa.DateTime),
+        sa.column('finished_at', sa.DateTime), sa.column('updated_at', sa.DateTime)
+    )
+    op.get_bind().execute(jobs.update().values(
+        updated_at=sa.func.coalesce(jobs.c.finished_at, jobs.c.started_at, jobs.c.created_at)
+    ))
+
+    with op.batch_alter_table('jobs', schema=None) as batch_op:
+        batch_op.create_index('ix_jobs_status_updated', ['status', 'updated_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('jobs', schema=None) as batch_op:
+        batch_op.drop_index('ix_jobs_status_updated')
+        batch_op.drop_column('updated_at')
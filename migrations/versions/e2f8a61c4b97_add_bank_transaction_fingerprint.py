@@ -0,0 +1,70 @@
+"""Add content fingerprint to bank_transactions
+
+Revision ID: e2f8a61c4b97
+Revises: c5e07a9b3d18
+Create Date: 2026-10-18 13:02:47.218305
+
+"""
+import hashlib
+from decimal import Decimal
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2f8a61c4b97'
+down_revision = 'c5e07a9b3d18'
+branch_labels = None
+depends_on = None
+
+
+def _fingerprint(row):
+    content = '|'.join((
+        str(row.account_id),
+        str(row.transaction_date)[:10],
+        str(Decimal(str(row.amount)).quantize(Decimal('0.01'))),
+        ' '.join((row.description or '').split()).lower(),
+        (row.reference or '').strip()
+    ))
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def upgrade():
+    with op.batch_alter_table('bank_transactions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('fingerprint', sa.String(length=64), nullable=True))
+
+    # Fingerprint existing lines; repeats of an earlier line keep a NULL fingerprint
+    bind = op.get_bind()
+    bank_transactions = sa.table(
+        'bank_transactions',
+        sa.column('id', sa.Integer), sa.column('account_id', sa.Integer),
+        sa.column('transaction_date', sa.Date), sa.column('amount', sa.Numeric(15, 2)),
+        sa.column('description', sa.String), sa.column('reference', sa.String),
+        sa.column('fingerprint', sa.String)
+    )
+    seen = set()
+    updates = []
+    rows = bind.execute(sa.select(bank_transactions).order_by(bank_transactions.c.id))
+    for row in rows:
+        fingerprint = _fingerprint(row)
+        if fingerprint in seen:
+            continue
+        seen.add(fingerprint)
+        updates.append({'row_id': row.id, 'value': fingerprint})
+    if updates:
+        bind.execute(
+            bank_transactions.update()
+            .where(bank_transactions.c.id == sa.bindparam('row_id'))
+            .values(fingerprint=sa.bindparam('value')),
+            updates
+        )
+
+    with op.batch_alter_table('bank_transactions', schema=None) as batch_op:
+        batch_op.create_index('ix_bank_transactions_fingerprint', ['fingerprint'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('bank_transactions', schema=None) as batch_op:
+        batch_op.drop_index('ix_bank_transactions_fingerprint')
+        batch_op.drop_column('fingerprint')
@@ -0,0 +1,32 @@
+"""Add (organization, sort column, id) indexes for keyset pages of name-sorted lists
+
+Revision ID: e7b2a9d4c615
+Revises: d4a7c2e9f813
+Create Date: 2026-10-18 19:04:52.318604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b2a9d4c615'
+down_revision = 'd4a7c2e9f813'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_customers_org_display_name', 'customers', ['organization_id', 'display_name', 'id'], unique=False)
+    op.create_index('ix_vendors_org_display_name', 'vendors', ['organization_id', 'display_name', 'id'], unique=False)
+    op.create_index('ix_items_org_name', 'items', ['organization_id', 'name', 'id'], unique=False)
+    op.create_index('ix_accounts_org_code', 'accounts', ['organization_id', 'code', 'id'], unique=False)
+    op.create_index('ix_tax_codes_org_name', 'tax_codes', ['organization_id', 'name', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_tax_codes_org_name', table_name='tax_codes')
+    op.drop_index('ix_accounts_org_code', table_name='accounts')
+    op.drop_index('ix_items_org_name', table_name='items')
+    op.drop_index('ix_vendors_org_display_name', table_name='vendors')
+    op.drop_index('ix_customers_org_display_name', table_name='customers')
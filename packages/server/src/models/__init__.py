@@ -55,6 +55,11 @@ class TaxType(enum.Enum):
 
 class TaxCode(db.Model):
     __tablename__ = 'tax_codes'
+    __table_args__ = (
+        db.Index('ix_tax_codes_org_type', 'organization_id', 'tax_type'),
+        db.Index('ix_tax_codes_org_updated', 'organization_id', 'updated_at', 'id'),
+        db.Index('ix_tax_codes_org_name', 'organization_id', 'name', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     code = db.Column(db.String(20), nullable=False)
@@ -163,6 +168,11 @@ class User(UserMixin, db.Model):
 
 class Account(db.Model):
     __tablename__ = 'accounts'
+    __table_args__ = (
+        db.Index('ix_accounts_org_type', 'organization_id', 'type'),
+        db.Index('ix_accounts_org_updated', 'organization_id', 'updated_at', 'id'),
+        db.Index('ix_accounts_org_code', 'organization_id', 'code', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     code = db.Column(db.String(20), nullable=False)
@@ -187,6 +197,11 @@ class Account(db.Model):
 
 class Customer(db.Model):
     __tablename__ = 'customers'
+    __table_args__ = (
+        db.Index('ix_customers_org_active', 'organization_id', 'is_active'),
+        db.Index('ix_customers_org_updated', 'organization_id', 'updated_at', 'id'),
+        db.Index('ix_customers_org_display_name', 'organization_id', 'display_name', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     display_name = db.Column(db.String(255), nullable=False)
@@ -233,6 +248,11 @@ class Customer(db.Model):
 
 class Vendor(db.Model):
     __tablename__ = 'vendors'
+    __table_args__ = (
+        db.Index('ix_vendors_org_active', 'organization_id', 'is_active'),
+        db.Index('ix_vendors_org_updated', 'organization_id', 'updated_at', 'id'),
+        db.Index('ix_vendors_org_display_name', 'organization_id', 'display_name', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     display_name = db.Column(db.String(255), nullable=False)
@@ -271,6 +291,11 @@ class Vendor(db.Model):
 
 class Item(db.Model):
     __tablename__ = 'items'
+    __table_args__ = (
+        db.Index('ix_items_org_active', 'organization_id', 'is_active'),
+        db.Index('ix_items_org_updated', 'organization_id', 'updated_at', 'id'),
+        db.Index('ix_items_org_name', 'organization_id', 'name', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
@@ -314,9 +339,16 @@ class Item(db.Model):
 
 class Invoice(db.Model):
     __tablename__ = 'invoices'
+    __table_args__ = (
+        db.Index('ix_invoices_org_date', 'organization_id', 'invoice_date'),
+        db.Index('ix_invoices_org_status', 'organization_id', 'status'),
+        db.Index('ix_invoices_customer', 'customer_id'),
+        db.UniqueConstraint('organization_id', 'invoice_number', name='uq_invoices_org_number'),
+        db.Index('ix_invoices_org_updated', 'organization_id', 'updated_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    invoice_number = db.Column(db.String(50), nullable=False, unique=True)
+    invoice_number = db.Column(db.String(50), nullable=False)
     reference = db.Column(db.String(100))
     
     # Dates
@@ -355,6 +387,9 @@ class Invoice(db.Model):
 
 class InvoiceLineItem(db.Model):
     __tablename__ = 'invoice_line_items'
+    __table_args__ = (
+        db.Index('ix_invoice_line_items_invoice', 'invoice_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     invoice_id = db.Column(db.Integer, db.ForeignKey('invoices.id'), nullable=False)
@@ -375,9 +410,93 @@ class InvoiceLineItem(db.Model):
     item = db.relationship('Item')
     tax_code = db.relationship('TaxCode')
 
+class RecurringInvoice(db.Model):
+    """Template the scheduler turns into an invoice every period"""
+    __tablename__ = 'recurring_invoices'
+    __table_args__ = (
+        db.Index('ix_recurring_invoices_active_next_run', 'is_active', 'next_run_date'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(200), nullable=False)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'), nullable=False)
+
+    # Schedule
+    frequency = db.Column(db.String(20), nullable=False, default='monthly')  # weekly, monthly, quarterly, yearly
+    interval = db.Column(db.Integer, nullable=False, default=1)  # Every N periods
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date)
+    next_run_date = db.Column(db.Date, nullable=False)
+    last_run_date = db.Column(db.Date)
+
+    # Generated invoice settings
+    due_days = db.Column(db.Integer, nullable=False, default=30)
+    auto_send = db.Column(db.Boolean, default=False)  # Create as sent and post the journal entry
+    reference = db.Column(db.String(100))
+    discount_amount = db.Column(db.Numeric(15, 2), default=0)
+    currency = db.Column(db.String(3), default='USD')
+    terms = db.Column(db.Text)
+    notes = db.Column(db.Text)
+
+    is_active = db.Column(db.Boolean, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Foreign Keys
+    organization_id = db.Column(db.Integer, db.ForeignKey('organizations.id'), nullable=False)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+
+    # Relationships
+    customer = db.relationship('Customer')
+    line_items = db.relationship('RecurringInvoiceLineItem', backref='recurring_invoice',
+                                 cascade='all, delete-orphan', order_by='RecurringInvoiceLineItem.id')
+
+    def __repr__(self):
+        return f'<RecurringInvoice {self.name} next {self.next_run_date}>'
+
+class RecurringInvoiceLineItem(db.Model):
+    __tablename__ = 'recurring_invoice_line_items'
+    __table_args__ = (
+        db.Index('ix_recurring_invoice_line_items_template', 'recurring_invoice_id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    recurring_invoice_id = db.Column(db.Integer, db.ForeignKey('recurring_invoices.id'), nullable=False)
+    item_id = db.Column(db.Integer, db.ForeignKey('items.id'))
+
+    description = db.Column(db.String(500))  # Defaults to the item name
+    quantity = db.Column(db.Numeric(15, 2), nullable=False, default=1)
+    rate = db.Column(db.Numeric(15, 2))  # Defaults to the item's sell price
+    tax_rate = db.Column(db.Numeric(5, 2), default=0)
+
+    # Relationships
+    item = db.relationship('Item')
+
+class RecurringInvoiceRun(db.Model):
+    """One period of a recurring invoice; the unique key makes generation idempotent"""
+    __tablename__ = 'recurring_invoice_runs'
+    __table_args__ = (
+        db.UniqueConstraint('recurring_invoice_id', 'period_key', name='uq_recurring_invoice_runs_period'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    recurring_invoice_id = db.Column(db.Integer, db.ForeignKey('recurring_invoices.id'), nullable=False)
+    period_key = db.Column(db.String(20), nullable=False)  # e.g. 2024-05, 2024-Q2, week of 2024-05-06
+    run_date = db.Column(db.Date, nullable=False)
+    invoice_id = db.Column(db.Integer, db.ForeignKey('invoices.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<RecurringInvoiceRun {self.recurring_invoice_id} {self.period_key}>'
+
 # Journal and Transaction Models
 class JournalEntry(db.Model):
     __tablename__ = 'journal_entries'
+    __table_args__ = (
+        db.Index('ix_journal_entries_org_date', 'organization_id', 'date'),
+        db.Index('ix_journal_entries_org_source', 'organization_id', 'source_type', 'source_id'),
+        db.Index('ix_journal_entries_org_updated', 'organization_id', 'updated_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     entry_number = db.Column(db.String(50), nullable=False)
@@ -421,6 +540,10 @@ class JournalEntry(db.Model):
 
 class JournalLineItem(db.Model):
     __tablename__ = 'journal_line_items'
+    __table_args__ = (
+        db.Index('ix_journal_line_items_entry', 'journal_entry_id'),
+        db.Index('ix_journal_line_items_account', 'account_id', 'journal_entry_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     journal_entry_id = db.Column(db.Integer, db.ForeignKey('journal_entries.id'), nullable=False)
@@ -455,9 +578,128 @@ class JournalLineItem(db.Model):
         amount = self.debit if self.debit > 0 else -self.credit
         return f'<JournalLineItem {self.account.code if self.account else "N/A"}: {amount}>'
 
+class AccountBalanceSnapshot(db.Model):
+    """Running debit/credit totals for an account as at the end of a day"""
+    __tablename__ = 'account_balance_snapshots'
+    __table_args__ = (
+        db.UniqueConstraint('organization_id', 'account_id', 'snapshot_date',
+                            name='uq_account_balance_snapshots_org_account_date'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    snapshot_date = db.Column(db.Date, nullable=False)
+    
+    # Cumulative totals of all journal lines up to and including snapshot_date
+    debit_total = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    credit_total = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Foreign Keys
+    organization_id = db.Column(db.Integer, db.ForeignKey('organizations.id'), nullable=False)
+    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=False)
+    
+    @property
+    def balance(self):
+        """Debit minus credit as at snapshot_date"""
+        return (self.debit_total or 0) - (self.credit_total or 0)
+    
+    def __repr__(self):
+        return f'<AccountBalanceSnapshot {self.account_id} {self.snapshot_date}: {self.balance}>'
+
+class Tombstone(db.Model):
+    """Record of a deleted or deactivated row, read by sync clients"""
+    __tablename__ = 'tombstones'
+    __table_args__ = (
+        db.Index('ix_tombstones_org_resource', 'organization_id', 'resource', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    resource = db.Column(db.String(50), nullable=False)
+    record_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    # Foreign Keys
+    organization_id = db.Column(db.Integer, db.ForeignKey('organizations.id'), nullable=False)
+    
+    def __repr__(self):
+        return f'<Tombstone {self.resource} {self.record_id}>'
+
+class Job(db.Model):
+    """Background job run by the worker pool; progress is visible from every process"""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_org_created', 'organization_id', 'created_at'),
+        db.Index('ix_jobs_status_updated', 'status', 'updated_at'),
+    )
+    
+    id = db.Column(db.String(36), primary_key=True)
+    job_type = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, completed, failed, cancelled
+    progress = db.Column(db.Integer, default=0)
+    message = db.Column(db.String(255))
+    params = db.Column(db.Text)  # JSON of the handler arguments
+    result = db.Column(db.Text)  # JSON returned by the handler
+    result_path = db.Column(db.String(500))  # File produced by the job, if any
+    error = db.Column(db.Text)
+    cancel_requested = db.Column(db.Boolean, default=False)
+    
+    # Timing
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)  # Heartbeat: last write by the worker
+    
+    # Foreign Keys
+    organization_id = db.Column(db.Integer, db.ForeignKey('organizations.id'))
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    
+    @property
+    def is_finished(self):
+        return self.status in ('completed', 'failed', 'cancelled')
+    
+    @property
+    def queue_seconds(self):
+        """Time spent waiting for a worker"""
+        if not self.started_at:
+            return None
+        return (self.started_at - self.created_at).total_seconds()
+    
+    @property
+    def run_seconds(self):
+        """Time spent running"""
+        if not self.started_at or not self.finished_at:
+            return None
+        return (self.finished_at - self.started_at).total_seconds()
+    
+    def __repr__(self):
+        return f'<Job {self.id} {self.job_type} {self.status}>'
+
+class DocumentSequence(db.Model):
+    """Next number to issue for a document prefix within an organization"""
+    __tablename__ = 'document_sequences'
+    __table_args__ = (
+        db.UniqueConstraint('organization_id', 'prefix', name='uq_document_sequences_org_prefix'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    prefix = db.Column(db.String(20), nullable=False)
+    next_value = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Foreign Keys
+    organization_id = db.Column(db.Integer, db.ForeignKey('organizations.id'), nullable=False)
+    
+    def __repr__(self):
+        return f'<DocumentSequence {self.organization_id} {self.prefix}: {self.next_value}>'
+
 # Australian BAS Report Model
 class BASReport(db.Model):
     __tablename__ = 'bas_reports'
+    __table_args__ = (
+        db.UniqueConstraint('organization_id', 'period_start', 'period_end',
+                            name='uq_bas_reports_org_period'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     report_number = db.Column(db.String(50), nullable=False)
@@ -533,6 +775,10 @@ class BASReport(db.Model):
     prepared_by = db.Column(db.String(255))
     reviewed_by = db.Column(db.String(255))
     
+    # Generated report cache
+    report_data = db.Column(db.Text)  # JSON of the generated BAS statement
+    ledger_watermark = db.Column(db.String(255))  # Ledger state the statement was generated from
+    
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -558,6 +804,11 @@ class BASReport(db.Model):
         """Check if this is a monthly BAS report"""
         return self.reporting_period == 'monthly'
     
+    @property
+    def is_locked(self):
+        """Lodged (or amended) statements are never recomputed"""
+        return self.status in ('lodged', 'amended')
+    
     @property
     def period_description(self):
         """Get a human-readable description of the reporting period"""
@@ -614,6 +865,13 @@ class BASReport(db.Model):
 class BankTransaction(db.Model):
     """Model for imported bank transactions used in reconciliation"""
     __tablename__ = 'bank_transactions'
+    __table_args__ = (
+        db.Index('ix_bank_transactions_account_date', 'account_id', 'transaction_date'),
+        db.Index('ix_bank_transactions_account_status', 'account_id', 'status'),
+        db.Index('ix_bank_transactions_org_date', 'organization_id', 'transaction_date'),
+        db.Index('ix_bank_transactions_fingerprint', 'fingerprint', unique=True),
+        db.Index('ix_bank_transactions_org_updated', 'organization_id', 'updated_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     account_id = db.Column(db.Integer, db.ForeignKey('bank_accounts.id'), nullable=False)
@@ -626,6 +884,7 @@ class BankTransaction(db.Model):
     is_reconciled = db.Column(db.Boolean, default=False)
     reconciled_at = db.Column(db.DateTime)
     reconciled_by_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    fingerprint = db.Column(db.String(64))  # Content hash used to skip re-imported statement lines
     organization_id = db.Column(db.Integer, db.ForeignKey('organizations.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -668,6 +927,11 @@ class BankReconciliation(db.Model):
 class ReconciliationMatch(db.Model):
     """Model for matching bank transactions to journal entries during reconciliation"""
     __tablename__ = 'reconciliation_matches'
+    __table_args__ = (
+        db.Index('ix_reconciliation_matches_reconciliation', 'reconciliation_id'),
+        db.Index('ix_reconciliation_matches_bank_transaction', 'bank_transaction_id'),
+        db.Index('ix_reconciliation_matches_journal_line', 'journal_line_item_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     reconciliation_id = db.Column(db.Integer, db.ForeignKey('bank_reconciliations.id'), nullable=False)
@@ -724,9 +988,15 @@ class BankAccount(db.Model):
 class Payment(db.Model):
     """Model for payments received from customers"""
     __tablename__ = 'payments'
+    __table_args__ = (
+        db.Index('ix_payments_org_date', 'organization_id', 'payment_date'),
+        db.Index('ix_payments_customer', 'customer_id'),
+        db.UniqueConstraint('organization_id', 'payment_number', name='uq_payments_org_number'),
+        db.Index('ix_payments_org_updated', 'organization_id', 'updated_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    payment_number = db.Column(db.String(50), nullable=False, unique=True)
+    payment_number = db.Column(db.String(50), nullable=False)
     payment_date = db.Column(db.Date, nullable=False)
     amount = db.Column(db.Numeric(15, 2), nullable=False)
     payment_method = db.Column(db.Enum(PaymentMethod), nullable=False)
@@ -759,6 +1029,10 @@ class Payment(db.Model):
 class PaymentAllocation(db.Model):
     """Model for allocating payments to specific invoices"""
     __tablename__ = 'payment_allocations'
+    __table_args__ = (
+        db.Index('ix_payment_allocations_payment', 'payment_id'),
+        db.Index('ix_payment_allocations_invoice', 'invoice_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     payment_id = db.Column(db.Integer, db.ForeignKey('payments.id'), nullable=False)
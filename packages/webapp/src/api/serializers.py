@@ -0,0 +1,232 @@
+"""
+Declarative serializer schemas for the API.
+
+A schema lists the columns and relationships a resource exposes. The same
+declaration drives eager loading, so a list endpoint runs a fixed number of
+queries whatever the page size.
+"""
+
+from sqlalchemy.orm import joinedload, selectinload
+
+from packages.server.src.models import (
+    Account, BankTransaction, Customer, Invoice, InvoiceLineItem, Item,
+    JournalEntry, JournalLineItem, Payment, PaymentAllocation, TaxCode, User, Vendor
+)
+from .utils import serialize_model
+
+
+class Nested:
+    """Relationship rendered with another schema"""
+
+    def __init__(self, schema, many=False, source=None):
+        self.schema = schema
+        self.many = many
+        self.source = source
+
+
+class Schema:
+    """Base schema; subclasses set ``model`` and optionally the other attributes"""
+
+    model = None
+    fields = None  # Column names to include; None for all columns
+    exclude = ()
+    nested = {}  # Output key -> Nested
+
+    _options = None
+
+    @classmethod
+    def loader_options(cls):
+        """Eager loading options covering every nested relationship"""
+        if cls.__dict__.get('_options') is None:
+            options = []
+            for key, nested in cls.nested.items():
+                attribute = getattr(cls.model, nested.source or key)
+                # Collections load in one IN query; single objects join onto the parent
+                loader = selectinload(attribute) if nested.many else joinedload(attribute)
+                child_options = nested.schema.loader_options()
+                options.append(loader.options(*child_options) if child_options else loader)
+            cls._options = options
+        return cls._options
+
+    @classmethod
+    def apply(cls, query):
+        """Add the schema's eager loading to a query"""
+        return query.options(*cls.loader_options())
+
+    @classmethod
+    def dump(cls, obj):
+        """Serialize one object"""
+        if obj is None:
+            return None
+        data = serialize_model(obj, fields=cls.fields, exclude=cls.exclude)
+        for key, nested in cls.nested.items():
+            value = getattr(obj, nested.source or key)
+            if nested.many:
+                data[key] = [nested.schema.dump(child) for child in value]
+            else:
+                data[key] = nested.schema.dump(value)
+        return data
+
+    @classmethod
+    def dump_many(cls, objects):
+        """Serialize a sequence of objects"""
+        return [cls.dump(obj) for obj in objects]
+
+
+# Shared building blocks
+
+class UserSchema(Schema):
+    model = User
+    exclude = ('password_hash',)
+
+
+class CustomerSchema(Schema):
+    model = Customer
+
+
+class CustomerSummarySchema(Schema):
+    model = Customer
+    fields = ('id', 'display_name', 'email')
+
+
+class AccountSchema(Schema):
+    model = Account
+
+
+class AccountSummarySchema(Schema):
+    model = Account
+    fields = ('id', 'name', 'code')
+
+
+class LineAccountSchema(Schema):
+    model = Account
+    fields = ('id', 'code', 'name')
+
+
+class LineAccountDetailSchema(Schema):
+    model = Account
+    fields = ('id', 'code', 'name', 'type')
+
+
+class ItemSummarySchema(Schema):
+    model = Item
+    fields = ('id', 'name', 'sku')
+
+
+class InvoiceSummarySchema(Schema):
+    model = Invoice
+    fields = ('id', 'invoice_number', 'invoice_date', 'total', 'balance')
+
+
+# Invoices
+
+class InvoiceListSchema(Schema):
+    model = Invoice
+    nested = {'customer': Nested(CustomerSummarySchema)}
+
+
+class InvoiceLineItemSchema(Schema):
+    model = InvoiceLineItem
+    nested = {'item': Nested(ItemSummarySchema)}
+
+
+class InvoiceDetailSchema(Schema):
+    model = Invoice
+    nested = {
+        'customer': Nested(CustomerSchema),
+        'line_items': Nested(InvoiceLineItemSchema, many=True),
+    }
+
+
+# Payments
+
+class PaymentListSchema(Schema):
+    model = Payment
+    nested = {
+        'customer': Nested(CustomerSummarySchema),
+        'deposit_account': Nested(AccountSummarySchema),
+    }
+
+
+class PaymentAllocationSchema(Schema):
+    model = PaymentAllocation
+    nested = {'invoice': Nested(InvoiceSummarySchema)}
+
+
+class PaymentDetailSchema(Schema):
+    model = Payment
+    nested = {
+        'customer': Nested(CustomerSchema),
+        'deposit_account': Nested(AccountSchema),
+        'allocations': Nested(PaymentAllocationSchema, many=True),
+    }
+
+
+# Journal entries
+
+class JournalLineItemSchema(Schema):
+    model = JournalLineItem
+    nested = {'account': Nested(LineAccountSchema)}
+
+
+class JournalLineItemDetailSchema(Schema):
+    model = JournalLineItem
+    nested = {'account': Nested(LineAccountDetailSchema)}
+
+
+class JournalEntryListSchema(Schema):
+    model = JournalEntry
+    nested = {
+        'created_by': Nested(UserSchema, source='creator'),
+        'line_items': Nested(JournalLineItemSchema, many=True),
+    }
+
+
+class JournalEntryDetailSchema(Schema):
+    model = JournalEntry
+    nested = {
+        'created_by': Nested(UserSchema, source='creator'),
+        'line_items': Nested(JournalLineItemDetailSchema, many=True),
+    }
+
+
+# Banking
+
+class BankTransactionSchema(Schema):
+    model = BankTransaction
+    nested = {'reconciled_by': Nested(UserSchema)}
+
+
+# Sync feeds; related records sync as resources of their own, so only owned lines are nested
+
+def plain_schema(model):
+    """Column-only schema for a model"""
+    return type(f'{model.__name__}SyncSchema', (Schema,), {'model': model})
+
+
+class InvoiceSyncSchema(Schema):
+    model = Invoice
+    nested = {'line_items': Nested(plain_schema(InvoiceLineItem), many=True)}
+
+
+class JournalEntrySyncSchema(Schema):
+    model = JournalEntry
+    nested = {'line_items': Nested(plain_schema(JournalLineItem), many=True)}
+
+
+class PaymentSyncSchema(Schema):
+    model = Payment
+    nested = {'allocations': Nested(plain_schema(PaymentAllocation), many=True)}
+
+
+SYNC_SCHEMAS = {
+    Account: plain_schema(Account),
+    BankTransaction: plain_schema(BankTransaction),
+    Customer: plain_schema(Customer),
+    Invoice: InvoiceSyncSchema,
+    Item: plain_schema(Item),
+    JournalEntry: JournalEntrySyncSchema,
+    Payment: PaymentSyncSchema,
+    TaxCode: plain_schema(TaxCode),
+    Vendor: plain_schema(Vendor),
+}
@@ -5,8 +5,13 @@ API Utilities and Helper Functions
 from functools import wraps
 from flask import jsonify, request, current_app
 from flask_login import current_user
+import base64
+import json
 import jwt
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from enum import Enum
+from sqlalchemy import and_, func, literal, or_, tuple_, types as sa_types
 from packages.server.src.models import User
 
 def api_response(data=None, message=None, status_code=200, errors=None):
@@ -71,11 +76,173 @@ def validate_json_request(required_fields=None):
         return decorated_function
     return decorator
 
-def paginate_query(query, page=1, per_page=20, max_per_page=100):
-    """Paginate a SQLAlchemy query"""
+class InvalidCursor(ValueError):
+    """Raised for a pagination cursor that cannot be decoded or does not fit the request"""
+
+# Lowest value of each column type, which NULLs sort as when keyset paging.
+# Enums have none (a native enum rejects any other value) and are ordered by
+# a NULL flag instead.
+NULL_SENTINELS = (
+    (sa_types.DateTime, datetime.min),
+    (sa_types.Date, date.min),
+    (sa_types.Boolean, False),
+    (sa_types.Integer, -2 ** 63),
+    (sa_types.Numeric, Decimal('-1e18')),
+    (sa_types.String, ''),
+)
+
+class SortKey:
+    """Column a list is ordered by, with the primary key as tie-breaker"""
+    
+    def __init__(self, model, column, descending=False, coalesce_nulls=False):
+        self.model = model
+        self.column = column
+        self.descending = descending
+        self.sentinel = None
+        self.has_value = None
+        if coalesce_nulls and column is not model.id and model.__table__.columns[column.key].nullable:
+            column_type = model.__table__.columns[column.key].type
+            if isinstance(column_type, sa_types.Enum):
+                self.has_value = column.isnot(None)
+                return
+            self.sentinel = next(
+                (value for sentinel_type, value in NULL_SENTINELS if isinstance(column_type, sentinel_type)),
+                None
+            )
+            if self.sentinel is None:
+                raise InvalidCursor(f'Cannot page through {column.key} with a cursor; sort by another column')
+    
+    @property
+    def name(self):
+        return self.column.key
+    
+    @property
+    def expression(self):
+        """Sort column, with NULLs replaced by the type's lowest value when coalescing"""
+        return self.column if self.sentinel is None else func.coalesce(self.column, literal(self.sentinel))
+    
+    def order_by(self, reverse=False):
+        descending = self.descending != reverse
+        columns = [self.model.id] if self.column is self.model.id else [self.expression, self.model.id]
+        if self.has_value is not None:
+            # NULLs first ascending, last descending, as with a sentinel
+            columns.insert(0, self.has_value)
+        return [column.desc() if descending else column.asc() for column in columns]
+    
+    def after(self, value, row_id, reverse=False):
+        """Criterion for rows that come after (value, row_id) in this order"""
+        descending = self.descending != reverse
+        if self.column is self.model.id:
+            return self.model.id < row_id if descending else self.model.id > row_id
+        if self.has_value is not None:
+            return self._after_nullable(value, row_id, descending)
+        if value is None and self.sentinel is not None:
+            value = self.sentinel
+        key = tuple_(self.expression, self.model.id)
+        return key < (value, row_id) if descending else key > (value, row_id)
+    
+    def _after_nullable(self, value, row_id, descending):
+        """``after`` for a column whose NULLs come before every value"""
+        is_null = self.column.is_(None)
+        if value is None:
+            null_rows = and_(is_null, self.model.id < row_id if descending else self.model.id > row_id)
+            return null_rows if descending else or_(null_rows, self.has_value)
+        key = tuple_(self.column, self.model.id)
+        return or_(is_null, key < (value, row_id)) if descending else and_(self.has_value, key > (value, row_id))
+
+def apply_sorting(query, model, default_sort, default_order='asc'):
+    """Order a list query by the sort_by/sort_order request arguments; returns (query, sort)"""
+    columns = model.__table__.columns
+    sort_by = request.args.get('sort_by', default_sort)
+    if sort_by not in columns:
+        sort_by = default_sort
+    sort_order = request.args.get('sort_order', default_order)
+    
+    sort = SortKey(model, getattr(model, sort_by), descending=(sort_order == 'desc'))
+    return query.order_by(*sort.order_by()), sort
+
+def _encode_cursor(sort, item, direction):
+    value = getattr(item, sort.name)
+    converter = column_converters(sort.model).get(sort.name)
+    if converter is not None and value is not None:
+        value = converter(value)
+    payload = {'s': sort.name, 'o': 'desc' if sort.descending else 'asc',
+               'v': value, 'id': item.id, 'd': direction}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode().rstrip('=')
+
+def _decode_cursor(cursor, sort):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if payload['s'] != sort.name or payload['o'] != ('desc' if sort.descending else 'asc'):
+            raise InvalidCursor('Cursor does not match the requested sort order')
+        value = payload['v']
+        column_type = sort.model.__table__.columns[sort.name].type
+        if value is not None:
+            if isinstance(column_type, sa_types.DateTime):
+                value = datetime.fromisoformat(value)
+            elif isinstance(column_type, sa_types.Date):
+                value = date.fromisoformat(value)
+            elif isinstance(column_type, sa_types.Enum) and column_type.enum_class:
+                value = column_type.enum_class(value)
+            elif isinstance(column_type, sa_types.Numeric):
+                value = Decimal(str(value))
+        row_id = payload['id']
+        if isinstance(sort.model.__table__.columns['id'].type, sa_types.Integer):
+            row_id = int(row_id)
+        return value, row_id, payload['d']
+    except InvalidCursor:
+        raise
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor('Invalid pagination cursor') from e
+
+def _keyset_page(query, sort, cursor, per_page):
+    """One page of a keyset-paginated query plus its pagination details"""
+    # NULLs cannot be compared, so a nullable sort column is paged on coalesce(column, lowest value)
+    sort = SortKey(sort.model, sort.column, sort.descending, coalesce_nulls=True)
+    
+    query = query.order_by(None)
+    backwards = False
+    if cursor:
+        value, row_id, direction = _decode_cursor(cursor, sort)
+        backwards = direction == 'prev'
+        query = query.filter(sort.after(value, row_id, reverse=backwards))
+    
+    rows = query.order_by(*sort.order_by(reverse=backwards)).limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    items = rows[:per_page]
+    if backwards:
+        items.reverse()
+    
+    has_next = has_more if not backwards else bool(cursor)
+    has_prev = has_more if backwards else bool(cursor)
+    pagination = {
+        'per_page': per_page,
+        'sort_by': sort.name,
+        'has_next': has_next and bool(items),
+        'has_prev': has_prev and bool(items),
+        'next_cursor': _encode_cursor(sort, items[-1], 'next') if has_next and items else None,
+        'prev_cursor': _encode_cursor(sort, items[0], 'prev') if has_prev and items else None
+    }
+    return items, pagination
+
+def paginate_query(query, page=1, per_page=20, max_per_page=100, sort=None):
+    """
+    Paginate a SQLAlchemy query.
+    
+    With a ``sort`` key and a ``cursor`` request argument (empty for the first
+    page) the query is paginated on (sort column, id) instead of OFFSET, and the
+    total is only counted when ``include_total`` is requested.
+    """
     if per_page > max_per_page:
         per_page = max_per_page
     
+    if sort is not None and 'cursor' in request.args:
+        items, pagination = _keyset_page(query, sort, request.args.get('cursor', ''), per_page)
+        if request.args.get('include_total', '').lower() in ('1', 'true'):
+            pagination['total'] = query.order_by(None).count()
+        return {'items': items, 'pagination': pagination}
+    
     total = query.count()
     items = query.offset((page - 1) * per_page).limit(per_page).all()
     
@@ -102,16 +269,59 @@ def get_pagination_params():
     
     return page, per_page
 
+def _isoformat(value):
+    return value.isoformat()
+
+def _to_float(value):
+    return float(value)
+
+def _enum_value(value):
+    return value.value if isinstance(value, Enum) else value
+
+def _converter_for(column_type):
+    """Function turning a column's Python value into a JSON value"""
+    if isinstance(column_type, (sa_types.Date, sa_types.DateTime, sa_types.Time)):
+        return _isoformat
+    if isinstance(column_type, sa_types.Enum):
+        return _enum_value
+    if isinstance(column_type, sa_types.Numeric):
+        return _to_float
+    return None
+
+_column_cache = {}
+
+def column_converters(model_class):
+    """Column names and value converters of a model, computed once per class"""
+    columns = _column_cache.get(model_class)
+    if columns is None:
+        columns = {
+            column.name: _converter_for(column.type)
+            for column in model_class.__table__.columns
+        }
+        _column_cache[model_class] = columns
+    return columns
+
+def _convert_value(value):
+    """Convert a non-column attribute value"""
+    if hasattr(value, 'isoformat'):  # datetime/date objects
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
 def serialize_model(model, fields=None, exclude=None):
     """Serialize SQLAlchemy model to dictionary"""
     if model is None:
         return None
     
     result = {}
+    columns = column_converters(type(model))
     
     # Get all columns if no specific fields requested
     if fields is None:
-        fields = [column.name for column in model.__table__.columns]
+        fields = columns
     
     for field in fields:
         if exclude and field in exclude:
@@ -119,13 +329,12 @@ def serialize_model(model, fields=None, exclude=None):
             
         value = getattr(model, field, None)
         
-        # Handle special types
-        if hasattr(value, 'isoformat'):  # datetime/date objects
-            value = value.isoformat()
-        elif hasattr(value, '__float__'):  # Decimal objects
-            value = float(value)
-        elif hasattr(value, 'value'):  # Enum objects
-            value = value.value
+        if field in columns:
+            convert = columns[field]
+            if convert is not None and value is not None:
+                value = convert(value)
+        else:
+            value = _convert_value(value)
         
         result[field] = value
     
@@ -16,10 +16,20 @@ from .organizations import organizations_api_bp
 from .banking import banking_api_bp
 from .journal import journal_api_bp
 from .tax import tax_api_bp
+from .sync import sync_api_bp
+from .export import export_api_bp
+from .jobs import jobs_api_bp
+from .recurring_invoices import recurring_invoices_api_bp
+from ..utils import InvalidCursor, api_error
 
 # Create API v1 blueprint
 api_v1_bp = Blueprint('api_v1', __name__)
 
+@api_v1_bp.errorhandler(InvalidCursor)
+def handle_invalid_cursor(error):
+    """Report a bad pagination cursor as a client error"""
+    return api_error(str(error), 400)
+
 def register_api_blueprints(app):
     """Register all API v1 blueprints"""
     
@@ -36,6 +46,10 @@ def register_api_blueprints(app):
     api_v1_bp.register_blueprint(banking_api_bp, url_prefix='/banking')
     api_v1_bp.register_blueprint(journal_api_bp, url_prefix='/journal')
     api_v1_bp.register_blueprint(tax_api_bp, url_prefix='/tax')
+    api_v1_bp.register_blueprint(sync_api_bp, url_prefix='/sync')
+    api_v1_bp.register_blueprint(export_api_bp, url_prefix='/export')
+    api_v1_bp.register_blueprint(jobs_api_bp, url_prefix='/jobs')
+    api_v1_bp.register_blueprint(recurring_invoices_api_bp, url_prefix='/recurring-invoices')
     
     # Register main API v1 blueprint
     app.register_blueprint(api_v1_bp, url_prefix='/api/v1')
@@ -9,7 +9,7 @@ from packages.server.src.models import Account, AccountType
 from packages.server.src.database import db
 from ..utils import (
     api_response, api_error, require_api_key, validate_json_request,
-    paginate_query, get_pagination_params, serialize_model
+    paginate_query, get_pagination_params, apply_sorting, serialize_model
 )
 
 accounts_api_bp = Blueprint('accounts_api', __name__)
@@ -45,18 +45,10 @@ def list_accounts():
         )
     
     # Apply sorting
-    sort_by = request.args.get('sort_by', 'code')
-    sort_order = request.args.get('sort_order', 'asc')
-    
-    if hasattr(Account, sort_by):
-        column = getattr(Account, sort_by)
-        if sort_order == 'desc':
-            query = query.order_by(column.desc())
-        else:
-            query = query.order_by(column.asc())
+    query, sort = apply_sorting(query, Account, 'code', 'asc')
     
     # Paginate results
-    result = paginate_query(query, page, per_page)
+    result = paginate_query(query, page, per_page, sort=sort)
     
     # Serialize accounts with parent information
     accounts_data = []
@@ -6,9 +6,10 @@ from flask import Blueprint, request, jsonify
 from flask_login import current_user
 from sqlalchemy.exc import IntegrityError
 from packages.server.src.models import BankAccount, BankTransaction, db
+from packages.webapp.src.api.serializers import BankTransactionSchema
 from packages.webapp.src.api.utils import (
     api_response, api_error, require_api_key, validate_json_request,
-    paginate_query, get_pagination_params, serialize_model
+    paginate_query, get_pagination_params, apply_sorting, serialize_model
 )
 
 banking_api_bp = Blueprint('banking_api', __name__)
@@ -52,25 +53,13 @@ def list_transactions(account_id):
         query = query.filter(BankTransaction.description.ilike(f'%{search}%'))
 
     # Apply sorting
-    sort_by = request.args.get('sort_by', 'transaction_date')
-    sort_order = request.args.get('sort_order', 'desc')
+    query, sort = apply_sorting(query, BankTransaction, 'transaction_date', 'desc')
 
-    if hasattr(BankTransaction, sort_by):
-        column = getattr(BankTransaction, sort_by)
-        if sort_order == 'desc':
-            query = query.order_by(column.desc())
-        else:
-            query = query.order_by(column.asc())
-
-    # Paginate results
-    result = paginate_query(query, page, per_page)
+    # Paginate results with reconciling users loaded alongside
+    result = paginate_query(BankTransactionSchema.apply(query), page, per_page, sort=sort)
 
     # Serialize transactions
-    transactions_data = []
-    for transaction in result['items']:
-        transaction_data = serialize_model(transaction)
-        transaction_data['reconciled_by'] = serialize_model(transaction.reconciled_by) if transaction.reconciled_by else None
-        transactions_data.append(transaction_data)
+    transactions_data = BankTransactionSchema.dump_many(result['items'])
 
     return api_response(data={
         'transactions': transactions_data,
@@ -99,8 +88,7 @@ def get_transaction(account_id, transaction_id):
     if not transaction:
         return api_error('Transaction not found', 404)
 
-    transaction_data = serialize_model(transaction)
-    transaction_data['reconciled_by'] = serialize_model(transaction.reconciled_by) if transaction.reconciled_by else None
+    transaction_data = BankTransactionSchema.dump(transaction)
 
     return api_response(data={'transaction': transaction_data})
 
@@ -135,8 +123,7 @@ def reconcile_transaction(account_id, transaction_id):
         transaction.reconciled_by_id = current_user.id
         db.session.commit()
 
-        transaction_data = serialize_model(transaction)
-        transaction_data['reconciled_by'] = serialize_model(transaction.reconciled_by)
+        transaction_data = BankTransactionSchema.dump(transaction)
 
         return api_response(
             data={'transaction': transaction_data},
@@ -9,7 +9,7 @@ from packages.server.src.models import Customer
 from packages.server.src.database import db
 from ..utils import (
     api_response, api_error, require_api_key, validate_json_request,
-    paginate_query, get_pagination_params, serialize_model
+    paginate_query, get_pagination_params, apply_sorting, serialize_model
 )
 
 customers_api_bp = Blueprint('customers_api', __name__)
@@ -36,18 +36,10 @@ def list_customers():
         )
     
     # Apply sorting
-    sort_by = request.args.get('sort_by', 'display_name')
-    sort_order = request.args.get('sort_order', 'asc')
-    
-    if hasattr(Customer, sort_by):
-        column = getattr(Customer, sort_by)
-        if sort_order == 'desc':
-            query = query.order_by(column.desc())
-        else:
-            query = query.order_by(column.asc())
+    query, sort = apply_sorting(query, Customer, 'display_name', 'asc')
     
     # Paginate results
-    result = paginate_query(query, page, per_page)
+    result = paginate_query(query, page, per_page, sort=sort)
     
     # Serialize customers
     customers_data = [serialize_model(customer) for customer in result['items']]
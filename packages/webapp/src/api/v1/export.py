@@ -0,0 +1,247 @@
+"""
+Export API endpoints
+
+Exports stream rows from a server-side cursor straight into the response, so
+memory use stays flat however many rows are exported. Output is NDJSON by
+default; ``format=json`` sends a single JSON array instead. The same exports
+can be written to a file by an ``export`` background job.
+"""
+
+import json
+from datetime import datetime
+
+from flask import Blueprint, Response, request, stream_with_context
+from flask_login import current_user
+from sqlalchemy import func, select
+from packages.server.src.models import (
+    Account, BankAccount, BankTransaction, Customer, Invoice, InvoiceStatus, JournalEntry,
+    JournalLineItem, db
+)
+from packages.webapp.src.api.utils import api_error, require_api_key, column_converters
+from packages.webapp.src.utils.jobs import job_handler
+
+export_api_bp = Blueprint('export_api', __name__)
+
+BATCH_SIZE = 1000
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+}
+
+
+def _field(attribute, key=None):
+    """Output key, column and JSON converter for a mapped column attribute"""
+    name = attribute.property.columns[0].name
+    return key or attribute.key, attribute, column_converters(attribute.class_)[name]
+
+
+def _model_fields(model, exclude=()):
+    return [
+        _field(getattr(model, column.name))
+        for column in model.__table__.columns
+        if column.name not in exclude
+    ]
+
+
+JOURNAL_LINE_FIELDS = _model_fields(JournalLineItem) + [
+    _field(JournalEntry.entry_number),
+    _field(JournalEntry.date, 'entry_date'),
+    _field(JournalEntry.status, 'entry_status'),
+    _field(Account.code, 'account_code'),
+    _field(Account.name, 'account_name'),
+]
+
+INVOICE_FIELDS = _model_fields(Invoice) + [
+    _field(Customer.display_name, 'customer_name'),
+]
+
+BANK_TRANSACTION_FIELDS = _model_fields(BankTransaction, exclude=('fingerprint',))
+
+
+def _parse_date(value):
+    """Date from a YYYY-MM-DD string, or None when missing or malformed"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+def journal_lines_statement(organization_id, start_date=None, end_date=None, account_id=None):
+    """Journal lines with their entry and account"""
+    statement = select(*[column for _, column, _ in JOURNAL_LINE_FIELDS]).join(
+        JournalEntry, JournalLineItem.journal_entry_id == JournalEntry.id
+    ).join(
+        Account, JournalLineItem.account_id == Account.id
+    ).where(
+        JournalEntry.organization_id == organization_id
+    )
+    if start_date:
+        statement = statement.where(JournalEntry.date >= start_date)
+    if end_date:
+        statement = statement.where(JournalEntry.date <= end_date)
+    if account_id:
+        statement = statement.where(JournalLineItem.account_id == account_id)
+    return statement.order_by(JournalEntry.date, JournalEntry.id, JournalLineItem.id)
+
+
+def invoices_statement(organization_id, start_date=None, end_date=None, status=None):
+    """Invoices with their customer name; raises ValueError for an unknown status"""
+    statement = select(*[column for _, column, _ in INVOICE_FIELDS]).join(
+        Customer, Invoice.customer_id == Customer.id
+    ).where(
+        Invoice.organization_id == organization_id
+    )
+    if start_date:
+        statement = statement.where(Invoice.invoice_date >= start_date)
+    if end_date:
+        statement = statement.where(Invoice.invoice_date <= end_date)
+    if status:
+        statement = statement.where(Invoice.status == InvoiceStatus(status))
+    return statement.order_by(Invoice.invoice_date, Invoice.id)
+
+
+def bank_transactions_statement(organization_id, start_date=None, end_date=None, account_id=None):
+    """Bank transactions, optionally for one bank account"""
+    statement = select(*[column for _, column, _ in BANK_TRANSACTION_FIELDS]).where(
+        BankTransaction.organization_id == organization_id
+    )
+    if account_id:
+        statement = statement.where(BankTransaction.account_id == account_id)
+    if start_date:
+        statement = statement.where(BankTransaction.transaction_date >= start_date)
+    if end_date:
+        statement = statement.where(BankTransaction.transaction_date <= end_date)
+    return statement.order_by(BankTransaction.transaction_date, BankTransaction.id)
+
+
+# Export name -> (statement builder, fields)
+EXPORTS = {
+    'journal-lines': (journal_lines_statement, JOURNAL_LINE_FIELDS),
+    'invoices': (invoices_statement, INVOICE_FIELDS),
+    'bank-transactions': (bank_transactions_statement, BANK_TRANSACTION_FIELDS),
+}
+
+
+def _encode_rows(result, fields):
+    """JSON text of each row, a batch at a time"""
+    for rows in result.partitions():
+        yield [
+            json.dumps({
+                key: convert(value) if convert is not None and value is not None else value
+                for (key, _, convert), value in zip(fields, row)
+            }, separators=(',', ':'))
+            for row in rows
+        ]
+
+
+def iter_export(statement, fields, fmt):
+    """Text chunks of an export, one per batch of rows"""
+    result = db.session.execute(statement.execution_options(yield_per=BATCH_SIZE))
+    if fmt == 'json':
+        yield '['
+        first = True
+        for batch in _encode_rows(result, fields):
+            chunk = ','.join(batch)
+            yield chunk if first else ',' + chunk
+            first = False
+        yield ']'
+    else:
+        for batch in _encode_rows(result, fields):
+            yield '\n'.join(batch) + '\n'
+
+
+def _stream(statement, fields, name):
+    """Streaming response for a select of ``fields``"""
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in FORMATS:
+        return api_error('Unsupported export format', 400)
+
+    response = Response(stream_with_context(iter_export(statement, fields, fmt)), mimetype=FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename={name}.{fmt}'
+    # Let proxies pass batches on as they are produced
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@job_handler('export', public=True)
+def run_export_job(context, resource, format='ndjson', start_date=None, end_date=None,
+                   account_id=None, status=None):
+    """Write an export to a file on the job pool"""
+    if resource not in EXPORTS or format not in FORMATS:
+        raise ValueError(f'Unsupported export: {resource} as {format}')
+    build, fields = EXPORTS[resource]
+
+    filters = {'start_date': _parse_date(start_date), 'end_date': _parse_date(end_date)}
+    if resource == 'invoices':
+        filters['status'] = status
+    else:
+        filters['account_id'] = account_id
+    statement = build(context.organization_id, **filters)
+
+    total = db.session.execute(
+        select(func.count()).select_from(statement.order_by(None).subquery())
+    ).scalar() or 1
+    path = context.file_path(f'{resource}.{format}')
+    batches = 0
+    with open(path, 'w', encoding='utf-8') as out:
+        for chunk in iter_export(statement, fields, format):
+            out.write(chunk)
+            batches += 1
+            if batches % 10 == 0:
+                context.progress(95 * min(1, batches * BATCH_SIZE / total), f'{batches * BATCH_SIZE} rows written')
+
+    return {'path': path, 'rows': total}
+
+
+@export_api_bp.route('/journal-lines', methods=['GET'])
+@require_api_key
+def export_journal_lines():
+    """Stream journal lines with their entry and account"""
+    statement = journal_lines_statement(
+        current_user.organization_id,
+        start_date=_parse_date(request.args.get('start_date')),
+        end_date=_parse_date(request.args.get('end_date')),
+        account_id=request.args.get('account_id', type=int)
+    )
+    return _stream(statement, JOURNAL_LINE_FIELDS, 'journal-lines')
+
+
+@export_api_bp.route('/invoices', methods=['GET'])
+@require_api_key
+def export_invoices():
+    """Stream invoices with their customer name"""
+    try:
+        statement = invoices_statement(
+            current_user.organization_id,
+            start_date=_parse_date(request.args.get('start_date')),
+            end_date=_parse_date(request.args.get('end_date')),
+            status=request.args.get('status')
+        )
+    except ValueError:
+        return api_error('Invalid invoice status', 400)
+    return _stream(statement, INVOICE_FIELDS, 'invoices')
+
+
+@export_api_bp.route('/bank-transactions', methods=['GET'])
+@require_api_key
+def export_bank_transactions():
+    """Stream bank transactions, optionally for one bank account"""
+    account_id = request.args.get('account_id', type=int)
+    if account_id:
+        bank_account = BankAccount.query.filter_by(
+            id=account_id,
+            organization_id=current_user.organization_id
+        ).first()
+        if not bank_account:
+            return api_error('Bank account not found', 404)
+
+    statement = bank_transactions_statement(
+        current_user.organization_id,
+        start_date=_parse_date(request.args.get('start_date')),
+        end_date=_parse_date(request.args.get('end_date')),
+        account_id=account_id
+    )
+    return _stream(statement, BANK_TRANSACTION_FIELDS, 'bank-transactions')
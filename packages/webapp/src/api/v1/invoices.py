@@ -2,20 +2,72 @@
 Invoices API endpoints
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from flask_login import current_user
 from sqlalchemy.exc import IntegrityError
 from datetime import date, datetime
 from decimal import Decimal
 from packages.server.src.models import Invoice, InvoiceLineItem, Customer, Item, InvoiceStatus
 from packages.server.src.database import db
+from packages.webapp.src.utils.invoicing import InvoiceBatchService, InvoiceDraft, InvoiceLineDraft
+from packages.webapp.src.utils.sequences import next_number
+from ..serializers import InvoiceDetailSchema, InvoiceListSchema
 from ..utils import (
     api_response, api_error, require_api_key, validate_json_request,
-    paginate_query, get_pagination_params, serialize_model
+    paginate_query, get_pagination_params, apply_sorting, serialize_model
 )
 
 invoices_api_bp = Blueprint('invoices_api', __name__)
 
+DEFAULT_BATCH_MAX_INVOICES = 5000
+DEFAULT_BATCH_CHUNK_SIZE = 500
+
+def parse_batch_invoice(item):
+    """InvoiceDraft for one item of a batch; raises ValueError with the reason it is unusable"""
+    if not isinstance(item, dict):
+        raise ValueError('Invoice must be a JSON object')
+    missing = [field for field in ('customer_id', 'invoice_date', 'due_date', 'line_items') if item.get(field) is None]
+    if missing:
+        raise ValueError(f'Missing required fields: {", ".join(missing)}')
+    try:
+        invoice_date = datetime.strptime(item['invoice_date'], '%Y-%m-%d').date()
+        due_date = datetime.strptime(item['due_date'], '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ValueError('Invalid date format. Use YYYY-MM-DD')
+    if not isinstance(item['line_items'], list) or not all(isinstance(line, dict) for line in item['line_items']):
+        raise ValueError('line_items must be a list of objects')
+    try:
+        status = InvoiceStatus(item.get('status', InvoiceStatus.DRAFT.value))
+    except ValueError:
+        raise ValueError('Invalid status')
+    return InvoiceDraft(
+        customer_id=item['customer_id'],
+        invoice_date=invoice_date,
+        due_date=due_date,
+        lines=[
+            InvoiceLineDraft(
+                description=line.get('description'),
+                quantity=line.get('quantity', 1),
+                rate=line.get('rate'),
+                tax_rate=line.get('tax_rate', 0),
+                item_id=line.get('item_id')
+            )
+            for line in item['line_items']
+        ],
+        reference=item.get('reference'),
+        currency=item.get('currency', 'USD'),
+        terms=item.get('terms'),
+        notes=item.get('notes'),
+        discount_amount=item.get('discount_amount', 0),
+        status=status
+    )
+
+def batch_status_code(succeeded, failed, success_code):
+    """``success_code`` when nothing failed, 207 for a partial success, 400 when nothing succeeded"""
+    if failed == 0:
+        return success_code
+    return 207 if succeeded else 400
+
 @invoices_api_bp.route('', methods=['GET'])
 @require_api_key
 def list_invoices():
@@ -69,29 +121,13 @@ def list_invoices():
         )
     
     # Apply sorting
-    sort_by = request.args.get('sort_by', 'invoice_date')
-    sort_order = request.args.get('sort_order', 'desc')
+    query, sort = apply_sorting(query, Invoice, 'invoice_date', 'desc')
     
-    if hasattr(Invoice, sort_by):
-        column = getattr(Invoice, sort_by)
-        if sort_order == 'desc':
-            query = query.order_by(column.desc())
-        else:
-            query = query.order_by(column.asc())
-    
-    # Paginate results
-    result = paginate_query(query, page, per_page)
+    # Paginate results with customers loaded alongside
+    result = paginate_query(InvoiceListSchema.apply(query), page, per_page, sort=sort)
     
     # Serialize invoices with customer information
-    invoices_data = []
-    for invoice in result['items']:
-        invoice_data = serialize_model(invoice)
-        invoice_data['customer'] = {
-            'id': invoice.customer.id,
-            'display_name': invoice.customer.display_name,
-            'email': invoice.customer.email
-        }
-        invoices_data.append(invoice_data)
+    invoices_data = InvoiceListSchema.dump_many(result['items'])
     
     return api_response(data={
         'invoices': invoices_data,
@@ -102,7 +138,7 @@ def list_invoices():
 @require_api_key
 def get_invoice(invoice_id):
     """Get specific invoice by ID with line items"""
-    invoice = Invoice.query.filter_by(
+    invoice = InvoiceDetailSchema.apply(Invoice.query).filter_by(
         id=invoice_id,
         organization_id=current_user.organization_id
     ).first()
@@ -110,22 +146,8 @@ def get_invoice(invoice_id):
     if not invoice:
         return api_error('Invoice not found', 404)
     
-    invoice_data = serialize_model(invoice)
-    invoice_data['customer'] = serialize_model(invoice.customer)
-    
-    # Add line items
-    line_items_data = []
-    for line_item in invoice.line_items:
-        line_data = serialize_model(line_item)
-        if line_item.item:
-            line_data['item'] = {
-                'id': line_item.item.id,
-                'name': line_item.item.name,
-                'sku': line_item.item.sku
-            }
-        line_items_data.append(line_data)
-    
-    invoice_data['line_items'] = line_items_data
+    # Invoice with customer and line items
+    invoice_data = InvoiceDetailSchema.dump(invoice)
     
     return api_response(data={'invoice': invoice_data})
 
@@ -152,15 +174,7 @@ def create_invoice():
     
     try:
         # Generate invoice number
-        last_invoice = Invoice.query.filter_by(
-            organization_id=current_user.organization_id
-        ).order_by(Invoice.id.desc()).first()
-        
-        if last_invoice:
-            last_number = int(last_invoice.invoice_number.split('-')[-1])
-            invoice_number = f"INV-{last_number + 1:05d}"
-        else:
-            invoice_number = "INV-00001"
+        invoice_number = next_number(current_user.organization_id, 'invoice')
         
         # Parse dates
         invoice_date = datetime.strptime(data['invoice_date'], '%Y-%m-%d').date()
@@ -239,6 +253,124 @@ def create_invoice():
         db.session.rollback()
         return api_error(f'Failed to create invoice: {str(e)}', 500)
 
+@invoices_api_bp.route('/batch', methods=['POST'])
+@require_api_key
+def create_invoices_batch():
+    """
+    Create many invoices from {"invoices": [...]}. Customers and items are
+    resolved once for the batch and valid invoices are written in chunked
+    transactions even when others fail; the response has a result per
+    invoice, in request order.
+    """
+    max_invoices = current_app.config.get('INVOICE_BATCH_MAX_INVOICES', DEFAULT_BATCH_MAX_INVOICES)
+    chunk_size = current_app.config.get('INVOICE_BATCH_CHUNK_SIZE', DEFAULT_BATCH_CHUNK_SIZE)
+
+    data = request.get_json(silent=True)
+    items = data.get('invoices') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return api_error('Request body must be JSON with a non-empty invoices array', 400)
+    if len(items) > max_invoices:
+        return api_error(f'A batch can contain at most {max_invoices} invoices', 413)
+
+    service = InvoiceBatchService(current_user.organization_id, current_user.id)
+    results = []
+
+    def failed(index, message):
+        results.append({'index': index, 'status': 'error', 'error': message})
+
+    drafts = []
+    for index, item in enumerate(items):
+        try:
+            drafts.append((index, parse_batch_invoice(item)))
+        except ValueError as e:
+            failed(index, str(e))
+
+    errors = service.validate([draft for _, draft in drafts])
+    valid = []
+    for position, (index, draft) in enumerate(drafts):
+        if position in errors:
+            failed(index, errors[position])
+        else:
+            valid.append((index, draft))
+
+    for start in range(0, len(valid), chunk_size):
+        chunk = valid[start:start + chunk_size]
+        try:
+            created = service.create([draft for _, draft in chunk], validate=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            for index, _ in chunk:
+                failed(index, f'Failed to create invoice: {str(e)}')
+            continue
+        for (index, _), invoice in zip(chunk, created):
+            results.append({
+                'index': index,
+                'status': 'created',
+                'id': invoice.id,
+                'invoice_number': invoice.invoice_number,
+                'total': float(invoice.total)
+            })
+
+    results.sort(key=lambda result: result['index'])
+    created = sum(1 for result in results if result['status'] == 'created')
+    failed_count = len(results) - created
+
+    return api_response(
+        data={'results': results, 'summary': {'created': created, 'failed': failed_count}},
+        message=f'{created} invoices created, {failed_count} failed',
+        status_code=batch_status_code(created, failed_count, 201)
+    )
+
+@invoices_api_bp.route('/status/batch', methods=['PUT'])
+@require_api_key
+@validate_json_request(['invoice_ids', 'status'])
+def update_invoice_status_batch():
+    """
+    Move many invoices to one status with a single UPDATE per chunk. Invoices
+    leaving draft for sent, partial, paid or overdue get their journal
+    entries posted; the response has a result per invoice id.
+    """
+    data = request.get_json()
+    max_invoices = current_app.config.get('INVOICE_BATCH_MAX_INVOICES', DEFAULT_BATCH_MAX_INVOICES)
+    chunk_size = current_app.config.get('INVOICE_BATCH_CHUNK_SIZE', DEFAULT_BATCH_CHUNK_SIZE)
+
+    invoice_ids = data['invoice_ids']
+    if not isinstance(invoice_ids, list) or not invoice_ids or not all(isinstance(i, int) for i in invoice_ids):
+        return api_error('invoice_ids must be a non-empty list of integers', 400)
+    if len(invoice_ids) > max_invoices:
+        return api_error(f'A batch can contain at most {max_invoices} invoices', 413)
+    try:
+        new_status = InvoiceStatus(data['status'])
+    except ValueError:
+        return api_error('Invalid status', 400)
+
+    service = InvoiceBatchService(current_user.organization_id, current_user.id)
+    invoice_ids = list(dict.fromkeys(invoice_ids))
+    outcomes = {}
+    for start in range(0, len(invoice_ids), chunk_size):
+        chunk = invoice_ids[start:start + chunk_size]
+        try:
+            outcomes.update(service.transition(chunk, new_status))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            outcomes.update((invoice_id, f'Failed to update status: {str(e)}') for invoice_id in chunk)
+
+    results = [
+        {'id': invoice_id, 'status': 'error', 'error': error} if error
+        else {'id': invoice_id, 'status': 'updated'}
+        for invoice_id, error in outcomes.items()
+    ]
+    updated = sum(1 for result in results if result['status'] == 'updated')
+    failed_count = len(results) - updated
+
+    return api_response(
+        data={'results': results, 'summary': {'updated': updated, 'failed': failed_count}},
+        message=f'{updated} invoices updated to {new_status.value}, {failed_count} failed',
+        status_code=batch_status_code(updated, failed_count, 200)
+    )
+
 @invoices_api_bp.route('/<int:invoice_id>', methods=['PUT'])
 @require_api_key
 @validate_json_request(['customer_id', 'invoice_date', 'due_date'])
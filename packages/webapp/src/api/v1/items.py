@@ -9,7 +9,7 @@ from packages.server.src.models import Item, Account
 from packages.server.src.database import db
 from ..utils import (
     api_response, api_error, require_api_key, validate_json_request,
-    paginate_query, get_pagination_params, serialize_model
+    paginate_query, get_pagination_params, apply_sorting, serialize_model
 )
 
 items_api_bp = Blueprint('items_api', __name__)
@@ -46,18 +46,10 @@ def list_items():
         query = query.filter(Item.type == item_type)
     
     # Apply sorting
-    sort_by = request.args.get('sort_by', 'name')
-    sort_order = request.args.get('sort_order', 'asc')
-    
-    if hasattr(Item, sort_by):
-        column = getattr(Item, sort_by)
-        if sort_order == 'desc':
-            query = query.order_by(column.desc())
-        else:
-            query = query.order_by(column.asc())
+    query, sort = apply_sorting(query, Item, 'name', 'asc')
     
     # Paginate results
-    result = paginate_query(query, page, per_page)
+    result = paginate_query(query, page, per_page, sort=sort)
     
     # Serialize items with account information
     items_data = []
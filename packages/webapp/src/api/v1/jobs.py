@@ -0,0 +1,118 @@
+"""
+Background jobs API endpoints
+"""
+
+import json
+import os
+
+from flask import Blueprint, request, send_file
+from flask_login import current_user
+from packages.server.src.models import Job
+from packages.webapp.src.api.utils import (
+    api_response, api_error, require_api_key, validate_json_request,
+    paginate_query, get_pagination_params, apply_sorting, serialize_model
+)
+from packages.webapp.src.utils.jobs import PUBLIC_JOB_TYPES, cancel_job, submit_job
+
+jobs_api_bp = Blueprint('jobs_api', __name__)
+
+def _job_data(job):
+    job_data = serialize_model(job, exclude=('params', 'result', 'result_path'))
+    job_data['params'] = json.loads(job.params) if job.params else {}
+    job_data['result'] = json.loads(job.result) if job.result else None
+    job_data['has_file'] = bool(job.result_path)
+    job_data['queue_seconds'] = job.queue_seconds
+    job_data['run_seconds'] = job.run_seconds
+    return job_data
+
+def _get_job(job_id):
+    return Job.query.filter_by(
+        id=job_id,
+        organization_id=current_user.organization_id
+    ).first()
+
+@jobs_api_bp.route('', methods=['GET'])
+@require_api_key
+def list_jobs():
+    """Get paginated list of background jobs"""
+    page, per_page = get_pagination_params()
+
+    query = Job.query.filter_by(organization_id=current_user.organization_id)
+
+    # Apply filters
+    status = request.args.get('status')
+    if status:
+        query = query.filter(Job.status == status)
+    job_type = request.args.get('job_type')
+    if job_type:
+        query = query.filter(Job.job_type == job_type)
+
+    # Apply sorting
+    query, sort = apply_sorting(query, Job, 'created_at', 'desc')
+
+    result = paginate_query(query, page, per_page, sort=sort)
+
+    return api_response(data={
+        'jobs': [_job_data(job) for job in result['items']],
+        'pagination': result['pagination']
+    })
+
+@jobs_api_bp.route('', methods=['POST'])
+@require_api_key
+@validate_json_request(['job_type'])
+def create_job():
+    """Start a background job"""
+    data = request.get_json()
+
+    job_type = data['job_type']
+    if job_type not in PUBLIC_JOB_TYPES:
+        return api_error(f'Job type must be one of: {", ".join(sorted(PUBLIC_JOB_TYPES))}', 400)
+
+    params = data.get('params') or {}
+    if not isinstance(params, dict):
+        return api_error('params must be an object', 400)
+
+    job = submit_job(job_type, params,
+                     organization_id=current_user.organization_id, user_id=current_user.id)
+
+    return api_response(
+        data={'job': _job_data(job)},
+        message='Job started',
+        status_code=202
+    )
+
+@jobs_api_bp.route('/<job_id>', methods=['GET'])
+@require_api_key
+def get_job(job_id):
+    """Get a job's status, progress and timings"""
+    job = _get_job(job_id)
+    if not job:
+        return api_error('Job not found', 404)
+
+    return api_response(data={'job': _job_data(job)})
+
+@jobs_api_bp.route('/<job_id>/cancel', methods=['POST'])
+@require_api_key
+def cancel(job_id):
+    """Request cancellation of a job"""
+    job = _get_job(job_id)
+    if not job:
+        return api_error('Job not found', 404)
+
+    if not cancel_job(job):
+        return api_error('Job has already finished', 409)
+
+    return api_response(data={'job': _job_data(job)}, message='Cancellation requested')
+
+@jobs_api_bp.route('/<job_id>/download', methods=['GET'])
+@require_api_key
+def download(job_id):
+    """Download the file a job produced"""
+    job = _get_job(job_id)
+    if not job:
+        return api_error('Job not found', 404)
+
+    if job.status != 'completed' or not job.result_path or not os.path.exists(job.result_path):
+        return api_error('No file is available for this job', 404)
+
+    return send_file(job.result_path, as_attachment=True)
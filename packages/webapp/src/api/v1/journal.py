@@ -2,19 +2,122 @@
 Journal Entries API endpoints
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from flask_login import current_user
 from sqlalchemy.exc import IntegrityError
 from datetime import datetime
 from decimal import Decimal
+from itertools import islice
+import json
 from packages.server.src.models import JournalEntry, JournalLineItem, Account, db
+from packages.webapp.src.utils.ledger_posting import DraftEntry, DraftLine, LedgerPostingService, PostingError
+from packages.webapp.src.api.serializers import JournalEntryDetailSchema, JournalEntryListSchema
 from packages.webapp.src.api.utils import (
     api_response, api_error, require_api_key, validate_json_request,
-    paginate_query, get_pagination_params, serialize_model
+    paginate_query, get_pagination_params, apply_sorting, serialize_model
 )
 
 journal_api_bp = Blueprint('journal_api', __name__)
 
+DEFAULT_BATCH_MAX_ENTRIES = 10000
+DEFAULT_BATCH_CHUNK_SIZE = 500
+
+def parse_draft_lines(line_items_data):
+    """Journal lines from request data; amounts are checked when posting"""
+    return [
+        DraftLine(
+            account_id=line_data.get('account_id'),
+            debit=Decimal(str(line_data.get('debit', 0))),
+            credit=Decimal(str(line_data.get('credit', 0))),
+            description=line_data.get('description', '')
+        )
+        for line_data in line_items_data or []
+    ]
+
+def parse_batch_entry(item):
+    """DraftEntry for one item of a batch; raises ValueError with the reason it is unusable"""
+    if not isinstance(item, dict):
+        raise ValueError('Entry must be a JSON object')
+    missing = [field for field in ('date', 'description', 'line_items') if item.get(field) is None]
+    if missing:
+        raise ValueError(f'Missing required fields: {", ".join(missing)}')
+    try:
+        entry_date = datetime.strptime(item['date'], '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ValueError('Invalid date format. Use YYYY-MM-DD')
+    if not isinstance(item['line_items'], list) or not all(isinstance(line, dict) for line in item['line_items']):
+        raise ValueError('line_items must be a list of objects')
+    try:
+        lines = parse_draft_lines(item['line_items'])
+    except (ArithmeticError, ValueError):
+        raise ValueError('Invalid debit or credit amount')
+    if not all(isinstance(line.account_id, int) for line in lines):
+        raise ValueError('account_id must be an integer')
+    return DraftEntry(
+        date=entry_date,
+        lines=lines,
+        description=item['description'],
+        reference=item.get('reference', ''),
+        source_type='manual'
+    )
+
+def iter_ndjson_entries():
+    """Entries of an NDJSON request body, read as they arrive; unparsable lines yield None"""
+    for line in request.stream:
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+
+def post_journal_batch(service, items, validate_size, chunk_size, results):
+    """
+    Validate items ``validate_size`` at a time and post the valid ones in
+    transactions of ``chunk_size`` entries, appending a result per item
+    """
+    def failed(index, message):
+        results.append({'index': index, 'status': 'error', 'error': message})
+
+    items = iter(items)
+    while True:
+        group = list(islice(items, validate_size))
+        if not group:
+            return
+
+        drafts = []
+        for index, item in group:
+            try:
+                drafts.append((index, parse_batch_entry(item)))
+            except ValueError as e:
+                failed(index, str(e))
+
+        # One account lookup covers the whole group
+        errors = service.validate([draft for _, draft in drafts])
+        valid = []
+        for position, (index, draft) in enumerate(drafts):
+            if position in errors:
+                failed(index, errors[position])
+            else:
+                valid.append((index, draft))
+
+        for start in range(0, len(valid), chunk_size):
+            chunk = valid[start:start + chunk_size]
+            try:
+                posted = service.post([draft for _, draft in chunk], validate=False)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                for index, _ in chunk:
+                    failed(index, f'Failed to create journal entry: {str(e)}')
+                continue
+            for (index, _), entry in zip(chunk, posted):
+                results.append({
+                    'index': index,
+                    'status': 'created',
+                    'id': entry.id,
+                    'entry_number': entry.entry_number
+                })
+
 @journal_api_bp.route('', methods=['GET'])
 @require_api_key
 def list_journal_entries():
@@ -49,38 +152,13 @@ def list_journal_entries():
         )
 
     # Apply sorting
-    sort_by = request.args.get('sort_by', 'date')
-    sort_order = request.args.get('sort_order', 'desc')
+    query, sort = apply_sorting(query, JournalEntry, 'date', 'desc')
 
-    if hasattr(JournalEntry, sort_by):
-        column = getattr(JournalEntry, sort_by)
-        if sort_order == 'desc':
-            query = query.order_by(column.desc())
-        else:
-            query = query.order_by(column.asc())
-
-    # Paginate results
-    result = paginate_query(query, page, per_page)
+    # Paginate results with creators, line items and accounts loaded alongside
+    result = paginate_query(JournalEntryListSchema.apply(query), page, per_page, sort=sort)
 
     # Serialize journal entries with line items
-    entries_data = []
-    for entry in result['items']:
-        entry_data = serialize_model(entry)
-        entry_data['created_by'] = serialize_model(entry.creator) if entry.creator else None
-
-        # Add line items
-        line_items_data = []
-        for line_item in entry.line_items:
-            line_data = serialize_model(line_item)
-            line_data['account'] = {
-                'id': line_item.account.id,
-                'code': line_item.account.code,
-                'name': line_item.account.name
-            } if line_item.account else None
-            line_items_data.append(line_data)
-
-        entry_data['line_items'] = line_items_data
-        entries_data.append(entry_data)
+    entries_data = JournalEntryListSchema.dump_many(result['items'])
 
     return api_response(data={
         'journal_entries': entries_data,
@@ -91,7 +169,7 @@ def list_journal_entries():
 @require_api_key
 def get_journal_entry(entry_id):
     """Get specific journal entry with line items"""
-    entry = JournalEntry.query.filter_by(
+    entry = JournalEntryDetailSchema.apply(JournalEntry.query).filter_by(
         id=entry_id,
         organization_id=current_user.organization_id
     ).first()
@@ -99,22 +177,8 @@ def get_journal_entry(entry_id):
     if not entry:
         return api_error('Journal entry not found', 404)
 
-    entry_data = serialize_model(entry)
-    entry_data['created_by'] = serialize_model(entry.creator) if entry.creator else None
-
-    # Add line items with account details
-    line_items_data = []
-    for line_item in entry.line_items:
-        line_data = serialize_model(line_item)
-        line_data['account'] = {
-            'id': line_item.account.id,
-            'code': line_item.account.code,
-            'name': line_item.account.name,
-            'type': line_item.account.type.value if line_item.account.type else None
-        } if line_item.account else None
-        line_items_data.append(line_data)
-
-    entry_data['line_items'] = line_items_data
+    # Entry with line items and account details
+    entry_data = JournalEntryDetailSchema.dump(entry)
 
     return api_response(data={'journal_entry': entry_data})
 
@@ -129,99 +193,25 @@ def create_journal_entry():
         # Parse date
         entry_date = datetime.strptime(data['date'], '%Y-%m-%d').date()
 
-        # Generate entry number
-        last_entry = JournalEntry.query.filter(
-            JournalEntry.organization_id == current_user.organization_id,
-            JournalEntry.entry_number.like('JE%')
-        ).order_by(JournalEntry.id.desc()).first()
-
-        if last_entry:
-            last_num = int(last_entry.entry_number[2:])
-            entry_number = f"JE{last_num + 1:06d}"
-        else:
-            entry_number = "JE000001"
-
-        # Create journal entry
-        journal_entry = JournalEntry(
-            entry_number=entry_number,
-            reference=data.get('reference', ''),
+        draft = DraftEntry(
             date=entry_date,
+            lines=parse_draft_lines(data['line_items']),
             description=data['description'],
-            source_type='manual',
-            organization_id=current_user.organization_id,
-            created_by=current_user.id
+            reference=data.get('reference', ''),
+            source_type='manual'
         )
 
-        # Process line items
-        line_items_data = data['line_items']
-        if not line_items_data or len(line_items_data) < 2:
-            return api_error('Journal entry must have at least 2 line items', 400)
-
-        total_debit = Decimal('0.00')
-        total_credit = Decimal('0.00')
-
-        for line_data in line_items_data:
-            account_id = line_data.get('account_id')
-            debit = Decimal(str(line_data.get('debit', 0)))
-            credit = Decimal(str(line_data.get('credit', 0)))
-            description = line_data.get('description', '')
-
-            # Validate account exists and belongs to organization
-            account = Account.query.filter_by(
-                id=account_id,
-                organization_id=current_user.organization_id,
-                is_active=True
-            ).first()
-
-            if not account:
-                return api_error(f'Account {account_id} not found or inactive', 400)
-
-            # Validate amounts
-            if debit < 0 or credit < 0:
-                return api_error('Debit and credit amounts cannot be negative', 400)
-
-            if debit > 0 and credit > 0:
-                return api_error('Line item cannot have both debit and credit amounts', 400)
-
-            if debit == 0 and credit == 0:
-                return api_error('Line item must have either debit or credit amount', 400)
-
-            line_item = JournalLineItem(
-                account_id=account_id,
-                debit=debit,
-                credit=credit,
-                description=description
-            )
-
-            journal_entry.line_items.append(line_item)
-            total_debit += debit
-            total_credit += credit
-
-        # Validate balanced entry
-        if total_debit != total_credit:
-            return api_error(
-                f'Journal entry is not balanced. Debit total: {total_debit}, Credit total: {total_credit}',
-                400
-            )
-
-        db.session.add(journal_entry)
+        # Validate, number and post the entry with its balance updates
+        service = LedgerPostingService(current_user.organization_id, current_user.id)
+        try:
+            posted = service.post_entry(draft)
+        except PostingError as e:
+            return api_error(str(e), 400)
+
         db.session.commit()
 
         # Return created entry
-        entry_data = serialize_model(journal_entry)
-        entry_data['created_by'] = serialize_model(journal_entry.creator)
-
-        line_items_data = []
-        for line_item in journal_entry.line_items:
-            line_data = serialize_model(line_item)
-            line_data['account'] = {
-                'id': line_item.account.id,
-                'code': line_item.account.code,
-                'name': line_item.account.name
-            }
-            line_items_data.append(line_data)
-
-        entry_data['line_items'] = line_items_data
+        entry_data = JournalEntryListSchema.dump(db.session.get(JournalEntry, posted.id))
 
         return api_response(
             data={'journal_entry': entry_data},
@@ -235,6 +225,55 @@ def create_journal_entry():
         db.session.rollback()
         return api_error(f'Failed to create journal entry: {str(e)}', 500)
 
+@journal_api_bp.route('/batch', methods=['POST'])
+@require_api_key
+def create_journal_entries_batch():
+    """
+    Create many journal entries from a JSON body ({"entries": [...]}) or an
+    NDJSON stream with one entry per line. Valid entries are posted in
+    chunked transactions even when others fail; the response has a result
+    per entry, in request order.
+    """
+    max_entries = current_app.config.get('JOURNAL_BATCH_MAX_ENTRIES', DEFAULT_BATCH_MAX_ENTRIES)
+    chunk_size = current_app.config.get('JOURNAL_BATCH_CHUNK_SIZE', DEFAULT_BATCH_CHUNK_SIZE)
+    service = LedgerPostingService(current_user.organization_id, current_user.id)
+    results = []
+
+    if request.mimetype == 'application/x-ndjson':
+        # Streamed bodies are validated chunk by chunk as they are read
+        entries = enumerate(iter_ndjson_entries())
+        post_journal_batch(service, islice(entries, max_entries), chunk_size, chunk_size, results)
+        if next(entries, None) is not None:
+            results.append({
+                'index': max_entries,
+                'status': 'error',
+                'error': f'Batch limit of {max_entries} entries exceeded; the remaining entries were not read'
+            })
+    else:
+        data = request.get_json(silent=True)
+        entries = data.get('entries') if isinstance(data, dict) else None
+        if not isinstance(entries, list) or not entries:
+            return api_error('Request body must be JSON with a non-empty entries array, or NDJSON', 400)
+        if len(entries) > max_entries:
+            return api_error(f'A batch can contain at most {max_entries} entries', 413)
+        post_journal_batch(service, enumerate(entries), len(entries), chunk_size, results)
+
+    results.sort(key=lambda result: result['index'])
+    created = sum(1 for result in results if result['status'] == 'created')
+    failed = len(results) - created
+    if failed == 0:
+        status_code = 201
+    elif created:
+        status_code = 207
+    else:
+        status_code = 400
+
+    return api_response(
+        data={'results': results, 'summary': {'created': created, 'failed': failed}},
+        message=f'{created} journal entries created, {failed} failed',
+        status_code=status_code
+    )
+
 @journal_api_bp.route('/<int:entry_id>', methods=['PUT'])
 @require_api_key
 @validate_json_request(['date', 'description', 'line_items'])
@@ -263,79 +302,32 @@ def update_journal_entry(entry_id):
         entry.date = entry_date
         entry.description = data['description']
 
-        # Remove existing line items
-        JournalLineItem.query.filter_by(journal_entry_id=entry_id).delete()
-
-        # Process new line items
-        line_items_data = data['line_items']
-        if not line_items_data or len(line_items_data) < 2:
-            return api_error('Journal entry must have at least 2 line items', 400)
-
-        total_debit = Decimal('0.00')
-        total_credit = Decimal('0.00')
-
-        for line_data in line_items_data:
-            account_id = line_data.get('account_id')
-            debit = Decimal(str(line_data.get('debit', 0)))
-            credit = Decimal(str(line_data.get('credit', 0)))
-            description = line_data.get('description', '')
-
-            # Validate account exists and belongs to organization
-            account = Account.query.filter_by(
-                id=account_id,
-                organization_id=current_user.organization_id,
-                is_active=True
-            ).first()
-
-            if not account:
-                return api_error(f'Account {account_id} not found or inactive', 400)
-
-            # Validate amounts
-            if debit < 0 or credit < 0:
-                return api_error('Debit and credit amounts cannot be negative', 400)
-
-            if debit > 0 and credit > 0:
-                return api_error('Line item cannot have both debit and credit amounts', 400)
-
-            if debit == 0 and credit == 0:
-                return api_error('Line item must have either debit or credit amount', 400)
-
-            line_item = JournalLineItem(
-                journal_entry_id=entry_id,
-                account_id=account_id,
-                debit=debit,
-                credit=credit,
-                description=description
-            )
-
-            db.session.add(line_item)
-            total_debit += debit
-            total_credit += credit
-
-        # Validate balanced entry
-        if total_debit != total_credit:
-            return api_error(
-                f'Journal entry is not balanced. Debit total: {total_debit}, Credit total: {total_credit}',
-                400
-            )
+        lines = parse_draft_lines(data['line_items'])
+        service = LedgerPostingService(current_user.organization_id, current_user.id)
+        errors = service.validate([DraftEntry(date=entry_date, lines=lines)])
+        if errors:
+            return api_error(errors[0], 400)
+
+        # Replace the line items through the ORM so balance snapshots follow,
+        # moving the account balances from the old lines to the new ones
+        service.adjust_balances(entry.line_items, reverse=True)
+        entry.line_items.clear()
+        for number, line in enumerate(lines, start=1):
+            entry.line_items.append(JournalLineItem(
+                account_id=line.account_id,
+                debit=line.debit,
+                credit=line.credit,
+                description=line.description,
+                line_number=number
+            ))
+        entry.debit_total = sum(line.debit for line in lines)
+        entry.credit_total = sum(line.credit for line in lines)
+        service.adjust_balances(lines)
 
         db.session.commit()
 
         # Return updated entry
-        entry_data = serialize_model(entry)
-        entry_data['created_by'] = serialize_model(entry.creator) if entry.creator else None
-
-        line_items_data = []
-        for line_item in entry.line_items:
-            line_data = serialize_model(line_item)
-            line_data['account'] = {
-                'id': line_item.account.id,
-                'code': line_item.account.code,
-                'name': line_item.account.name
-            }
-            line_items_data.append(line_data)
-
-        entry_data['line_items'] = line_items_data
+        entry_data = JournalEntryListSchema.dump(entry)
 
         return api_response(
             data={'journal_entry': entry_data},
@@ -365,10 +357,10 @@ def delete_journal_entry(entry_id):
         return api_error('Only manual journal entries can be deleted', 400)
 
     try:
-        # Delete line items first
-        JournalLineItem.query.filter_by(journal_entry_id=entry_id).delete()
-
-        # Delete journal entry
+        # Delete journal entry; line items are removed by the cascade
+        LedgerPostingService(current_user.organization_id, current_user.id).adjust_balances(
+            entry.line_items, reverse=True
+        )
         db.session.delete(entry)
         db.session.commit()
 
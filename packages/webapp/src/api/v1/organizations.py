@@ -99,28 +99,9 @@ def get_organization_stats():
     if not current_user.organization:
         return api_error('No organization found', 404)
     
-    org_id = current_user.organization_id
+    # Count various entities (cached until the records change)
+    from packages.webapp.src.utils.metrics_cache import get_metric
     
-    # Count various entities
-    from packages.server.src.models import Customer, Vendor, Item, Invoice, Account
-    
-    stats = {
-        'customers': Customer.query.filter_by(
-            organization_id=org_id, is_active=True
-        ).count(),
-        'vendors': Vendor.query.filter_by(
-            organization_id=org_id, is_active=True
-        ).count(),
-        'items': Item.query.filter_by(
-            organization_id=org_id, is_active=True
-        ).count(),
-        'invoices': Invoice.query.filter_by(
-            organization_id=org_id
-        ).count(),
-        'accounts': Account.query.filter_by(
-            organization_id=org_id, is_active=True
-        ).count(),
-        'users': len(current_user.organization.users)
-    }
+    stats = dict(get_metric('entity_counts', current_user.organization_id))
     
     return api_response(data={'stats': stats})
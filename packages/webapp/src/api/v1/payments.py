@@ -9,13 +9,27 @@ from datetime import date, datetime
 from decimal import Decimal
 from packages.server.src.models import Payment, PaymentAllocation, PaymentMethod, Customer, Invoice, Account
 from packages.server.src.database import db
+from packages.webapp.src.utils.payment_allocation import (
+    allocate_payment, parse_allocation_list, release_allocations
+)
+from packages.webapp.src.utils.sequences import next_number
+from ..serializers import PaymentDetailSchema, PaymentListSchema
 from ..utils import (
     api_response, api_error, require_api_key, validate_json_request,
-    paginate_query, get_pagination_params, serialize_model
+    paginate_query, get_pagination_params, apply_sorting, serialize_model
 )
 
 payments_api_bp = Blueprint('payments_api', __name__)
 
+def allocation_data(allocation):
+    return {
+        'invoice_id': allocation.invoice_id,
+        'invoice_number': allocation.invoice_number,
+        'amount': float(allocation.amount),
+        'invoice_balance': float(allocation.balance),
+        'invoice_status': allocation.status.value
+    }
+
 @payments_api_bp.route('', methods=['GET'])
 @require_api_key
 def list_payments():
@@ -69,34 +83,13 @@ def list_payments():
         )
     
     # Apply sorting
-    sort_by = request.args.get('sort_by', 'payment_date')
-    sort_order = request.args.get('sort_order', 'desc')
+    query, sort = apply_sorting(query, Payment, 'payment_date', 'desc')
     
-    if hasattr(Payment, sort_by):
-        column = getattr(Payment, sort_by)
-        if sort_order == 'desc':
-            query = query.order_by(column.desc())
-        else:
-            query = query.order_by(column.asc())
-    
-    # Paginate results
-    result = paginate_query(query, page, per_page)
+    # Paginate results with customers and deposit accounts loaded alongside
+    result = paginate_query(PaymentListSchema.apply(query), page, per_page, sort=sort)
     
     # Serialize payments with customer information
-    payments_data = []
-    for payment in result['items']:
-        payment_data = serialize_model(payment)
-        payment_data['customer'] = {
-            'id': payment.customer.id,
-            'display_name': payment.customer.display_name,
-            'email': payment.customer.email
-        }
-        payment_data['deposit_account'] = {
-            'id': payment.deposit_account.id,
-            'name': payment.deposit_account.name,
-            'code': payment.deposit_account.code
-        }
-        payments_data.append(payment_data)
+    payments_data = PaymentListSchema.dump_many(result['items'])
     
     return api_response(data={
         'payments': payments_data,
@@ -107,7 +100,7 @@ def list_payments():
 @require_api_key
 def get_payment(payment_id):
     """Get specific payment by ID with allocations"""
-    payment = Payment.query.filter_by(
+    payment = PaymentDetailSchema.apply(Payment.query).filter_by(
         id=payment_id,
         organization_id=current_user.organization_id
     ).first()
@@ -115,24 +108,8 @@ def get_payment(payment_id):
     if not payment:
         return api_error('Payment not found', 404)
     
-    payment_data = serialize_model(payment)
-    payment_data['customer'] = serialize_model(payment.customer)
-    payment_data['deposit_account'] = serialize_model(payment.deposit_account)
-    
-    # Add allocations
-    allocations_data = []
-    for allocation in payment.payment_allocations:
-        allocation_data = serialize_model(allocation)
-        allocation_data['invoice'] = {
-            'id': allocation.invoice.id,
-            'invoice_number': allocation.invoice.invoice_number,
-            'invoice_date': allocation.invoice.invoice_date.isoformat(),
-            'total': float(allocation.invoice.total),
-            'balance': float(allocation.invoice.balance)
-        }
-        allocations_data.append(allocation_data)
-    
-    payment_data['allocations'] = allocations_data
+    # Payment with customer, deposit account and allocations
+    payment_data = PaymentDetailSchema.dump(payment)
     
     return api_response(data={'payment': payment_data})
 
@@ -163,15 +140,7 @@ def create_payment():
     
     try:
         # Generate payment number
-        last_payment = Payment.query.filter_by(
-            organization_id=current_user.organization_id
-        ).order_by(Payment.id.desc()).first()
-        
-        if last_payment:
-            last_number = int(last_payment.payment_number.split('-')[-1])
-            payment_number = f"PMT-{last_number + 1:05d}"
-        else:
-            payment_number = "PMT-00001"
+        payment_number = next_number(current_user.organization_id, 'payment')
         
         # Parse date and validate payment method
         payment_date = datetime.strptime(data['payment_date'], '%Y-%m-%d').date()
@@ -200,41 +169,12 @@ def create_payment():
         db.session.add(payment)
         db.session.flush()  # Get payment ID
         
-        # Handle allocations if provided
-        allocations_data = data.get('allocations', [])
-        total_allocated = Decimal('0.00')
-        
-        for allocation_data in allocations_data:
-            invoice_id = allocation_data.get('invoice_id')
-            allocated_amount = Decimal(str(allocation_data.get('amount', 0)))
-            
-            if allocated_amount > 0 and invoice_id:
-                # Validate invoice exists and belongs to customer
-                invoice = Invoice.query.filter_by(
-                    id=invoice_id,
-                    customer_id=data['customer_id'],
-                    organization_id=current_user.organization_id
-                ).first()
-                
-                if invoice and allocated_amount <= invoice.balance:
-                    allocation = PaymentAllocation(
-                        payment_id=payment.id,
-                        invoice_id=invoice_id,
-                        allocated_amount=allocated_amount
-                    )
-                    db.session.add(allocation)
-                    
-                    # Update invoice
-                    invoice.paid_amount = (invoice.paid_amount or 0) + allocated_amount
-                    invoice.balance = invoice.total - invoice.paid_amount
-                    
-                    # Update invoice status
-                    if invoice.balance <= 0:
-                        invoice.status = InvoiceStatus.PAID
-                    elif invoice.paid_amount > 0:
-                        invoice.status = InvoiceStatus.PARTIAL
-                    
-                    total_allocated += allocated_amount
+        # Apply to the listed invoices and, with auto_apply, open invoices oldest due first
+        allocations = allocate_payment(
+            payment,
+            parse_allocation_list(data.get('allocations')),
+            auto=bool(data.get('auto_apply', False))
+        )
         
         db.session.commit()
         
@@ -242,6 +182,8 @@ def create_payment():
         payment_data = serialize_model(payment)
         payment_data['customer'] = serialize_model(customer)
         payment_data['deposit_account'] = serialize_model(deposit_account)
+        payment_data['allocations'] = [allocation_data(allocation) for allocation in allocations]
+        payment_data['unallocated_amount'] = float(amount - sum((allocation.amount for allocation in allocations), Decimal('0.00')))
         
         return api_response(
             data={'payment': payment_data},
@@ -273,19 +215,7 @@ def update_payment(payment_id):
     
     try:
         # Reverse existing allocations
-        for allocation in payment.payment_allocations:
-            invoice = allocation.invoice
-            invoice.paid_amount = (invoice.paid_amount or 0) - allocation.allocated_amount
-            invoice.balance = invoice.total - invoice.paid_amount
-            
-            # Update invoice status
-            if invoice.balance >= invoice.total:
-                invoice.status = InvoiceStatus.SENT
-            elif invoice.paid_amount > 0:
-                invoice.status = InvoiceStatus.PARTIAL
-        
-        # Delete existing allocations
-        PaymentAllocation.query.filter_by(payment_id=payment.id).delete()
+        release_allocations(payment)
         
         # Update payment fields
         payment.payment_date = datetime.strptime(data['payment_date'], '%Y-%m-%d').date()
@@ -299,39 +229,17 @@ def update_payment(payment_id):
         payment.check_number = data.get('check_number')
         
         # Re-apply allocations
-        allocations_data = data.get('allocations', [])
-        for allocation_data in allocations_data:
-            invoice_id = allocation_data.get('invoice_id')
-            allocated_amount = Decimal(str(allocation_data.get('amount', 0)))
-            
-            if allocated_amount > 0 and invoice_id:
-                invoice = Invoice.query.filter_by(
-                    id=invoice_id,
-                    customer_id=data['customer_id'],
-                    organization_id=current_user.organization_id
-                ).first()
-                
-                if invoice:
-                    allocation = PaymentAllocation(
-                        payment_id=payment.id,
-                        invoice_id=invoice_id,
-                        allocated_amount=allocated_amount
-                    )
-                    db.session.add(allocation)
-                    
-                    # Update invoice
-                    invoice.paid_amount = (invoice.paid_amount or 0) + allocated_amount
-                    invoice.balance = invoice.total - invoice.paid_amount
-                    
-                    # Update invoice status
-                    if invoice.balance <= 0:
-                        invoice.status = InvoiceStatus.PAID
-                    elif invoice.paid_amount > 0:
-                        invoice.status = InvoiceStatus.PARTIAL
+        db.session.flush()
+        allocations = allocate_payment(
+            payment,
+            parse_allocation_list(data.get('allocations')),
+            auto=bool(data.get('auto_apply', False))
+        )
         
         db.session.commit()
         
         payment_data = serialize_model(payment)
+        payment_data['allocations'] = [allocation_data(allocation) for allocation in allocations]
         
         return api_response(
             data={'payment': payment_data},
@@ -359,19 +267,7 @@ def delete_payment(payment_id):
     
     try:
         # Reverse allocations
-        for allocation in payment.payment_allocations:
-            invoice = allocation.invoice
-            invoice.paid_amount = (invoice.paid_amount or 0) - allocation.allocated_amount
-            invoice.balance = invoice.total - invoice.paid_amount
-            
-            # Update invoice status
-            if invoice.balance >= invoice.total:
-                invoice.status = InvoiceStatus.SENT
-            elif invoice.paid_amount > 0:
-                invoice.status = InvoiceStatus.PARTIAL
-        
-        # Delete allocations
-        PaymentAllocation.query.filter_by(payment_id=payment.id).delete()
+        release_allocations(payment)
         
         # Delete payment
         db.session.delete(payment)
@@ -0,0 +1,149 @@
+"""
+Recurring invoices API endpoints
+"""
+
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from flask import Blueprint, request
+from flask_login import current_user
+from packages.server.src.models import Customer, RecurringInvoice, RecurringInvoiceLineItem, db
+from packages.webapp.src.api.utils import (
+    api_response, api_error, require_api_key, validate_json_request,
+    paginate_query, get_pagination_params, apply_sorting, serialize_model
+)
+from packages.webapp.src.utils.recurring_invoices import FREQUENCIES
+
+recurring_invoices_api_bp = Blueprint('recurring_invoices_api', __name__)
+
+def _template_data(template):
+    template_data = serialize_model(template)
+    template_data['line_items'] = [serialize_model(line) for line in template.line_items]
+    return template_data
+
+@recurring_invoices_api_bp.route('', methods=['GET'])
+@require_api_key
+def list_recurring_invoices():
+    """Get paginated list of recurring invoice templates"""
+    page, per_page = get_pagination_params()
+
+    query = RecurringInvoice.query.filter_by(organization_id=current_user.organization_id)
+
+    # Apply filters
+    is_active = request.args.get('is_active')
+    if is_active is not None:
+        query = query.filter(RecurringInvoice.is_active == (is_active.lower() == 'true'))
+    customer_id = request.args.get('customer_id', type=int)
+    if customer_id:
+        query = query.filter(RecurringInvoice.customer_id == customer_id)
+
+    # Apply sorting
+    query, sort = apply_sorting(query, RecurringInvoice, 'next_run_date', 'asc')
+
+    result = paginate_query(query, page, per_page, sort=sort)
+
+    return api_response(data={
+        'recurring_invoices': [_template_data(template) for template in result['items']],
+        'pagination': result['pagination']
+    })
+
+@recurring_invoices_api_bp.route('', methods=['POST'])
+@require_api_key
+@validate_json_request(['name', 'customer_id', 'frequency', 'start_date', 'line_items'])
+def create_recurring_invoice():
+    """Create a recurring invoice template; its first invoice is generated on start_date"""
+    data = request.get_json()
+
+    customer = Customer.query.filter_by(
+        id=data['customer_id'],
+        organization_id=current_user.organization_id
+    ).first()
+    if not customer:
+        return api_error('Customer not found', 404)
+
+    if data['frequency'] not in FREQUENCIES:
+        return api_error(f"Frequency must be one of: {', '.join(FREQUENCIES)}", 400)
+
+    line_items_data = data['line_items']
+    if not isinstance(line_items_data, list) or not line_items_data:
+        return api_error('At least one line item is required', 400)
+
+    try:
+        start_date = datetime.strptime(data['start_date'], '%Y-%m-%d').date()
+        end_date = datetime.strptime(data['end_date'], '%Y-%m-%d').date() if data.get('end_date') else None
+    except (TypeError, ValueError):
+        return api_error('Invalid date format. Use YYYY-MM-DD', 400)
+    if end_date and end_date < start_date:
+        return api_error('End date cannot be before start date', 400)
+
+    try:
+        interval = int(data.get('interval', 1))
+        due_days = int(data.get('due_days', 30))
+        if interval < 1 or due_days < 0:
+            raise ValueError
+        line_items = []
+        for line_data in line_items_data:
+            if not line_data.get('description') and not line_data.get('item_id'):
+                return api_error('Each line item needs a description or an item_id', 400)
+            line_items.append(RecurringInvoiceLineItem(
+                item_id=line_data.get('item_id'),
+                description=line_data.get('description'),
+                quantity=Decimal(str(line_data.get('quantity', 1))),
+                rate=Decimal(str(line_data['rate'])) if line_data.get('rate') is not None else None,
+                tax_rate=Decimal(str(line_data.get('tax_rate', 0)))
+            ))
+        discount_amount = Decimal(str(data.get('discount_amount', 0)))
+    except (TypeError, ValueError, InvalidOperation):
+        return api_error('Invalid interval, due_days or amount', 400)
+
+    try:
+        template = RecurringInvoice(
+            name=data['name'],
+            customer_id=customer.id,
+            frequency=data['frequency'],
+            interval=interval,
+            start_date=start_date,
+            end_date=end_date,
+            next_run_date=start_date,
+            due_days=due_days,
+            auto_send=bool(data.get('auto_send', False)),
+            reference=data.get('reference'),
+            discount_amount=discount_amount,
+            currency=data.get('currency', 'USD'),
+            terms=data.get('terms'),
+            notes=data.get('notes'),
+            organization_id=current_user.organization_id,
+            created_by=current_user.id,
+            line_items=line_items
+        )
+        db.session.add(template)
+        db.session.commit()
+
+        return api_response(
+            data={'recurring_invoice': _template_data(template)},
+            message='Recurring invoice created successfully',
+            status_code=201
+        )
+    except Exception as e:
+        db.session.rollback()
+        return api_error(f'Failed to create recurring invoice: {str(e)}', 500)
+
+@recurring_invoices_api_bp.route('/<int:template_id>', methods=['DELETE'])
+@require_api_key
+def deactivate_recurring_invoice(template_id):
+    """Stop a recurring invoice; invoices already generated are kept"""
+    template = RecurringInvoice.query.filter_by(
+        id=template_id,
+        organization_id=current_user.organization_id
+    ).first()
+
+    if not template:
+        return api_error('Recurring invoice not found', 404)
+
+    try:
+        template.is_active = False
+        db.session.commit()
+        return api_response(message='Recurring invoice deactivated successfully')
+    except Exception as e:
+        db.session.rollback()
+        return api_error(f'Failed to deactivate recurring invoice: {str(e)}', 500)
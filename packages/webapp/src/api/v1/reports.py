@@ -15,6 +15,13 @@ from packages.server.src.models import (
     JournalEntry, JournalLineItem
 )
 from packages.server.src.database import db
+from packages.webapp.src.utils.date_buckets import (
+    BUCKET_UNITS, bucket_label, date_bucket, parse_fiscal_year_start
+)
+from packages.webapp.src.utils.ledger import (
+    get_account_balances, get_accounts_by_type, get_balances_at, get_period_balances
+)
+from packages.webapp.src.utils.metrics_cache import get_metric
 from ..utils import api_response, api_error, require_api_key, serialize_model
 
 reports_api_bp = Blueprint('reports_api', __name__)
@@ -66,21 +73,179 @@ def get_date_range_api(period=None, start_date=None, end_date=None):
     
     return start_date, end_date
 
-def calculate_account_balance_api(account_id, start_date=None, end_date=None):
-    """Calculate account balance for a given period"""
-    query = db.session.query(func.sum(JournalLineItem.debit - JournalLineItem.credit)).filter(
-        JournalLineItem.account_id == account_id
-    ).join(JournalEntry).filter(
-        JournalEntry.organization_id == current_user.organization_id
+# Comparative report columns: bucket unit and length in months
+REPORT_COLUMNS = {
+    'monthly': ('month', 1),
+    'quarterly': ('quarter', 3),
+    'yearly': ('fiscal_year', 12)
+}
+DEFAULT_PERIODS = {'total': 1, 'monthly': 12, 'quarterly': 4, 'yearly': 3}
+MAX_PERIODS = 36
+
+def bucket_start(day, unit, fiscal_year_start=None):
+    """First day of the month, quarter or fiscal year containing a date"""
+    if unit == 'month':
+        return day.replace(day=1)
+    if unit == 'quarter':
+        return date(day.year, (day.month - 1) // 3 * 3 + 1, 1)
+    month, month_day = parse_fiscal_year_start(fiscal_year_start)
+    start = date(day.year, month, month_day)
+    return start if start <= day else start.replace(year=day.year - 1)
+
+def get_report_columns(start_date, end_date):
+    """
+    Periods requested with ``columns``, ``periods`` and ``compare``.
+    Returns (columns, error) where each column is a dict with label,
+    start_date, end_date and whether it is a comparison column.
+    """
+    columns = request.args.get('columns', 'total')
+    compare = request.args.get('compare')
+    if columns not in DEFAULT_PERIODS:
+        return None, f'columns must be one of: {", ".join(DEFAULT_PERIODS)}'
+    if compare not in (None, 'prior_year'):
+        return None, 'compare must be prior_year'
+    try:
+        periods = int(request.args.get('periods', DEFAULT_PERIODS[columns]))
+    except ValueError:
+        return None, 'periods must be a number'
+    if not 1 <= periods <= MAX_PERIODS:
+        return None, f'periods must be between 1 and {MAX_PERIODS}'
+
+    if columns == 'total':
+        current = [(start_date, end_date, f'{start_date.isoformat()}/{end_date.isoformat()}')]
+    else:
+        unit, months = REPORT_COLUMNS[columns]
+        first = bucket_start(end_date, unit, current_user.organization.fiscal_year_start)
+        current = []
+        for index in range(periods):
+            start = first - relativedelta(months=months * index)
+            # The latest column ends at the requested end date
+            end = end_date if index == 0 else start + relativedelta(months=months) - timedelta(days=1)
+            current.insert(0, (start, end, bucket_label(start, unit)))
+
+    result = [
+        {'label': label, 'start_date': start, 'end_date': end, 'comparison': False}
+        for start, end, label in current
+    ]
+    if compare == 'prior_year':
+        for column in list(result):
+            start = column['start_date'] - relativedelta(years=1)
+            end = column['end_date'] - relativedelta(years=1)
+            label = (f'{start.isoformat()}/{end.isoformat()}' if columns == 'total'
+                     else bucket_label(start, REPORT_COLUMNS[columns][0]))
+            result.append({'label': label, 'start_date': start, 'end_date': end, 'comparison': True})
+    return result, None
+
+def comparative_profit_loss(columns):
+    """Profit & Loss matrix: one row per account, one value per column"""
+    organization_id = current_user.organization_id
+    account_types = [AccountType.INCOME, AccountType.EXPENSE]
+    accounts = get_accounts_by_type(organization_id, account_types)
+    balances = get_period_balances(
+        organization_id, [(column['start_date'], column['end_date']) for column in columns],
+        account_types=account_types
     )
-    
-    if start_date:
-        query = query.filter(JournalEntry.date >= start_date)
-    if end_date:
-        query = query.filter(JournalEntry.date <= end_date)
-    
-    balance = query.scalar() or Decimal('0.00')
-    return balance
+
+    rows = []
+    totals = {account_type: [Decimal('0.00')] * len(columns) for account_type in account_types}
+    for account_type in account_types:
+        for account in accounts[account_type]:
+            values = [period.natural(account) for period in balances]
+            totals[account_type] = [total + value for total, value in zip(totals[account_type], values)]
+            rows.append([float(value) for value in values])
+
+    return {
+        'columns': [_column_header(column) for column in columns],
+        'accounts': _account_headers(accounts, account_types),
+        'rows': rows,
+        'totals': {
+            'income': [float(value) for value in totals[AccountType.INCOME]],
+            'expenses': [float(value) for value in totals[AccountType.EXPENSE]],
+            'net_profit': [float(income - expense) for income, expense
+                           in zip(totals[AccountType.INCOME], totals[AccountType.EXPENSE])]
+        }
+    }
+
+def _earnings(balances, accounts):
+    """Income less expenses in a set of balances"""
+    income = sum((balances.natural(acc) for acc in accounts[AccountType.INCOME]), Decimal('0.00'))
+    expenses = sum((balances.natural(acc) for acc in accounts[AccountType.EXPENSE]), Decimal('0.00'))
+    return income - expenses
+
+def prior_fiscal_year_end(as_of):
+    """Last day of the fiscal year before the one containing a date"""
+    return bucket_start(as_of, 'fiscal_year', current_user.organization.fiscal_year_start) - timedelta(days=1)
+
+def comparative_balance_sheet(columns):
+    """Balance Sheet matrix with one column per period end"""
+    organization_id = current_user.organization_id
+    account_types = [AccountType.ASSET, AccountType.LIABILITY, AccountType.EQUITY]
+    accounts = get_accounts_by_type(
+        organization_id, account_types + [AccountType.INCOME, AccountType.EXPENSE]
+    )
+
+    # Earnings are split at the end of the prior fiscal year, so those balances are needed too
+    dates = [column['end_date'] for column in columns]
+    year_ends = [prior_fiscal_year_end(as_of) for as_of in dates]
+    balances = get_balances_at(organization_id, dates + year_ends)
+
+    rows = []
+    totals = {account_type: [Decimal('0.00')] * len(columns) for account_type in account_types}
+    for account_type in account_types:
+        for account in accounts[account_type]:
+            values = [balances[as_of].natural(account) for as_of in dates]
+            totals[account_type] = [total + value for total, value in zip(totals[account_type], values)]
+            rows.append([float(value) for value in values])
+
+    # Earnings are not closed into equity accounts: earlier fiscal years accumulate
+    # and the current one runs from its first day
+    accumulated_earnings = [_earnings(balances[year_end], accounts) for year_end in year_ends]
+    current_year_earnings = [
+        _earnings(balances[as_of], accounts) - accumulated
+        for as_of, accumulated in zip(dates, accumulated_earnings)
+    ]
+    retained_earnings = [
+        accumulated + current for accumulated, current in zip(accumulated_earnings, current_year_earnings)
+    ]
+    equity = [total + retained for total, retained in zip(totals[AccountType.EQUITY], retained_earnings)]
+
+    return {
+        'columns': [
+            {'label': column['end_date'].isoformat(), 'as_of_date': column['end_date'].isoformat(),
+             'comparison': column['comparison']}
+            for column in columns
+        ],
+        'accounts': _account_headers(accounts, account_types),
+        'rows': rows,
+        'totals': {
+            'assets': [float(value) for value in totals[AccountType.ASSET]],
+            'liabilities': [float(value) for value in totals[AccountType.LIABILITY]],
+            'equity': [float(value) for value in equity],
+            'accumulated_earnings': [float(value) for value in accumulated_earnings],
+            'current_year_earnings': [float(value) for value in current_year_earnings],
+            'retained_earnings': [float(value) for value in retained_earnings],
+            'total_liabilities_equity': [float(liabilities + equity_total) for liabilities, equity_total
+                                         in zip(totals[AccountType.LIABILITY], equity)]
+        }
+    }
+
+def _column_header(column):
+    return {
+        'label': column['label'],
+        'start_date': column['start_date'].isoformat(),
+        'end_date': column['end_date'].isoformat(),
+        'comparison': column['comparison']
+    }
+
+def _account_headers(accounts, account_types):
+    return [
+        {'id': account.id, 'code': account.code, 'name': account.name, 'type': account_type.value}
+        for account_type in account_types
+        for account in accounts[account_type]
+    ]
+
+def is_comparative_request():
+    return 'columns' in request.args or 'compare' in request.args
 
 @reports_api_bp.route('/profit-loss', methods=['GET'])
 @require_api_key
@@ -92,27 +257,28 @@ def profit_loss_report():
     
     start_date, end_date = get_date_range_api(period, start_date_str, end_date_str)
     
-    # Get income accounts
-    income_accounts = Account.query.filter(
-        Account.organization_id == current_user.organization_id,
-        Account.type == AccountType.INCOME,
-        Account.is_active == True
-    ).order_by(Account.code).all()
+    if is_comparative_request():
+        columns, error = get_report_columns(start_date, end_date)
+        if error:
+            return api_error(error, 400)
+        return api_response(data={'report': comparative_profit_loss(columns)})
     
-    # Get expense accounts
-    expense_accounts = Account.query.filter(
-        Account.organization_id == current_user.organization_id,
-        Account.type == AccountType.EXPENSE,
-        Account.is_active == True
-    ).order_by(Account.code).all()
+
+    # Load income and expense accounts, then all their balances in one pass
+    accounts = get_accounts_by_type(
+        current_user.organization_id, [AccountType.INCOME, AccountType.EXPENSE]
+    )
+    balances = get_account_balances(
+        current_user.organization_id, start_date, end_date,
+        account_types=[AccountType.INCOME, AccountType.EXPENSE]
+    )
     
     # Calculate balances
     income_data = []
     total_income = Decimal('0.00')
     
-    for account in income_accounts:
-        balance = calculate_account_balance_api(account.id, start_date, end_date)
-        balance = abs(balance)  # Income accounts have credit balances
+    for account in accounts[AccountType.INCOME]:
+        balance = abs(balances.net(account.id))  # Income accounts have credit balances
         income_data.append({
             'id': account.id,
             'name': account.name,
@@ -124,8 +290,8 @@ def profit_loss_report():
     expense_data = []
     total_expenses = Decimal('0.00')
     
-    for account in expense_accounts:
-        balance = calculate_account_balance_api(account.id, start_date, end_date)
+    for account in accounts[AccountType.EXPENSE]:
+        balance = balances.net(account.id)
         expense_data.append({
             'id': account.id,
             'name': account.name,
@@ -161,8 +327,15 @@ def balance_sheet_report():
     end_date_str = request.args.get('end_date')
     period = request.args.get('period', 'this_month')
     
-    _, end_date = get_date_range_api(period, None, end_date_str)
+    start_date, end_date = get_date_range_api(period, None, end_date_str)
     
+    if is_comparative_request():
+        columns, error = get_report_columns(start_date, end_date)
+        if error:
+            return api_error(error, 400)
+        return api_response(data={'report': comparative_balance_sheet(columns)})
+    
+
     # Get accounts by type
     account_types = [AccountType.ASSET, AccountType.LIABILITY, AccountType.EQUITY]
     report_data = {
@@ -172,18 +345,20 @@ def balance_sheet_report():
         'equity': {'accounts': [], 'total': 0.0}
     }
     
+    accounts = get_accounts_by_type(
+        current_user.organization_id,
+        account_types + [AccountType.INCOME, AccountType.EXPENSE]
+    )
+    balances = get_account_balances(
+        current_user.organization_id, None, end_date, account_types=account_types
+    )
+    
     for account_type in account_types:
-        accounts = Account.query.filter(
-            Account.organization_id == current_user.organization_id,
-            Account.type == account_type,
-            Account.is_active == True
-        ).order_by(Account.code).all()
-        
         accounts_data = []
         total_balance = Decimal('0.00')
         
-        for account in accounts:
-            balance = calculate_account_balance_api(account.id, None, end_date)
+        for account in accounts[account_type]:
+            balance = balances.net(account.id)
             
             # Liabilities and equity typically have credit balances
             if account_type in [AccountType.LIABILITY, AccountType.EQUITY]:
@@ -197,32 +372,27 @@ def balance_sheet_report():
             })
             total_balance += balance
         
-        section_name = account_type.value + 's' if account_type != AccountType.EQUITY else 'equity'
+        section_name = {
+            AccountType.ASSET: 'assets',
+            AccountType.LIABILITY: 'liabilities',
+            AccountType.EQUITY: 'equity'
+        }[account_type]
         report_data[section_name]['accounts'] = accounts_data
         report_data[section_name]['total'] = float(total_balance)
     
-    # Add retained earnings to equity
-    ytd_start = date(end_date.year, 1, 1)
-    income_total = sum(
-        abs(calculate_account_balance_api(acc.id, ytd_start, end_date))
-        for acc in Account.query.filter(
-            Account.organization_id == current_user.organization_id,
-            Account.type == AccountType.INCOME,
-            Account.is_active == True
-        ).all()
-    )
-    
-    expense_total = sum(
-        calculate_account_balance_api(acc.id, ytd_start, end_date)
-        for acc in Account.query.filter(
-            Account.organization_id == current_user.organization_id,
-            Account.type == AccountType.EXPENSE,
-            Account.is_active == True
-        ).all()
+    # Add retained earnings to equity: earlier fiscal years plus the current one
+    year_end = prior_fiscal_year_end(end_date)
+    earnings_balances = get_balances_at(
+        current_user.organization_id, [year_end, end_date],
+        account_types=[AccountType.INCOME, AccountType.EXPENSE]
     )
+    accumulated_earnings = _earnings(earnings_balances[year_end], accounts)
+    current_year_earnings = _earnings(earnings_balances[end_date], accounts) - accumulated_earnings
     
-    retained_earnings = float(income_total - expense_total)
+    retained_earnings = float(accumulated_earnings + current_year_earnings)
     report_data['equity']['total'] += retained_earnings
+    report_data['accumulated_earnings'] = float(accumulated_earnings)
+    report_data['current_year_earnings'] = float(current_year_earnings)
     report_data['retained_earnings'] = retained_earnings
     
     # Calculate totals
@@ -311,6 +481,58 @@ def sales_summary_report():
     
     return api_response(data={'report': report_data})
 
+@reports_api_bp.route('/sales-trend', methods=['GET'])
+@require_api_key
+def sales_trend_report():
+    """Invoiced sales grouped into day, week, month, quarter, year or fiscal year buckets"""
+    period = request.args.get('period', 'this_year')
+    start_date_str = request.args.get('start_date')
+    end_date_str = request.args.get('end_date')
+    bucket = request.args.get('bucket', 'month')
+    
+    if bucket not in BUCKET_UNITS:
+        return api_error(f'bucket must be one of: {", ".join(BUCKET_UNITS)}', 400)
+    
+    start_date, end_date = get_date_range_api(period, start_date_str, end_date_str)
+    
+    # Bucketing happens in the database on every dialect
+    period_start = date_bucket(
+        Invoice.invoice_date, bucket, current_user.organization.fiscal_year_start
+    ).label('period_start')
+    rows = db.session.query(
+        period_start,
+        func.count(Invoice.id).label('invoice_count'),
+        func.coalesce(func.sum(Invoice.total), 0).label('total'),
+        func.coalesce(func.sum(Invoice.balance), 0).label('outstanding')
+    ).filter(
+        Invoice.organization_id == current_user.organization_id,
+        Invoice.invoice_date >= start_date,
+        Invoice.invoice_date <= end_date,
+        Invoice.status != InvoiceStatus.CANCELLED
+    ).group_by(period_start).order_by(period_start).all()
+    
+    trend_data = [
+        {
+            'period_start': row.period_start.isoformat(),
+            'label': bucket_label(row.period_start, bucket),
+            'invoice_count': row.invoice_count,
+            'total': float(row.total),
+            'outstanding': float(row.outstanding)
+        }
+        for row in rows
+    ]
+    
+    report_data = {
+        'period': {
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat()
+        },
+        'bucket': bucket,
+        'trend': trend_data
+    }
+    
+    return api_response(data={'report': report_data})
+
 @reports_api_bp.route('/customer-aging', methods=['GET'])
 @require_api_key
 def customer_aging_report():
@@ -399,57 +621,13 @@ def customer_aging_report():
 def dashboard_metrics():
     """Get dashboard metrics for API consumption"""
     org_id = current_user.organization_id
-    today = date.today()
-    
-    # Current month metrics
-    month_start = today.replace(day=1)
-    
-    # This month's sales
-    monthly_sales = db.session.query(func.sum(Invoice.total)).filter(
-        Invoice.organization_id == org_id,
-        Invoice.invoice_date >= month_start,
-        Invoice.status != InvoiceStatus.CANCELLED
-    ).scalar() or 0
-    
-    # Outstanding receivables
-    outstanding = db.session.query(func.sum(Invoice.balance)).filter(
-        Invoice.organization_id == org_id,
-        Invoice.balance > 0,
-        Invoice.status.in_([InvoiceStatus.SENT, InvoiceStatus.PARTIAL, InvoiceStatus.OVERDUE])
-    ).scalar() or 0
-    
-    # Invoice counts by status
-    invoice_counts = {}
-    for status in InvoiceStatus:
-        count = Invoice.query.filter_by(
-            organization_id=org_id,
-            status=status
-        ).count()
-        invoice_counts[status.value] = count
-    
-    # Monthly sales trend (last 6 months)
-    six_months_ago = today - timedelta(days=180)
-    monthly_trends = db.session.query(
-        func.date_trunc('month', Invoice.invoice_date).label('month'),
-        func.sum(Invoice.total).label('total')
-    ).filter(
-        Invoice.organization_id == org_id,
-        Invoice.invoice_date >= six_months_ago,
-        Invoice.status != InvoiceStatus.CANCELLED
-    ).group_by('month').order_by('month').all()
-    
-    trends_data = []
-    for trend in monthly_trends:
-        trends_data.append({
-            'month': trend.month.strftime('%Y-%m'),
-            'total': float(trend.total or 0)
-        })
+    invoice_summary = get_metric('invoice_summary', org_id)
     
     metrics = {
-        'monthly_sales': float(monthly_sales),
-        'outstanding_receivables': float(outstanding),
-        'invoice_counts': invoice_counts,
-        'monthly_trends': trends_data,
+        'monthly_sales': invoice_summary['monthly_sales'],
+        'outstanding_receivables': invoice_summary['outstanding_receivables'],
+        'invoice_counts': invoice_summary['counts'],
+        'monthly_trends': get_metric('monthly_sales', org_id),
         'generated_at': datetime.utcnow().isoformat()
     }
     
@@ -0,0 +1,129 @@
+"""
+Sync API endpoints
+
+Each resource has a change feed read in (updated_at, id) order through the
+``ix_<table>_org_updated`` indexes, plus the tombstones recorded for rows that
+were deleted or deactivated. Clients pass the returned ``next_since`` back as
+``since`` and apply ``deletes`` before ``changes``.
+"""
+
+import base64
+import json
+from datetime import datetime, timedelta
+
+from flask import Blueprint, request, current_app
+from flask_login import current_user
+from sqlalchemy import func, tuple_
+from packages.server.src.models import Tombstone, db
+from packages.webapp.src.api.utils import api_response, api_error, require_api_key
+from packages.webapp.src.api.serializers import SYNC_SCHEMAS
+from packages.webapp.src.utils.change_tracking import SYNC_RESOURCES
+
+sync_api_bp = Blueprint('sync_api', __name__)
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+
+
+def _encode_watermark(updated_at, record_id, tombstone_id):
+    payload = {'u': updated_at.isoformat() if updated_at else None, 'id': record_id, 't': tombstone_id}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def _decode_watermark(since, organization_id, resource):
+    """Parse ``since`` into (updated_at, id, tombstone id); accepts a token or an ISO datetime"""
+    if not since:
+        # Full sync: nothing deleted so far concerns the client
+        return None, 0, _last_tombstone_id(organization_id, resource)
+
+    try:
+        updated_at = datetime.fromisoformat(since)
+    except ValueError:
+        pass
+    else:
+        return updated_at, 0, _last_tombstone_id(organization_id, resource, before=updated_at)
+
+    try:
+        padded = since + '=' * (-len(since) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        updated_at = datetime.fromisoformat(payload['u']) if payload['u'] else None
+        return updated_at, int(payload['id']), int(payload['t'])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def _last_tombstone_id(organization_id, resource, before=None):
+    query = db.session.query(func.max(Tombstone.id)).filter(
+        Tombstone.organization_id == organization_id,
+        Tombstone.resource == resource
+    )
+    if before is not None:
+        query = query.filter(Tombstone.deleted_at < before)
+    return query.scalar() or 0
+
+
+@sync_api_bp.route('', methods=['GET'])
+@require_api_key
+def list_resources():
+    """List the resources with a change feed"""
+    return api_response(data={'resources': sorted(SYNC_RESOURCES)})
+
+
+@sync_api_bp.route('/<resource>', methods=['GET'])
+@require_api_key
+def sync_resource(resource):
+    """Get records changed and deleted since a watermark"""
+    model = SYNC_RESOURCES.get(resource)
+    if model is None:
+        return api_error('Unknown sync resource', 404)
+
+    organization_id = current_user.organization_id
+    watermark = _decode_watermark(request.args.get('since', '').strip(), organization_id, resource)
+    if watermark is None:
+        return api_error('Invalid since watermark', 400)
+    since_updated, since_id, since_tombstone = watermark
+
+    limit = request.args.get('limit', DEFAULT_LIMIT, type=int)
+    limit = max(1, min(limit, MAX_LIMIT))
+
+    # Leave out the last moments so rows from transactions still committing are not skipped
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config.get('SYNC_SETTLE_SECONDS', 2))
+
+    # Changed records
+    query = SYNC_SCHEMAS[model].apply(model.query).filter(
+        model.organization_id == organization_id,
+        model.updated_at < cutoff
+    )
+    if since_updated is not None:
+        query = query.filter(tuple_(model.updated_at, model.id) > (since_updated, since_id))
+    if hasattr(model, 'is_active'):
+        query = query.filter(model.is_active.isnot(False))
+    records = query.order_by(model.updated_at, model.id).limit(limit + 1).all()
+
+    # Deleted records
+    tombstones = Tombstone.query.filter(
+        Tombstone.organization_id == organization_id,
+        Tombstone.resource == resource,
+        Tombstone.id > since_tombstone,
+        Tombstone.deleted_at < cutoff
+    ).order_by(Tombstone.id).limit(limit + 1).all()
+
+    has_more = len(records) > limit or len(tombstones) > limit
+    records = records[:limit]
+    tombstones = tombstones[:limit]
+
+    if records:
+        since_updated, since_id = records[-1].updated_at, records[-1].id
+    if tombstones:
+        since_tombstone = tombstones[-1].id
+
+    return api_response(data={
+        'resource': resource,
+        'changes': SYNC_SCHEMAS[model].dump_many(records),
+        'deletes': [
+            {'id': tombstone.record_id, 'deleted_at': tombstone.deleted_at.isoformat()}
+            for tombstone in tombstones
+        ],
+        'next_since': _encode_watermark(since_updated, since_id, since_tombstone),
+        'has_more': has_more
+    })
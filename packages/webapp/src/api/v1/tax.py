@@ -9,7 +9,7 @@ from decimal import Decimal
 from packages.server.src.models import TaxCode, TaxType, db
 from packages.webapp.src.api.utils import (
     api_response, api_error, require_api_key, validate_json_request,
-    paginate_query, get_pagination_params, serialize_model
+    paginate_query, get_pagination_params, apply_sorting, serialize_model
 )
 
 tax_api_bp = Blueprint('tax_api', __name__)
@@ -38,18 +38,10 @@ def list_taxes():
         )
 
     # Apply sorting
-    sort_by = request.args.get('sort_by', 'name')
-    sort_order = request.args.get('sort_order', 'asc')
-
-    if hasattr(TaxCode, sort_by):
-        column = getattr(TaxCode, sort_by)
-        if sort_order == 'desc':
-            query = query.order_by(column.desc())
-        else:
-            query = query.order_by(column.asc())
+    query, sort = apply_sorting(query, TaxCode, 'name', 'asc')
 
     # Paginate results
-    result = paginate_query(query, page, per_page)
+    result = paginate_query(query, page, per_page, sort=sort)
 
     # Serialize tax codes
     taxes_data = []
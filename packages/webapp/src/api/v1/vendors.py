@@ -9,7 +9,7 @@ from packages.server.src.models import Vendor
 from packages.server.src.database import db
 from ..utils import (
     api_response, api_error, require_api_key, validate_json_request,
-    paginate_query, get_pagination_params, serialize_model
+    paginate_query, get_pagination_params, apply_sorting, serialize_model
 )
 
 vendors_api_bp = Blueprint('vendors_api', __name__)
@@ -36,18 +36,10 @@ def list_vendors():
         )
     
     # Apply sorting
-    sort_by = request.args.get('sort_by', 'display_name')
-    sort_order = request.args.get('sort_order', 'asc')
-    
-    if hasattr(Vendor, sort_by):
-        column = getattr(Vendor, sort_by)
-        if sort_order == 'desc':
-            query = query.order_by(column.desc())
-        else:
-            query = query.order_by(column.asc())
+    query, sort = apply_sorting(query, Vendor, 'display_name', 'asc')
     
     # Paginate results
-    result = paginate_query(query, page, per_page)
+    result = paginate_query(query, page, per_page, sort=sort)
     
     # Serialize vendors
     vendors_data = [serialize_model(vendor) for vendor in result['items']]
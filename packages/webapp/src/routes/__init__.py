@@ -21,6 +21,7 @@ from .preferences import preferences_bp
 from .backup import backup_bp
 from .financial import financial_bp
 from .banking import banking_bp
+from .jobs import jobs_bp
 
 # Import the reports blueprint registration function
 from .reports import register_reports_blueprints
@@ -50,6 +51,7 @@ def register_blueprints(app):
     app.register_blueprint(backup_bp, url_prefix='/backup')
     app.register_blueprint(financial_bp, url_prefix='/financial')
     app.register_blueprint(banking_bp)
+    app.register_blueprint(jobs_bp, url_prefix='/jobs')
 
     # The following blueprints were removed as they were reported as non-existent:
     # bills_bp, admin_bp, main_bp
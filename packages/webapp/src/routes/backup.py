@@ -3,8 +3,6 @@ from flask_login import login_required, current_user
 import subprocess
 import os
 import json
-import threading
-import time
 import uuid
 from datetime import datetime
 import shutil
@@ -12,9 +10,15 @@ import sqlite3
 import gnupg
 import tempfile
 
+from packages.server.src.models import Job
+from packages.webapp.src.utils.backup_archive import encrypt_stream, write_backup_zip
+from packages.webapp.src.utils.incremental_backup import DEFAULT_PAGES_PER_STEP, copy_database
+from packages.webapp.src.utils.jobs import cancel_job, job_handler, purge_jobs, submit_job
+
 # Try to import SQLAlchemy components with fallback
 try:
     from sqlalchemy import create_engine, text, inspect
+    from packages.webapp.src.utils.json_backup import write_json_backup
     SQLALCHEMY_AVAILABLE = True
 except ImportError:
     SQLALCHEMY_AVAILABLE = False
@@ -34,9 +38,6 @@ os.makedirs(GPG_HOME, exist_ok=True)
 gpg = gnupg.GPG(gnupghome=GPG_HOME)
 gpg.keyserver = 'keyserver.ubuntu.com'
 
-# In-memory job storage (use Redis or database in production)
-backup_jobs = {}
-
 @backup_bp.route('/')
 @login_required
 def index():
@@ -139,28 +140,15 @@ def create_backup():
         gpg_email = request.form.get('gpg_email')
 
         if encrypt_gpg and gpg_email:
-            job_id = str(uuid.uuid4())
-            backup_jobs[job_id] = {
-                'id': job_id,
-                'created_at': datetime.now(),
-                'status': 'Starting backup...',
-                'progress': 0,
-                'completed': False,
-                'error': None,
-                'details': None,
-                'download_url': None,
-                'file_path': None
-            }
-            
-            thread = threading.Thread(
-                target=create_backup_async,
-                args=(job_id, format_type, include_attachments, encrypt_gpg, gpg_email)
-            )
-            thread.daemon = True
-            thread.start()
+            job = submit_job('backup', {
+                'format_type': format_type,
+                'include_attachments': include_attachments,
+                'encrypt_gpg': encrypt_gpg,
+                'gpg_email': gpg_email
+            }, organization_id=current_user.organization_id, user_id=current_user.id)
             return jsonify({
                 'success': True,
-                'job_id': job_id,
+                'job_id': job.id,
                 'message': 'Backup started'
             })
         else:
@@ -180,44 +168,33 @@ def backup_progress(job_id):
     """
     Retrieves the current progress and status of an asynchronous backup job.
     """
-    job = backup_jobs.get(job_id)
+    job = _get_backup_job(job_id)
     if not job:
         return jsonify({'success': False, 'error': 'Job not found'}), 404
-    if job.get('error'):
-        return jsonify({'success': False, 'error': job['error'], 'details': job.get('details')})
+    if job.error or job.status == 'cancelled':
+        return jsonify({'success': False, 'error': job.error or 'Backup cancelled by user',
+                        'details': f"An error occurred during backup: {job.error}" if job.error else None})
     return jsonify({
         'success': True,
         'progress': {
-            'percentage': job['progress'],
-            'status': job['status'],
-            'label': f"Progress: {job['progress']}%"
+            'percentage': job.progress,
+            'status': job.message,
+            'label': f"Progress: {job.progress}%"
         },
-        'completed': job['completed'],
-        'download_url': job.get('download_url')
+        'completed': job.is_finished,
+        'download_url': f"/backup/download/{job.id}" if job.status == 'completed' else None
     })
 
 @backup_bp.route('/cancel/<job_id>', methods=['POST'])
 @login_required
 def cancel_backup(job_id):
     """
-    Cancels an ongoing backup job.
+    Cancels an ongoing backup job. The worker removes its files when it stops.
     """
-    job = backup_jobs.get(job_id)
+    job = _get_backup_job(job_id)
     if not job:
         return jsonify({'success': False, 'error': 'Job not found'}), 404
-    job['cancelled'] = True
-    job['completed'] = True
-    job['error'] = 'Backup cancelled by user'
-    
-    # Clean up files
-    for file_key in ['file_path', 'encrypted_file_path']:
-        file_path = job.get(file_key)
-        if file_path and os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-            except Exception as e:
-                print(f"Error cleaning up cancelled backup file {file_path}: {e}")
-    
+    cancel_job(job)
     return jsonify({'success': True, 'message': 'Backup cancelled'})
 
 @backup_bp.route('/download/<job_id>', methods=['GET'])
@@ -226,20 +203,27 @@ def download_backup(job_id):
     """
     Allows downloading of a completed backup file.
     """
-    job = backup_jobs.get(job_id)
+    job = _get_backup_job(job_id)
     if not job:
         return jsonify({'success': False, 'error': 'Job not found'}), 404
     
-    if not job['completed'] or job.get('error'):
+    if job.status != 'completed':
         return jsonify({'success': False, 'error': 'Backup not ready or failed'}), 400
     
-    file_path = job.get('encrypted_file_path') or job.get('file_path')
+    file_path = job.result_path
     
     if not file_path or not os.path.exists(file_path):
         return jsonify({'success': False, 'error': 'Backup file not found'}), 404
     
     return send_file(file_path, as_attachment=True)
 
+def _get_backup_job(job_id):
+    return Job.query.filter_by(
+        id=job_id,
+        job_type='backup',
+        organization_id=current_user.organization_id
+    ).first()
+
 def get_database_path():
     """
     Extracts the database file path from SQLAlchemy configuration.
@@ -285,10 +269,15 @@ def backup_database_with_sqlalchemy(backup_dir: str):
                 
                 with backup_engine.connect() as backup_conn:
                     backup_raw = backup_conn.connection.driver_connection
-                    source_raw.backup(backup_raw)
+                    # Copy in steps so writers are not locked out for the whole backup
+                    source_raw.backup(
+                        backup_raw,
+                        pages=current_app.config.get('BACKUP_PAGES_PER_STEP', DEFAULT_PAGES_PER_STEP),
+                        sleep=0.005
+                    )
             
-            # Gather metadata
-            inspector = inspect(engine)
+            # Gather metadata from the copy rather than the live database
+            inspector = inspect(backup_engine)
             table_names = inspector.get_table_names()
             
             metadata = {
@@ -300,7 +289,7 @@ def backup_database_with_sqlalchemy(backup_dir: str):
                 "tables": []
             }
             
-            with engine.connect() as conn:
+            with backup_engine.connect() as conn:
                 for table_name in table_names:
                     try:
                         result = conn.execute(text(f"SELECT COUNT(*) FROM {table_name}"))
@@ -315,6 +304,8 @@ def backup_database_with_sqlalchemy(backup_dir: str):
                             "error": str(e)
                         })
             
+            backup_engine.dispose()
+            engine.dispose()
             return backup_db_path, metadata
             
         except Exception as e:
@@ -331,50 +322,62 @@ def backup_database_with_sqlalchemy(backup_dir: str):
     }
     return backup_db_path, metadata
 
-def export_database_to_json():
+def export_database_to_json(path: str, header: dict, compress: bool = False, on_progress=None) -> dict:
     """
-    Exports all database tables to JSON format.
+    Streams all database tables into a JSON file at path, optionally gzip-compressed.
+    Returns the per-table manifest of row counts and checksums.
+    ``on_progress(tables_done, tables_total)`` is called after each table.
     """
     if not SQLALCHEMY_AVAILABLE:
-        return {
-            "export_method": "SQLAlchemy not available",
-            "error": "SQLAlchemy is required for JSON export",
-            "data": {}
-        }
-    
+        raise RuntimeError("SQLAlchemy is required for JSON export")
+
+    database_uri = current_app.config['SQLALCHEMY_DATABASE_URI']
+    snapshot_dir = None
+    if database_uri.startswith('sqlite:///'):
+        # Export from a backup API copy so writers are not held off while the JSON is written
+        snapshot_dir = tempfile.mkdtemp(prefix='json-export-', dir=BACKUP_DIR)
+        snapshot_path = os.path.join(snapshot_dir, 'database.db')
+        copy_database(get_database_path(), snapshot_path,
+                      pages_per_step=current_app.config.get('BACKUP_PAGES_PER_STEP', DEFAULT_PAGES_PER_STEP))
+        database_uri = f'sqlite:///{snapshot_path}'
+
+    engine = create_engine(database_uri)
     try:
-        engine = create_engine(current_app.config['SQLALCHEMY_DATABASE_URI'])
-        inspector = inspect(engine)
-        table_names = inspector.get_table_names()
-        
-        database_data = {}
-        
-        with engine.connect() as conn:
-            for table_name in table_names:
-                try:
-                    result = conn.execute(text(f"SELECT * FROM {table_name}"))
-                    rows = result.fetchall()
-                    database_data[table_name] = [dict(row._mapping) for row in rows]
-                except Exception as e:
-                    database_data[table_name] = {"error": str(e)}
-        
-        return {
-            "export_method": "SQLAlchemy",
-            "table_count": len(table_names),
-            "tables_exported": list(database_data.keys()),
-            "data": database_data
-        }
-        
-    except Exception as e:
-        return {
-            "export_method": "SQLAlchemy (failed)",
-            "error": str(e),
-            "data": {}
-        }
+        return write_json_backup(engine, path, header, compress=compress, on_progress=on_progress)
+    finally:
+        engine.dispose()
+        if snapshot_dir:
+            shutil.rmtree(snapshot_dir, ignore_errors=True)
 
-def generate_backup(format_type: str, include_attachments: bool) -> str:
+def get_attachment_directories():
+    """
+    Lists the directories attachments may be stored in.
+    """
+    possible_attachment_dirs = [
+        os.path.join(os.getcwd(), 'uploads'),
+        os.path.join(os.getcwd(), 'static', 'uploads'),
+        os.path.join(os.getcwd(), 'attachments'),
+        os.path.join(os.getcwd(), 'user_files')
+    ]
+    
+    # Add Flask-specific directories if available
+    try:
+        possible_attachment_dirs.extend([
+            os.path.join(current_app.root_path, 'uploads'),
+            os.path.join(current_app.root_path, 'static', 'uploads'),
+            os.path.join(current_app.root_path, 'attachments'),
+            os.path.join(current_app.root_path, 'user_files')
+        ])
+        if hasattr(current_app, 'instance_path'):
+            possible_attachment_dirs.append(os.path.join(current_app.instance_path, 'uploads'))
+    except:
+        pass  # current_app not available
+    return possible_attachment_dirs
+
+def generate_backup(format_type: str, include_attachments: bool, encrypt_to: str = None, on_progress=None) -> str:
     """
     Creates a backup file including the SQLite database.
+    ZIP backups are streamed; with encrypt_to they are piped straight into GPG.
     """
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     backup_filename_base = f"bigcapitalpy_backup_{timestamp}"
@@ -384,9 +387,10 @@ def generate_backup(format_type: str, include_attachments: bool) -> str:
         if format_type == 'zip':
             backup_content_dir = os.path.join(BACKUP_DIR, f"backup_content_{uuid.uuid4()}")
             os.makedirs(backup_content_dir, exist_ok=True)
+            final_zip_path = f"{backup_file_path}.zip.gpg" if encrypt_to else f"{backup_file_path}.zip"
 
             try:
-                # Backup database
+                # Snapshot the database; attachments are read in place
                 db_backup_path, db_metadata = backup_database_with_sqlalchemy(backup_content_dir)
                 print(f"Database backed up successfully: {db_backup_path}")
 
@@ -406,72 +410,27 @@ def generate_backup(format_type: str, include_attachments: bool) -> str:
                     metadata["sqlalchemy_uri"] = current_app.config.get('SQLALCHEMY_DATABASE_URI', 'Not configured')
                 except:
                     metadata["sqlalchemy_uri"] = "Not available (no app context)"
-                
-                with open(os.path.join(backup_content_dir, "backup_metadata.json"), "w") as f:
-                    json.dump(metadata, f, indent=2, default=str)
 
-                # Include attachments if requested
-                if include_attachments:
-                    attachments_dir = os.path.join(backup_content_dir, "attachments")
-                    os.makedirs(attachments_dir, exist_ok=True)
-                    
-                    # Common attachment directories
-                    possible_attachment_dirs = [
-                        os.path.join(os.getcwd(), 'uploads'),
-                        os.path.join(os.getcwd(), 'static', 'uploads'),
-                        os.path.join(os.getcwd(), 'attachments'),
-                        os.path.join(os.getcwd(), 'user_files')
-                    ]
-                    
-                    # Add Flask-specific directories if available
-                    try:
-                        possible_attachment_dirs.extend([
-                            os.path.join(current_app.root_path, 'uploads'),
-                            os.path.join(current_app.root_path, 'static', 'uploads'),
-                            os.path.join(current_app.root_path, 'attachments'),
-                            os.path.join(current_app.root_path, 'user_files')
-                        ])
-                        if hasattr(current_app, 'instance_path'):
-                            possible_attachment_dirs.append(os.path.join(current_app.instance_path, 'uploads'))
-                    except:
-                        pass  # current_app not available
-                    
-                    attachments_found = False
-                    attachment_summary = []
-                    
-                    for source_dir in possible_attachment_dirs:
-                        if os.path.exists(source_dir) and os.path.isdir(source_dir):
-                            dest_subdir = os.path.join(attachments_dir, os.path.basename(source_dir))
-                            shutil.copytree(source_dir, dest_subdir, dirs_exist_ok=True)
-                            
-                            file_count = sum([len(files) for r, d, files in os.walk(dest_subdir)])
-                            attachment_summary.append({
-                                "source": source_dir,
-                                "destination": os.path.basename(source_dir),
-                                "files_copied": file_count
-                            })
-                            attachments_found = True
-                            print(f"Copied {file_count} files from: {source_dir}")
-                    
-                    metadata["attachments"] = {
-                        "included": attachments_found,
-                        "directories_searched": possible_attachment_dirs,
-                        "directories_copied": attachment_summary
-                    }
-                    
-                    if not attachments_found:
-                        with open(os.path.join(attachments_dir, "no_attachments_found.txt"), "w") as f:
-                            f.write("No attachment directories were found at the expected locations.\n")
-                            f.write(f"Searched locations:\n")
-                            for dir_path in possible_attachment_dirs:
-                                f.write(f"  - {dir_path} {'(exists)' if os.path.exists(dir_path) else '(not found)'}\n")
-
-                # Update metadata file
-                with open(os.path.join(backup_content_dir, "backup_metadata.json"), "w") as f:
-                    json.dump(metadata, f, indent=2, default=str)
+                try:
+                    max_workers = current_app.config.get('BACKUP_COMPRESSION_WORKERS', 4)
+                except:
+                    max_workers = 4
+
+                def write_archive(output):
+                    write_backup_zip(
+                        output,
+                        db_backup_path,
+                        metadata,
+                        attachment_dirs=get_attachment_directories() if include_attachments else None,
+                        max_workers=max_workers,
+                        on_progress=on_progress
+                    )
 
                 # Create ZIP archive
-                final_zip_path = shutil.make_archive(backup_file_path, 'zip', root_dir=backup_content_dir)
+                if encrypt_to:
+                    encrypt_stream(gpg, [encrypt_to], final_zip_path, write_archive)
+                else:
+                    write_archive(final_zip_path)
                 
                 # Cleanup
                 shutil.rmtree(backup_content_dir)
@@ -480,27 +439,36 @@ def generate_backup(format_type: str, include_attachments: bool) -> str:
             except Exception as e:
                 if os.path.exists(backup_content_dir):
                     shutil.rmtree(backup_content_dir)
+                if os.path.exists(final_zip_path):
+                    os.remove(final_zip_path)
                 raise e
 
-        elif format_type == 'json':
-            final_json_path = f"{backup_file_path}.json"
+        elif format_type in ('json', 'json_gz'):
+            compress = format_type == 'json_gz'
+            final_json_path = f"{backup_file_path}.json.gz" if compress else f"{backup_file_path}.json"
             
-            backup_data = {
+            header = {
                 "backup_created": datetime.now().isoformat(),
                 "backup_type": "BigCapitalPy JSON Export",
                 "format": format_type,
                 "include_attachments": include_attachments,
                 "sqlalchemy_available": SQLALCHEMY_AVAILABLE,
-                "database_export": export_database_to_json()
+                "backup_version": "3.0"
             }
             
             try:
-                backup_data["sqlalchemy_uri"] = current_app.config.get('SQLALCHEMY_DATABASE_URI', 'Not configured')
+                header["sqlalchemy_uri"] = current_app.config.get('SQLALCHEMY_DATABASE_URI', 'Not configured')
             except:
-                backup_data["sqlalchemy_uri"] = "Not available (no app context)"
+                header["sqlalchemy_uri"] = "Not available (no app context)"
 
-            with open(final_json_path, "w") as f:
-                json.dump(backup_data, f, indent=2, default=str)
+            try:
+                manifest = export_database_to_json(final_json_path, header, compress=compress,
+                                                   on_progress=on_progress)
+            except Exception:
+                if os.path.exists(final_json_path):
+                    os.remove(final_json_path)
+                raise
+            print(f"JSON export written: {manifest['total_rows']} rows from {len(manifest['tables'])} tables")
             
             return final_json_path
 
@@ -565,37 +533,43 @@ def generate_backup(format_type: str, include_attachments: bool) -> str:
         print(f"Error generating backup: {e}")
         raise
 
-def create_backup_async(job_id: str, format_type: str, include_attachments: bool, encrypt_gpg: bool, gpg_email: str):
+@job_handler('backup')
+def create_backup_job(context, format_type: str, include_attachments: bool, encrypt_gpg: bool, gpg_email: str):
     """
-    Asynchronously creates a backup, optionally encrypting it with GPG.
+    Creates a backup on the job pool, optionally encrypting it with GPG.
     """
-    job = backup_jobs.get(job_id)
-    if not job:
-        print(f"Job {job_id} not found in async function.")
-        return
-
     original_file_path = None
     encrypted_file_path = None
 
     try:
-        job['status'] = 'Generating backup content...'
-        job['progress'] = 10
-        time.sleep(1)
+        context.progress(10, 'Generating backup content...')
 
-        # Generate backup
-        original_file_path = generate_backup(format_type=format_type, include_attachments=include_attachments)
-        job['file_path'] = original_file_path
+        # ZIP backups are encrypted while they are written
+        stream_encrypt = encrypt_gpg and format_type == 'zip'
+        reported = {'percent': 10}
+
+        # ZIP backups report attachments and JSON exports report tables; each
+        # report is also the job's heartbeat
+        unit = 'attachments' if format_type == 'zip' else 'tables'
 
-        if job.get('cancelled'):
-            raise Exception("Backup cancelled during content generation.")
+        def on_progress(done, total):
+            percent = 10 + 80 * done // total
+            if percent > reported['percent'] or format_type != 'zip':
+                reported['percent'] = max(percent, reported['percent'])
+                context.progress(reported['percent'], f'Backed up {done} of {total} {unit}...')
+
+        # Generate backup
+        original_file_path = generate_backup(
+            format_type=format_type,
+            include_attachments=include_attachments,
+            encrypt_to=gpg_email if stream_encrypt else None,
+            on_progress=on_progress
+        )
 
-        job['status'] = 'Backup content generated.'
-        job['progress'] = 50
-        time.sleep(1)
+        context.progress(90 if stream_encrypt else 50, 'Backup content generated.')
 
-        if encrypt_gpg:
-            job['status'] = 'Encrypting backup with GPG...'
-            job['progress'] = 70
+        if encrypt_gpg and not stream_encrypt:
+            context.progress(70, 'Encrypting backup with GPG...')
             
             encrypted_file_path = f"{original_file_path}.gpg"
             
@@ -608,22 +582,13 @@ def create_backup_async(job_id: str, format_type: str, include_attachments: bool
             if os.path.exists(original_file_path):
                 os.remove(original_file_path)
             
-            job['encrypted_file_path'] = encrypted_file_path
-            job['status'] = 'Backup encrypted successfully.'
-            job['progress'] = 90
-            time.sleep(1)
+            context.progress(90, 'Backup encrypted successfully.')
 
-        job['status'] = 'Backup process completed.'
-        job['progress'] = 100
-        job['completed'] = True
-        job['download_url'] = f"/backup/download/{job_id}"
+        context.progress(100, 'Backup process completed.')
+        return {'path': encrypted_file_path or original_file_path}
 
     except Exception as e:
-        job['error'] = str(e)
-        job['details'] = f"An error occurred during backup: {e}"
-        job['completed'] = True
-        job['progress'] = 100
-        print(f"Error in async backup job {job_id}: {e}")
+        print(f"Error in backup job {context.job_id}: {e!r}")
         
         # Cleanup
         for file_path in [original_file_path, encrypted_file_path]:
@@ -632,28 +597,10 @@ def create_backup_async(job_id: str, format_type: str, include_attachments: bool
                     os.remove(file_path)
                 except Exception as cleanup_e:
                     print(f"Error cleaning up file {file_path}: {cleanup_e}")
-    finally:
-        if not job['completed']:
-            job['completed'] = True
-            job['error'] = job.get('error', 'Unknown error completed job.')
-            job['progress'] = 100
+        raise
 
 def cleanup_old_jobs():
     """
-    Periodically cleans up old backup jobs and their associated files.
+    Cleans up finished jobs older than an hour and their associated files.
     """
-    cutoff = datetime.now().timestamp() - 3600  # 1 hour cutoff
-    jobs_to_remove = []
-    for job_id, job in backup_jobs.items():
-        if job['created_at'].timestamp() < cutoff:
-            # Clean up files
-            for file_key in ['file_path', 'encrypted_file_path']:
-                file_path = job.get(file_key)
-                if file_path and os.path.exists(file_path):
-                    try:
-                        os.remove(file_path)
-                    except Exception as e:
-                        print(f"Error cleaning up old backup file {file_path}: {e}")
-            jobs_to_remove.append(job_id)
-    for job_id in jobs_to_remove:
-        del backup_jobs[job_id]
\ No newline at end of file
+    return purge_jobs(older_than_hours=1)
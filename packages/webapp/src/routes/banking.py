@@ -3,12 +3,14 @@ Banking routes for BigCapitalPy
 Bank accounts management, transactions, and reconciliation
 """
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from flask_login import login_required, current_user
 from flask_wtf import FlaskForm
 from wtforms import StringField, SelectField, DecimalField, BooleanField
 from wtforms.validators import DataRequired, Length, Optional
 from packages.server.src.models import BankAccount, BankTransaction, db
+from packages.webapp.src.utils.bank_import import DEFAULT_CHUNK_SIZE
+from packages.webapp.src.utils.jobs import submit_job, upload_path
 from datetime import datetime
 import csv
 import io
@@ -214,85 +216,20 @@ def import_transactions(account_id):
             return redirect(request.url)
         
         try:
-            # Read CSV content
-            import csv
-            import io
+            # Import in the background; the job page shows progress and the report
+            path = upload_path('.csv')
+            file.save(path)
+            job = submit_job('bank_import', {
+                'path': path,
+                'account_id': account_id,
+                'parser': 'bank_export',
+                'chunk_size': current_app.config.get('BANK_IMPORT_CHUNK_SIZE', DEFAULT_CHUNK_SIZE),
+                'update_bank_balance': True
+            }, organization_id=current_user.organization_id, user_id=current_user.id)
             
-            # Decode file content
-            content = file.read().decode('utf-8')
-            csv_reader = csv.DictReader(io.StringIO(content))
-            
-            transactions_imported = 0
-            for row in csv_reader:
-                try:
-                    # Parse transaction data (similar to the import script)
-                    transaction_date = datetime.strptime(row['parsed_date'], '%Y-%m-%d').date()
-                    
-                    # Determine amount
-                    debit_str = row.get('debit_net_amount', '').strip()
-                    credit_str = row.get('credit_net_amount', '').strip()
-                    
-                    debit_amount = float(debit_str.replace(',', '')) if debit_str else 0
-                    credit_amount = float(credit_str.replace(',', '')) if credit_str else 0
-                    
-                    if debit_amount > 0:
-                        amount = -debit_amount
-                    elif credit_amount > 0:
-                        amount = credit_amount
-                    else:
-                        continue  # Skip zero-amount transactions
-                    
-                    # Get description
-                    description = row.get('description', '').strip()[:500]
-                    if not description:
-                        description = f"{row.get('type', 'Unknown')} transaction"
-                    
-                    # Get balance
-                    balance_str = row.get('account_balance', '').strip()
-                    balance = float(balance_str.replace(',', '')) if balance_str else 0
-                    
-                    # Check for duplicate
-                    reference = row.get('transaction_id', '').strip()
-                    if reference:
-                        existing = BankTransaction.query.filter_by(
-                            reference=reference,
-                            account_id=account_id
-                        ).first()
-                        if existing:
-                            continue
-                    
-                    # Create transaction
-                    transaction = BankTransaction(
-                        account_id=account_id,
-                        transaction_date=transaction_date,
-                        amount=amount,
-                        description=description,
-                        reference=reference,
-                        balance=balance,
-                        status='unmatched',
-                        organization_id=current_user.organization_id
-                    )
-                    
-                    db.session.add(transaction)
-                    transactions_imported += 1
-                    
-                except Exception as e:
-                    print(f"Error processing row: {e}")
-                    continue
-            
-            # Update account balance
-            if transactions_imported > 0:
-                # Get the latest balance from the imported transactions
-                latest_transaction = BankTransaction.query.filter_by(
-                    account_id=account_id
-                ).order_by(BankTransaction.transaction_date.desc()).first()
-                if latest_transaction:
-                    bank_account.balance = latest_transaction.balance
-            
-            db.session.commit()
-            
-            flash(f'Successfully imported {transactions_imported} transactions!', 'success')
-            return redirect(url_for('banking.account_detail', account_id=account_id))
+            flash('Import started.', 'info')
+            return redirect(url_for('jobs.view', job_id=job.id,
+                                    next=url_for('banking.account_detail', account_id=account_id)))
             
         except Exception as e:
             db.session.rollback()
@@ -4,10 +4,8 @@ Dashboard routes for BigCapitalPy
 
 from flask import Blueprint, render_template, jsonify
 from flask_login import login_required, current_user
-from packages.server.src.models import Customer, Vendor, Invoice, Account
-from packages.server.src.database import db
-from sqlalchemy import func
-from datetime import datetime, timedelta
+from packages.webapp.src.utils.metrics_cache import get_metric
+from datetime import datetime
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
@@ -16,38 +14,18 @@ dashboard_bp = Blueprint('dashboard', __name__)
 def index():
     """Main dashboard view"""
     
-    # Get key metrics for dashboard
+    # Get key metrics for dashboard (cached until the records change)
     org_id = current_user.organization_id
-    
-    # Customer metrics
-    total_customers = Customer.query.filter_by(organization_id=org_id, is_active=True).count()
-    
-    # Vendor metrics
-    total_vendors = Vendor.query.filter_by(organization_id=org_id, is_active=True).count()
-    
-    # Invoice metrics
-    total_invoices = Invoice.query.filter_by(organization_id=org_id).count()
-    pending_invoices = Invoice.query.filter_by(organization_id=org_id).filter(
-        Invoice.balance > 0
-    ).count()
-    
-    # Financial metrics
-    total_receivables = db.session.query(func.sum(Invoice.balance)).filter_by(
-        organization_id=org_id
-    ).scalar() or 0
-    
-    # Recent invoices
-    recent_invoices = Invoice.query.filter_by(organization_id=org_id).order_by(
-        Invoice.created_at.desc()
-    ).limit(5).all()
+    counts = get_metric('entity_counts', org_id)
+    invoice_summary = get_metric('invoice_summary', org_id)
     
     dashboard_data = {
-        'total_customers': total_customers,
-        'total_vendors': total_vendors,
-        'total_invoices': total_invoices,
-        'pending_invoices': pending_invoices,
-        'total_receivables': float(total_receivables),
-        'recent_invoices': recent_invoices,
+        'total_customers': counts['customers'],
+        'total_vendors': counts['vendors'],
+        'total_invoices': invoice_summary['total_invoices'],
+        'pending_invoices': invoice_summary['pending_invoices'],
+        'total_receivables': invoice_summary['total_receivables'],
+        'recent_invoices': get_metric('recent_invoices', org_id),
         'current_date': datetime.now()
     }
     
@@ -58,25 +36,8 @@ def index():
 def api_metrics():
     """API endpoint for dashboard metrics (for AJAX updates)"""
     
-    org_id = current_user.organization_id
-    
-    # Calculate monthly sales trend (last 6 months)
-    six_months_ago = datetime.now() - timedelta(days=180)
-    monthly_sales = db.session.query(
-        func.strftime('%Y-%m', Invoice.invoice_date).label('month'),
-        func.sum(Invoice.total).label('total')
-    ).filter(
-        Invoice.organization_id == org_id,
-        Invoice.invoice_date >= six_months_ago
-    ).group_by(func.strftime('%Y-%m', Invoice.invoice_date)).order_by(func.strftime('%Y-%m', Invoice.invoice_date)).all()
-    
-    sales_data = [
-        {
-            'month': sale.month.strftime('%Y-%m'),
-            'total': float(sale.total or 0)
-        }
-        for sale in monthly_sales
-    ]
+    # Monthly sales trend (last 6 months)
+    sales_data = get_metric('monthly_sales', current_user.organization_id)
     
     return jsonify({
         'monthly_sales': sales_data,
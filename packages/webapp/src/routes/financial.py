@@ -3,7 +3,7 @@ Financial routes for BigCapitalPy
 Banking, Manual Journals, Reconciliation, and other financial operations
 """
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from flask_login import login_required, current_user
 from datetime import datetime, date, timedelta
 from decimal import Decimal
@@ -19,6 +19,11 @@ from packages.server.src.models import (
     BankReconciliation, ReconciliationMatch
 )
 from packages.server.src.database import db
+from packages.webapp.src.utils.bank_import import DEFAULT_CHUNK_SIZE
+from packages.webapp.src.utils.date_buckets import date_bucket
+from packages.webapp.src.utils.jobs import submit_job, upload_path
+from packages.webapp.src.utils.ledger_posting import DraftEntry, DraftLine, LedgerPostingService, PostingError
+from packages.webapp.src.utils.reconciliation import auto_match
 
 financial_bp = Blueprint('financial', __name__)
 
@@ -115,77 +120,41 @@ def create_manual_journal():
             # Parse date
             entry_date = datetime.strptime(date_str, '%Y-%m-%d').date()
             
-            # Generate entry number
-            last_entry = JournalEntry.query.filter(
-                JournalEntry.organization_id == current_user.organization_id,
-                JournalEntry.entry_number.like('MJ%')
-            ).order_by(JournalEntry.id.desc()).first()
-            
-            if last_entry:
-                last_num = int(last_entry.entry_number[2:])
-                entry_number = f"MJ{last_num + 1:06d}"
-            else:
-                entry_number = "MJ000001"
-            
-            # Create journal entry
-            journal = JournalEntry(
-                entry_number=entry_number,
-                reference=reference,
-                date=entry_date,
-                description=description,
-                source_type='manual',
-                organization_id=current_user.organization_id,
-                created_by=current_user.id
-            )
-            
             # Process line items
             line_items_data = request.form.getlist('line_items')
-            debit_total = Decimal('0.00')
-            credit_total = Decimal('0.00')
+            lines = []
             
             for i, line_data in enumerate(line_items_data):
                 if not line_data:
                     continue
                     
                 account_id = request.form.get(f'account_id_{i}')
-                description = request.form.get(f'line_description_{i}', '')
+                line_description = request.form.get(f'line_description_{i}', '')
                 debit = Decimal(request.form.get(f'debit_{i}', '0') or '0')
                 credit = Decimal(request.form.get(f'credit_{i}', '0') or '0')
                 
                 if account_id and (debit > 0 or credit > 0):
-                    line_item = JournalLineItem(
-                        account_id=int(account_id),
-                        description=description,
-                        debit=debit,
-                        credit=credit
-                    )
-                    journal.line_items.append(line_item)
-                    debit_total += debit
-                    credit_total += credit
-            
-            # Validate balanced entry
-            if debit_total != credit_total:
-                flash(f'Journal entry is not balanced. Debits: {debit_total}, Credits: {credit_total}', 'error')
-                return redirect(url_for('financial.create_manual_journal'))
-            
-            journal.debit_total = debit_total
-            journal.credit_total = credit_total
-            
-            db.session.add(journal)
-            db.session.commit()
+                    lines.append(DraftLine(int(account_id), debit, credit, line_description))
             
-            # Update account balances
-            for line_item in journal.line_items:
-                account = Account.query.get(line_item.account_id)
-                if account:
-                    balance_change = line_item.debit - line_item.credit
-                    account.current_balance = (account.current_balance or 0) + balance_change
+            # Validate, number and post the entry with its balance updates
+            service = LedgerPostingService(current_user.organization_id, current_user.id)
+            service.post_entry(DraftEntry(
+                date=entry_date,
+                lines=lines,
+                description=description,
+                reference=reference,
+                source_type='manual'
+            ), number_type='manual_journal')
             
             db.session.commit()
             
             flash('Manual journal entry created successfully!', 'success')
             return redirect(url_for('financial.manual_journals'))
             
+        except PostingError as e:
+            db.session.rollback()
+            flash(str(e), 'error')
+            return redirect(url_for('financial.create_manual_journal'))
         except Exception as e:
             flash(f'Error creating journal entry: {str(e)}', 'error')
             db.session.rollback()
@@ -292,65 +261,26 @@ def upload_bank_statement(account_id):
         
         if file and file.filename.lower().endswith('.csv'):
             try:
-                # Read CSV file
-                stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-                csv_input = csv.DictReader(stream)
-                
-                # Get form data for column mapping
-                date_col = request.form.get('date_column')
-                desc_col = request.form.get('description_column')
-                amount_col = request.form.get('amount_column')
-                ref_col = request.form.get('reference_column', '')
-                balance_col = request.form.get('balance_column', '')
-                
-                imported_count = 0
-                duplicate_count = 0
+                # Import in the background with the submitted column mapping
+                path = upload_path('.csv')
+                file.save(path)
+                job = submit_job('bank_import', {
+                    'path': path,
+                    'account_id': account_id,
+                    'parser': 'column_mapping',
+                    'mapping': {
+                        'date_column': request.form.get('date_column'),
+                        'description_column': request.form.get('description_column'),
+                        'amount_column': request.form.get('amount_column'),
+                        'reference_column': request.form.get('reference_column', ''),
+                        'balance_column': request.form.get('balance_column', '')
+                    },
+                    'chunk_size': current_app.config.get('BANK_IMPORT_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+                }, organization_id=current_user.organization_id, user_id=current_user.id)
                 
-                for row in csv_input:
-                    try:
-                        # Parse transaction data
-                        transaction_date = datetime.strptime(row[date_col], '%Y-%m-%d').date()
-                        description = row[desc_col]
-                        amount = Decimal(str(row[amount_col]))
-                        reference = row.get(ref_col, '') if ref_col else ''
-                        balance = Decimal(str(row[balance_col])) if balance_col and row.get(balance_col) else None
-                        
-                        # Check for duplicates
-                        existing = BankTransaction.query.filter_by(
-                            account_id=account_id,
-                            transaction_date=transaction_date,
-                            description=description,
-                            amount=amount
-                        ).first()
-                        
-                        if existing:
-                            duplicate_count += 1
-                            continue
-                        
-                        # Create bank transaction
-                        bank_transaction = BankTransaction(
-                            account_id=account_id,
-                            transaction_date=transaction_date,
-                            description=description,
-                            reference=reference,
-                            amount=amount,
-                            balance=balance,
-                            organization_id=current_user.organization_id
-                        )
-                        
-                        db.session.add(bank_transaction)
-                        imported_count += 1
-                        
-                    except (ValueError, KeyError) as e:
-                        flash(f'Error processing row: {str(e)}', 'warning')
-                        continue
-                
-                db.session.commit()
-                
-                flash(f'Successfully imported {imported_count} transactions. '
-                      f'{duplicate_count} duplicates were skipped.', 'success')
-                
-                return redirect(url_for('financial.start_reconciliation', account_id=account_id))
+                flash('Bank statement import started.', 'info')
+                return redirect(url_for('jobs.view', job_id=job.id,
+                                        next=url_for('financial.start_reconciliation', account_id=account_id)))
                 
             except Exception as e:
                 flash(f'Error processing CSV file: {str(e)}', 'error')
@@ -483,14 +413,15 @@ def cash_flow():
     # Calculate monthly cash flow for last 6 months
     six_months_ago = date.today() - timedelta(days=180)
     
+    month = date_bucket(JournalEntry.date, 'month')
     monthly_flow = db.session.query(
-        func.strftime('%Y-%m', JournalEntry.date).label('month'),
+        month.label('month'),
         func.sum(JournalLineItem.debit - JournalLineItem.credit).label('net_flow')
     ).join(JournalLineItem).filter(
         JournalEntry.organization_id == current_user.organization_id,
         JournalEntry.date >= six_months_ago,
         JournalLineItem.account_id.in_([acc.id for acc in cash_accounts])
-    ).group_by(func.strftime('%Y-%m', JournalEntry.date)).all()
+    ).group_by(month).order_by(month).all()
     
     cash_flow_data = {
         'accounts': cash_accounts,
@@ -567,9 +498,14 @@ def unmatch_transaction(reconciliation_id, match_id):
     ).first_or_404()
     
     try:
-        # Update bank transaction status if it was matched
+        # Update bank transaction status unless other lines of a split match remain
         if match.bank_transaction:
-            match.bank_transaction.status = 'unmatched'
+            other_matches = ReconciliationMatch.query.filter(
+                ReconciliationMatch.bank_transaction_id == match.bank_transaction_id,
+                ReconciliationMatch.id != match.id
+            ).count()
+            if not other_matches:
+                match.bank_transaction.status = 'unmatched'
         
         db.session.delete(match)
         db.session.commit()
@@ -589,45 +525,15 @@ def auto_match_transactions(reconciliation_id):
         BankReconciliation.organization_id == current_user.organization_id
     ).first_or_404()
     
+    date_tolerance = request.form.get(
+        'date_tolerance',
+        current_app.config.get('RECONCILIATION_DATE_TOLERANCE_DAYS', 3),
+        type=int
+    )
+    
     try:
-        matched_count = 0
-        
-        # Get unmatched bank transactions
-        bank_transactions = BankTransaction.query.filter(
-            BankTransaction.account_id == reconciliation.account_id,
-            BankTransaction.transaction_date <= reconciliation.statement_ending_date,
-            BankTransaction.status == 'unmatched'
-        ).all()
-        
-        for bank_txn in bank_transactions:
-            # Look for journal entries with same date and amount
-            matching_journal = db.session.query(JournalLineItem).join(JournalEntry).filter(
-                JournalLineItem.account_id == reconciliation.account_id,
-                JournalEntry.date == bank_txn.transaction_date,
-                or_(
-                    and_(bank_txn.amount > 0, JournalLineItem.debit == bank_txn.amount),
-                    and_(bank_txn.amount < 0, JournalLineItem.credit == abs(bank_txn.amount))
-                ),
-                ~JournalLineItem.id.in_(
-                    db.session.query(ReconciliationMatch.journal_line_item_id).filter(
-                        ReconciliationMatch.journal_line_item_id.isnot(None)
-                    )
-                )
-            ).first()
-            
-            if matching_journal:
-                # Create automatic match
-                match = ReconciliationMatch(
-                    reconciliation_id=reconciliation_id,
-                    bank_transaction_id=bank_txn.id,
-                    journal_line_item_id=matching_journal.id,
-                    match_type='automatic',
-                    confidence_score=1.0
-                )
-                
-                db.session.add(match)
-                bank_txn.status = 'matched'
-                matched_count += 1
+        result = auto_match(reconciliation, date_tolerance_days=max(date_tolerance, 0))
+        matched_count = result.matched_count
         
         db.session.commit()
         
@@ -659,90 +565,36 @@ def create_journal_entry_from_bank(reconciliation_id):
         if not bank_txn:
             return jsonify({'success': False, 'message': 'Bank transaction not found'}), 404
         
-        # Generate entry number
-        last_entry = JournalEntry.query.filter(
-            JournalEntry.organization_id == current_user.organization_id,
-            JournalEntry.entry_number.like('BANK%')
-        ).order_by(JournalEntry.id.desc()).first()
-        
-        if last_entry:
-            last_num = int(last_entry.entry_number[4:])
-            entry_number = f"BANK{last_num + 1:06d}"
-        else:
-            entry_number = "BANK000001"
-        
-        # Create journal entry
-        journal = JournalEntry(
-            entry_number=entry_number,
-            reference=bank_txn.reference or '',
+        # Deposits debit the bank account and credit the contra account;
+        # withdrawals the other way round
+        amount = abs(bank_txn.amount)
+        line_description = description or bank_txn.description
+        bank_line = DraftLine(bank_txn.account_id, debit=amount if bank_txn.amount > 0 else Decimal('0.00'),
+                              credit=Decimal('0.00') if bank_txn.amount > 0 else amount,
+                              description=line_description)
+        contra_line = DraftLine(int(contra_account_id), debit=bank_line.credit, credit=bank_line.debit,
+                                description=line_description)
+        
+        service = LedgerPostingService(current_user.organization_id, current_user.id)
+        journal = service.post_entry(DraftEntry(
             date=bank_txn.transaction_date,
+            lines=[bank_line, contra_line],
             description=description or bank_txn.description,
-            source_type='bank_reconciliation',
-            organization_id=current_user.organization_id,
-            created_by=current_user.id
-        )
-        
-        # Create line items
-        if bank_txn.amount > 0:  # Deposit
-            # Debit bank account
-            bank_line = JournalLineItem(
-                account_id=bank_txn.account_id,
-                description=description or bank_txn.description,
-                debit=bank_txn.amount,
-                credit=Decimal('0.00')
-            )
-            # Credit contra account
-            contra_line = JournalLineItem(
-                account_id=int(contra_account_id),
-                description=description or bank_txn.description,
-                debit=Decimal('0.00'),
-                credit=bank_txn.amount
-            )
-        else:  # Withdrawal
-            # Credit bank account
-            bank_line = JournalLineItem(
-                account_id=bank_txn.account_id,
-                description=description or bank_txn.description,
-                debit=Decimal('0.00'),
-                credit=abs(bank_txn.amount)
-            )
-            # Debit contra account
-            contra_line = JournalLineItem(
-                account_id=int(contra_account_id),
-                description=description or bank_txn.description,
-                debit=abs(bank_txn.amount),
-                credit=Decimal('0.00')
-            )
-        
-        journal.line_items.extend([bank_line, contra_line])
-        journal.debit_total = abs(bank_txn.amount)
-        journal.credit_total = abs(bank_txn.amount)
-        
-        db.session.add(journal)
-        db.session.flush()  # Get the journal ID
+            reference=bank_txn.reference or '',
+            source_type='bank_reconciliation'
+        ), number_type='bank_journal')
         
         # Create match between bank transaction and journal entry
         match = ReconciliationMatch(
             reconciliation_id=reconciliation_id,
             bank_transaction_id=bank_txn.id,
-            journal_line_item_id=bank_line.id,
+            journal_line_item_id=journal.line_ids[0],
             match_type='created'
         )
         
         db.session.add(match)
         bank_txn.status = 'matched'
         
-        # Update account balances
-        bank_account = Account.query.get(bank_txn.account_id)
-        contra_account = Account.query.get(contra_account_id)
-        
-        if bank_account:
-            bank_account.current_balance = (bank_account.current_balance or 0) + bank_txn.amount
-        
-        if contra_account:
-            contra_balance_change = -bank_txn.amount if bank_txn.amount > 0 else abs(bank_txn.amount)
-            contra_account.current_balance = (contra_account.current_balance or 0) + contra_balance_change
-        
         db.session.commit()
         
         return jsonify({
@@ -10,9 +10,11 @@ from sqlalchemy import desc, func, and_, or_
 
 from packages.server.src.models import (
     Invoice, InvoiceLineItem, Customer, Item, Account, AccountType, 
-    InvoiceStatus, JournalEntry, JournalLineItem
+    InvoiceStatus
 )
 from packages.server.src.database import db
+from packages.webapp.src.utils import sequences
+from packages.webapp.src.utils.invoicing import InvoiceBatchService, InvoiceRecord
 
 invoices_bp = Blueprint('invoices', __name__)
 
@@ -126,20 +128,8 @@ def create():
         Item.is_active == True
     ).order_by(Item.name).all()
     
-    # Generate next invoice number
-    last_invoice = Invoice.query.filter(
-        Invoice.organization_id == current_user.organization_id
-    ).order_by(desc(Invoice.id)).first()
-    
-    if last_invoice:
-        # Extract number from last invoice and increment
-        try:
-            last_num = int(last_invoice.invoice_number.split('-')[-1])
-            next_number = f"INV-{last_num + 1:04d}"
-        except (ValueError, IndexError):
-            next_number = f"INV-{Invoice.query.filter(Invoice.organization_id == current_user.organization_id).count() + 1:04d}"
-    else:
-        next_number = "INV-0001"
+    # Preview the next invoice number; it is reserved when the invoice is saved
+    next_number = sequences.peek_number(current_user.organization_id, 'invoice')
     
     # Get default accounts
     sales_account = Account.query.filter(
@@ -165,6 +155,7 @@ def save():
         # Get form data
         customer_id = request.form.get('customer_id')
         invoice_number = request.form.get('invoice_number')
+        auto_number = request.form.get('auto_number')
         invoice_date = request.form.get('invoice_date')
         due_date = request.form.get('due_date')
         reference = request.form.get('reference', '')
@@ -185,7 +176,7 @@ def save():
             return redirect(url_for('invoices.create'))
         
         # Check if invoice number exists (for new invoices)
-        if not invoice_id:
+        if not invoice_id and invoice_number != auto_number:
             existing = Invoice.query.filter(
                 Invoice.organization_id == current_user.organization_id,
                 Invoice.invoice_number == invoice_number
@@ -201,6 +192,11 @@ def save():
                 flash('Invoice not found.', 'error')
                 return redirect(url_for('invoices.index'))
         else:
+            if invoice_number == auto_number:
+                # Take the next number now; the previewed one may have been issued since
+                invoice_number = sequences.next_number(current_user.organization_id, 'invoice')
+            else:
+                sequences.note_manual_number(current_user.organization_id, 'invoice', invoice_number)
             invoice = Invoice(
                 organization_id=current_user.organization_id,
                 invoice_number=invoice_number
@@ -379,58 +375,10 @@ def send(id):
 
 def create_invoice_journal_entry(invoice):
     """Create accounting journal entry for an invoice"""
-    # Get accounts
-    accounts_receivable = Account.query.filter(
-        Account.organization_id == current_user.organization_id,
-        Account.type == AccountType.ASSET,
-        Account.name.ilike('%receivable%')
-    ).first()
-    
-    sales_account = Account.query.filter(
-        Account.organization_id == current_user.organization_id,
-        Account.type == AccountType.INCOME,
-        Account.name.ilike('%sales%')
-    ).first()
-    
-    if not accounts_receivable or not sales_account:
-        raise Exception("Required accounts not found. Please set up Accounts Receivable and Sales accounts.")
-    
-    # Create journal entry
-    entry = JournalEntry(
-        organization_id=current_user.organization_id,
-        entry_number=f"INV-{invoice.invoice_number}",
-        date=invoice.invoice_date,
-        description=f"Invoice {invoice.invoice_number} - {invoice.customer.display_name}",
-        source_type='invoice',
-        source_id=invoice.id,
-        created_by=current_user.id,
-        debit_total=invoice.total,
-        credit_total=invoice.total
-    )
-    db.session.add(entry)
-    db.session.flush()
-    
-    # Debit Accounts Receivable
-    debit_line = JournalLineItem(
-        journal_entry_id=entry.id,
-        account_id=accounts_receivable.id,
-        description=f"Invoice {invoice.invoice_number}",
-        debit=invoice.total,
-        credit=Decimal('0.00'),
-        contact_type='customer',
-        contact_id=invoice.customer_id
-    )
-    db.session.add(debit_line)
-    
-    # Credit Sales
-    credit_line = JournalLineItem(
-        journal_entry_id=entry.id,
-        account_id=sales_account.id,
-        description=f"Sales - Invoice {invoice.invoice_number}",
-        debit=Decimal('0.00'),
-        credit=invoice.total
-    )
-    db.session.add(credit_line)
+    # Debit Accounts Receivable, credit Sales
+    InvoiceBatchService(current_user.organization_id, current_user.id).post_journals([
+        InvoiceRecord.of(invoice)
+    ])
 
 @invoices_bp.route('/mark-paid/<int:id>', methods=['POST'])
 @login_required
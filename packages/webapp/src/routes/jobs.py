@@ -0,0 +1,54 @@
+"""
+Background job status pages for BigCapitalPy
+"""
+
+from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file
+from flask_login import login_required, current_user
+import json
+import os
+from packages.server.src.models import Job
+from packages.webapp.src.utils.jobs import cancel_job
+
+jobs_bp = Blueprint('jobs', __name__)
+
+def _get_job(job_id):
+    return Job.query.filter_by(
+        id=job_id,
+        organization_id=current_user.organization_id
+    ).first_or_404()
+
+def _next_url():
+    """Local page to continue to once the job is done"""
+    next_url = request.args.get('next', '')
+    if next_url.startswith('/') and not next_url.startswith('//'):
+        return next_url
+    return None
+
+@jobs_bp.route('/<job_id>')
+@login_required
+def view(job_id):
+    """Show a job's progress and outcome"""
+    job = _get_job(job_id)
+    result = json.loads(job.result) if job.result else None
+    return render_template('jobs/view.html', job=job, result=result, next_url=_next_url())
+
+@jobs_bp.route('/<job_id>/cancel', methods=['POST'])
+@login_required
+def cancel(job_id):
+    """Request cancellation of a job"""
+    job = _get_job(job_id)
+    if cancel_job(job):
+        flash('Cancellation requested.', 'info')
+    else:
+        flash('This job has already finished.', 'warning')
+    return redirect(url_for('jobs.view', job_id=job.id, next=_next_url()))
+
+@jobs_bp.route('/<job_id>/download')
+@login_required
+def download(job_id):
+    """Download the file a job produced"""
+    job = _get_job(job_id)
+    if job.status != 'completed' or not job.result_path or not os.path.exists(job.result_path):
+        flash('No file is available for this job.', 'error')
+        return redirect(url_for('jobs.view', job_id=job.id))
+    return send_file(job.result_path, as_attachment=True)
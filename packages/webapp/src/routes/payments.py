@@ -11,9 +11,14 @@ from sqlalchemy import desc, func, and_, or_
 
 from packages.server.src.models import (
     Payment, PaymentAllocation, PaymentMethod, Customer, Invoice, 
-    Account, AccountType, InvoiceStatus, JournalEntry, JournalLineItem
+    Account, AccountType, InvoiceStatus, JournalEntry
 )
 from packages.server.src.database import db
+from packages.webapp.src.utils import sequences
+from packages.webapp.src.utils.ledger_posting import DraftEntry, DraftLine, LedgerPostingService
+from packages.webapp.src.utils.payment_allocation import (
+    AllocationError, allocate_payment, parse_allocation_strings, release_allocations
+)
 
 payments_bp = Blueprint('payments', __name__)
 
@@ -132,19 +137,8 @@ def create():
             Account.is_active == True
         ).order_by(Account.name).all()
     
-    # Generate next payment number
-    last_payment = Payment.query.filter(
-        Payment.organization_id == current_user.organization_id
-    ).order_by(desc(Payment.id)).first()
-    
-    if last_payment:
-        try:
-            last_num = int(last_payment.payment_number.split('-')[-1])
-            next_number = f"PMT-{last_num + 1:05d}"
-        except (ValueError, IndexError):
-            next_number = f"PMT-{Payment.query.filter(Payment.organization_id == current_user.organization_id).count() + 1:05d}"
-    else:
-        next_number = "PMT-00001"
+    # Preview the next payment number; it is reserved when the payment is saved
+    next_number = sequences.peek_number(current_user.organization_id, 'payment')
     
     return render_template('payments/create.html',
                          customers=customers,
@@ -187,6 +181,7 @@ def save():
         # Get form data
         customer_id = request.form.get('customer_id')
         payment_number = request.form.get('payment_number')
+        auto_number = request.form.get('auto_number')
         payment_date = request.form.get('payment_date')
         amount = request.form.get('amount')
         payment_method = request.form.get('payment_method')
@@ -214,14 +209,19 @@ def save():
             flash('Payment amount must be greater than zero.', 'error')
             return redirect(url_for('payments.create'))
         
-        # Check if payment number exists
-        existing = Payment.query.filter(
-            Payment.organization_id == current_user.organization_id,
-            Payment.payment_number == payment_number
-        ).first()
-        if existing:
-            flash('Payment number already exists.', 'error')
-            return redirect(url_for('payments.create'))
+        if payment_number == auto_number:
+            # Take the next number now; the previewed one may have been issued since
+            payment_number = sequences.next_number(current_user.organization_id, 'payment')
+        else:
+            # Check if payment number exists
+            existing = Payment.query.filter(
+                Payment.organization_id == current_user.organization_id,
+                Payment.payment_number == payment_number
+            ).first()
+            if existing:
+                flash('Payment number already exists.', 'error')
+                return redirect(url_for('payments.create'))
+            sequences.note_manual_number(current_user.organization_id, 'payment', payment_number)
         
         # Create payment
         payment = Payment(
@@ -242,53 +242,18 @@ def save():
         db.session.add(payment)
         db.session.flush()  # Get payment ID
         
-        # Handle invoice allocations
-        allocations_data = request.form.getlist('allocations')
-        total_allocated = Decimal('0.00')
-        
-        for allocation_str in allocations_data:
-            if allocation_str:
-                try:
-                    invoice_id, allocated_amount = allocation_str.split(':')
-                    invoice_id = int(invoice_id)
-                    allocated_amount = Decimal(allocated_amount)
-                    
-                    if allocated_amount > 0:
-                        # Validate invoice exists and belongs to customer
-                        invoice = Invoice.query.filter(
-                            Invoice.id == invoice_id,
-                            Invoice.customer_id == customer_id,
-                            Invoice.organization_id == current_user.organization_id
-                        ).first()
-                        
-                        if not invoice:
-                            continue
-                        
-                        # Don't allocate more than the invoice balance
-                        allocated_amount = min(allocated_amount, invoice.balance)
-                        
-                        if allocated_amount > 0:
-                            allocation = PaymentAllocation(
-                                payment_id=payment.id,
-                                invoice_id=invoice_id,
-                                allocated_amount=allocated_amount
-                            )
-                            db.session.add(allocation)
-                            
-                            # Update invoice paid amount and balance
-                            invoice.paid_amount = (invoice.paid_amount or 0) + allocated_amount
-                            invoice.balance = invoice.total - invoice.paid_amount
-                            
-                            # Update invoice status
-                            if invoice.balance <= 0:
-                                invoice.status = InvoiceStatus.PAID
-                            elif invoice.paid_amount > 0:
-                                invoice.status = InvoiceStatus.PARTIAL
-                            
-                            total_allocated += allocated_amount
-                            
-                except (ValueError, TypeError):
-                    continue
+        # Apply the payment to the listed invoices, or oldest due first
+        try:
+            allocations = allocate_payment(
+                payment,
+                parse_allocation_strings(request.form.getlist('allocations')),
+                auto=bool(request.form.get('auto_apply'))
+            )
+        except AllocationError as e:
+            db.session.rollback()
+            flash(str(e), 'error')
+            return redirect(url_for('payments.create'))
+        total_allocated = sum((allocation.amount for allocation in allocations), Decimal('0.00'))
         
         # Create journal entry for the payment
         create_payment_journal_entry(payment, total_allocated)
@@ -353,25 +318,16 @@ def delete(id):
     
     try:
         # Reverse invoice allocations
-        for allocation in payment.payment_allocations:
-            invoice = allocation.invoice
-            invoice.paid_amount = (invoice.paid_amount or 0) - allocation.allocated_amount
-            invoice.balance = invoice.total - invoice.paid_amount
-            
-            # Update invoice status
-            if invoice.balance >= invoice.total:
-                invoice.status = InvoiceStatus.SENT
-            elif invoice.paid_amount > 0:
-                invoice.status = InvoiceStatus.PARTIAL
-        
-        # Delete allocations
-        PaymentAllocation.query.filter_by(payment_id=payment.id).delete()
+        release_allocations(payment)
         
-        # Delete journal entries
-        JournalEntry.query.filter(
+        # Delete journal entries along with their line items
+        service = LedgerPostingService(current_user.organization_id, current_user.id)
+        for entry in JournalEntry.query.filter(
             JournalEntry.organization_id == current_user.organization_id,
             JournalEntry.reference == f"Payment {payment.payment_number}"
-        ).delete()
+        ).all():
+            service.adjust_balances(entry.line_items, reverse=True)
+            db.session.delete(entry)
         
         # Delete payment
         db.session.delete(payment)
@@ -410,41 +366,17 @@ def create_payment_journal_entry(payment, allocated_amount):
             db.session.add(ar_account)
             db.session.flush()
         
-        # Create journal entry
-        journal_entry = JournalEntry(
-            date=payment.payment_date,
-            reference=f"Payment {payment.payment_number}",
-            description=f"Customer payment from {payment.customer.display_name}",
-            organization_id=current_user.organization_id,
-            created_by=current_user.id
-        )
-        
-        db.session.add(journal_entry)
-        db.session.flush()
-        
-        # Debit: Deposit Account (increase cash/bank)
-        debit_line = JournalLineItem(
-            journal_entry_id=journal_entry.id,
-            account_id=payment.deposit_account_id,
-            description=f"Payment received from {payment.customer.display_name}",
-            debit=payment.amount,
-            credit=0,
-            contact_type='customer',
-            contact_id=payment.customer_id
-        )
-        db.session.add(debit_line)
+        description = f"Payment received from {payment.customer.display_name}"
+        lines = [
+            # Debit: Deposit Account (increase cash/bank)
+            DraftLine(int(payment.deposit_account_id), debit=payment.amount, description=description,
+                      contact_type='customer', contact_id=payment.customer_id)
+        ]
         
         # Credit: Accounts Receivable (decrease what customer owes)
-        credit_line = JournalLineItem(
-            journal_entry_id=journal_entry.id,
-            account_id=ar_account.id,
-            description=f"Payment received from {payment.customer.display_name}",
-            debit=0,
-            credit=allocated_amount,
-            contact_type='customer',
-            contact_id=payment.customer_id
-        )
-        db.session.add(credit_line)
+        if allocated_amount > 0:
+            lines.append(DraftLine(ar_account.id, credit=allocated_amount, description=description,
+                                   contact_type='customer', contact_id=payment.customer_id))
         
         # If there's unallocated amount (overpayment), credit to customer deposits/prepayments
         unallocated = payment.amount - allocated_amount
@@ -466,16 +398,18 @@ def create_payment_journal_entry(payment, allocated_amount):
                 db.session.add(deposits_account)
                 db.session.flush()
             
-            unallocated_line = JournalLineItem(
-                journal_entry_id=journal_entry.id,
-                account_id=deposits_account.id,
-                description=f"Unallocated payment from {payment.customer.display_name}",
-                debit=0,
-                credit=unallocated,
-                contact_type='customer',
-                contact_id=payment.customer_id
-            )
-            db.session.add(unallocated_line)
+            lines.append(DraftLine(deposits_account.id, credit=unallocated,
+                                   description=f"Unallocated payment from {payment.customer.display_name}",
+                                   contact_type='customer', contact_id=payment.customer_id))
+        
+        LedgerPostingService(current_user.organization_id, current_user.id).post_entry(DraftEntry(
+            date=payment.payment_date,
+            lines=lines,
+            description=f"Customer payment from {payment.customer.display_name}",
+            reference=f"Payment {payment.payment_number}",
+            source_type='payment',
+            source_id=payment.id
+        ))
         
     except Exception as e:
         # Log the error but don't fail the payment creation
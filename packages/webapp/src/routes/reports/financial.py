@@ -1,44 +1,123 @@
 
-from flask import Blueprint, render_template
+from flask import Blueprint, render_template, Response, stream_template
+from flask_login import login_required, current_user
 financial_bp = Blueprint('financial', __name__)
 
+def _parse_date_arg(name):
+    """Date from a YYYY-MM-DD query parameter, or None"""
+    from datetime import datetime
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
 # Trial Balance route (for reports.financial.trial_balance endpoint)
 @financial_bp.route('/trial-balance')
+@login_required
 def trial_balance():
-    # TODO: Replace with real data and template
-    from datetime import date
-    report_data = {
-        'as_of_date': date.today().isoformat(),
-        'accounts': [],
-        'trial_balance_data': [],
-        'total_debits': 0.0,
-        'total_credits': 0.0,
-        'is_balanced': True
-    }
+    as_of_date = _parse_date_arg('as_of_date') or date.today()
+    report_data = generate_trial_balance_data(current_user.organization_id, as_of_date)
+
+    format = request.args.get('format')
+    if format == 'csv':
+        return export_trial_balance_csv(report_data)
+    if format == 'pdf':
+        return generate_pdf_report(report_data)
     return render_template('reports/tax-compliance/trial_balance.html', report_data=report_data)
 
+def generate_trial_balance_data(organization_id, as_of_date):
+    """Debit or credit balance of every account with a balance as of the date"""
+    accounts = Account.query.filter_by(organization_id=organization_id).order_by(Account.code).all()
+    # One snapshot-backed lookup for all accounts
+    balances = get_account_balances(organization_id, None, as_of_date)
+
+    rows = []
+    total_debits = Decimal('0.00')
+    total_credits = Decimal('0.00')
+    for account in accounts:
+        net = balances.net(account.id)
+        if not net:
+            continue
+        debit_balance = net if net > 0 else Decimal('0.00')
+        credit_balance = -net if net < 0 else Decimal('0.00')
+        total_debits += debit_balance
+        total_credits += credit_balance
+        rows.append({
+            'account_id': account.id,
+            'account_code': account.code or '',
+            'account_name': account.name,
+            'account_type': account.type.value,
+            'debit_balance': float(debit_balance),
+            'credit_balance': float(credit_balance)
+        })
+
+    return {
+        'as_of_date': as_of_date.isoformat(),
+        'accounts': accounts,
+        'trial_balance_data': rows,
+        'total_debits': float(total_debits),
+        'total_credits': float(total_credits),
+        'is_balanced': total_debits == total_credits
+    }
+
 
 # General Ledger route (for reports.financial.general_ledger endpoint)
 @financial_bp.route('/general-ledger')
+@login_required
 def general_ledger():
-    # TODO: Replace with real data and template
-    # Provide safe fallbacks for required context variables
-    from datetime import date
+    organization_id = current_user.organization_id
+    end_date = _parse_date_arg('end_date') or _parse_date_arg('as_of_date') or date.today()
+    start_date = _parse_date_arg('start_date') or end_date.replace(month=1, day=1)
     report_period = {
-        'start_date': date.today(),
-        'end_date': date.today()
+        'start_date': start_date,
+        'end_date': end_date,
+        'opening_date': start_date - timedelta(days=1)
     }
+
+    accounts = Account.query.filter_by(organization_id=organization_id).order_by(Account.code).all()
+    account_id = request.args.get('account_id', type=int)
+    account = next((a for a in accounts if a.id == account_id), None)
+
+    if request.args.get('format') == 'csv':
+        # Without an account the export covers the whole ledger
+        return export_general_ledger_csv(
+            organization_id, [account] if account else accounts, start_date, end_date
+        )
+
     report_data = {
-        'account': None,
-        'accounts': [],
+        'account': account,
+        'accounts': accounts,
         'ledger_entries': [],
+        'transaction_count': 0,
         'opening_balance': 0.0,
         'closing_balance': 0.0,
         'total_debits': 0.0,
         'total_credits': 0.0,
         'net_change': 0.0
     }
-    return render_template('reports/tax-compliance/general_ledger.html', report_period=report_period, report_data=report_data)
+    if account:
+        section = next(iter_general_ledger(organization_id, [account], start_date, end_date), None)
+        if section is None:
+            section = LedgerSection(account, Decimal('0.00'))
+        # Header figures come from an aggregate so the lines can be streamed
+        count, totals = get_ledger_totals(organization_id, account.id, start_date, end_date)
+        net_change = totals.natural(account.type)
+        report_data.update({
+            'ledger_entries': section.lines,
+            'transaction_count': count,
+            'opening_balance': float(section.opening_balance),
+            'closing_balance': float(section.opening_balance + net_change),
+            'total_debits': float(totals.debit),
+            'total_credits': float(totals.credit),
+            'net_change': float(net_change)
+        })
+
+    return Response(stream_template(
+        'reports/tax-compliance/general_ledger.html', report_period=report_period, report_data=report_data
+    ))
 
 # Cash Flow Statement route (for reports.financial.cash_flow endpoint)
 from datetime import date
@@ -120,7 +199,9 @@ def generate_cash_flow_data(start_date, end_date):
 
 # Balance Sheet route (for reports.financial.balance_sheet endpoint)
 from datetime import date
+from flask_login import login_required, current_user
 @financial_bp.route('/balance-sheet')
+@login_required
 def balance_sheet():
     # Use today's date as the report period end date
     report_period = {
@@ -128,41 +209,29 @@ def balance_sheet():
     }
     # Query the database for assets, liabilities, and equity accounts and balances
     try:
-        assets = get_accounts_with_balances(AccountType.ASSET, None, None)
-        liabilities = get_accounts_with_balances(AccountType.LIABILITY, None, None)
-        equity = get_accounts_with_balances(AccountType.EQUITY, None, None)
-        total_assets = sum(a['balance'] for a in assets) if assets else 0.0
-        total_liabilities = sum(l['balance'] for l in liabilities) if liabilities else 0.0
-        total_equity = sum(e['balance'] for e in equity) if equity else 0.0
+        sections = get_accounts_with_balances(
+            [AccountType.ASSET, AccountType.LIABILITY, AccountType.EQUITY,
+             AccountType.INCOME, AccountType.EXPENSE],
+            None, report_period['end_date']
+        )
+        assets = sections[AccountType.ASSET]
+        liabilities = sections[AccountType.LIABILITY]
+        equity = sections[AccountType.EQUITY]
+        retained_earnings = (
+            sum(i['balance'] for i in sections[AccountType.INCOME]) -
+            sum(e['balance'] for e in sections[AccountType.EXPENSE])
+        )
+        total_assets = sum(a['balance'] for a in assets)
+        total_liabilities = sum(l['balance'] for l in liabilities)
+        total_equity = sum(e['balance'] for e in equity) + retained_earnings
         report_data = {
-            'assets': [
-                {
-                    'id': a.id,
-                    'name': a.name,
-                    'code': getattr(a, 'code', ''),
-                    'balance': float(a.balance) if a.balance else 0.0
-                } for a in assets
-            ],
-            'liabilities': [
-                {
-                    'id': l.id,
-                    'name': l.name,
-                    'code': getattr(l, 'code', ''),
-                    'balance': float(l.balance) if l.balance else 0.0
-                } for l in liabilities
-            ],
-            'equity': [
-                {
-                    'id': e.id,
-                    'name': e.name,
-                    'code': getattr(e, 'code', ''),
-                    'balance': float(e.balance) if e.balance else 0.0
-                } for e in equity
-            ],
+            'assets': assets,
+            'liabilities': liabilities,
+            'equity': equity,
             'total_assets': total_assets,
             'total_liabilities': total_liabilities,
             'total_equity': total_equity,
-            'retained_earnings': 0.0,
+            'retained_earnings': retained_earnings,
             'total_liabilities_equity': total_liabilities + total_equity
         }
     except Exception as ex:
@@ -184,11 +253,17 @@ def balance_sheet():
 
 from flask import request
 from datetime import datetime, timedelta
+from decimal import Decimal
 from packages.server.src.models import db, Account, AccountType, JournalEntry, JournalLineItem
+from packages.webapp.src.utils.ledger import (
+    LedgerSection, get_account_balances, get_accounts_by_type, get_ledger_totals, iter_general_ledger
+)
+from .utils import export_general_ledger_csv, export_trial_balance_csv
 from sqlalchemy import func
 
 @financial_bp.route('/profit-loss')
 @financial_bp.route('/profit-loss/<format>')
+@login_required
 def profit_loss(format=None):
     # Get dates from request parameters or use defaults
     start_date_str = request.args.get('start_date')
@@ -238,26 +313,11 @@ def generate_profit_loss_data(start_date, end_date):
         'net_profit_margin': 0.0
     }
     try:
-        income_results = get_accounts_with_balances(AccountType.INCOME, start_date, end_date)
-        expense_results = get_accounts_with_balances(AccountType.EXPENSE, start_date, end_date)
-        report_data['income_accounts'] = [
-            {
-                'id': result.id,
-                'name': result.name,
-                'code': getattr(result, 'code', ''),
-                'balance': float(result.balance) if result.balance else 0.0
-            }
-            for result in income_results
-        ]
-        report_data['expense_accounts'] = [
-            {
-                'id': result.id,
-                'name': result.name,
-                'code': getattr(result, 'code', ''),
-                'balance': float(result.balance) if result.balance else 0.0
-            }
-            for result in expense_results
-        ]
+        sections = get_accounts_with_balances(
+            [AccountType.INCOME, AccountType.EXPENSE], start_date, end_date
+        )
+        report_data['income_accounts'] = sections[AccountType.INCOME]
+        report_data['expense_accounts'] = sections[AccountType.EXPENSE]
         report_data['total_income'] = sum(account['balance'] for account in report_data['income_accounts'])
         report_data['total_expenses'] = sum(account['balance'] for account in report_data['expense_accounts'])
         # TODO: Implement actual COGS, categories, and other income/expense logic
@@ -293,41 +353,26 @@ def generate_profit_loss_data(start_date, end_date):
         ]
     return report_data
 
-def get_accounts_with_balances(account_type, start_date, end_date):
+def get_accounts_with_balances(account_types, start_date, end_date):
     """
-    Get accounts of specified type with their balances for the given date range.
-    Returns accounts even if they have zero balances.
+    Get the organization's accounts of the given types with their balances for
+    the date range, grouped by type. Returns accounts even if they have zero balances.
     """
-    try:
-        all_accounts = Account.query.filter_by(type=account_type).all()
-        if not all_accounts:
-            return []
-        accounts_with_balances = (
-            db.session.query(
-                Account.id,
-                Account.name,
-                Account.code,
-                func.coalesce(func.sum(JournalLineItem.amount), 0).label('balance')
-            )
-            .outerjoin(JournalLineItem, JournalLineItem.account_id == Account.id)
-            .outerjoin(JournalEntry, JournalLineItem.journal_entry_id == JournalEntry.id)
-            .filter(Account.type == account_type)
-            .filter(
-                db.or_(
-                    JournalEntry.date.is_(None),
-                    db.and_(
-                        JournalEntry.date >= start_date,
-                        JournalEntry.date <= end_date
-                    )
-                )
-            )
-            .group_by(Account.id, Account.name, Account.code)
-            .all()
-        )
-        return accounts_with_balances
-    except Exception as e:
-        print(f"Error querying accounts with balances: {e}")
-        return []
+    organization_id = current_user.organization_id
+    accounts = get_accounts_by_type(organization_id, account_types)
+    balances = get_account_balances(organization_id, start_date, end_date, account_types=account_types)
+    return {
+        account_type: [
+            {
+                'id': account.id,
+                'name': account.name,
+                'code': account.code or '',
+                'balance': float(balances.natural(account))
+            }
+            for account in type_accounts
+        ]
+        for account_type, type_accounts in accounts.items()
+    }
 
 # Placeholder for PDF export
 def generate_pdf_report(report_data):
@@ -3,22 +3,25 @@ Tax & Compliance Reports module for BigCapitalPy
 Contains Australian GST BAS Report, Tax Codes, and Tax Summary reports
 """
 
-from flask import Blueprint, render_template, request, jsonify, make_response, current_app
+from flask import Blueprint, render_template, request, jsonify, make_response, current_app, flash, redirect, url_for
 from flask_login import login_required, current_user
 from datetime import date, datetime
 from decimal import Decimal
-from sqlalchemy import func
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
 import io
 import csv
+import json
 
 from packages.server.src.models import (
     Account, AccountType, TaxCode, TaxType, Invoice, InvoiceStatus,
-    JournalEntry, JournalLineItem, InvoiceLineItem
+    JournalEntry, JournalLineItem, InvoiceLineItem, BASReport
 )
 from packages.server.src.database import db
 # Old import path commented out: from .utils import get_date_range
 # New import path for get_date_range from the more general utils directory
 from packages.webapp.src.utils.date_utils import get_date_range 
+from packages.webapp.src.utils.jobs import job_handler
 
 tax_bp = Blueprint('tax', __name__)
 
@@ -41,6 +44,11 @@ class AustralianGSTBASReport:
         self.GST_RATE = Decimal('0.10')  # 10% GST
         self.GST_DIVISOR = Decimal('11')  # 1 + GST rate for inclusive calculations
         
+        # Aggregates loaded on first use and shared by every field calculation
+        self._tax_codes = None
+        self._invoice_totals = None
+        self._journal_totals = None
+        
     def _get_quarter(self):
         """Get the BAS quarter from the end date"""
         month = self.end_date.month
@@ -55,145 +63,147 @@ class AustralianGSTBASReport:
         else:
             return f"{year}-Q4"
     
-    def _get_tax_codes_for_type(self, tax_type):
-        """Get tax codes for a specific tax type"""
-        return TaxCode.query.filter_by(
-            organization_id=self.organization_id,
-            tax_type=tax_type,
-            is_active=True
-        ).all()
+    @property
+    def tax_codes(self):
+        """Active tax codes for the organization, loaded once"""
+        if self._tax_codes is None:
+            self._tax_codes = TaxCode.query.filter_by(
+                organization_id=self.organization_id,
+                is_active=True
+            ).order_by(TaxCode.tax_type, TaxCode.code).all()
+        return self._tax_codes
     
-    def calculate_g1(self):
+    def _load_aggregates(self):
         """
-        G1 - Total Sales (GST Inclusive)
-        Include all sales with GST
+        Load the invoice and journal aggregates for the period.
+        Invoices are summed per tax type (an invoice counts once for each tax type
+        on its lines); journal lines are summed per (tax type, account type).
         """
-        gst_tax_codes = self._get_tax_codes_for_type(TaxType.GST_STANDARD)
-        tax_code_ids = [tc.id for tc in gst_tax_codes]
-        
-        # Get sales from invoices with GST
-        invoice_total = db.session.query(func.sum(Invoice.total)).filter(
+        if self._invoice_totals is not None:
+            return
+        
+        self._invoice_totals = {}
+        self._journal_totals = {}
+        if not self.tax_codes:
+            return
+        
+        active_tax_code = db.and_(
+            TaxCode.organization_id == self.organization_id,
+            TaxCode.is_active == True
+        )
+        
+        tagged_invoices = db.session.query(
+            Invoice.id.label('invoice_id'),
+            Invoice.total.label('total'),
+            TaxCode.tax_type.label('tax_type')
+        ).join(
+            InvoiceLineItem, InvoiceLineItem.invoice_id == Invoice.id
+        ).join(
+            TaxCode, TaxCode.id == InvoiceLineItem.tax_code_id
+        ).filter(
             Invoice.organization_id == self.organization_id,
             Invoice.invoice_date.between(self.start_date, self.end_date),
             Invoice.status.in_([InvoiceStatus.SENT, InvoiceStatus.PAID]),
-            Invoice.line_items.any(InvoiceLineItem.tax_code_id.in_(tax_code_ids))
-        ).scalar() or Decimal('0')
-        
-        # Get sales from journal entries with GST
-        journal_sales = db.session.query(func.sum(JournalLineItem.credit)).join(
-            JournalEntry
-        ).join(Account).filter(
+            active_tax_code
+        ).distinct().subquery()
+        
+        invoice_rows = db.session.query(
+            tagged_invoices.c.tax_type,
+            func.sum(tagged_invoices.c.total)
+        ).group_by(tagged_invoices.c.tax_type)
+        
+        for tax_type, total in invoice_rows:
+            self._invoice_totals[tax_type] = Decimal(str(total or 0))
+        
+        journal_rows = db.session.query(
+            TaxCode.tax_type,
+            Account.type,
+            func.sum(JournalLineItem.debit),
+            func.sum(JournalLineItem.credit)
+        ).join(
+            JournalEntry, JournalLineItem.journal_entry_id == JournalEntry.id
+        ).join(
+            Account, JournalLineItem.account_id == Account.id
+        ).join(
+            TaxCode, TaxCode.id == JournalLineItem.tax_code_id
+        ).filter(
             JournalEntry.organization_id == self.organization_id,
             JournalEntry.date.between(self.start_date, self.end_date),
-            Account.type == AccountType.INCOME,
-            JournalLineItem.tax_code_id.in_(tax_code_ids)
-        ).scalar() or Decimal('0')
+            active_tax_code
+        ).group_by(TaxCode.tax_type, Account.type)
         
-        return round(invoice_total + journal_sales, 2)
+        for tax_type, account_type, debit, credit in journal_rows:
+            self._journal_totals[(tax_type, account_type)] = (
+                Decimal(str(debit or 0)), Decimal(str(credit or 0))
+            )
+    
+    def _invoice_sales(self, tax_type):
+        """Total of period invoices carrying the tax type"""
+        self._load_aggregates()
+        return self._invoice_totals.get(tax_type, Decimal('0'))
+    
+    def _journal_credits(self, tax_types, account_types):
+        """Journal credits for the tax types posted to the account types"""
+        self._load_aggregates()
+        return sum(
+            (self._journal_totals.get((tax_type, account_type), (0, 0))[1]
+             for tax_type in tax_types for account_type in account_types),
+            Decimal('0')
+        )
+    
+    def _journal_debits(self, tax_types, account_types):
+        """Journal debits for the tax types posted to the account types"""
+        self._load_aggregates()
+        return sum(
+            (self._journal_totals.get((tax_type, account_type), (0, 0))[0]
+             for tax_type in tax_types for account_type in account_types),
+            Decimal('0')
+        )
+    
+    def _sales_for_tax_type(self, tax_type):
+        """Invoice sales plus journal income for a tax type"""
+        return round(
+            self._invoice_sales(tax_type) +
+            self._journal_credits([tax_type], [AccountType.INCOME]),
+            2
+        )
+    
+    def calculate_g1(self):
+        """
+        G1 - Total Sales (GST Inclusive)
+        Include all sales with GST
+        """
+        return self._sales_for_tax_type(TaxType.GST_STANDARD)
     
     def calculate_g2(self):
         """
         G2 - Export Sales
         GST-free export sales
         """
-        export_tax_codes = self._get_tax_codes_for_type(TaxType.EXPORT)
-        tax_code_ids = [tc.id for tc in export_tax_codes]
-        
-        # Get export sales from invoices
-        invoice_exports = db.session.query(func.sum(Invoice.total)).filter(
-            Invoice.organization_id == self.organization_id,
-            Invoice.invoice_date.between(self.start_date, self.end_date),
-            Invoice.status.in_([InvoiceStatus.SENT, InvoiceStatus.PAID]),
-            Invoice.line_items.any(InvoiceLineItem.tax_code_id.in_(tax_code_ids))
-        ).scalar() or Decimal('0')
-        
-        # Get export sales from journal entries
-        journal_exports = db.session.query(func.sum(JournalLineItem.credit)).join(
-            JournalEntry
-        ).join(Account).filter(
-            JournalEntry.organization_id == self.organization_id,
-            JournalEntry.date.between(self.start_date, self.end_date),
-            Account.type == AccountType.INCOME,
-            JournalLineItem.tax_code_id.in_(tax_code_ids)
-        ).scalar() or Decimal('0')
-        
-        return round(invoice_exports + journal_exports, 2)
+        return self._sales_for_tax_type(TaxType.EXPORT)
     
     def calculate_g3(self):
         """
         G3 - Other GST-Free Sales
         Domestic GST-free sales (excluding exports)
         """
-        gst_free_tax_codes = self._get_tax_codes_for_type(TaxType.GST_FREE)
-        tax_code_ids = [tc.id for tc in gst_free_tax_codes]
-        
-        # Get GST-free sales from invoices
-        invoice_gst_free = db.session.query(func.sum(Invoice.total)).filter(
-            Invoice.organization_id == self.organization_id,
-            Invoice.invoice_date.between(self.start_date, self.end_date),
-            Invoice.status.in_([InvoiceStatus.SENT, InvoiceStatus.PAID]),
-            Invoice.line_items.any(InvoiceLineItem.tax_code_id.in_(tax_code_ids))
-        ).scalar() or Decimal('0')
-        
-        # Get GST-free sales from journal entries
-        journal_gst_free = db.session.query(func.sum(JournalLineItem.credit)).join(
-            JournalEntry
-        ).join(Account).filter(
-            JournalEntry.organization_id == self.organization_id,
-            JournalEntry.date.between(self.start_date, self.end_date),
-            Account.type == AccountType.INCOME,
-            JournalLineItem.tax_code_id.in_(tax_code_ids)
-        ).scalar() or Decimal('0')
-        
-        return round(invoice_gst_free + journal_gst_free, 2)
+        return self._sales_for_tax_type(TaxType.GST_FREE)
     
     def calculate_g4(self):
         """
         G4 - Input Taxed Sales
         Input taxed sales (financial services, residential rent)
         """
-        input_taxed_codes = self._get_tax_codes_for_type(TaxType.INPUT_TAXED)
-        tax_code_ids = [tc.id for tc in input_taxed_codes]
-        
-        # Get input taxed sales from invoices
-        invoice_input_taxed = db.session.query(func.sum(Invoice.total)).filter(
-            Invoice.organization_id == self.organization_id,
-            Invoice.invoice_date.between(self.start_date, self.end_date),
-            Invoice.status.in_([InvoiceStatus.SENT, InvoiceStatus.PAID]),
-            Invoice.line_items.any(InvoiceLineItem.tax_code_id.in_(tax_code_ids))
-        ).scalar() or Decimal('0')
-        
-        # Get input taxed sales from journal entries
-        journal_input_taxed = db.session.query(func.sum(JournalLineItem.credit)).join(
-            JournalEntry
-        ).join(Account).filter(
-            JournalEntry.organization_id == self.organization_id,
-            JournalEntry.date.between(self.start_date, self.end_date),
-            Account.type == AccountType.INCOME,
-            JournalLineItem.tax_code_id.in_(tax_code_ids)
-        ).scalar() or Decimal('0')
-        
-        return round(invoice_input_taxed + journal_input_taxed, 2)
+        return self._sales_for_tax_type(TaxType.INPUT_TAXED)
     
     def calculate_g10(self):
         """
         G10 - Capital Purchases (GST Inclusive)
         Capital purchases including GST
         """
-        gst_tax_codes = self._get_tax_codes_for_type(TaxType.GST_STANDARD)
-        capital_tax_codes = self._get_tax_codes_for_type(TaxType.CAPITAL_ACQUISITION)
-        tax_code_ids = [tc.id for tc in gst_tax_codes + capital_tax_codes]
-        
-        # Get capital purchases from journal entries
-        capital_purchases = db.session.query(func.sum(JournalLineItem.debit)).join(
-            JournalEntry
-        ).join(Account).filter(
-            JournalEntry.organization_id == self.organization_id,
-            JournalEntry.date.between(self.start_date, self.end_date),
-            Account.type == AccountType.ASSET,
-            JournalLineItem.tax_code_id.in_(tax_code_ids)
-        ).scalar() or Decimal('0')
-        
+        capital_purchases = self._journal_debits(
+            [TaxType.GST_STANDARD, TaxType.CAPITAL_ACQUISITION], [AccountType.ASSET]
+        )
         return round(capital_purchases, 2)
     
     def calculate_g11(self):
@@ -201,19 +211,9 @@ class AustralianGSTBASReport:
         G11 - Non-Capital Purchases (GST Inclusive)
         Operating expenses and inventory purchases with GST
         """
-        gst_tax_codes = self._get_tax_codes_for_type(TaxType.GST_STANDARD)
-        tax_code_ids = [tc.id for tc in gst_tax_codes]
-        
-        # Get non-capital purchases from journal entries
-        non_capital_purchases = db.session.query(func.sum(JournalLineItem.debit)).join(
-            JournalEntry
-        ).join(Account).filter(
-            JournalEntry.organization_id == self.organization_id,
-            JournalEntry.date.between(self.start_date, self.end_date),
-            Account.type == AccountType.EXPENSE,
-            JournalLineItem.tax_code_id.in_(tax_code_ids)
-        ).scalar() or Decimal('0')
-        
+        non_capital_purchases = self._journal_debits(
+            [TaxType.GST_STANDARD], [AccountType.EXPENSE]
+        )
         return round(non_capital_purchases, 2)
     
     def calculate_g13(self):
@@ -230,19 +230,9 @@ class AustralianGSTBASReport:
         G14 - Purchases Without GST
         GST-free purchases and imports
         """
-        gst_free_tax_codes = self._get_tax_codes_for_type(TaxType.GST_FREE)
-        export_tax_codes = self._get_tax_codes_for_type(TaxType.EXPORT)
-        tax_code_ids = [tc.id for tc in gst_free_tax_codes + export_tax_codes]
-        
-        # Get GST-free purchases from journal entries
-        gst_free_purchases = db.session.query(func.sum(JournalLineItem.debit)).join(
-            JournalEntry
-        ).join(Account).filter(
-            JournalEntry.organization_id == self.organization_id,
-            JournalEntry.date.between(self.start_date, self.end_date),
-            Account.type.in_([AccountType.EXPENSE, AccountType.ASSET]),
-            JournalLineItem.tax_code_id.in_(tax_code_ids)
-        ).scalar() or Decimal('0')
+        gst_free_purchases = self._journal_debits(
+            [TaxType.GST_FREE, TaxType.EXPORT], [AccountType.EXPENSE, AccountType.ASSET]
+        )
         
         return round(gst_free_purchases, 2)
     
@@ -329,6 +319,35 @@ class AustralianGSTBASReport:
         
         return validations
     
+    def ledger_watermark(self):
+        """
+        Fingerprint of the ledger data the period's statement depends on.
+        Changes whenever an invoice, journal line or tax code affecting the
+        period is added, edited or removed.
+        """
+        period_invoices = db.and_(
+            Invoice.organization_id == self.organization_id,
+            Invoice.invoice_date.between(self.start_date, self.end_date)
+        )
+        period_entries = db.and_(
+            JournalEntry.organization_id == self.organization_id,
+            JournalEntry.date.between(self.start_date, self.end_date)
+        )
+        
+        parts = db.session.query(
+            select(func.max(Invoice.updated_at)).where(period_invoices).scalar_subquery(),
+            select(func.count(InvoiceLineItem.id)).join(Invoice).where(period_invoices).scalar_subquery(),
+            select(func.max(InvoiceLineItem.id)).join(Invoice).where(period_invoices).scalar_subquery(),
+            select(func.max(JournalEntry.updated_at)).where(period_entries).scalar_subquery(),
+            select(func.count(JournalLineItem.id)).join(JournalEntry).where(period_entries).scalar_subquery(),
+            select(func.max(JournalLineItem.id)).join(JournalEntry).where(period_entries).scalar_subquery(),
+            select(func.sum(JournalLineItem.debit + JournalLineItem.credit)).join(JournalEntry).where(period_entries).scalar_subquery(),
+            select(func.max(TaxCode.updated_at)).where(TaxCode.organization_id == self.organization_id).scalar_subquery(),
+            select(func.count(TaxCode.id)).where(TaxCode.organization_id == self.organization_id).scalar_subquery()
+        ).one()
+        
+        return '|'.join('' if part is None else str(part) for part in parts)
+    
     def generate_bas_report(self):
         """
         Generate complete BAS report with all calculations
@@ -393,6 +412,102 @@ class AustralianGSTBASReport:
         }
 
 
+def _store_bas_report(bas_report, bas_data, watermark):
+    """Copy generated BAS figures onto the persisted report"""
+    bas_report.g1_total_sales = bas_data['sales']['G1']
+    bas_report.g2_export_sales = bas_data['sales']['G2']
+    bas_report.g3_other_gst_free_sales = bas_data['sales']['G3']
+    bas_report.g4_input_taxed_sales = bas_data['sales']['G4']
+    bas_report.g7_total_purchases = bas_data['purchases']['total_purchases']
+    bas_report.g18_capital_purchases = bas_data['purchases']['G10']
+    bas_report.g19_non_capital_purchases = bas_data['purchases']['G11']
+    bas_report.g1a_gst_on_sales = bas_data['gst']['1A']
+    bas_report.g7a_gst_on_purchases = bas_data['gst']['1B']
+    bas_report.calculate_totals()
+    
+    stored = dict(bas_data, period=dict(
+        bas_data['period'],
+        start_date=bas_data['period']['start_date'].isoformat(),
+        end_date=bas_data['period']['end_date'].isoformat()
+    ))
+    bas_report.report_data = json.dumps(stored)
+    bas_report.ledger_watermark = watermark
+
+
+def _load_bas_data(bas_report):
+    """Rebuild the BAS data dict from a persisted report"""
+    bas_data = json.loads(bas_report.report_data)
+    bas_data['period']['start_date'] = date.fromisoformat(bas_data['period']['start_date'])
+    bas_data['period']['end_date'] = date.fromisoformat(bas_data['period']['end_date'])
+    return bas_data
+
+
+def get_bas_report(start_date, end_date, organization_id, user_id):
+    """
+    Get the BAS statement for a period.
+    
+    Returns (generator, bas_report, bas_data). The persisted BASReport is served
+    as-is when it is lodged or when the ledger watermark is unchanged; otherwise
+    the statement is regenerated and saved.
+    """
+    bas_generator = AustralianGSTBASReport(
+        start_date=start_date,
+        end_date=end_date,
+        organization_id=organization_id
+    )
+    
+    bas_report = BASReport.query.filter_by(
+        organization_id=organization_id,
+        period_start=bas_generator.start_date,
+        period_end=bas_generator.end_date
+    ).first()
+    
+    if bas_report and bas_report.report_data and bas_report.is_locked:
+        return bas_generator, bas_report, _load_bas_data(bas_report)
+    
+    watermark = bas_generator.ledger_watermark()
+    if bas_report and bas_report.report_data and bas_report.ledger_watermark == watermark:
+        return bas_generator, bas_report, _load_bas_data(bas_report)
+    
+    bas_data = bas_generator.generate_bas_report()
+    
+    if not bas_report:
+        same_month = (bas_generator.start_date.year, bas_generator.start_date.month) == \
+            (bas_generator.end_date.year, bas_generator.end_date.month)
+        bas_report = BASReport(
+            report_number=f"BAS-{bas_generator.start_date:%Y%m%d}-{bas_generator.end_date:%Y%m%d}",
+            period_start=bas_generator.start_date,
+            period_end=bas_generator.end_date,
+            reporting_period='monthly' if same_month else 'quarterly',
+            organization_id=organization_id,
+            created_by=user_id
+        )
+        db.session.add(bas_report)
+    
+    _store_bas_report(bas_report, bas_data, watermark)
+    
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another request saved this period first; its copy is equally current
+        db.session.rollback()
+        bas_report = None
+    
+    return bas_generator, bas_report, bas_data
+
+
+@job_handler('bas_report', public=True)
+def precompute_bas_report(context, period='this_quarter', start_date=None, end_date=None):
+    """Generate and save a BAS statement ahead of time so the report page is served from it"""
+    start_date, end_date = get_date_range(period, start_date, end_date)
+    context.progress(10, f'Calculating BAS for {start_date} to {end_date}')
+    _, bas_report, bas_data = get_bas_report(start_date, end_date, context.organization_id, context.user_id)
+    return {
+        'bas_report_id': bas_report.id if bas_report else None,
+        'period': bas_data['period']
+    }
+
+
 @tax_bp.route('/australian-gst-bas')
 @login_required
 def australian_gst_bas():
@@ -404,24 +519,15 @@ def australian_gst_bas():
     # Get date range
     start_date, end_date = get_date_range(period, start_date, end_date)
     
-    # Generate BAS report
-    bas_generator = AustralianGSTBASReport(
-        start_date=start_date,
-        end_date=end_date,
-        organization_id=current_user.organization_id
+    # Get the BAS report, reusing the saved statement when nothing has changed
+    bas_generator, bas_report, bas_data = get_bas_report(
+        start_date, end_date, current_user.organization_id, current_user.id
     )
     
-    bas_data = bas_generator.generate_bas_report()
-    
-    # Get available tax codes for reference
-    tax_codes = TaxCode.query.filter_by(
-        organization_id=current_user.organization_id,
-        is_active=True
-    ).order_by(TaxCode.tax_type, TaxCode.code).all()
-    
     return render_template('reports/tax-compliance/australian_gst_bas.html', 
                          bas_data=bas_data,
-                         tax_codes=tax_codes,
+                         bas_report=bas_report,
+                         tax_codes=bas_generator.tax_codes,
                          period=period,
                          start_date=start_date,
                          end_date=end_date)
@@ -438,15 +544,11 @@ def export_australian_gst_bas():
     # Get date range
     start_date, end_date = get_date_range(period, start_date, end_date)
 
-    # Generate BAS report
-    bas_generator = AustralianGSTBASReport(
-        start_date=start_date,
-        end_date=end_date,
-        organization_id=current_user.organization_id
+    # Get the BAS report, reusing the saved statement when nothing has changed
+    _, _, bas_data = get_bas_report(
+        start_date, end_date, current_user.organization_id, current_user.id
     )
 
-    bas_data = bas_generator.generate_bas_report()
-
     # Create CSV response
     output = io.StringIO()
     writer = csv.writer(output)
@@ -500,6 +602,34 @@ def export_australian_gst_bas():
     response.headers['Content-Disposition'] = 'attachment; filename=australian_gst_bas.csv'
     response.headers['Content-Type'] = 'text/csv'
     return response
+
+@tax_bp.route('/australian-gst-bas/lodge', methods=['POST'])
+@login_required
+def lodge_australian_gst_bas():
+    """Mark the BAS statement for a period as lodged, freezing its figures"""
+    start_date, end_date = get_date_range(
+        'custom', request.form.get('start_date'), request.form.get('end_date')
+    )
+    
+    _, bas_report, _ = get_bas_report(
+        start_date, end_date, current_user.organization_id, current_user.id
+    )
+    
+    if not bas_report:
+        flash('BAS report could not be saved. Please try again.', 'error')
+    elif bas_report.is_locked:
+        flash(f'BAS report {bas_report.report_number} has already been lodged.', 'info')
+    else:
+        bas_report.status = 'lodged'
+        bas_report.lodged_date = date.today()
+        bas_report.lodged_at = datetime.utcnow()
+        bas_report.lodged_by = current_user.id
+        db.session.commit()
+        flash(f'BAS report {bas_report.report_number} marked as lodged.', 'success')
+    
+    return redirect(url_for('reports.tax.australian_gst_bas', period='custom',
+                            start_date=start_date, end_date=end_date))
+
 # Tax Codes Configuration Report
 @tax_bp.route('/tax-codes')
 @login_required
@@ -532,12 +662,9 @@ def tax_summary():
     start_date, end_date = get_date_range(period, start_date, end_date)
 
     # Example summary: total GST collected and paid
-    bas_generator = AustralianGSTBASReport(
-        start_date=start_date,
-        end_date=end_date,
-        organization_id=current_user.organization_id
+    _, _, bas_data = get_bas_report(
+        start_date, end_date, current_user.organization_id, current_user.id
     )
-    bas_data = bas_generator.generate_bas_report()
 
     return render_template('reports/tax_summary.html', bas_data=bas_data, period=period, start_date=start_date, end_date=end_date)
 
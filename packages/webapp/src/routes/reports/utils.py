@@ -6,7 +6,7 @@ from datetime import date, timedelta
 import calendar
 import io
 import csv
-from flask import make_response
+from flask import Response, make_response, stream_with_context
 from decimal import Decimal
 
 
@@ -47,21 +47,89 @@ def export_profit_loss_csv(report_data, report_period):
     return response
 
 
+def export_trial_balance_csv(report_data):
+    """Export Trial Balance report as CSV"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    
+    writer.writerow(['Trial Balance'])
+    writer.writerow([f"As of {report_data['as_of_date']}"])
+    writer.writerow([])
+    writer.writerow(['Account Code', 'Account Name', 'Account Type', 'Debit', 'Credit'])
+    for account in report_data['trial_balance_data']:
+        writer.writerow([
+            account['account_code'], account['account_name'], account['account_type'],
+            f"{account['debit_balance']:.2f}", f"{account['credit_balance']:.2f}"
+        ])
+    writer.writerow(['', 'Total', '', f"{report_data['total_debits']:.2f}", f"{report_data['total_credits']:.2f}"])
+    
+    response = make_response(output.getvalue())
+    response.headers['Content-Type'] = 'text/csv'
+    response.headers['Content-Disposition'] = f"attachment; filename=trial_balance_{report_data['as_of_date']}.csv"
+    
+    return response
+
+
+def export_general_ledger_csv(organization_id, accounts, start_date, end_date):
+    """Stream the General Ledger for the accounts as CSV, one account section after another"""
+    from packages.webapp.src.utils.ledger import iter_general_ledger
+
+    def generate():
+        output = io.StringIO()
+        writer = csv.writer(output)
+
+        def flush():
+            data = output.getvalue()
+            output.seek(0)
+            output.truncate(0)
+            return data
+
+        writer.writerow(['General Ledger'])
+        writer.writerow([f"{start_date} to {end_date}"])
+        writer.writerow(['Account', 'Date', 'Entry #', 'Description', 'Reference', 'Debit', 'Credit', 'Balance'])
+
+        for section in iter_general_ledger(organization_id, accounts, start_date, end_date):
+            name = f"{section.account.code} - {section.account.name}" if section.account.code else section.account.name
+            writer.writerow([name, start_date - timedelta(days=1), '', 'Opening Balance', '', '', '', f"{section.opening_balance:.2f}"])
+            for line in section.lines:
+                writer.writerow([
+                    name, line.date, line.entry_number, line.description or '', line.reference or '',
+                    f"{line.debit:.2f}", f"{line.credit:.2f}", f"{line.balance:.2f}"
+                ])
+                if output.tell() > 65536:
+                    yield flush()
+            writer.writerow([name, end_date, '', 'Closing Balance', '', f"{section.total_debits:.2f}",
+                             f"{section.total_credits:.2f}", f"{section.closing_balance:.2f}"])
+            yield flush()
+
+        yield flush()
+
+    response = Response(stream_with_context(generate()), mimetype='text/csv')
+    response.headers['Content-Disposition'] = f'attachment; filename=general_ledger_{start_date}_{end_date}.csv'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 def calculate_account_balance(account_id, start_date=None, end_date=None):
     """Calculate account balance for a given period"""
     from flask_login import current_user
     from packages.server.src.models import JournalEntry, JournalLineItem
     from packages.server.src.database import db
+    from packages.webapp.src.utils.balance_snapshots import counted_entry_filter, get_account_balance_as_of
     from sqlalchemy import func
     
+    if not start_date:
+        # Balance as of a date comes from the daily snapshots
+        return get_account_balance_as_of(current_user.organization_id, account_id, end_date)
+    
     query = db.session.query(func.sum(JournalLineItem.debit - JournalLineItem.credit)).filter(
         JournalLineItem.account_id == account_id
     ).join(JournalEntry).filter(
-        JournalEntry.organization_id == current_user.organization_id
+        JournalEntry.organization_id == current_user.organization_id,
+        JournalEntry.date >= start_date,
+        counted_entry_filter()
     )
     
-    if start_date:
-        query = query.filter(JournalEntry.date >= start_date)
     if end_date:
         query = query.filter(JournalEntry.date <= end_date)
     
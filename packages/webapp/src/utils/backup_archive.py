@@ -0,0 +1,201 @@
+"""
+Streaming backup archives for BigCapitalPy.
+
+``write_backup_zip`` writes the database snapshot, attachments and metadata
+straight into an output stream without staging copies on disk. Attachments
+are deflated on a thread pool (zlib releases the GIL) and written to the
+archive in order as they complete; files larger than
+``INLINE_COMPRESS_LIMIT`` are compressed by the writer itself so that only a
+bounded amount of compressed data is ever held in memory.
+
+Adding a member deflated elsewhere needs zipfile internals, so it is only
+done on the Python versions in ``PRECOMPRESSED_PYTHON_VERSIONS``, where the
+archive is checked by tests/test_backup_archive.py. Other versions compress
+every attachment on the writer through the public ZipFile API.
+
+``encrypt_stream`` runs GPG on the read end of a pipe while the archive is
+written to the other, so an encrypted backup never exists unencrypted on
+disk and zipping and encryption overlap.
+"""
+
+import json
+import os
+import sys
+import threading
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+INLINE_COMPRESS_LIMIT = 16 * 1024 * 1024
+READ_SIZE = 1024 * 1024
+
+# Oldest and newest Python versions whose zipfile internals write_deflated matches
+PRECOMPRESSED_PYTHON_VERSIONS = ((3, 8), (3, 13))
+PRECOMPRESSED_SUPPORTED = (
+    PRECOMPRESSED_PYTHON_VERSIONS[0] <= sys.version_info[:2] <= PRECOMPRESSED_PYTHON_VERSIONS[1]
+)
+
+
+class _StreamingZipFile(zipfile.ZipFile):
+    """ZipFile that can also add members deflated elsewhere"""
+
+    def write_deflated(self, zinfo, data, crc, file_size):
+        """Add a member whose raw deflate stream, CRC and size are already known"""
+        zinfo.compress_type = zipfile.ZIP_DEFLATED
+        zinfo.flag_bits = 0
+        zinfo.CRC = crc
+        zinfo.file_size = file_size
+        zinfo.compress_size = len(data)
+        if not zinfo.external_attr:
+            zinfo.external_attr = 0o600 << 16
+        zip64 = file_size > zipfile.ZIP64_LIMIT or len(data) > zipfile.ZIP64_LIMIT
+
+        # Sizes are known up front, so the local header is final and no data
+        # descriptor is needed even on an unseekable stream
+        if self._seekable:
+            self.fp.seek(self.start_dir)
+        zinfo.header_offset = self.fp.tell()
+        self._writecheck(zinfo)
+        self._didModify = True
+        self.fp.write(zinfo.FileHeader(zip64))
+        self.fp.write(data)
+        self.start_dir = self.fp.tell()
+        self.filelist.append(zinfo)
+        self.NameToInfo[zinfo.filename] = zinfo
+
+
+def _deflate_file(path):
+    """Raw-deflate a file the way zipfile does; returns (data, crc, size)"""
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    chunks = []
+    crc = 0
+    size = 0
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(READ_SIZE), b''):
+            crc = zlib.crc32(block, crc)
+            size += len(block)
+            chunks.append(compressor.compress(block))
+    chunks.append(compressor.flush())
+    return b''.join(chunks), crc, size
+
+
+def iter_attachment_files(source_dirs):
+    """Yield (path, arcname, source_dir) for every file under the existing source directories"""
+    seen = set()
+    for source_dir in source_dirs:
+        if not os.path.isdir(source_dir):
+            continue
+        prefix = os.path.basename(source_dir)
+        for root, dirs, files in os.walk(source_dir):
+            dirs.sort()
+            for filename in sorted(files):
+                path = os.path.join(root, filename)
+                arcname = '/'.join(['attachments', prefix] + os.path.relpath(path, source_dir).split(os.sep))
+                # Directories sharing a name are merged; the first copy of a file wins
+                if arcname in seen:
+                    continue
+                seen.add(arcname)
+                yield path, arcname, source_dir
+
+
+def write_backup_zip(output, database_path, metadata, attachment_dirs=None, max_workers=4, on_progress=None):
+    """
+    Write a backup archive to ``output`` (a path or a writable stream).
+    ``metadata`` is updated with the attachment summary and written last as
+    backup_metadata.json. ``on_progress(files_done, files_total)`` is called
+    after each attachment.
+    """
+    if not PRECOMPRESSED_SUPPORTED:
+        max_workers = 0
+
+    with _StreamingZipFile(output, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+        archive.write(database_path, 'database.db')
+
+        if attachment_dirs is not None:
+            files = list(iter_attachment_files(attachment_dirs))
+            copied = {}
+            pending = deque()
+
+            def write_next():
+                path, arcname, source_dir, future = pending.popleft()
+                if future is None:
+                    archive.write(path, arcname)
+                else:
+                    data, crc, size = future.result()
+                    zinfo = zipfile.ZipInfo.from_file(path, arcname)
+                    archive.write_deflated(zinfo, data, crc, size)
+                copied[source_dir] = copied.get(source_dir, 0) + 1
+                if on_progress:
+                    on_progress(sum(copied.values()), len(files))
+
+            with ThreadPoolExecutor(max_workers=max(max_workers, 1), thread_name_prefix='backup-zip') as pool:
+                for path, arcname, source_dir in files:
+                    inline = not max_workers or os.path.getsize(path) > INLINE_COMPRESS_LIMIT
+                    pending.append((path, arcname, source_dir, None if inline else pool.submit(_deflate_file, path)))
+                    # Bound the compressed data held in memory
+                    while len(pending) > max_workers * 2:
+                        write_next()
+                while pending:
+                    write_next()
+
+            metadata["attachments"] = {
+                "included": bool(copied),
+                "directories_searched": attachment_dirs,
+                "directories_copied": [
+                    {"source": source_dir, "destination": os.path.basename(source_dir), "files_copied": count}
+                    for source_dir, count in copied.items()
+                ]
+            }
+            if not copied:
+                lines = ["No attachment directories were found at the expected locations.", "Searched locations:"]
+                lines += [f"  - {d} {'(exists)' if os.path.exists(d) else '(not found)'}" for d in attachment_dirs]
+                archive.writestr('attachments/no_attachments_found.txt', '\n'.join(lines) + '\n')
+
+        archive.writestr('backup_metadata.json', json.dumps(metadata, indent=2, default=str))
+
+
+def encrypt_stream(gpg, recipients, output_path, write):
+    """
+    Call ``write(stream)`` with the write end of a pipe whose read end GPG
+    encrypts into ``output_path``. Raises if either side fails; the output
+    file is removed in that case.
+    """
+    read_fd, write_fd = os.pipe()
+    reader = os.fdopen(read_fd, 'rb')
+    outcome = {}
+
+    def encrypt():
+        try:
+            outcome['result'] = gpg.encrypt_file(reader, recipients=recipients, output=output_path, armor=False)
+        except Exception as e:
+            outcome['error'] = e
+        finally:
+            # Unblocks the writer if GPG stopped reading early
+            reader.close()
+
+    started = datetime.now()
+    encryptor = threading.Thread(target=encrypt, name='backup-gpg', daemon=True)
+    encryptor.start()
+    write_error = None
+    try:
+        with os.fdopen(write_fd, 'wb') as writer:
+            write(writer)
+    except BaseException as e:
+        write_error = e
+    encryptor.join()
+
+    result = outcome.get('result')
+    encrypt_failed = 'error' in outcome or not result.ok
+    if write_error or encrypt_failed:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+    # A broken pipe only means GPG gave up first; report GPG's reason instead
+    if encrypt_failed and (write_error is None or isinstance(write_error, BrokenPipeError)):
+        raise RuntimeError(f"GPG encryption failed: {getattr(result, 'status', None) or outcome.get('error')}"
+                           f" - {getattr(result, 'stderr', '')}")
+    if write_error:
+        raise write_error
+    print(f"Encrypted backup written to {output_path} in {(datetime.now() - started).total_seconds():.2f}s")
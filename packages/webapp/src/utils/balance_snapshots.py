@@ -0,0 +1,358 @@
+"""
+Daily account balance snapshots for BigCapitalPy.
+
+Each snapshot row holds the running debit/credit totals of one account as at the
+end of a day with activity, so an "as of" balance is one indexed lookup plus a
+short tail of journal lines. Rows are maintained from the session flush whenever
+journal lines are posted, changed or their entry is reversed, and can be rebuilt
+from the ledger with ``flask rebuild-balance-snapshots``.
+"""
+
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import and_, delete, event, func, insert, inspect, literal, or_, select, update
+
+from packages.server.src.models import Account, AccountBalanceSnapshot, JournalEntry, JournalLineItem
+from packages.server.src.database import db
+from packages.webapp.src.utils.jobs import job_handler
+
+
+REVERSED_STATUS = 'reversed'
+
+
+def counted_entry_filter():
+    """SQL criterion for journal entries that count toward balances"""
+    return JournalEntry.status.is_distinct_from(REVERSED_STATUS)
+
+
+def _ledger_totals_before(connection, organization_id, account_id, day):
+    """Debit/credit totals of an account's journal lines dated before a day"""
+    return connection.execute(
+        select(
+            func.coalesce(func.sum(JournalLineItem.debit), 0).label('debit_total'),
+            func.coalesce(func.sum(JournalLineItem.credit), 0).label('credit_total')
+        ).join(
+            JournalEntry, JournalLineItem.journal_entry_id == JournalEntry.id
+        ).where(
+            JournalEntry.organization_id == organization_id,
+            JournalLineItem.account_id == account_id,
+            JournalEntry.date < day,
+            counted_entry_filter()
+        )
+    ).one()
+
+
+def apply_deltas(connection, deltas):
+    """
+    Add debit/credit deltas to the snapshots.
+
+    ``deltas`` maps (organization_id, account_id, date) to (debit, credit).
+    The snapshot for that day is created from the previous one if missing, or
+    from the account's earlier journal lines when no snapshot precedes it, and
+    every later snapshot of the account is shifted by the same amounts.
+    """
+    snapshots = AccountBalanceSnapshot.__table__
+    now = datetime.utcnow()
+
+    for (organization_id, account_id, day), (debit, credit) in sorted(deltas.items()):
+        if not debit and not credit:
+            continue
+
+        account_filter = and_(
+            snapshots.c.organization_id == organization_id,
+            snapshots.c.account_id == account_id
+        )
+
+        existing = connection.execute(
+            select(snapshots.c.id).where(account_filter, snapshots.c.snapshot_date == day)
+        ).first()
+
+        if existing is None:
+            previous = connection.execute(
+                select(snapshots.c.debit_total, snapshots.c.credit_total)
+                .where(account_filter, snapshots.c.snapshot_date < day)
+                .order_by(snapshots.c.snapshot_date.desc())
+                .limit(1)
+            ).first()
+            if previous is None:
+                # No snapshot yet: start from whatever the ledger already holds
+                previous = _ledger_totals_before(connection, organization_id, account_id, day)
+            previous_debit = Decimal(str(previous.debit_total))
+            previous_credit = Decimal(str(previous.credit_total))
+
+            connection.execute(insert(snapshots).values(
+                organization_id=organization_id,
+                account_id=account_id,
+                snapshot_date=day,
+                debit_total=previous_debit + debit,
+                credit_total=previous_credit + credit,
+                updated_at=now
+            ))
+            later = snapshots.c.snapshot_date > day
+        else:
+            later = snapshots.c.snapshot_date >= day
+
+        connection.execute(
+            update(snapshots)
+            .where(account_filter, later)
+            .values(
+                debit_total=snapshots.c.debit_total + debit,
+                credit_total=snapshots.c.credit_total + credit,
+                updated_at=now
+            )
+        )
+
+
+def _value(obj, attr, before):
+    """Attribute value before or after the current flush"""
+    if before:
+        history = inspect(obj).attrs[attr].history
+        if history.deleted:
+            return history.deleted[0]
+    return getattr(obj, attr)
+
+
+def _line_contribution(line, entry, before):
+    """Ledger key and amounts a journal line contributes before or after the flush"""
+    if entry is None or _value(entry, 'status', before) == REVERSED_STATUS:
+        return None
+    key = (
+        _value(entry, 'organization_id', before),
+        _value(line, 'account_id', before),
+        _value(entry, 'date', before)
+    )
+    debit = Decimal(str(_value(line, 'debit', before) or 0))
+    credit = Decimal(str(_value(line, 'credit', before) or 0))
+    return key, debit, credit
+
+
+def _entry_for(session, line):
+    """Journal entry of a line without going to the database when possible"""
+    entry = line.__dict__.get('journal_entry')
+    if entry is None and line.journal_entry_id is not None:
+        entry = session.get(JournalEntry, line.journal_entry_id)
+    return entry
+
+
+def _maintain_snapshots(session, flush_context):
+    """Collect ledger changes from the flush and apply them to the snapshots"""
+    new, dirty = session.new, session.dirty
+    # Lines removed from their entry are deleted by the delete-orphan cascade
+    # without ever showing up in session.deleted
+    deleted = session.deleted.union(
+        state.obj() for state, (is_delete, _) in flush_context.states.items()
+        if is_delete and state.obj() is not None
+    )
+    lines = {}
+    for obj in new | dirty | deleted:
+        if isinstance(obj, JournalLineItem):
+            lines[id(obj)] = obj
+        elif isinstance(obj, JournalEntry) and obj in dirty:
+            state = inspect(obj)
+            if any(state.attrs[attr].history.has_changes()
+                   for attr in ('date', 'status', 'organization_id')):
+                for line in obj.line_items:
+                    lines[id(line)] = line
+
+    if not lines:
+        return
+
+    deltas = defaultdict(lambda: [Decimal('0.00'), Decimal('0.00')])
+    for line in lines.values():
+        entry = _entry_for(session, line)
+        is_new = line in new
+        is_deleted = line in deleted
+
+        if not is_new:
+            contribution = _line_contribution(line, entry, before=True)
+            if contribution:
+                key, debit, credit = contribution
+                deltas[key][0] -= debit
+                deltas[key][1] -= credit
+        if not is_deleted:
+            contribution = _line_contribution(line, entry, before=False)
+            if contribution:
+                key, debit, credit = contribution
+                deltas[key][0] += debit
+                deltas[key][1] += credit
+
+    apply_deltas(session.connection(), deltas)
+
+
+def get_balances_as_of(organization_id, as_of=None, account_types=None):
+    """
+    Debit/credit totals per account as at a date.
+
+    Reads the latest snapshot of each account on or before ``as_of`` and adds
+    any journal lines dated after it. Returns {account_id: (debit, credit)}.
+    """
+    latest = db.session.query(
+        AccountBalanceSnapshot.account_id,
+        func.max(AccountBalanceSnapshot.snapshot_date).label('snapshot_date')
+    ).filter(
+        AccountBalanceSnapshot.organization_id == organization_id
+    )
+    if as_of:
+        latest = latest.filter(AccountBalanceSnapshot.snapshot_date <= as_of)
+    latest = latest.group_by(AccountBalanceSnapshot.account_id).subquery()
+
+    snapshot_query = db.session.query(
+        AccountBalanceSnapshot.account_id,
+        AccountBalanceSnapshot.debit_total,
+        AccountBalanceSnapshot.credit_total
+    ).join(
+        latest, and_(
+            AccountBalanceSnapshot.account_id == latest.c.account_id,
+            AccountBalanceSnapshot.snapshot_date == latest.c.snapshot_date
+        )
+    ).filter(
+        AccountBalanceSnapshot.organization_id == organization_id
+    )
+
+    tail_query = db.session.query(
+        JournalLineItem.account_id,
+        func.coalesce(func.sum(JournalLineItem.debit), 0),
+        func.coalesce(func.sum(JournalLineItem.credit), 0)
+    ).join(
+        JournalEntry, JournalLineItem.journal_entry_id == JournalEntry.id
+    ).outerjoin(
+        latest, JournalLineItem.account_id == latest.c.account_id
+    ).filter(
+        JournalEntry.organization_id == organization_id,
+        counted_entry_filter(),
+        or_(latest.c.snapshot_date.is_(None), JournalEntry.date > latest.c.snapshot_date)
+    )
+    if as_of:
+        tail_query = tail_query.filter(JournalEntry.date <= as_of)
+
+    if account_types:
+        snapshot_query = snapshot_query.join(
+            Account, AccountBalanceSnapshot.account_id == Account.id
+        ).filter(Account.type.in_(account_types))
+        tail_query = tail_query.join(
+            Account, JournalLineItem.account_id == Account.id
+        ).filter(Account.type.in_(account_types))
+
+    totals = defaultdict(lambda: [Decimal('0.00'), Decimal('0.00')])
+    for account_id, debit, credit in snapshot_query:
+        totals[account_id][0] += Decimal(str(debit))
+        totals[account_id][1] += Decimal(str(credit))
+    for account_id, debit, credit in tail_query.group_by(JournalLineItem.account_id):
+        totals[account_id][0] += Decimal(str(debit))
+        totals[account_id][1] += Decimal(str(credit))
+
+    return {account_id: (debit, credit) for account_id, (debit, credit) in totals.items()}
+
+
+def get_account_balance_as_of(organization_id, account_id, as_of=None):
+    """Debit minus credit for one account as at a date"""
+    snapshot = AccountBalanceSnapshot.query.filter(
+        AccountBalanceSnapshot.organization_id == organization_id,
+        AccountBalanceSnapshot.account_id == account_id
+    )
+    if as_of:
+        snapshot = snapshot.filter(AccountBalanceSnapshot.snapshot_date <= as_of)
+    snapshot = snapshot.order_by(AccountBalanceSnapshot.snapshot_date.desc()).first()
+
+    tail = db.session.query(
+        func.sum(JournalLineItem.debit - JournalLineItem.credit)
+    ).join(
+        JournalEntry, JournalLineItem.journal_entry_id == JournalEntry.id
+    ).filter(
+        JournalLineItem.account_id == account_id,
+        JournalEntry.organization_id == organization_id,
+        counted_entry_filter()
+    )
+    if snapshot:
+        tail = tail.filter(JournalEntry.date > snapshot.snapshot_date)
+    if as_of:
+        tail = tail.filter(JournalEntry.date <= as_of)
+
+    balance = Decimal(str(snapshot.balance)) if snapshot else Decimal('0.00')
+    return balance + Decimal(str(tail.scalar() or 0))
+
+
+def rebuild_snapshots(organization_id=None):
+    """Recreate snapshots from the journal; returns the number of rows written"""
+    snapshots = AccountBalanceSnapshot.__table__
+
+    clear = delete(snapshots)
+    if organization_id:
+        clear = clear.where(snapshots.c.organization_id == organization_id)
+    db.session.execute(clear)
+
+    daily = select(
+        JournalEntry.organization_id,
+        JournalLineItem.account_id,
+        JournalEntry.date,
+        func.coalesce(func.sum(JournalLineItem.debit), 0).label('debit'),
+        func.coalesce(func.sum(JournalLineItem.credit), 0).label('credit')
+    ).join(
+        JournalEntry, JournalLineItem.journal_entry_id == JournalEntry.id
+    ).where(
+        counted_entry_filter()
+    )
+    if organization_id:
+        daily = daily.where(JournalEntry.organization_id == organization_id)
+    daily = daily.group_by(
+        JournalEntry.organization_id, JournalLineItem.account_id, JournalEntry.date
+    ).subquery()
+
+    partition = (daily.c.organization_id, daily.c.account_id)
+    running = select(
+        daily.c.organization_id,
+        daily.c.account_id,
+        daily.c.date,
+        func.sum(daily.c.debit).over(partition_by=partition, order_by=daily.c.date),
+        func.sum(daily.c.credit).over(partition_by=partition, order_by=daily.c.date),
+        literal(datetime.utcnow())
+    )
+
+    result = db.session.execute(insert(snapshots).from_select(
+        ['organization_id', 'account_id', 'snapshot_date', 'debit_total', 'credit_total', 'updated_at'],
+        running
+    ))
+    db.session.commit()
+    return result.rowcount
+
+
+@click.command('rebuild-balance-snapshots')
+@click.option('--organization-id', type=int, default=None,
+              help='Only rebuild snapshots for this organization.')
+@with_appcontext
+def rebuild_balance_snapshots_command(organization_id):
+    """Rebuild account balance snapshots from the journal."""
+    count = rebuild_snapshots(organization_id)
+    click.echo(f'Rebuilt {count} account balance snapshots')
+
+
+@job_handler('balance_snapshots', public=True)
+def rebuild_snapshots_job(context):
+    """Rebuild the organization's snapshots on the job pool"""
+    context.progress(10, 'Rebuilding balance snapshots')
+    return {'snapshots': rebuild_snapshots(context.organization_id)}
+
+
+# Attributes whose previous value is needed to reverse a line's old contribution
+TRACKED_ATTRIBUTES = (
+    JournalEntry.date, JournalEntry.status, JournalEntry.organization_id,
+    JournalLineItem.account_id, JournalLineItem.debit, JournalLineItem.credit
+)
+
+
+def _keep_previous_value(target, value, oldvalue, initiator):
+    return value
+
+
+def init_app(app):
+    """Register snapshot maintenance and the rebuild command"""
+    if not event.contains(db.session, 'after_flush', _maintain_snapshots):
+        event.listen(db.session, 'after_flush', _maintain_snapshots)
+        # Load the old value on assignment even when the attribute was expired
+        for attribute in TRACKED_ATTRIBUTES:
+            event.listen(attribute, 'set', _keep_previous_value, active_history=True, retval=True)
+    app.cli.add_command(rebuild_balance_snapshots_command)
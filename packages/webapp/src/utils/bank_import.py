@@ -0,0 +1,268 @@
+"""
+Streaming bank statement import for BigCapitalPy.
+
+CSV uploads are read row by row from the request stream and processed in
+chunks: each chunk is de-duplicated against existing transactions with one
+fingerprint lookup, inserted with one multi-row INSERT and committed, so memory
+stays bounded however large the statement is.
+"""
+
+import codecs
+import csv
+import hashlib
+import os
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+
+from packages.server.src.models import BankAccount, BankTransaction
+from packages.server.src.database import db
+from packages.webapp.src.utils.jobs import job_handler
+
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Errors a row parser may raise for a malformed row
+ROW_ERRORS = (ValueError, KeyError, TypeError, InvalidOperation)
+
+
+class ImportReport:
+    """Outcome of an import: counts plus the rows that could not be read"""
+
+    def __init__(self):
+        self.imported = 0
+        self.duplicates = 0
+        self.skipped = 0
+        self.errors = []
+
+    def add_error(self, line_number, message):
+        self.errors.append({'line': line_number, 'message': message})
+
+    def to_dict(self):
+        return {
+            'imported': self.imported,
+            'duplicates': self.duplicates,
+            'skipped': self.skipped,
+            'errors': self.errors
+        }
+
+
+def normalize_description(description):
+    """Case and whitespace insensitive form of a description"""
+    return ' '.join((description or '').split()).lower()
+
+
+def transaction_fingerprint(account_id, transaction_date, amount, description, reference=None):
+    """Content hash identifying a statement line within an account"""
+    content = '|'.join((
+        str(account_id),
+        transaction_date.isoformat(),
+        str(Decimal(str(amount)).quantize(Decimal('0.01'))),
+        normalize_description(description),
+        (reference or '').strip()
+    ))
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def read_csv_rows(file_storage, encoding='utf-8-sig'):
+    """Iterate (line_number, row) over an uploaded CSV without reading it into memory"""
+    reader = csv.DictReader(codecs.iterdecode(file_storage.stream, encoding))
+    for row in reader:
+        yield reader.line_num, row
+
+
+def _decimal(value):
+    return Decimal(str(value).replace(',', '').strip())
+
+
+def column_mapping_parser(date_column, description_column, amount_column,
+                          reference_column='', balance_column='', date_format='%Y-%m-%d'):
+    """Row parser for statements whose columns are mapped by the user"""
+    def parse(row):
+        balance = row.get(balance_column) if balance_column else None
+        return {
+            'transaction_date': datetime.strptime(row[date_column].strip(), date_format).date(),
+            'description': row[description_column].strip()[:500],
+            'amount': _decimal(row[amount_column]),
+            'reference': row.get(reference_column, '').strip()[:100] if reference_column else '',
+            'balance': _decimal(balance) if balance and balance.strip() else None
+        }
+    return parse
+
+
+def bank_export_parser(row):
+    """Row parser for the bank feed export format (separate debit/credit columns)"""
+    debit_str = (row.get('debit_net_amount') or '').strip()
+    credit_str = (row.get('credit_net_amount') or '').strip()
+    debit_amount = _decimal(debit_str) if debit_str else Decimal('0')
+    credit_amount = _decimal(credit_str) if credit_str else Decimal('0')
+
+    if debit_amount > 0:
+        amount = -debit_amount
+    elif credit_amount > 0:
+        amount = credit_amount
+    else:
+        return None  # Skip zero-amount transactions
+
+    description = (row.get('description') or '').strip()[:500]
+    if not description:
+        description = f"{row.get('type', 'Unknown')} transaction"
+
+    balance_str = (row.get('account_balance') or '').strip()
+    return {
+        'transaction_date': datetime.strptime(row['parsed_date'], '%Y-%m-%d').date(),
+        'description': description,
+        'amount': amount,
+        'reference': (row.get('transaction_id') or '').strip()[:100],
+        'balance': _decimal(balance_str) if balance_str else Decimal('0')
+    }
+
+
+def _existing_fingerprints(account_id, fingerprints):
+    return set(db.session.execute(
+        select(BankTransaction.fingerprint).where(
+            BankTransaction.account_id == account_id,
+            BankTransaction.fingerprint.in_(fingerprints)
+        )
+    ).scalars())
+
+
+def _insert_chunk(rows, account_id):
+    """Insert the rows not already stored; returns how many were written"""
+    for attempt in range(2):
+        existing = _existing_fingerprints(account_id, [row['fingerprint'] for row in rows])
+        new_rows = [row for row in rows if row['fingerprint'] not in existing]
+        if not new_rows:
+            return 0
+        try:
+            db.session.execute(insert(BankTransaction).values(new_rows))
+            db.session.commit()
+            return len(new_rows)
+        except IntegrityError:
+            # A concurrent import stored some of these lines; look again
+            db.session.rollback()
+            if attempt:
+                raise
+
+
+def import_bank_transactions(rows, parse_row, organization_id, account_id,
+                             chunk_size=DEFAULT_CHUNK_SIZE, on_chunk=None):
+    """
+    Import statement rows into an account's bank transactions.
+
+    ``rows`` yields (line_number, raw_row) and ``parse_row`` turns a raw row into
+    a dict of transaction fields, or None to skip it. Lines already imported,
+    including repeats within the file, are counted as duplicates. Each chunk is
+    committed on its own, after which ``on_chunk(report)`` is called if given;
+    returns an ImportReport.
+    """
+    report = ImportReport()
+    rows = iter(rows)
+
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+
+        # Earlier chunks are committed, so only this chunk needs an in-memory check
+        seen = set()
+        now = datetime.utcnow()
+        pending = []
+        for line_number, raw_row in chunk:
+            try:
+                values = parse_row(raw_row)
+            except ROW_ERRORS as e:
+                report.add_error(line_number, f'{type(e).__name__}: {e}')
+                continue
+            if values is None:
+                report.skipped += 1
+                continue
+
+            fingerprint = transaction_fingerprint(
+                account_id, values['transaction_date'], values['amount'],
+                values['description'], values.get('reference')
+            )
+            if fingerprint in seen:
+                report.duplicates += 1
+                continue
+            seen.add(fingerprint)
+
+            pending.append({
+                'account_id': account_id,
+                'organization_id': organization_id,
+                'transaction_date': values['transaction_date'],
+                'description': values['description'],
+                'reference': values.get('reference') or '',
+                'amount': values['amount'],
+                'balance': values.get('balance'),
+                'status': 'unmatched',
+                'is_reconciled': False,
+                'fingerprint': fingerprint,
+                'created_at': now,
+                'updated_at': now
+            })
+
+        if pending:
+            inserted = _insert_chunk(pending, account_id)
+            report.imported += inserted
+            report.duplicates += len(pending) - inserted
+
+        if on_chunk is not None:
+            on_chunk(report)
+
+    return report
+
+
+def import_csv_upload(file_storage, parse_row, organization_id, account_id,
+                      chunk_size=DEFAULT_CHUNK_SIZE):
+    """Stream an uploaded CSV file through the importer"""
+    return import_bank_transactions(
+        read_csv_rows(file_storage), parse_row, organization_id, account_id, chunk_size
+    )
+
+
+# Row parsers a background import can name in its parameters
+PARSERS = {
+    'bank_export': lambda mapping: bank_export_parser,
+    'column_mapping': lambda mapping: column_mapping_parser(**mapping),
+}
+
+
+@job_handler('bank_import')
+def run_import_job(context, path, account_id, parser, mapping=None,
+                   chunk_size=DEFAULT_CHUNK_SIZE, update_bank_balance=False):
+    """Import a staged statement file, reporting progress by bytes read"""
+    parse_row = PARSERS[parser](mapping or {})
+    size = os.path.getsize(path) or 1
+
+    try:
+        with open(path, 'rb') as statement:
+            reader = csv.DictReader(codecs.iterdecode(statement, 'utf-8-sig'))
+            rows = ((reader.line_num, row) for row in reader)
+
+            def on_chunk(report):
+                context.progress(
+                    95 * statement.tell() / size,
+                    f'{report.imported} imported, {report.duplicates} duplicates'
+                )
+
+            report = import_bank_transactions(
+                rows, parse_row, context.organization_id, account_id, chunk_size, on_chunk
+            )
+    finally:
+        os.remove(path)
+
+    if update_bank_balance and report.imported > 0:
+        # The account shows the balance of its latest statement line
+        latest = BankTransaction.query.filter_by(
+            account_id=account_id
+        ).order_by(BankTransaction.transaction_date.desc()).first()
+        bank_account = db.session.get(BankAccount, account_id)
+        if latest and bank_account:
+            bank_account.balance = latest.balance
+            db.session.commit()
+
+    return report.to_dict()
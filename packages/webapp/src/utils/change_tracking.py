@@ -0,0 +1,85 @@
+"""
+Change tracking for the sync API.
+
+Synced resources are read back by ``updated_at``, so this module keeps that
+column honest and records tombstones for rows sync clients must drop: hard
+deletes and deactivations (``is_active`` set to False). Editing, adding or
+removing a line item also touches its parent document, whose sync payload
+embeds the lines.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import event, inspect
+
+from packages.server.src.models import (
+    Account, BankTransaction, Customer, Invoice, InvoiceLineItem, Item, JournalEntry,
+    JournalLineItem, Payment, PaymentAllocation, TaxCode, Tombstone, Vendor
+)
+from packages.server.src.database import db
+
+
+# Synced models and their resource names in the sync API
+SYNC_RESOURCES = {
+    'accounts': Account,
+    'bank-transactions': BankTransaction,
+    'customers': Customer,
+    'invoices': Invoice,
+    'items': Item,
+    'journal': JournalEntry,
+    'payments': Payment,
+    'tax-codes': TaxCode,
+    'vendors': Vendor,
+}
+
+RESOURCE_NAMES = {model: resource for resource, model in SYNC_RESOURCES.items()}
+
+# Child rows and the (parent model, relationship, foreign key) they belong to
+CHILD_PARENTS = {
+    InvoiceLineItem: (Invoice, 'invoice', 'invoice_id'),
+    JournalLineItem: (JournalEntry, 'journal_entry', 'journal_entry_id'),
+    PaymentAllocation: (Payment, 'payment', 'payment_id'),
+}
+
+
+def _deactivated(obj):
+    """True when the flush turns is_active off"""
+    if getattr(obj, 'is_active', True) is not False:
+        return False
+    return inspect(obj).attrs.is_active.history.has_changes()
+
+
+def _record_changes(session, flush_context, instances):
+    """Add tombstones and touch parents of changed line items before the flush"""
+    now = datetime.utcnow()
+    deleted = session.deleted
+    touched = set()
+
+    for obj in list(session.new | session.dirty | deleted):
+        model = type(obj)
+
+        resource = RESOURCE_NAMES.get(model)
+        if resource and obj.id is not None and (obj in deleted or _deactivated(obj)):
+            session.add(Tombstone(
+                organization_id=obj.organization_id,
+                resource=resource,
+                record_id=obj.id,
+                deleted_at=now
+            ))
+            continue
+
+        if model in CHILD_PARENTS:
+            parent_model, relationship, foreign_key = CHILD_PARENTS[model]
+            # Removed children still carry the key; new ones may only have the relationship
+            parent_id = getattr(obj, foreign_key)
+            parent = session.get(parent_model, parent_id) if parent_id else getattr(obj, relationship)
+            if parent is None or parent in deleted or id(parent) in touched:
+                continue
+            touched.add(id(parent))
+            parent.updated_at = now
+
+
+def init_app(app):
+    """Register tombstone recording on the shared session"""
+    if not event.contains(db.session, 'before_flush', _record_changes):
+        event.listen(db.session, 'before_flush', _record_changes)
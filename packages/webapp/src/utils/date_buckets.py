@@ -0,0 +1,127 @@
+"""
+Database-agnostic date bucketing for time-series reports.
+
+``date_bucket(column, unit)`` is a SQL expression for the first day of the
+day, week (Monday), month, quarter, calendar year or fiscal year containing
+``column``. It compiles to native date functions on SQLite, PostgreSQL and
+MySQL/MariaDB, so trend queries group in the database on every deployment
+and return real dates.
+
+Fiscal years start on the organization's ``fiscal_year_start`` (MM-DD); a
+fiscal year bucket is the date that fiscal year began.
+"""
+
+from datetime import date
+
+from sqlalchemy import Date
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.sql.visitors import InternalTraversal
+
+
+BUCKET_UNITS = ('day', 'week', 'month', 'quarter', 'year', 'fiscal_year')
+
+LABEL_FORMATS = {
+    'day': '%Y-%m-%d',
+    'week': '%Y-%m-%d',
+    'month': '%Y-%m',
+    'year': '%Y',
+}
+
+
+def parse_fiscal_year_start(value):
+    """(month, day) from an MM-DD string, defaulting to January 1st"""
+    try:
+        month, day = (int(part) for part in (value or '01-01').split('-'))
+        date(2001, month, day)
+    except (TypeError, ValueError):
+        return 1, 1
+    return month, day
+
+
+class date_bucket(FunctionElement):
+    """First day of the ``unit`` bucket containing a date column"""
+
+    type = Date()
+    name = 'date_bucket'
+    inherit_cache = True
+    _traverse_internals = FunctionElement._traverse_internals + [
+        ('unit', InternalTraversal.dp_string),
+        ('fiscal_month', InternalTraversal.dp_plain_obj),
+        ('fiscal_day', InternalTraversal.dp_plain_obj),
+    ]
+
+    def __init__(self, column, unit='month', fiscal_year_start='01-01'):
+        if unit not in BUCKET_UNITS:
+            raise ValueError(f"Unknown bucket unit: {unit}")
+        self.unit = unit
+        self.fiscal_month, self.fiscal_day = parse_fiscal_year_start(fiscal_year_start)
+        super().__init__(column)
+
+
+def bucket_label(day, unit):
+    """Display label for a bucket start date"""
+    if day is None:
+        return None
+    if unit == 'quarter':
+        return f"{day.year}-Q{(day.month - 1) // 3 + 1}"
+    if unit == 'fiscal_year':
+        return f"FY{day.year}" if (day.month, day.day) == (1, 1) else f"FY{day.year}-{(day.year + 1) % 100:02d}"
+    return day.strftime(LABEL_FORMATS[unit])
+
+
+def _column(element, compiler, **kw):
+    return compiler.process(list(element.clauses)[0], **kw)
+
+
+@compiles(date_bucket, 'sqlite')
+def _sqlite_date_bucket(element, compiler, **kw):
+    column = _column(element, compiler, **kw)
+    if element.unit == 'day':
+        return f"date({column})"
+    if element.unit == 'week':
+        return f"date({column}, '-' || ((CAST(strftime('%w', {column}) AS INTEGER) + 6) % 7) || ' days')"
+    if element.unit == 'month':
+        return f"date({column}, 'start of month')"
+    if element.unit == 'quarter':
+        return (f"date({column}, 'start of month', "
+                f"'-' || ((CAST(strftime('%m', {column}) AS INTEGER) - 1) % 3) || ' months')")
+    if element.unit == 'year':
+        return f"date({column}, 'start of year')"
+    months, days = element.fiscal_month - 1, element.fiscal_day - 1
+    return (f"date({column}, '-{months} months', '-{days} days', 'start of year', "
+            f"'+{months} months', '+{days} days')")
+
+
+@compiles(date_bucket, 'postgresql')
+def _postgresql_date_bucket(element, compiler, **kw):
+    column = _column(element, compiler, **kw)
+    if element.unit == 'day':
+        return f"CAST({column} AS DATE)"
+    if element.unit in ('week', 'month', 'quarter', 'year'):
+        return f"CAST(date_trunc('{element.unit}', {column}) AS DATE)"
+    offset = f"INTERVAL '{element.fiscal_month - 1} months {element.fiscal_day - 1} days'"
+    return f"CAST(date_trunc('year', {column} - {offset}) + {offset} AS DATE)"
+
+
+@compiles(date_bucket, 'mysql')
+def _mysql_date_bucket(element, compiler, **kw):
+    column = _column(element, compiler, **kw)
+    if element.unit == 'day':
+        return f"DATE({column})"
+    if element.unit == 'week':
+        return f"DATE_SUB(DATE({column}), INTERVAL WEEKDAY({column}) DAY)"
+    if element.unit == 'month':
+        return f"DATE_SUB(DATE({column}), INTERVAL DAYOFMONTH({column}) - 1 DAY)"
+    if element.unit == 'quarter':
+        return f"MAKEDATE(YEAR({column}), 1) + INTERVAL QUARTER({column}) - 1 QUARTER"
+    if element.unit == 'year':
+        return f"MAKEDATE(YEAR({column}), 1)"
+    months, days = element.fiscal_month - 1, element.fiscal_day - 1
+    shifted = f"{column} - INTERVAL {months} MONTH - INTERVAL {days} DAY"
+    return f"MAKEDATE(YEAR({shifted}), 1) + INTERVAL {months} MONTH + INTERVAL {days} DAY"
+
+
+@compiles(date_bucket)
+def _default_date_bucket(element, compiler, **kw):
+    raise NotImplementedError(f"date_bucket is not supported on {compiler.dialect.name}")
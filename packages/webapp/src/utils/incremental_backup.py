@@ -0,0 +1,263 @@
+"""
+Incremental SQLite backups for BigCapitalPy.
+
+A backup chain is a directory holding a compressed base snapshot followed by
+deltas. Each backup first takes a snapshot with the SQLite online backup API,
+copying a limited number of pages per step so writers are only ever blocked
+for one step. The snapshot is then compared page by page with the hashes
+recorded for the previous backup in the chain, and only the pages that
+differ are written to the delta.
+
+``manifest.json`` lists the chain's entries in order, with each entry's page
+count and the SHA-256 of the database it reproduces. ``restore_chain`` replays
+the base and the deltas and checks the result against that digest.
+
+    flask backup-incremental [--full]
+    flask restore-backup-chain CHAIN_DIR TARGET [--upto N]
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import struct
+import tempfile
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+
+MANIFEST = 'manifest.json'
+PAGE_INDEX = 'pages.idx'
+DIGEST_SIZE = 16
+PAGE_HEADER = struct.Struct('>I')
+
+DEFAULT_PAGES_PER_STEP = 1024
+DEFAULT_MAX_CHAIN = 24
+
+
+def copy_database(source_path, target_path, pages_per_step=DEFAULT_PAGES_PER_STEP, sleep=0.005):
+    """Consistent copy of a live database, taken ``pages_per_step`` pages at a time"""
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target, pages=pages_per_step, sleep=sleep)
+    finally:
+        target.close()
+        source.close()
+
+
+def _page_size(path):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute('PRAGMA page_size').fetchone()[0]
+    finally:
+        connection.close()
+
+
+def _iter_pages(path, page_size):
+    with open(path, 'rb') as f:
+        while True:
+            page = f.read(page_size)
+            if not page:
+                return
+            yield page
+
+
+def _page_digest(page):
+    return hashlib.blake2b(page, digest_size=DIGEST_SIZE).digest()
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_page_index(chain_dir):
+    with open(os.path.join(chain_dir, PAGE_INDEX), 'rb') as f:
+        data = f.read()
+    return [data[i:i + DIGEST_SIZE] for i in range(0, len(data), DIGEST_SIZE)]
+
+
+def _replace_file(path, write):
+    """Write a file through a temporary name so readers never see it half written"""
+    temporary = f'{path}.tmp'
+    with open(temporary, 'wb') as f:
+        write(f)
+    os.replace(temporary, path)
+
+
+def load_manifest(chain_dir):
+    with open(os.path.join(chain_dir, MANIFEST)) as f:
+        return json.load(f)
+
+
+def _save_manifest(chain_dir, manifest):
+    _replace_file(os.path.join(chain_dir, MANIFEST),
+                  lambda f: f.write(json.dumps(manifest, indent=2).encode('utf-8')))
+
+
+def _latest_chain(backup_root):
+    chains = sorted(
+        name for name in os.listdir(backup_root)
+        if name.startswith('chain_') and os.path.exists(os.path.join(backup_root, name, MANIFEST))
+    )
+    return os.path.join(backup_root, chains[-1]) if chains else None
+
+
+def _write_base(snapshot_path, chain_dir, page_size):
+    """Store the snapshot as the chain's base; returns the page digests"""
+    digests = []
+    with gzip.open(os.path.join(chain_dir, 'base.db.gz'), 'wb') as out:
+        for page in _iter_pages(snapshot_path, page_size):
+            digests.append(_page_digest(page))
+            out.write(page)
+    return digests
+
+
+def _write_delta(snapshot_path, delta_path, page_size, previous):
+    """Store the pages that differ from ``previous``; returns (digests, changed count)"""
+    digests = []
+    changed = 0
+    with gzip.open(delta_path, 'wb') as out:
+        for number, page in enumerate(_iter_pages(snapshot_path, page_size)):
+            digest = _page_digest(page)
+            digests.append(digest)
+            if number >= len(previous) or previous[number] != digest:
+                out.write(PAGE_HEADER.pack(number))
+                out.write(page)
+                changed += 1
+    return digests, changed
+
+
+def create_incremental_backup(database_path, backup_root, full=False, max_chain=DEFAULT_MAX_CHAIN,
+                              pages_per_step=DEFAULT_PAGES_PER_STEP):
+    """
+    Back up a SQLite database into the latest chain under ``backup_root``.
+    A new chain with a full base is started when asked for, when there is no
+    chain yet, when the chain has ``max_chain`` deltas or when the page size
+    changed. Returns the manifest entry that was written.
+    """
+    os.makedirs(backup_root, exist_ok=True)
+    created = datetime.now()
+
+    with tempfile.TemporaryDirectory(dir=backup_root) as work_dir:
+        snapshot_path = os.path.join(work_dir, 'snapshot.db')
+        copy_database(database_path, snapshot_path, pages_per_step)
+        page_size = _page_size(snapshot_path)
+
+        chain_dir = None if full else _latest_chain(backup_root)
+        manifest = load_manifest(chain_dir) if chain_dir else None
+        if manifest and (manifest['page_size'] != page_size or len(manifest['entries']) > max_chain):
+            chain_dir = manifest = None
+
+        if chain_dir is None:
+            chain_dir = os.path.join(backup_root, f'chain_{created:%Y%m%d_%H%M%S_%f}')
+            os.makedirs(chain_dir)
+            manifest = {'database_path': database_path, 'page_size': page_size, 'entries': []}
+            digests = _write_base(snapshot_path, chain_dir, page_size)
+            entry = {'sequence': 0, 'type': 'base', 'file': 'base.db.gz', 'changed_pages': len(digests)}
+        else:
+            sequence = len(manifest['entries'])
+            delta_file = f'delta_{sequence:04d}.pages.gz'
+            digests, changed = _write_delta(
+                snapshot_path, os.path.join(chain_dir, delta_file), page_size, _read_page_index(chain_dir)
+            )
+            entry = {'sequence': sequence, 'type': 'delta', 'file': delta_file, 'changed_pages': changed}
+
+        entry.update({
+            'created': created.isoformat(),
+            'page_count': len(digests),
+            'sha256': _file_sha256(snapshot_path),
+            'size': os.path.getsize(os.path.join(chain_dir, entry['file']))
+        })
+
+    _replace_file(os.path.join(chain_dir, PAGE_INDEX), lambda f: f.write(b''.join(digests)))
+    manifest['entries'].append(entry)
+    _save_manifest(chain_dir, manifest)
+    entry['chain'] = chain_dir
+    return entry
+
+
+def restore_chain(chain_dir, target_path, upto=None):
+    """
+    Rebuild the database as of entry ``upto`` (default: the latest) of a chain.
+    Raises ValueError when the result does not match the recorded checksum.
+    """
+    manifest = load_manifest(chain_dir)
+    entries = manifest['entries']
+    if upto is not None:
+        entries = [entry for entry in entries if entry['sequence'] <= upto]
+    if not entries:
+        raise ValueError('No backups to restore')
+
+    page_size = manifest['page_size']
+    temporary = f'{target_path}.restoring'
+    with gzip.open(os.path.join(chain_dir, entries[0]['file']), 'rb') as base, open(temporary, 'wb') as out:
+        shutil.copyfileobj(base, out)
+
+    with open(temporary, 'r+b') as out:
+        for entry in entries[1:]:
+            with gzip.open(os.path.join(chain_dir, entry['file']), 'rb') as delta:
+                while True:
+                    header = delta.read(PAGE_HEADER.size)
+                    if not header:
+                        break
+                    (number,) = PAGE_HEADER.unpack(header)
+                    out.seek(number * page_size)
+                    out.write(delta.read(page_size))
+            # The database may have shrunk since the previous backup
+            out.truncate(entry['page_count'] * page_size)
+
+    if _file_sha256(temporary) != entries[-1]['sha256']:
+        os.remove(temporary)
+        raise ValueError(f"Restored database does not match backup {entries[-1]['sequence']}")
+    os.replace(temporary, target_path)
+    return entries[-1]
+
+
+@click.command('backup-incremental')
+@click.option('--full', is_flag=True, help='Start a new chain with a full base backup.')
+@with_appcontext
+def backup_incremental_command(full):
+    """Back up the SQLite database as a delta of the previous backup."""
+    from packages.webapp.src.routes.backup import get_database_path
+
+    entry = create_incremental_backup(
+        get_database_path(),
+        current_app.config['INCREMENTAL_BACKUP_DIR'],
+        full=full,
+        max_chain=current_app.config.get('INCREMENTAL_BACKUP_MAX_CHAIN', DEFAULT_MAX_CHAIN),
+        pages_per_step=current_app.config.get('BACKUP_PAGES_PER_STEP', DEFAULT_PAGES_PER_STEP)
+    )
+    click.echo(f"Wrote {entry['type']} {entry['sequence']} to {entry['chain']}: "
+               f"{entry['changed_pages']} of {entry['page_count']} pages, {entry['size']:,} bytes")
+
+
+@click.command('restore-backup-chain')
+@click.argument('chain_dir', type=click.Path(exists=True, file_okay=False))
+@click.argument('target', type=click.Path(dir_okay=False))
+@click.option('--upto', type=int, default=None, help='Restore the state as of this backup number.')
+def restore_backup_chain_command(chain_dir, target, upto):
+    """Rebuild a database file from a backup chain."""
+    if os.path.exists(target):
+        raise click.ClickException(f'{target} already exists; restore to a new path')
+    try:
+        entry = restore_chain(chain_dir, target, upto)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Restored backup {entry['sequence']} from {entry['created']} to {target}")
+
+
+def init_app(app):
+    """Register the incremental backup commands"""
+    app.config.setdefault('INCREMENTAL_BACKUP_DIR', os.path.join(os.getcwd(), 'backups_incremental'))
+    app.cli.add_command(backup_incremental_command)
+    app.cli.add_command(restore_backup_chain_command)
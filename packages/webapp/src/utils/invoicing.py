@@ -0,0 +1,340 @@
+"""
+Set-based invoicing for BigCapitalPy.
+
+``InvoiceBatchService`` creates any number of invoices with one customer
+lookup, one item lookup, a block of invoice numbers and executemany inserts
+for invoices and their lines. Status changes are applied with one UPDATE for
+the whole set. Invoices that leave draft for a status that carries a
+receivable get their journal entries (debit Accounts Receivable, credit
+Sales) posted together through ``LedgerPostingService``. Nothing is
+committed; the caller's transaction covers the lot.
+"""
+
+from collections import namedtuple
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from sqlalchemy import insert, select, update
+
+from packages.server.src.models import (
+    Account, AccountType, Customer, Invoice, InvoiceLineItem, InvoiceStatus, Item, JournalEntry
+)
+from packages.server.src.database import db
+from packages.webapp.src.utils import metrics_cache
+from packages.webapp.src.utils.ledger_posting import (
+    DraftEntry, DraftLine, LedgerPostingService, insert_returning_ids, loaded_instances
+)
+from packages.webapp.src.utils.sequences import next_number, reserve_numbers
+
+
+CENT = Decimal('0.01')
+
+# Statuses in which an invoice is owed and its journal entry is on the books
+RECEIVABLE_STATUSES = (InvoiceStatus.SENT, InvoiceStatus.PARTIAL, InvoiceStatus.PAID, InvoiceStatus.OVERDUE)
+
+# Statuses an invoice can be created in
+CREATE_STATUSES = (InvoiceStatus.DRAFT, InvoiceStatus.SENT)
+
+
+class InvoiceLineDraft(namedtuple('InvoiceLineDraft', [
+    'description', 'quantity', 'rate', 'tax_rate', 'item_id'
+], defaults=(1, None, 0, None))):
+    """An invoice line to create; an item supplies a missing description or rate"""
+
+    __slots__ = ()
+
+
+class InvoiceDraft(namedtuple('InvoiceDraft', [
+    'customer_id', 'invoice_date', 'due_date', 'lines', 'reference', 'currency',
+    'terms', 'notes', 'discount_amount', 'status'
+], defaults=(None, 'USD', None, None, 0, InvoiceStatus.DRAFT))):
+    """An invoice to create"""
+
+    __slots__ = ()
+
+
+class InvoiceRecord(namedtuple('InvoiceRecord', [
+    'id', 'invoice_number', 'invoice_date', 'total', 'customer_id', 'customer_name', 'status'
+])):
+    """The fields of an invoice that its journal entry needs"""
+
+    __slots__ = ()
+
+    @classmethod
+    def of(cls, invoice):
+        return cls(invoice.id, invoice.invoice_number, invoice.invoice_date, invoice.total,
+                   invoice.customer_id, invoice.customer.display_name, invoice.status)
+
+
+class InvoicingError(ValueError):
+    """An invoice failed validation; ``index`` is its position in the batch"""
+
+    def __init__(self, message, index=None):
+        super().__init__(message)
+        self.index = index
+
+
+def _money(value):
+    return Decimal(str(value)).quantize(CENT, ROUND_HALF_UP)
+
+
+def find_invoice_accounts(organization_id):
+    """(Accounts Receivable id, Sales id) used by invoice journal entries"""
+    accounts_receivable = Account.query.filter(
+        Account.organization_id == organization_id,
+        Account.type == AccountType.ASSET,
+        Account.name.ilike('%receivable%')
+    ).first()
+
+    sales_account = Account.query.filter(
+        Account.organization_id == organization_id,
+        Account.type == AccountType.INCOME,
+        Account.name.ilike('%sales%')
+    ).first()
+
+    if not accounts_receivable or not sales_account:
+        raise InvoicingError("Required accounts not found. Please set up Accounts Receivable and Sales accounts.")
+    return accounts_receivable.id, sales_account.id
+
+
+class InvoiceBatchService:
+    """Creates invoices and changes their status in bulk for one organization"""
+
+    def __init__(self, organization_id, user_id, session=None):
+        self.organization_id = organization_id
+        self.user_id = user_id
+        self.session = session or db.session
+        # Lookups are kept so repeated batches only query new ids
+        self._customers = {}
+        self._items = {}
+        self._accounts = None
+        self._ledger = LedgerPostingService(organization_id, user_id, self.session)
+
+    def _load(self, drafts):
+        """Resolve the referenced customers and items, one query each"""
+        customer_ids = {draft.customer_id for draft in drafts} - self._customers.keys()
+        if customer_ids:
+            rows = self.session.execute(select(Customer.id, Customer.display_name).where(
+                Customer.organization_id == self.organization_id,
+                Customer.id.in_(customer_ids)
+            )).all()
+            self._customers.update(dict.fromkeys(customer_ids))
+            self._customers.update((row.id, row.display_name) for row in rows)
+
+        item_ids = {line.item_id for draft in drafts for line in draft.lines if line.item_id is not None}
+        item_ids -= self._items.keys()
+        if item_ids:
+            rows = self.session.execute(select(Item.id, Item.name, Item.sell_price).where(
+                Item.organization_id == self.organization_id,
+                Item.id.in_(item_ids)
+            )).all()
+            self._items.update(dict.fromkeys(item_ids))
+            self._items.update((row.id, row) for row in rows)
+
+    def _resolve_line(self, line):
+        """(description, quantity, rate, tax_rate) with item defaults applied"""
+        item = self._items.get(line.item_id) if line.item_id is not None else None
+        if line.item_id is not None and item is None:
+            raise InvoicingError(f'Item {line.item_id} not found')
+        description = line.description or (item.name if item else None)
+        if not description:
+            raise InvoicingError('Line item description is required')
+        rate = line.rate if line.rate is not None else (item.sell_price if item else 0)
+        try:
+            return description, Decimal(str(line.quantity)), Decimal(str(rate or 0)), Decimal(str(line.tax_rate or 0))
+        except InvalidOperation:
+            raise InvoicingError('Invalid quantity, rate or tax rate')
+
+    def _check_invoice(self, draft):
+        if self._customers.get(draft.customer_id) is None:
+            return 'Customer not found'
+        if not draft.lines:
+            return 'At least one line item is required'
+        if draft.status not in CREATE_STATUSES:
+            return 'Invoices can only be created as draft or sent'
+        try:
+            for line in draft.lines:
+                self._resolve_line(line)
+        except InvoicingError as e:
+            return str(e)
+        try:
+            _money(draft.discount_amount or 0)
+        except InvalidOperation:
+            return 'Invalid discount amount'
+        return None
+
+    def validate(self, drafts):
+        """Problems with the invoices as {index: message}; empty when all can be created"""
+        self._load(drafts)
+        errors = {}
+        for index, draft in enumerate(drafts):
+            message = self._check_invoice(draft)
+            if message:
+                errors[index] = message
+        return errors
+
+    def _invoice_numbers(self, count):
+        if count == 1:
+            return [next_number(self.organization_id, 'invoice')]
+        return reserve_numbers(self.organization_id, 'invoice', count)
+
+    def create(self, drafts, validate=True):
+        """
+        Create invoices in the current transaction and return an InvoiceRecord
+        for each. Raises InvoicingError for the first invalid invoice; nothing
+        is written in that case.
+        """
+        drafts = list(drafts)
+        if not drafts:
+            return []
+        if validate:
+            errors = self.validate(drafts)
+            if errors:
+                index = min(errors)
+                raise InvoicingError(errors[index], index)
+        else:
+            self._load(drafts)
+
+        if any(draft.status in RECEIVABLE_STATUSES for draft in drafts):
+            self._invoice_accounts()
+        self.session.flush()
+
+        now = datetime.utcnow()
+        invoice_rows = []
+        invoice_lines = []
+        for draft, number in zip(drafts, self._invoice_numbers(len(drafts))):
+            subtotal = tax_amount = Decimal('0.00')
+            lines = []
+            for line in draft.lines:
+                description, quantity, rate, tax_rate = self._resolve_line(line)
+                line_amount = _money(quantity * rate)
+                line_tax = _money(line_amount * tax_rate / 100)
+                lines.append({
+                    'item_id': line.item_id,
+                    'description': description,
+                    'quantity': quantity,
+                    'rate': rate,
+                    'amount': line_amount,
+                    'tax_rate': tax_rate,
+                    'tax_amount': line_tax
+                })
+                subtotal += line_amount
+                tax_amount += line_tax
+
+            discount_amount = _money(draft.discount_amount or 0)
+            total = subtotal - discount_amount + tax_amount
+            invoice_rows.append({
+                'invoice_number': number,
+                'reference': draft.reference,
+                'invoice_date': draft.invoice_date,
+                'due_date': draft.due_date,
+                'customer_id': draft.customer_id,
+                'subtotal': subtotal,
+                'tax_amount': tax_amount,
+                'discount_amount': discount_amount,
+                'total': total,
+                'paid_amount': Decimal('0.00'),
+                'balance': total,
+                'currency': draft.currency or 'USD',
+                'status': draft.status,
+                'terms': draft.terms,
+                'notes': draft.notes,
+                'organization_id': self.organization_id,
+                'created_at': now,
+                'updated_at': now
+            })
+            invoice_lines.append(lines)
+
+        invoice_ids = insert_returning_ids(self.session, Invoice, invoice_rows)
+        line_rows = [
+            dict(line, invoice_id=invoice_id)
+            for invoice_id, lines in zip(invoice_ids, invoice_lines)
+            for line in lines
+        ]
+        self.session.connection().execute(insert(InvoiceLineItem.__table__), line_rows)
+        metrics_cache.mark_changed(self.session, self.organization_id)
+
+        records = [
+            InvoiceRecord(invoice_id, row['invoice_number'], row['invoice_date'], row['total'],
+                          row['customer_id'], self._customers[row['customer_id']], row['status'])
+            for invoice_id, row in zip(invoice_ids, invoice_rows)
+        ]
+        self.post_journals([record for record in records if record.status in RECEIVABLE_STATUSES])
+        return records
+
+    def transition(self, invoice_ids, status):
+        """
+        Move invoices to ``status`` with one UPDATE, posting the journal
+        entries of those leaving draft for a receivable status. Returns
+        {invoice_id: error message or None}.
+        """
+        invoice_ids = list(dict.fromkeys(invoice_ids))
+        rows = self.session.execute(select(
+            Invoice.id, Invoice.invoice_number, Invoice.invoice_date, Invoice.total,
+            Invoice.customer_id, Customer.display_name, Invoice.status
+        ).join(
+            Customer, Invoice.customer_id == Customer.id
+        ).where(
+            Invoice.organization_id == self.organization_id,
+            Invoice.id.in_(invoice_ids)
+        )).all()
+        found = {row.id: InvoiceRecord(*row) for row in rows}
+
+        results = {invoice_id: None if invoice_id in found else 'Invoice not found' for invoice_id in invoice_ids}
+        if not found:
+            return results
+
+        self.session.flush()
+        invoices = Invoice.__table__
+        self.session.connection().execute(
+            update(invoices)
+            .where(invoices.c.id.in_(list(found)))
+            .values(status=status, updated_at=datetime.utcnow())
+        )
+        metrics_cache.mark_changed(self.session, self.organization_id)
+        # Loaded invoices would otherwise keep showing the old status
+        for invoice in loaded_instances(self.session, Invoice, found):
+            self.session.expire(invoice, ['status', 'updated_at'])
+
+        if status in RECEIVABLE_STATUSES:
+            self.post_journals([
+                record for record in found.values() if record.status == InvoiceStatus.DRAFT
+            ])
+        return results
+
+    def _invoice_accounts(self):
+        if self._accounts is None:
+            self._accounts = find_invoice_accounts(self.organization_id)
+        return self._accounts
+
+    def post_journals(self, records):
+        """Post the journal entries of invoices that do not have one yet, in one posting"""
+        if not records:
+            return []
+        posted = set(self.session.execute(select(JournalEntry.source_id).where(
+            JournalEntry.organization_id == self.organization_id,
+            JournalEntry.source_type == 'invoice',
+            JournalEntry.source_id.in_([record.id for record in records])
+        )).scalars())
+        records = [record for record in records if record.id not in posted]
+        if not records:
+            return []
+
+        receivable_id, sales_id = self._invoice_accounts()
+        return self._ledger.post([
+            DraftEntry(
+                date=record.invoice_date,
+                lines=[
+                    DraftLine(receivable_id, debit=record.total,
+                              description=f"Invoice {record.invoice_number}",
+                              contact_type='customer', contact_id=record.customer_id),
+                    DraftLine(sales_id, credit=record.total,
+                              description=f"Sales - Invoice {record.invoice_number}")
+                ],
+                description=f"Invoice {record.invoice_number} - {record.customer_name}",
+                source_type='invoice',
+                source_id=record.id,
+                entry_number=f"INV-{record.invoice_number}"
+            )
+            for record in records
+        ])
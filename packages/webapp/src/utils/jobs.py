@@ -0,0 +1,329 @@
+"""
+Background jobs for BigCapitalPy.
+
+Long-running work (backups, bank imports, report pre-computation, exports) is
+recorded in the ``jobs`` table and run on a bounded worker pool. Status,
+progress and results live in the database, so any web worker can report on a
+job, and a cancellation request made from one process is seen by the worker
+running it at its next progress update.
+
+Handlers are registered with ``@job_handler('name')`` and called as
+``handler(context, **params)`` inside an application context. They report
+progress through the JobContext and may return a JSON-serialisable dict; a
+``path`` key in it becomes the job's downloadable result.
+
+``JOB_EXECUTOR`` selects a thread pool (default) or a process pool, whose
+workers are forked from the web process, and ``JOB_MAX_WORKERS`` bounds it.
+
+Every write by a job's worker stamps ``updated_at`` as a heartbeat, so
+handlers should report progress more often than ``JOB_STALE_SECONDS``.
+Jobs orphaned by a process that died are recovered by ``recover_jobs``, which
+runs when a process starts its pool, before each purge and from
+``flask recover-jobs``: stale running jobs fail as interrupted and queued
+jobs nobody claimed are submitted again.
+"""
+
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import func, select, update
+
+from packages.server.src.models import Job
+from packages.server.src.database import db
+
+
+JOB_HANDLERS = {}
+PUBLIC_JOB_TYPES = set()
+
+DEFAULT_STALE_SECONDS = 1800
+
+_app = None
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler once cancellation has been requested"""
+
+
+def job_handler(name, public=False):
+    """Register a job handler; public types may be started through the API"""
+    def register(func):
+        JOB_HANDLERS[name] = func
+        if public:
+            PUBLIC_JOB_TYPES.add(name)
+        return func
+    return register
+
+
+def _update_job(job_id, *criteria, **values):
+    """Write job fields in a short transaction of their own; returns the rows changed"""
+    jobs = Job.__table__
+    values.setdefault('updated_at', datetime.utcnow())
+    with db.engine.begin() as connection:
+        return connection.execute(update(jobs).where(jobs.c.id == job_id, *criteria).values(**values)).rowcount
+
+
+class JobContext:
+    """Handle a running handler uses to report progress and notice cancellation"""
+
+    def __init__(self, job):
+        self.job_id = job.id
+        self.organization_id = job.organization_id
+        self.user_id = job.created_by
+
+    @property
+    def cancelled(self):
+        jobs = Job.__table__
+        with db.engine.connect() as connection:
+            return bool(connection.execute(
+                select(jobs.c.cancel_requested).where(jobs.c.id == self.job_id)
+            ).scalar())
+
+    def progress(self, percent, message=None):
+        """Record progress; raises JobCancelled if the job has been cancelled"""
+        values = {'progress': max(0, min(100, int(percent)))}
+        if message is not None:
+            values['message'] = message[:255]
+        _update_job(self.job_id, **values)
+        if self.cancelled:
+            raise JobCancelled()
+
+    def file_path(self, filename):
+        """Path for a file the job produces, inside the job files directory"""
+        directory = os.path.join(current_app.config['JOB_FILES_DIR'], self.job_id)
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, filename)
+
+
+def upload_path(suffix=''):
+    """Where to stage an uploaded file until its job picks it up"""
+    directory = os.path.join(current_app.config['JOB_FILES_DIR'], 'uploads')
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f'{uuid.uuid4()}{suffix}')
+
+
+def _finish(job, status, started, **values):
+    """
+    Record the outcome and log the job's queue and run times. A job already
+    failed as interrupted or cancelled while it ran keeps that status.
+    """
+    finished = datetime.utcnow()
+    if not _update_job(job.id, Job.__table__.c.status == 'running', status=status, finished_at=finished, **values):
+        print(f"Job {job.id} ({job.job_type}) ended {status} after it was already stopped; outcome discarded")
+        return
+    print(f"Job {job.id} ({job.job_type}) {status} in {(finished - started).total_seconds():.2f}s "
+          f"after {(started - job.created_at).total_seconds():.2f}s queued")
+
+
+def _run_job(job_id):
+    """Worker entry point"""
+    with _app.app_context():
+        try:
+            job = db.session.get(Job, job_id)
+            if job is None or job.status != 'queued':
+                return
+            # Handlers commit and roll back the session, so keep a detached copy
+            db.session.expunge(job)
+
+            # Claim the job unless it was cancelled while queued
+            started = datetime.utcnow()
+            if not _update_job(job.id, Job.__table__.c.status == 'queued',
+                               status='running', started_at=started, message='Running'):
+                return
+
+            handler = JOB_HANDLERS.get(job.job_type)
+            if handler is None:
+                _finish(job, 'failed', started, message='Failed', error=f'Unknown job type: {job.job_type}')
+                return
+
+            try:
+                result = handler(JobContext(job), **json.loads(job.params or '{}')) or {}
+            except JobCancelled:
+                db.session.rollback()
+                _finish(job, 'cancelled', started, message='Cancelled')
+            except Exception as e:
+                db.session.rollback()
+                _finish(job, 'failed', started, message='Failed', error=str(e))
+            else:
+                _finish(job, 'completed', started, progress=100, message='Completed',
+                        result=json.dumps(result, default=str), result_path=result.get('path'))
+        finally:
+            db.session.remove()
+
+
+def _init_process_worker():
+    """Drop database connections inherited from the parent process"""
+    with _app.app_context():
+        db.engine.dispose(close=False)
+
+
+def get_executor():
+    """The process-wide worker pool, created on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            return _executor
+        max_workers = current_app.config.get('JOB_MAX_WORKERS', 2)
+        if current_app.config.get('JOB_EXECUTOR', 'thread') == 'process':
+            _executor = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context('fork'),
+                initializer=_init_process_worker
+            )
+        else:
+            _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+
+    # A new pool takes over whatever a process that died left queued
+    try:
+        recover_jobs(requeue_all=True)
+    except Exception as e:
+        print(f"Error recovering orphaned jobs: {e}")
+    return _executor
+
+
+def _stale_cutoff(stale_seconds=None):
+    """Heartbeats older than this belong to jobs whose worker has gone"""
+    if stale_seconds is None:
+        stale_seconds = current_app.config.get('JOB_STALE_SECONDS', DEFAULT_STALE_SECONDS)
+    return datetime.utcnow() - timedelta(seconds=stale_seconds)
+
+
+def recover_jobs(stale_seconds=None, requeue_all=False):
+    """
+    Recover jobs orphaned by a worker process that died. Running jobs whose
+    heartbeat is older than ``stale_seconds`` (JOB_STALE_SECONDS by default)
+    fail as interrupted. Queued jobs no pool has claimed in that time, or all
+    of them with ``requeue_all``, are submitted to this process's pool again;
+    claiming is guarded on the queued status, so a job also queued on a live
+    pool still runs once. Returns (interrupted, requeued).
+    """
+    jobs = Job.__table__
+    cutoff = _stale_cutoff(stale_seconds)
+    now = datetime.utcnow()
+    with db.engine.begin() as connection:
+        interrupted = connection.execute(
+            update(jobs)
+            .where(jobs.c.status == 'running', func.coalesce(jobs.c.updated_at, jobs.c.started_at) < cutoff)
+            .values(status='failed', message='Interrupted', finished_at=now, updated_at=now,
+                    error='Interrupted: the worker running this job stopped before it finished')
+        ).rowcount
+
+        queued = select(jobs.c.id).where(jobs.c.status == 'queued')
+        if not requeue_all:
+            queued = queued.where(func.coalesce(jobs.c.updated_at, jobs.c.created_at) < cutoff)
+        job_ids = connection.execute(queued.order_by(jobs.c.created_at)).scalars().all()
+        if job_ids:
+            # Restart their clock so the next sweep leaves them to this pool
+            connection.execute(
+                update(jobs).where(jobs.c.id.in_(job_ids), jobs.c.status == 'queued').values(updated_at=now)
+            )
+
+    executor = get_executor()
+    for job_id in job_ids:
+        executor.submit(_run_job, job_id)
+    if interrupted or job_ids:
+        print(f"Recovered orphaned jobs: {interrupted} interrupted, {len(job_ids)} resubmitted")
+    return interrupted, len(job_ids)
+
+
+def submit_job(job_type, params=None, organization_id=None, user_id=None):
+    """Record a job and queue it on the worker pool; returns the Job"""
+    if job_type not in JOB_HANDLERS:
+        raise ValueError(f'Unknown job type: {job_type}')
+
+    now = datetime.utcnow()
+    job = Job(
+        id=str(uuid.uuid4()),
+        job_type=job_type,
+        status='queued',
+        progress=0,
+        message='Queued',
+        params=json.dumps(params or {}, default=str),
+        organization_id=organization_id,
+        created_by=user_id,
+        created_at=now,
+        updated_at=now
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    get_executor().submit(_run_job, job.id)
+    return job
+
+
+def cancel_job(job):
+    """
+    Request cancellation; a job that has not started yet, or whose worker has
+    stopped sending heartbeats, is cancelled at once
+    """
+    if job.is_finished:
+        return False
+    job.cancel_requested = True
+    orphaned = job.status == 'running' and (job.updated_at or job.started_at) < _stale_cutoff()
+    if job.status == 'queued' or orphaned:
+        job.status = 'cancelled'
+        job.message = 'Cancelled'
+        job.finished_at = job.updated_at = datetime.utcnow()
+    db.session.commit()
+    return True
+
+
+def purge_jobs(older_than_hours=24):
+    """Delete finished jobs older than the cutoff along with their files"""
+    # Orphaned jobs are failed first so they are reaped like any other
+    recover_jobs()
+    cutoff = datetime.utcnow() - timedelta(hours=older_than_hours)
+    jobs = Job.query.filter(
+        Job.status.in_(('completed', 'failed', 'cancelled')),
+        Job.created_at < cutoff
+    ).all()
+    for job in jobs:
+        if job.result_path and os.path.exists(job.result_path):
+            try:
+                os.remove(job.result_path)
+            except OSError as e:
+                print(f"Error removing job file {job.result_path}: {e}")
+        shutil.rmtree(os.path.join(current_app.config['JOB_FILES_DIR'], job.id), ignore_errors=True)
+        db.session.delete(job)
+    db.session.commit()
+    return len(jobs)
+
+
+@click.command('purge-jobs')
+@click.option('--older-than-hours', type=int, default=24,
+              help='Delete finished jobs created before this many hours ago.')
+@with_appcontext
+def purge_jobs_command(older_than_hours):
+    """Delete finished background jobs and their files."""
+    count = purge_jobs(older_than_hours)
+    click.echo(f'Purged {count} jobs')
+
+
+@click.command('recover-jobs')
+@click.option('--stale-seconds', type=int, default=None,
+              help='Fail running jobs without a heartbeat for this long (default: JOB_STALE_SECONDS).')
+@with_appcontext
+def recover_jobs_command(stale_seconds):
+    """Fail interrupted background jobs and resubmit unclaimed queued ones."""
+    interrupted, requeued = recover_jobs(stale_seconds)
+    click.echo(f'{interrupted} jobs interrupted, {requeued} resubmitted')
+
+
+def init_app(app):
+    """Remember the app for worker threads and register the job commands"""
+    global _app
+    _app = app
+    app.config.setdefault('JOB_FILES_DIR', os.path.join(os.getcwd(), 'jobs_temp'))
+    app.config.setdefault('JOB_STALE_SECONDS', DEFAULT_STALE_SECONDS)
+    app.cli.add_command(purge_jobs_command)
+    app.cli.add_command(recover_jobs_command)
@@ -0,0 +1,294 @@
+"""
+Ledger aggregation helpers for BigCapitalPy reports.
+"""
+
+from collections import namedtuple
+from datetime import timedelta
+from decimal import Decimal
+from itertools import groupby
+
+from sqlalchemy import case, func, select
+
+from packages.server.src.models import Account, AccountType, JournalEntry, JournalLineItem
+from packages.server.src.database import db
+from packages.webapp.src.utils.balance_snapshots import counted_entry_filter, get_balances_as_of
+
+
+# Account types whose natural balance sits on the credit side
+CREDIT_NORMAL_TYPES = (AccountType.LIABILITY, AccountType.EQUITY, AccountType.INCOME)
+
+
+class LedgerBalance(namedtuple('LedgerBalance', ['debit', 'credit'])):
+    """Debit and credit totals for a single account"""
+
+    __slots__ = ()
+
+    @property
+    def net(self):
+        """Debit minus credit"""
+        return self.debit - self.credit
+
+    def natural(self, account_type):
+        """Balance expressed on the account type's normal side"""
+        if account_type in CREDIT_NORMAL_TYPES:
+            return self.credit - self.debit
+        return self.debit - self.credit
+
+
+ZERO_BALANCE = LedgerBalance(Decimal('0.00'), Decimal('0.00'))
+
+
+class AccountBalances(dict):
+    """Ledger balances keyed by account id; missing accounts read as zero"""
+
+    def __missing__(self, account_id):
+        return ZERO_BALANCE
+
+    def net(self, account_id):
+        """Debit minus credit for an account"""
+        return self[account_id].net
+
+    def natural(self, account):
+        """Balance of an account on its normal side"""
+        return self[account.id].natural(account.type)
+
+    def total(self, account_ids):
+        """Sum of net balances for the given accounts"""
+        return sum((self[account_id].net for account_id in account_ids), Decimal('0.00'))
+
+
+def get_account_balances(organization_id, start_date=None, end_date=None, account_types=None):
+    """
+    Aggregate debit/credit totals for every account in one grouped query.
+    Open-ended ("as of") ranges are served from the balance snapshots.
+    """
+    balances = AccountBalances()
+
+    if not start_date:
+        totals = get_balances_as_of(organization_id, end_date, account_types=account_types)
+        for account_id, (debit, credit) in totals.items():
+            balances[account_id] = LedgerBalance(debit, credit)
+        return balances
+
+    query = db.session.query(
+        JournalLineItem.account_id,
+        func.coalesce(func.sum(JournalLineItem.debit), 0),
+        func.coalesce(func.sum(JournalLineItem.credit), 0)
+    ).join(
+        JournalEntry, JournalLineItem.journal_entry_id == JournalEntry.id
+    ).filter(
+        JournalEntry.organization_id == organization_id,
+        JournalEntry.date >= start_date,
+        counted_entry_filter()
+    )
+
+    if end_date:
+        query = query.filter(JournalEntry.date <= end_date)
+    if account_types:
+        query = query.join(Account, JournalLineItem.account_id == Account.id).filter(
+            Account.type.in_(account_types)
+        )
+
+    for account_id, debit, credit in query.group_by(JournalLineItem.account_id):
+        balances[account_id] = LedgerBalance(Decimal(str(debit)), Decimal(str(credit)))
+    return balances
+
+
+def get_period_balances(organization_id, periods, account_types=None):
+    """
+    Debit/credit totals for every account in each of several (start, end)
+    periods, from one query grouped by account and period. Periods may
+    overlap; they are cut into disjoint pieces at their boundaries and each
+    period sums its pieces. Returns an AccountBalances per period, in order.
+    """
+    balances = [AccountBalances() for _ in periods]
+    if not periods:
+        return balances
+
+    points = sorted({start for start, _ in periods} | {end + timedelta(days=1) for _, end in periods})
+    pieces = [
+        (start, following - timedelta(days=1)) for start, following in zip(points, points[1:])
+        if any(period_start <= start < following <= period_end + timedelta(days=1)
+               for period_start, period_end in periods)
+    ]
+
+    piece_index = case(
+        *((JournalEntry.date.between(start, end), index) for index, (start, end) in enumerate(pieces))
+    ).label('piece_index')
+    query = db.session.query(
+        JournalLineItem.account_id,
+        piece_index,
+        func.coalesce(func.sum(JournalLineItem.debit), 0),
+        func.coalesce(func.sum(JournalLineItem.credit), 0)
+    ).join(
+        JournalEntry, JournalLineItem.journal_entry_id == JournalEntry.id
+    ).filter(
+        JournalEntry.organization_id == organization_id,
+        JournalEntry.date >= points[0],
+        JournalEntry.date < points[-1],
+        counted_entry_filter()
+    )
+    if account_types:
+        query = query.join(Account, JournalLineItem.account_id == Account.id).filter(
+            Account.type.in_(account_types)
+        )
+
+    piece_balances = [AccountBalances() for _ in pieces]
+    for account_id, index, debit, credit in query.group_by(JournalLineItem.account_id, piece_index):
+        # Lines falling in a gap between periods are grouped under NULL
+        if index is not None:
+            piece_balances[index][account_id] = LedgerBalance(Decimal(str(debit)), Decimal(str(credit)))
+
+    for (start, end), period in zip(periods, balances):
+        for (piece_start, piece_end), piece in zip(pieces, piece_balances):
+            if start <= piece_start and piece_end <= end:
+                for account_id, balance in piece.items():
+                    total = period[account_id]
+                    period[account_id] = LedgerBalance(total.debit + balance.debit, total.credit + balance.credit)
+    return balances
+
+
+def get_balances_at(organization_id, dates, account_types=None):
+    """
+    Balances as at each of several dates: the earliest comes from the balance
+    snapshots and the rest add the movements between consecutive dates,
+    fetched in one grouped query. Returns {date: AccountBalances}.
+    """
+    dates = sorted(set(dates))
+    if not dates:
+        return {}
+
+    running = AccountBalances()
+    for account_id, (debit, credit) in get_balances_as_of(organization_id, dates[0], account_types).items():
+        running[account_id] = LedgerBalance(debit, credit)
+    result = {dates[0]: running}
+
+    intervals = [(previous + timedelta(days=1), current) for previous, current in zip(dates, dates[1:])]
+    for as_of, movements in zip(dates[1:], get_period_balances(organization_id, intervals, account_types)):
+        running = AccountBalances(running)
+        for account_id, movement in movements.items():
+            balance = running[account_id]
+            running[account_id] = LedgerBalance(balance.debit + movement.debit, balance.credit + movement.credit)
+        result[as_of] = running
+    return result
+
+
+def get_accounts_by_type(organization_id, account_types, active_only=True):
+    """Load accounts for the given types, grouped by type and ordered by code"""
+    query = Account.query.filter(
+        Account.organization_id == organization_id,
+        Account.type.in_(account_types)
+    )
+    if active_only:
+        query = query.filter(Account.is_active == True)
+
+    grouped = {account_type: [] for account_type in account_types}
+    for account in query.order_by(Account.code).all():
+        grouped[account.type].append(account)
+    return grouped
+
+
+class LedgerLine(namedtuple('LedgerLine', [
+    'account_id', 'date', 'journal_entry_id', 'entry_number', 'description',
+    'reference', 'debit', 'credit', 'balance'
+])):
+    """A journal line with the account's running balance after it"""
+
+    __slots__ = ()
+
+
+class LedgerSection:
+    """
+    One account's ledger for a period. ``lines`` is consumed lazily; the
+    closing balance and totals are complete once it has been exhausted.
+    """
+
+    def __init__(self, account, opening_balance, rows=()):
+        self.account = account
+        self.opening_balance = opening_balance
+        self.closing_balance = opening_balance
+        self.total_debits = Decimal('0.00')
+        self.total_credits = Decimal('0.00')
+        self.transaction_count = 0
+        self._rows = rows
+
+    @property
+    def lines(self):
+        credit_normal = self.account.type in CREDIT_NORMAL_TYPES
+        zero = ZERO_BALANCE.debit
+        for row in self._rows:
+            # Numeric columns already come back as Decimal
+            debit = row.debit or zero
+            credit = row.credit or zero
+            self.total_debits += debit
+            self.total_credits += credit
+            self.transaction_count += 1
+            self.closing_balance += (credit - debit) if credit_normal else (debit - credit)
+            yield LedgerLine(
+                row.account_id, row.date, row.journal_entry_id, row.entry_number,
+                row.description, row.reference, debit, credit, self.closing_balance
+            )
+
+
+def general_ledger_statement(organization_id, start_date, end_date, account_ids=None):
+    """Counted journal lines in the period, in (account, date, entry, line) order"""
+    statement = select(
+        JournalLineItem.account_id,
+        JournalEntry.date,
+        JournalEntry.id.label('journal_entry_id'),
+        JournalEntry.entry_number,
+        func.coalesce(JournalLineItem.description, JournalEntry.description).label('description'),
+        JournalEntry.reference,
+        JournalLineItem.debit,
+        JournalLineItem.credit
+    ).join(
+        JournalEntry, JournalLineItem.journal_entry_id == JournalEntry.id
+    ).where(
+        JournalEntry.organization_id == organization_id,
+        JournalEntry.date.between(start_date, end_date),
+        counted_entry_filter()
+    ).order_by(
+        JournalLineItem.account_id, JournalEntry.date, JournalEntry.id, JournalLineItem.id
+    )
+    if account_ids is not None:
+        statement = statement.where(JournalLineItem.account_id.in_(account_ids))
+    return statement
+
+
+def iter_general_ledger(organization_id, accounts, start_date, end_date, batch_size=1000):
+    """
+    Yield a LedgerSection per account, in account id order, for accounts with
+    an opening balance or activity in the period. Opening balances come from
+    one aggregate lookup and lines are fetched ``batch_size`` rows at a time,
+    so memory stays bounded however long the ledger is. Each section's lines
+    must be consumed before moving on to the next section.
+    """
+    accounts = sorted(accounts, key=lambda account: account.id)
+    account_ids = [account.id for account in accounts]
+    openings = get_account_balances(organization_id, None, start_date - timedelta(days=1))
+
+    rows = db.session.execute(
+        general_ledger_statement(organization_id, start_date, end_date, account_ids),
+        execution_options={'yield_per': batch_size}
+    )
+    groups = groupby(rows, key=lambda row: row.account_id)
+    group = next(groups, None)
+
+    for account in accounts:
+        opening = openings.natural(account)
+        if group is not None and group[0] == account.id:
+            yield LedgerSection(account, opening, group[1])
+            group = next(groups, None)
+        elif opening:
+            yield LedgerSection(account, opening)
+
+
+def get_ledger_totals(organization_id, account_id, start_date, end_date):
+    """Line count and debit/credit totals of one account's ledger for a period"""
+    lines = general_ledger_statement(organization_id, start_date, end_date, [account_id]).subquery()
+    count, debit, credit = db.session.execute(select(
+        func.count(),
+        func.coalesce(func.sum(lines.c.debit), 0),
+        func.coalesce(func.sum(lines.c.credit), 0)
+    )).one()
+    return count, LedgerBalance(Decimal(str(debit)), Decimal(str(credit)))
@@ -0,0 +1,258 @@
+"""
+Journal posting for BigCapitalPy.
+
+``LedgerPostingService`` is the single path for writing journal entries. It
+validates one or many balanced entries with one account lookup for the whole
+set, reserves their numbers in a block, inserts entries and lines with
+executemany statements and applies the per-account balance deltas with one
+``UPDATE ... SET current_balance = current_balance + :delta`` per touched
+account. Nothing is committed; the caller's transaction covers the lot.
+
+Rows are written with Core statements, which the session flush listeners do
+not see, so the service updates the balance snapshots and the metrics cache
+itself.
+"""
+
+from collections import defaultdict, namedtuple
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import bindparam, func, insert, select, update
+from sqlalchemy.orm.util import identity_key
+
+from packages.server.src.models import Account, JournalEntry, JournalLineItem
+from packages.server.src.database import db
+from packages.webapp.src.utils import metrics_cache
+from packages.webapp.src.utils.balance_snapshots import REVERSED_STATUS, apply_deltas
+from packages.webapp.src.utils.sequences import next_number, reserve_numbers
+
+
+ZERO = Decimal('0.00')
+
+
+class DraftLine(namedtuple('DraftLine', [
+    'account_id', 'debit', 'credit', 'description', 'contact_type', 'contact_id'
+], defaults=(ZERO, ZERO, None, None, None))):
+    """A journal line to post"""
+
+    __slots__ = ()
+
+
+class DraftEntry(namedtuple('DraftEntry', [
+    'date', 'lines', 'description', 'reference', 'source_type', 'source_id', 'entry_number', 'status'
+], defaults=('', '', 'manual', None, None, None))):
+    """A journal entry to post; entries without a number get one from the sequence"""
+
+    __slots__ = ()
+
+
+PostedEntry = namedtuple('PostedEntry', ['id', 'entry_number', 'line_ids'])
+
+
+class PostingError(ValueError):
+    """An entry failed validation; ``index`` is its position in the batch"""
+
+    def __init__(self, message, index=None):
+        super().__init__(message)
+        self.index = index
+
+
+def _amount(value):
+    try:
+        return Decimal(str(value if value is not None else 0))
+    except InvalidOperation:
+        raise ValueError(f'Invalid amount: {value}')
+
+
+def insert_returning_ids(session, model, rows):
+    """Insert rows in one executemany and return their ids in row order"""
+    connection = session.connection()
+    if connection.dialect.insert_executemany_returning_sort_by_parameter_order:
+        result = connection.execute(
+            insert(model.__table__).returning(model.id, sort_by_parameter_order=True), rows
+        )
+        return list(result.scalars())
+    # Without RETURNING each row reports its own key
+    return [connection.execute(insert(model.__table__), row).inserted_primary_key[0] for row in rows]
+
+
+def loaded_instances(session, model, ids):
+    """Instances with the given ids already in the session, found without loading any"""
+    identity_map = session.identity_map
+    instances = (identity_map.get(identity_key(model, instance_id)) for instance_id in ids)
+    return [instance for instance in instances if instance is not None]
+
+
+class LedgerPostingService:
+    """Validates and posts journal entries for one organization"""
+
+    def __init__(self, organization_id, user_id, session=None):
+        self.organization_id = organization_id
+        self.user_id = user_id
+        self.session = session or db.session
+        # Account id -> usable, so repeated batches only look up new ids
+        self._accounts = {}
+
+    def _active_accounts(self, entries):
+        """Ids of the referenced accounts that belong to the organization and are active"""
+        account_ids = {line.account_id for entry in entries for line in entry.lines}
+        unknown = account_ids - self._accounts.keys()
+        if unknown:
+            found = set(self.session.execute(
+                select(Account.id).where(
+                    Account.organization_id == self.organization_id,
+                    Account.id.in_(unknown),
+                    Account.is_active == True
+                )
+            ).scalars())
+            self._accounts.update((account_id, account_id in found) for account_id in unknown)
+        return {account_id for account_id in account_ids if self._accounts[account_id]}
+
+    def _check_entry(self, entry, accounts):
+        if not entry.date:
+            return 'Journal entry date is required'
+        if len(entry.lines) < 2:
+            return 'Journal entry must have at least 2 line items'
+
+        total_debit = total_credit = ZERO
+        for line in entry.lines:
+            try:
+                debit, credit = _amount(line.debit), _amount(line.credit)
+            except ValueError as e:
+                return str(e)
+            if line.account_id not in accounts:
+                return f'Account {line.account_id} not found or inactive'
+            if debit < 0 or credit < 0:
+                return 'Debit and credit amounts cannot be negative'
+            if debit > 0 and credit > 0:
+                return 'Line item cannot have both debit and credit amounts'
+            if debit == 0 and credit == 0:
+                return 'Line item must have either debit or credit amount'
+            total_debit += debit
+            total_credit += credit
+
+        if total_debit != total_credit:
+            return f'Journal entry is not balanced. Debit total: {total_debit}, Credit total: {total_credit}'
+        return None
+
+    def validate(self, entries):
+        """Problems with the entries as {index: message}; empty when all can be posted"""
+        accounts = self._active_accounts(entries)
+        errors = {}
+        for index, entry in enumerate(entries):
+            message = self._check_entry(entry, accounts)
+            if message:
+                errors[index] = message
+        return errors
+
+    def post(self, entries, number_type='journal', validate=True):
+        """
+        Post entries in the current transaction and return a PostedEntry for
+        each. Raises PostingError for the first invalid entry; nothing is
+        written in that case.
+        """
+        entries = list(entries)
+        if not entries:
+            return []
+        if validate:
+            errors = self.validate(entries)
+            if errors:
+                index = min(errors)
+                raise PostingError(errors[index], index)
+
+        # Pending ORM objects (new accounts, the source document) must exist first
+        self.session.flush()
+
+        numbers = iter(self._entry_numbers(number_type, sum(1 for entry in entries if not entry.entry_number)))
+
+        now = datetime.utcnow()
+        entry_rows = []
+        for entry in entries:
+            lines = [(_amount(line.debit), _amount(line.credit)) for line in entry.lines]
+            row = {
+                'entry_number': entry.entry_number or next(numbers),
+                'reference': entry.reference or '',
+                'date': entry.date,
+                'description': entry.description or '',
+                'source_type': entry.source_type,
+                'source_id': entry.source_id,
+                'debit_total': sum((debit for debit, _ in lines), ZERO),
+                'credit_total': sum((credit for _, credit in lines), ZERO),
+                'organization_id': self.organization_id,
+                'created_by': self.user_id,
+                'status': entry.status or JournalEntry.status.default.arg,
+                'created_at': now,
+                'updated_at': now
+            }
+            entry_rows.append(row)
+        entry_ids = insert_returning_ids(self.session, JournalEntry, entry_rows)
+
+        line_rows = []
+        balance_deltas = defaultdict(lambda: ZERO)
+        snapshot_deltas = defaultdict(lambda: [ZERO, ZERO])
+        for entry, entry_id in zip(entries, entry_ids):
+            counted = entry.status != REVERSED_STATUS
+            for number, line in enumerate(entry.lines, start=1):
+                debit, credit = _amount(line.debit), _amount(line.credit)
+                line_rows.append({
+                    'journal_entry_id': entry_id,
+                    'account_id': line.account_id,
+                    'description': line.description or '',
+                    'debit': debit,
+                    'credit': credit,
+                    'contact_type': line.contact_type,
+                    'contact_id': line.contact_id,
+                    'line_number': number
+                })
+                if counted:
+                    balance_deltas[line.account_id] += debit - credit
+                    key = (self.organization_id, line.account_id, entry.date)
+                    snapshot_deltas[key][0] += debit
+                    snapshot_deltas[key][1] += credit
+        line_ids = iter(insert_returning_ids(self.session, JournalLineItem, line_rows))
+
+        self._apply_deltas(balance_deltas)
+        apply_deltas(self.session.connection(), snapshot_deltas)
+        metrics_cache.mark_changed(self.session, self.organization_id)
+
+        return [
+            PostedEntry(entry_id, row['entry_number'], [next(line_ids) for _ in entry.lines])
+            for entry, entry_id, row in zip(entries, entry_ids, entry_rows)
+        ]
+
+    def _entry_numbers(self, number_type, count):
+        """Numbers for entries posted without one, reserved as a block"""
+        if count == 1:
+            return [next_number(self.organization_id, number_type)]
+        return reserve_numbers(self.organization_id, number_type, count) if count else []
+
+    def post_entry(self, entry, number_type='journal'):
+        """Post a single entry; returns its PostedEntry"""
+        return self.post([entry], number_type)[0]
+
+    def adjust_balances(self, lines, reverse=False):
+        """
+        Add journal lines' net debits to their accounts' running balances, or
+        take them back (``reverse``) before the lines are deleted or replaced
+        """
+        deltas = defaultdict(lambda: ZERO)
+        for line in lines:
+            delta = _amount(line.debit) - _amount(line.credit)
+            deltas[line.account_id] += -delta if reverse else delta
+        self._apply_deltas(deltas)
+
+    def _apply_deltas(self, deltas):
+        """One UPDATE per touched account, sent as a single executemany"""
+        deltas = {account_id: delta for account_id, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        accounts = Account.__table__
+        self.session.connection().execute(
+            update(accounts)
+            .where(accounts.c.id == bindparam('account'))
+            .values(current_balance=func.coalesce(accounts.c.current_balance, 0) + bindparam('delta')),
+            [{'account': account_id, 'delta': delta} for account_id, delta in sorted(deltas.items())]
+        )
+        # Loaded accounts would otherwise keep showing the old balance
+        for account in loaded_instances(self.session, Account, deltas):
+            self.session.expire(account, ['current_balance'])
@@ -0,0 +1,261 @@
+"""
+Per-organization dashboard metrics cache for BigCapitalPy.
+
+Dashboard and stats figures are computed by a handful of grouped queries and
+kept in a cache, either in-process with a TTL (default) or in Redis when
+``METRICS_CACHE_URL`` points at one. An ``after_flush`` listener notes the
+organizations whose invoices, customers, vendors, items, accounts, users or
+journal entries changed, and their cached metrics are dropped once the
+transaction commits, so a page load normally costs no queries at all.
+
+Metrics are registered with ``@metric('name')`` as ``compute(organization_id)``
+and read with ``get_metric('name', organization_id)``.
+"""
+
+import pickle
+import threading
+import time
+from datetime import date, timedelta
+from itertools import chain
+
+from flask import current_app
+from sqlalchemy import case, event, func, select
+
+from packages.server.src.models import (
+    Account, Customer, Invoice, InvoiceStatus, Item, JournalEntry, User, Vendor
+)
+from packages.server.src.database import db
+from packages.webapp.src.utils.date_buckets import date_bucket
+
+
+METRICS = {}
+TRACKED_MODELS = (Invoice, Customer, Vendor, Item, Account, JournalEntry, User)
+DIRTY_KEY = 'metrics_cache_organizations'
+
+_backend = None
+
+
+class MemoryBackend:
+    """In-process cache with per-key expiry"""
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._values.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._values[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._values[key] = (time.monotonic() + ttl, value)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._values.pop(key, None)
+
+
+class RedisBackend:
+    """Cache shared by all web workers through Redis"""
+
+    def __init__(self, url):
+        import redis
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self._client.get(key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl):
+        self._client.setex(key, ttl, pickle.dumps(value))
+
+    def delete(self, *keys):
+        if keys:
+            self._client.delete(*keys)
+
+
+def metric(name):
+    """Register a metric computed per organization"""
+    def register(func):
+        METRICS[name] = func
+        return func
+    return register
+
+
+def _key(name, organization_id):
+    return f'metrics:{organization_id}:{name}'
+
+
+def get_metric(name, organization_id):
+    """Cached value of a metric, computing and storing it on a miss"""
+    key = _key(name, organization_id)
+    try:
+        value = _backend.get(key)
+    except Exception as e:
+        print(f"Metrics cache read failed: {e}")
+        return METRICS[name](organization_id)
+
+    if value is None:
+        value = METRICS[name](organization_id)
+        try:
+            _backend.set(key, value, current_app.config.get('METRICS_CACHE_TTL', 300))
+        except Exception as e:
+            print(f"Metrics cache write failed: {e}")
+    return value
+
+
+def invalidate(organization_id):
+    """Drop every cached metric of an organization"""
+    try:
+        _backend.delete(*(_key(name, organization_id) for name in METRICS))
+    except Exception as e:
+        print(f"Metrics cache invalidation failed: {e}")
+
+
+@metric('invoice_summary')
+def invoice_summary(organization_id):
+    """Invoice counts and amounts by status in one grouped query"""
+    month_start = date.today().replace(day=1)
+    open_statuses = (InvoiceStatus.SENT, InvoiceStatus.PARTIAL, InvoiceStatus.OVERDUE)
+    rows = db.session.execute(select(
+        Invoice.status,
+        func.count(Invoice.id),
+        func.coalesce(func.sum(Invoice.balance), 0),
+        func.count(case((Invoice.balance > 0, 1))),
+        func.coalesce(func.sum(case((Invoice.balance > 0, Invoice.balance), else_=0)), 0),
+        func.coalesce(func.sum(case((Invoice.invoice_date >= month_start, Invoice.total), else_=0)), 0)
+    ).where(
+        Invoice.organization_id == organization_id
+    ).group_by(Invoice.status)).all()
+
+    summary = {
+        'counts': {status.value: 0 for status in InvoiceStatus},
+        'total_invoices': 0,
+        'pending_invoices': 0,
+        'total_receivables': 0.0,
+        'outstanding_receivables': 0.0,
+        'monthly_sales': 0.0
+    }
+    for status, count, balance, pending, positive_balance, month_total in rows:
+        summary['counts'][status.value] = count
+        summary['total_invoices'] += count
+        summary['pending_invoices'] += pending
+        summary['total_receivables'] += float(balance)
+        if status in open_statuses:
+            summary['outstanding_receivables'] += float(positive_balance)
+        if status != InvoiceStatus.CANCELLED:
+            summary['monthly_sales'] += float(month_total)
+    return summary
+
+
+@metric('entity_counts')
+def entity_counts(organization_id):
+    """Active record counts for the organization in a single round trip"""
+    def active_count(model):
+        return select(func.count(model.id)).where(
+            model.organization_id == organization_id, model.is_active == True
+        ).scalar_subquery()
+
+    row = db.session.execute(select(
+        active_count(Customer).label('customers'),
+        active_count(Vendor).label('vendors'),
+        active_count(Item).label('items'),
+        active_count(Account).label('accounts'),
+        select(func.count(Invoice.id)).where(Invoice.organization_id == organization_id)
+        .scalar_subquery().label('invoices'),
+        select(func.count(User.id)).where(User.organization_id == organization_id)
+        .scalar_subquery().label('users')
+    )).one()
+    return dict(row._mapping)
+
+
+@metric('recent_invoices')
+def recent_invoices(organization_id):
+    """The five most recently created invoices"""
+    rows = db.session.execute(select(
+        Invoice.id, Invoice.invoice_number, Invoice.status, Invoice.created_at, Customer.display_name
+    ).outerjoin(
+        Customer, Invoice.customer_id == Customer.id
+    ).where(
+        Invoice.organization_id == organization_id
+    ).order_by(Invoice.created_at.desc()).limit(5)).all()
+    return [
+        {
+            'id': row.id,
+            'invoice_number': row.invoice_number,
+            'status': row.status.value,
+            'created_at': row.created_at,
+            'customer_name': row.display_name
+        }
+        for row in rows
+    ]
+
+
+@metric('monthly_sales')
+def monthly_sales(organization_id):
+    """Invoiced totals per month over the last six months, excluding cancelled invoices"""
+    six_months_ago = date.today() - timedelta(days=180)
+    month = date_bucket(Invoice.invoice_date, 'month')
+    rows = db.session.execute(select(
+        month.label('month'),
+        func.sum(Invoice.total).label('total')
+    ).where(
+        Invoice.organization_id == organization_id,
+        Invoice.invoice_date >= six_months_ago,
+        Invoice.status != InvoiceStatus.CANCELLED
+    ).group_by(month).order_by(month)).all()
+    return [{'month': row.month.strftime('%Y-%m'), 'total': float(row.total or 0)} for row in rows]
+
+
+def mark_changed(session, organization_id):
+    """Invalidate on commit for rows written with Core statements the flush never sees"""
+    session.info.setdefault(DIRTY_KEY, set()).add(organization_id)
+
+
+def _collect_organizations(session, flush_context):
+    """Note the organizations whose metrics a flush affects"""
+    organizations = session.info.setdefault(DIRTY_KEY, set())
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, TRACKED_MODELS) and obj.organization_id:
+            organizations.add(obj.organization_id)
+
+
+def _invalidate_committed(session):
+    for organization_id in session.info.pop(DIRTY_KEY, ()):
+        invalidate(organization_id)
+
+
+def _discard_collected(session):
+    # Only the outermost rollback discards; a savepoint rollback keeps what
+    # was flushed before it
+    session.info.pop(DIRTY_KEY, None)
+
+
+def init_app(app):
+    """Pick the cache backend and register invalidation on the shared session"""
+    global _backend
+    url = app.config.get('METRICS_CACHE_URL')
+    if url:
+        try:
+            _backend = RedisBackend(url)
+        except ImportError:
+            print("Warning: redis is not installed; using the in-process metrics cache.")
+            _backend = MemoryBackend()
+    else:
+        _backend = MemoryBackend()
+
+    # Collect on flush but only invalidate once the data is committed, so a
+    # concurrent request cannot re-cache figures that are then rolled back
+    for name, listener in (('after_flush', _collect_organizations),
+                           ('after_commit', _invalidate_committed),
+                           ('after_rollback', _discard_collected)):
+        if not event.contains(db.session, name, listener):
+            event.listen(db.session, name, listener)
@@ -0,0 +1,251 @@
+"""
+Payment allocation for BigCapitalPy.
+
+``allocate_payment`` applies a customer payment to that customer's invoices.
+Explicit instructions pay the listed invoices, each capped at its balance.
+Auto mode pays open invoices in due date order (FIFO) with whatever the
+instructions leave over. The invoices come from one ordered query. The
+PaymentAllocation rows are inserted with one executemany, and the invoices'
+paid amount, balance and status are set with one executemany UPDATE.
+``release_allocations`` undoes a payment's allocations the same way.
+"""
+
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import bindparam, delete, insert, or_, select, update
+
+from packages.server.src.models import Invoice, InvoiceStatus, Payment, PaymentAllocation
+from packages.server.src.database import db
+from packages.webapp.src.utils import metrics_cache
+from packages.webapp.src.utils.ledger_posting import loaded_instances
+
+
+ZERO = Decimal('0.00')
+
+# Invoices that can take a payment
+OPEN_STATUSES = (InvoiceStatus.SENT, InvoiceStatus.PARTIAL, InvoiceStatus.OVERDUE)
+
+
+AllocationInstruction = namedtuple('AllocationInstruction', ['invoice_id', 'amount'])
+
+Allocation = namedtuple('Allocation', ['invoice_id', 'invoice_number', 'amount', 'balance', 'status'])
+
+
+class AllocationError(ValueError):
+    """An allocation instruction cannot be applied"""
+
+
+def parse_allocation_strings(values):
+    """Instructions from "invoice_id:amount" form values; malformed values are skipped"""
+    instructions = []
+    for value in values:
+        try:
+            invoice_id, amount = value.split(':')
+            instructions.append(AllocationInstruction(int(invoice_id), Decimal(amount)))
+        except (ValueError, InvalidOperation):
+            continue
+    return instructions
+
+
+def parse_allocation_list(items):
+    """Instructions from [{"invoice_id": ..., "amount": ...}]; raises AllocationError on bad items"""
+    instructions = []
+    for item in items or []:
+        try:
+            instructions.append(AllocationInstruction(int(item['invoice_id']), Decimal(str(item['amount']))))
+        except (KeyError, TypeError, ValueError, InvalidOperation):
+            raise AllocationError('Each allocation needs an integer invoice_id and an amount')
+    return instructions
+
+
+def _invoice_status(paid_amount, balance, status):
+    if balance <= 0:
+        return InvoiceStatus.PAID
+    if paid_amount > 0:
+        return InvoiceStatus.PARTIAL
+    # Nothing paid any more: a fully released invoice is owed again
+    return InvoiceStatus.SENT if status in (InvoiceStatus.PAID, InvoiceStatus.PARTIAL) else status
+
+
+def plan_allocations(invoices, amount, instructions=(), auto=False):
+    """
+    Split ``amount`` over invoices, given in FIFO order as rows with id,
+    invoice_number, paid_amount, balance and status. Instructions are applied
+    first, then (``auto``) open balances oldest first. No invoice takes more
+    than its balance and the total never exceeds ``amount``.
+    """
+    balances = OrderedDict((invoice.id, invoice.balance or ZERO) for invoice in invoices)
+    requested = OrderedDict()
+    for instruction in instructions:
+        if instruction.amount < 0:
+            raise AllocationError('Allocation amounts cannot be negative')
+        requested[instruction.invoice_id] = requested.get(instruction.invoice_id, ZERO) + instruction.amount
+
+    remaining = amount
+    applied = OrderedDict()
+
+    def apply(invoice_id, wanted):
+        nonlocal remaining
+        share = min(wanted, balances[invoice_id] - applied.get(invoice_id, ZERO), remaining)
+        if share > 0:
+            applied[invoice_id] = applied.get(invoice_id, ZERO) + share
+            remaining -= share
+
+    for invoice_id, wanted in requested.items():
+        apply(invoice_id, wanted)
+    if auto:
+        for invoice in invoices:
+            if remaining <= 0:
+                break
+            if invoice.status in OPEN_STATUSES:
+                apply(invoice.id, balances[invoice.id])
+
+    by_id = {invoice.id: invoice for invoice in invoices}
+    allocations = []
+    for invoice_id, share in applied.items():
+        invoice = by_id[invoice_id]
+        paid_amount = (invoice.paid_amount or ZERO) + share
+        balance = balances[invoice_id] - share
+        allocations.append(Allocation(
+            invoice_id, invoice.invoice_number, share, balance,
+            _invoice_status(paid_amount, balance, invoice.status)
+        ))
+    return allocations
+
+
+def _update_invoices(session, rows):
+    """Set paid amount, balance and status of many invoices with one executemany"""
+    invoices = Invoice.__table__
+    session.connection().execute(
+        update(invoices)
+        .where(invoices.c.id == bindparam('invoice'))
+        .values(
+            paid_amount=bindparam('new_paid_amount'),
+            balance=bindparam('new_balance'),
+            status=bindparam('new_status'),
+            updated_at=datetime.utcnow()
+        ),
+        rows
+    )
+    # Loaded invoices would otherwise keep showing the old figures
+    for invoice in loaded_instances(session, Invoice, (row['invoice'] for row in rows)):
+        session.expire(invoice, ['paid_amount', 'balance', 'status', 'updated_at'])
+
+
+def _touch_payment(session, payment, now):
+    """Stamp the payment so sync clients pick up its changed allocations"""
+    payments = Payment.__table__
+    session.connection().execute(
+        update(payments).where(payments.c.id == payment.id).values(updated_at=now)
+    )
+    session.expire(payment, ['updated_at'])
+
+
+def allocate_payment(payment, instructions=(), auto=False, session=None):
+    """
+    Allocate a flushed payment to its customer's invoices and return an
+    Allocation per invoice paid. Raises AllocationError when an instruction
+    names an invoice that is not an open invoice of the customer.
+    """
+    session = session or db.session
+    instructions = list(instructions)
+    if not instructions and not auto:
+        return []
+
+    invoice_ids = {instruction.invoice_id for instruction in instructions}
+    wanted = Invoice.id.in_(invoice_ids)
+    if auto:
+        wanted = or_(wanted, (Invoice.status.in_(OPEN_STATUSES) & (Invoice.balance > 0)))
+    invoices = session.execute(
+        select(Invoice.id, Invoice.invoice_number, Invoice.paid_amount, Invoice.balance, Invoice.status)
+        .where(
+            Invoice.organization_id == payment.organization_id,
+            Invoice.customer_id == int(payment.customer_id),
+            wanted
+        )
+        .order_by(Invoice.due_date, Invoice.invoice_date, Invoice.id)
+        .with_for_update()
+    ).all()
+
+    found = {invoice.id: invoice for invoice in invoices}
+    for instruction in instructions:
+        invoice = found.get(instruction.invoice_id)
+        if invoice is None:
+            raise AllocationError(f'Invoice {instruction.invoice_id} not found for this customer')
+        if invoice.status not in OPEN_STATUSES and instruction.amount > 0:
+            raise AllocationError(f'Invoice {invoice.invoice_number} is not open for payment')
+
+    allocations = plan_allocations(invoices, Decimal(str(payment.amount)), instructions, auto)
+    if not allocations:
+        return []
+
+    now = datetime.utcnow()
+    session.connection().execute(insert(PaymentAllocation.__table__), [
+        {
+            'payment_id': payment.id,
+            'invoice_id': allocation.invoice_id,
+            'allocated_amount': allocation.amount,
+            'created_at': now
+        }
+        for allocation in allocations
+    ])
+    _update_invoices(session, [
+        {
+            'invoice': allocation.invoice_id,
+            'new_paid_amount': (found[allocation.invoice_id].paid_amount or ZERO) + allocation.amount,
+            'new_balance': allocation.balance,
+            'new_status': allocation.status
+        }
+        for allocation in allocations
+    ])
+    _touch_payment(session, payment, now)
+    metrics_cache.mark_changed(session, payment.organization_id)
+    return allocations
+
+
+def release_allocations(payment, session=None):
+    """Take a payment's allocations back off its invoices and delete them; returns the amount released"""
+    session = session or db.session
+    session.flush()
+    rows = session.execute(
+        select(
+            Invoice.id, Invoice.total, Invoice.paid_amount, Invoice.status,
+            PaymentAllocation.id.label('allocation_id'), PaymentAllocation.allocated_amount
+        )
+        .join(PaymentAllocation, PaymentAllocation.invoice_id == Invoice.id)
+        .where(PaymentAllocation.payment_id == payment.id)
+        .with_for_update()
+    ).all()
+    if not rows:
+        return ZERO
+
+    released = OrderedDict()
+    invoices = {}
+    for row in rows:
+        released[row.id] = released.get(row.id, ZERO) + row.allocated_amount
+        invoices[row.id] = row
+
+    updates = []
+    for invoice_id, amount in released.items():
+        invoice = invoices[invoice_id]
+        paid_amount = (invoice.paid_amount or ZERO) - amount
+        balance = (invoice.total or ZERO) - paid_amount
+        updates.append({
+            'invoice': invoice_id,
+            'new_paid_amount': paid_amount,
+            'new_balance': balance,
+            'new_status': _invoice_status(paid_amount, balance, invoice.status)
+        })
+    _update_invoices(session, updates)
+
+    session.connection().execute(
+        delete(PaymentAllocation.__table__).where(PaymentAllocation.__table__.c.payment_id == payment.id)
+    )
+    for allocation in loaded_instances(session, PaymentAllocation, (row.allocation_id for row in rows)):
+        session.expunge(allocation)
+    session.expire(payment, ['allocations'])
+    _touch_payment(session, payment, datetime.utcnow())
+    metrics_cache.mark_changed(session, payment.organization_id)
+    return sum(released.values(), ZERO)
@@ -0,0 +1,164 @@
+"""
+Bank reconciliation matching engine for BigCapitalPy.
+
+Loads the candidate bank transactions and the unmatched journal lines of the
+reconciled account once, pairs them in memory and writes the matches in bulk.
+"""
+
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import exists, insert, update
+
+from packages.server.src.models import (
+    BankTransaction, JournalEntry, JournalLineItem, ReconciliationMatch
+)
+from packages.server.src.database import db
+from packages.webapp.src.utils.balance_snapshots import counted_entry_filter
+
+
+CENT = Decimal('0.01')
+
+MatchResult = namedtuple('MatchResult', ['matched_count', 'match_rows', 'split_matches'])
+
+
+def _money(value):
+    return Decimal(str(value or 0)).quantize(CENT)
+
+
+def _day_offsets(tolerance_days):
+    """0, -1, +1, -2, +2 ... so the closest date wins and earlier dates break ties"""
+    yield 0
+    for offset in range(1, tolerance_days + 1):
+        yield -offset
+        yield offset
+
+
+class _LedgerIndex:
+    """Unmatched journal lines indexed by (amount, date) and by (date, direction)"""
+
+    def __init__(self, lines):
+        self.by_amount_date = defaultdict(list)
+        self.by_date_direction = defaultdict(list)
+        self.used = set()
+        for line_id, line_date, amount in lines:
+            self.by_amount_date[(amount, line_date)].append(line_id)
+            self.by_date_direction[(line_date, amount > 0)].append((line_id, amount))
+
+    def take_single(self, amount, day):
+        """Claim one unused line with exactly this amount on this day"""
+        for line_id in self.by_amount_date.get((amount, day), ()):
+            if line_id not in self.used:
+                self.used.add(line_id)
+                return line_id
+        return None
+
+    def take_group(self, amount, day):
+        """Claim all unused same-direction lines of a day when together they make up the amount"""
+        group = [
+            (line_id, line_amount)
+            for line_id, line_amount in self.by_date_direction.get((day, amount > 0), ())
+            if line_id not in self.used
+        ]
+        if len(group) < 2 or sum(line_amount for _, line_amount in group) != amount:
+            return None
+        line_ids = [line_id for line_id, _ in group]
+        self.used.update(line_ids)
+        return line_ids
+
+
+def auto_match(reconciliation, date_tolerance_days=0, allow_split=True):
+    """
+    Match the reconciliation's unmatched bank transactions to journal lines.
+
+    A bank transaction first matches a single journal line with the same signed
+    amount (debit for deposits, credit for withdrawals) on the closest date within
+    ``date_tolerance_days``. With ``allow_split`` it may otherwise match every
+    remaining line of one day that together add up to its amount (a batched
+    deposit). Matches are inserted and bank statuses updated in bulk; the caller
+    commits.
+    """
+    bank_transactions = db.session.query(
+        BankTransaction.id,
+        BankTransaction.transaction_date,
+        BankTransaction.amount
+    ).filter(
+        BankTransaction.account_id == reconciliation.account_id,
+        BankTransaction.organization_id == reconciliation.organization_id,
+        BankTransaction.transaction_date <= reconciliation.statement_ending_date,
+        BankTransaction.status == 'unmatched'
+    ).order_by(BankTransaction.transaction_date, BankTransaction.id).all()
+
+    if not bank_transactions:
+        return MatchResult(0, 0, 0)
+
+    tolerance = timedelta(days=date_tolerance_days)
+    already_matched = exists().where(
+        ReconciliationMatch.journal_line_item_id == JournalLineItem.id
+    )
+    lines = db.session.query(
+        JournalLineItem.id,
+        JournalEntry.date,
+        JournalLineItem.debit,
+        JournalLineItem.credit
+    ).join(
+        JournalEntry, JournalLineItem.journal_entry_id == JournalEntry.id
+    ).filter(
+        JournalLineItem.account_id == reconciliation.account_id,
+        JournalEntry.organization_id == reconciliation.organization_id,
+        JournalEntry.date >= bank_transactions[0].transaction_date - tolerance,
+        JournalEntry.date <= reconciliation.statement_ending_date + tolerance,
+        counted_entry_filter(),
+        ~already_matched
+    ).order_by(JournalEntry.date, JournalLineItem.id)
+
+    index = _LedgerIndex(
+        (line_id, line_date, _money(debit) - _money(credit))
+        for line_id, line_date, debit, credit in lines
+    )
+
+    now = datetime.utcnow()
+    match_rows = []
+    matched_ids = []
+    split_matches = 0
+
+    for bank_id, bank_date, bank_amount in bank_transactions:
+        amount = _money(bank_amount)
+        if not amount:
+            continue
+
+        line_ids = None
+        for offset in _day_offsets(date_tolerance_days):
+            line_id = index.take_single(amount, bank_date + timedelta(days=offset))
+            if line_id:
+                line_ids = [line_id]
+                break
+
+        if line_ids is None and allow_split:
+            for offset in _day_offsets(date_tolerance_days):
+                line_ids = index.take_group(amount, bank_date + timedelta(days=offset))
+                if line_ids:
+                    split_matches += 1
+                    break
+
+        if not line_ids:
+            continue
+
+        matched_ids.append(bank_id)
+        match_rows.extend({
+            'reconciliation_id': reconciliation.id,
+            'bank_transaction_id': bank_id,
+            'journal_line_item_id': line_id,
+            'match_type': 'automatic',
+            'created_at': now
+        } for line_id in line_ids)
+
+    if match_rows:
+        db.session.execute(insert(ReconciliationMatch), match_rows)
+        db.session.execute(
+            update(BankTransaction),
+            [{'id': bank_id, 'status': 'matched'} for bank_id in matched_ids]
+        )
+
+    return MatchResult(len(matched_ids), len(match_rows), split_matches)
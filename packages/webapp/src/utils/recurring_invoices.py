@@ -0,0 +1,246 @@
+"""
+Recurring invoices for BigCapitalPy.
+
+``generate_due_invoices`` turns active templates whose next run date has
+passed into invoices. Templates are read a batch at a time through the
+(is_active, next_run_date) index. Every due period of a template becomes one
+invoice, so a scheduler that missed runs catches up on the next one. The
+invoices of each organization are created together by
+``InvoiceBatchService``, which also posts the journal entries of templates
+set to send automatically.
+
+Each generated period is recorded in ``recurring_invoice_runs`` under a
+unique (template, period key) pair in the same transaction as its invoice.
+Periods already recorded are skipped, and a concurrent scheduler fails on
+the key instead of creating a duplicate.
+
+    flask run-recurring-invoices [--date YYYY-MM-DD] [--batch-size N]
+"""
+
+import calendar
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.orm import selectinload
+
+from packages.server.src.models import (
+    InvoiceStatus, RecurringInvoice, RecurringInvoiceRun
+)
+from packages.server.src.database import db
+from packages.webapp.src.utils.date_buckets import bucket_label
+from packages.webapp.src.utils.invoicing import InvoiceBatchService, InvoiceDraft, InvoiceLineDraft
+
+
+# Frequency -> date bucket that names its periods
+FREQUENCIES = {
+    'weekly': 'week',
+    'monthly': 'month',
+    'quarterly': 'quarter',
+    'yearly': 'year',
+}
+
+FREQUENCY_MONTHS = {'monthly': 1, 'quarterly': 3, 'yearly': 12}
+
+DEFAULT_BATCH_SIZE = 200
+
+
+def add_period(day, frequency, interval=1, anchor_day=None):
+    """
+    The run date ``interval`` periods after ``day``. Monthly cadences keep
+    ``anchor_day`` where the month is long enough, so a template starting on
+    the 31st runs on the last day of shorter months.
+    """
+    if frequency == 'weekly':
+        return day + timedelta(weeks=interval)
+    year, month = divmod(day.year * 12 + day.month - 1 + FREQUENCY_MONTHS[frequency] * interval, 12)
+    month += 1
+    return date(year, month, min(anchor_day or day.day, calendar.monthrange(year, month)[1]))
+
+
+def period_key(run_date, frequency):
+    """Name of the period a run date falls in, e.g. 2024-05 or 2024-Q2"""
+    if frequency == 'weekly':
+        run_date -= timedelta(days=run_date.weekday())
+    return bucket_label(run_date, FREQUENCIES[frequency])
+
+
+def due_runs(template, as_of):
+    """
+    (run_date, period_key) for each period of a template due by ``as_of``,
+    and the run date that follows them
+    """
+    runs = []
+    run_date = template.next_run_date
+    while run_date <= as_of and (template.end_date is None or run_date <= template.end_date):
+        runs.append((run_date, period_key(run_date, template.frequency)))
+        run_date = add_period(run_date, template.frequency, template.interval or 1, template.start_date.day)
+    return runs, run_date
+
+
+def template_draft(template, run_date):
+    """InvoiceDraft for one period of a template"""
+    return InvoiceDraft(
+        customer_id=template.customer_id,
+        invoice_date=run_date,
+        due_date=run_date + timedelta(days=template.due_days or 0),
+        lines=[
+            InvoiceLineDraft(
+                description=line.description,
+                quantity=line.quantity,
+                rate=line.rate,
+                tax_rate=line.tax_rate or 0,
+                item_id=line.item_id
+            )
+            for line in template.line_items
+        ],
+        reference=template.reference,
+        currency=template.currency or 'USD',
+        terms=template.terms,
+        notes=template.notes,
+        discount_amount=template.discount_amount or 0,
+        status=InvoiceStatus.SENT if template.auto_send else InvoiceStatus.DRAFT
+    )
+
+
+def _plan_batch(templates, as_of, summary):
+    """
+    Runs still to generate per (organization, user), and each template's
+    schedule once they are done, read before anything is committed
+    """
+    generated = set(db.session.execute(
+        select(RecurringInvoiceRun.recurring_invoice_id, RecurringInvoiceRun.period_key).where(
+            RecurringInvoiceRun.recurring_invoice_id.in_([template.id for template in templates])
+        )
+    ).all())
+
+    groups = defaultdict(list)
+    schedules = {}
+    for template in templates:
+        runs, next_run_date = due_runs(template, as_of)
+        summary['templates'] += 1
+        for run_date, key in runs:
+            if (template.id, key) in generated:
+                summary['skipped'] += 1
+            else:
+                groups[template.organization_id, template.created_by].append(
+                    (template.id, run_date, key, template_draft(template, run_date))
+                )
+        schedules[template.id] = {
+            'template': template.id,
+            'next_run_date': next_run_date,
+            'last_run_date': runs[-1][0] if runs else template.last_run_date,
+            # Templates past their end date stop running
+            'is_active': template.end_date is None or next_run_date <= template.end_date
+        }
+    return groups, schedules
+
+
+def _save_schedules(schedules):
+    """Move templates to their next run date with one executemany UPDATE"""
+    if not schedules:
+        return
+    templates = RecurringInvoice.__table__
+    now = datetime.utcnow()
+    db.session.connection().execute(
+        update(templates)
+        .where(templates.c.id == bindparam('template'))
+        .values(
+            next_run_date=bindparam('next_run_date'),
+            last_run_date=bindparam('last_run_date'),
+            is_active=bindparam('is_active'),
+            updated_at=now
+        ),
+        schedules
+    )
+
+
+def _generate_group(organization_id, user_id, runs, schedules, summary):
+    """Create one organization's invoices and record their runs in one transaction"""
+    service = InvoiceBatchService(organization_id, user_id)
+    errors = service.validate([draft for _, _, _, draft in runs])
+    failed = {runs[index][0]: message for index, message in errors.items()}
+    runs = [run for run in runs if run[0] not in failed]
+    template_ids = {template_id for template_id, _, _, _ in runs}
+
+    try:
+        created = service.create([draft for _, _, _, draft in runs], validate=False)
+        if runs:
+            db.session.connection().execute(insert(RecurringInvoiceRun.__table__), [
+                {
+                    'recurring_invoice_id': template_id,
+                    'period_key': key,
+                    'run_date': run_date,
+                    'invoice_id': invoice.id,
+                    'created_at': datetime.utcnow()
+                }
+                for (template_id, run_date, key, _), invoice in zip(runs, created)
+            ])
+        _save_schedules([schedules[template_id] for template_id in template_ids])
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        failed.update((template_id, f'Failed to generate invoices: {str(e)}') for template_id in template_ids)
+        created = []
+
+    summary['invoices'] += len(created)
+    summary['errors'].update(failed)
+    return failed
+
+
+def generate_due_invoices(as_of=None, batch_size=None):
+    """
+    Generate the invoices of every period due by ``as_of`` (today by default).
+    Returns a summary with the number of templates processed, invoices
+    created, periods skipped as already generated, and errors by template id.
+    Templates that fail keep their schedule and are retried on the next run.
+    """
+    as_of = as_of or date.today()
+    batch_size = batch_size or current_app.config.get('RECURRING_INVOICE_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    summary = {'templates': 0, 'invoices': 0, 'skipped': 0, 'errors': {}}
+
+    while True:
+        query = RecurringInvoice.query.options(
+            selectinload(RecurringInvoice.line_items)
+        ).filter(
+            RecurringInvoice.is_active == True,
+            RecurringInvoice.next_run_date <= as_of
+        )
+        if summary['errors']:
+            query = query.filter(RecurringInvoice.id.notin_(list(summary['errors'])))
+        templates = query.order_by(RecurringInvoice.next_run_date, RecurringInvoice.id).limit(batch_size).all()
+        if not templates:
+            return summary
+
+        groups, schedules = _plan_batch(templates, as_of, summary)
+        for (organization_id, user_id), runs in groups.items():
+            _generate_group(organization_id, user_id, runs, schedules, summary)
+
+        # Templates with nothing left to generate only need their schedule moved on
+        pending = {template_id for runs in groups.values() for template_id, _, _, _ in runs}
+        idle = [schedule for template_id, schedule in schedules.items() if template_id not in pending]
+        if idle:
+            _save_schedules(idle)
+            db.session.commit()
+
+
+@click.command('run-recurring-invoices')
+@click.option('--date', 'as_of', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Generate invoices due on or before this date (default: today).')
+@click.option('--batch-size', type=int, default=None, help='Templates read per batch.')
+@with_appcontext
+def run_recurring_invoices_command(as_of, batch_size):
+    """Generate the invoices of recurring templates that are due."""
+    summary = generate_due_invoices(as_of.date() if as_of else None, batch_size)
+    click.echo(f"Processed {summary['templates']} templates: {summary['invoices']} invoices created, "
+               f"{summary['skipped']} periods already generated, {len(summary['errors'])} failed")
+    for template_id, message in sorted(summary['errors'].items()):
+        click.echo(f"  Template {template_id}: {message}", err=True)
+
+
+def init_app(app):
+    """Register the recurring invoice command"""
+    app.cli.add_command(run_recurring_invoices_command)
@@ -0,0 +1,179 @@
+"""
+Document number sequences for BigCapitalPy.
+
+Invoice, payment and journal numbers come from per-organization counters in
+``document_sequences``. A number is reserved with a single atomic
+``UPDATE ... RETURNING`` (or a locked read where RETURNING is unavailable)
+inside the caller's transaction, so a rolled back create releases its number
+and the series stays gap-free.
+
+Setting ``DOCUMENT_SEQUENCE_BLOCK_SIZE`` above 1 trades that guarantee for
+throughput: each worker process then reserves blocks of numbers in a short
+transaction of its own and hands them out from memory.
+"""
+
+import os
+import threading
+from collections import namedtuple
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from packages.server.src.models import DocumentSequence, Invoice, JournalEntry, Payment
+from packages.server.src.database import db
+
+
+SequenceSpec = namedtuple('SequenceSpec', ['prefix', 'width', 'column'])
+
+# Document types and the column holding their numbers
+SEQUENCES = {
+    'invoice': SequenceSpec('INV-', 5, Invoice.invoice_number),
+    'payment': SequenceSpec('PMT-', 5, Payment.payment_number),
+    'journal': SequenceSpec('JE', 6, JournalEntry.entry_number),
+    'manual_journal': SequenceSpec('MJ', 6, JournalEntry.entry_number),
+    'bank_journal': SequenceSpec('BANK', 6, JournalEntry.entry_number),
+}
+
+_blocks = {}
+_blocks_lock = threading.Lock()
+
+# Blocks reserved by a parent process must not be handed out again by its children
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_blocks.clear)
+
+
+def format_number(document_type, value):
+    """Render a sequence value as a document number"""
+    spec = SEQUENCES[document_type]
+    return f'{spec.prefix}{value:0{spec.width}d}'
+
+
+def _last_used_value(connection, organization_id, spec):
+    """Highest numeric suffix already used for the prefix"""
+    model = spec.column.class_
+    numbers = connection.execute(
+        select(spec.column).where(
+            model.organization_id == organization_id,
+            spec.column.like(f'{spec.prefix}%')
+        )
+    ).scalars()
+    last = 0
+    for number in numbers:
+        suffix = number[len(spec.prefix):]
+        if suffix.isdigit():
+            last = max(last, int(suffix))
+    return last
+
+
+def _create_sequence(connection, organization_id, spec):
+    """Start a counter after the numbers already in use; a no-op if one exists"""
+    values = dict(
+        organization_id=organization_id,
+        prefix=spec.prefix,
+        next_value=_last_used_value(connection, organization_id, spec) + 1,
+        updated_at=datetime.utcnow()
+    )
+    table = DocumentSequence.__table__
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        statement = postgresql.insert(table).values(**values).on_conflict_do_nothing()
+    elif dialect == 'sqlite':
+        statement = sqlite.insert(table).values(**values).on_conflict_do_nothing()
+    else:
+        statement = insert(table).values(**values).prefix_with('IGNORE')
+    connection.execute(statement)
+
+
+def _increment(connection, organization_id, prefix, count):
+    """Advance a counter by ``count``; returns the first reserved value or None"""
+    table = DocumentSequence.__table__
+    criteria = (table.c.organization_id == organization_id, table.c.prefix == prefix)
+
+    if connection.dialect.update_returning:
+        new_value = connection.execute(
+            update(table).where(*criteria)
+            .values(next_value=table.c.next_value + count, updated_at=datetime.utcnow())
+            .returning(table.c.next_value)
+        ).scalar()
+        return new_value - count if new_value is not None else None
+
+    current = connection.execute(
+        select(table.c.next_value).where(*criteria).with_for_update()
+    ).scalar()
+    if current is None:
+        return None
+    connection.execute(
+        update(table).where(*criteria)
+        .values(next_value=current + count, updated_at=datetime.utcnow())
+    )
+    return current
+
+
+def _reserve(connection, organization_id, document_type, count):
+    spec = SEQUENCES[document_type]
+    first = _increment(connection, organization_id, spec.prefix, count)
+    if first is None:
+        _create_sequence(connection, organization_id, spec)
+        first = _increment(connection, organization_id, spec.prefix, count)
+    return first
+
+
+def reserve_numbers(organization_id, document_type, count=1):
+    """Reserve ``count`` consecutive numbers in the current transaction"""
+    first = _reserve(db.session.connection(), organization_id, document_type, count)
+    return [format_number(document_type, value) for value in range(first, first + count)]
+
+
+def allocate_block(organization_id, document_type, size):
+    """Reserve a block of values in its own committed transaction; returns (first, end)"""
+    with db.engine.begin() as connection:
+        first = _reserve(connection, organization_id, document_type, size)
+    return first, first + size
+
+
+def next_number(organization_id, document_type):
+    """Next document number for an organization"""
+    block_size = current_app.config.get('DOCUMENT_SEQUENCE_BLOCK_SIZE', 1)
+    if block_size <= 1:
+        return reserve_numbers(organization_id, document_type)[0]
+
+    key = (organization_id, document_type)
+    with _blocks_lock:
+        first, end = _blocks.get(key, (0, 0))
+        if first >= end:
+            first, end = allocate_block(organization_id, document_type, block_size)
+        _blocks[key] = (first + 1, end)
+    return format_number(document_type, first)
+
+
+def note_manual_number(organization_id, document_type, number):
+    """Move the counter past a number that was entered by hand"""
+    spec = SEQUENCES[document_type]
+    number = number or ''
+    suffix = number[len(spec.prefix):]
+    if not number.startswith(spec.prefix) or not suffix.isdigit():
+        return
+
+    connection = db.session.connection()
+    table = DocumentSequence.__table__
+    criteria = (table.c.organization_id == organization_id, table.c.prefix == spec.prefix)
+    if connection.execute(select(table.c.id).where(*criteria)).first() is None:
+        _create_sequence(connection, organization_id, spec)
+    connection.execute(
+        update(table).where(*criteria, table.c.next_value <= int(suffix))
+        .values(next_value=int(suffix) + 1, updated_at=datetime.utcnow())
+    )
+
+
+def peek_number(organization_id, document_type):
+    """Number the next reservation is expected to get, without reserving it"""
+    spec = SEQUENCES[document_type]
+    value = db.session.query(DocumentSequence.next_value).filter(
+        DocumentSequence.organization_id == organization_id,
+        DocumentSequence.prefix == spec.prefix
+    ).scalar()
+    if value is None:
+        value = _last_used_value(db.session.connection(), organization_id, spec) + 1
+    return format_number(document_type, value)
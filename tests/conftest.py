@@ -0,0 +1,65 @@
+"""
+Shared fixtures: the Flask app on an in-memory SQLite database, and an
+organization with a small chart of accounts.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+@pytest.fixture(scope='session')
+def app():
+    os.environ['DATABASE_URL'] = 'sqlite://'
+    from app import app as flask_app
+    flask_app.config.update(TESTING=True, WTF_CSRF_ENABLED=False, SERVER_NAME='localhost')
+    return flask_app
+
+
+@pytest.fixture
+def db_session(app):
+    from packages.server.src.database import db
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield db.session
+        db.session.remove()
+
+
+@pytest.fixture
+def organization(db_session):
+    """(organization, user, {code: account}) with one account of each type"""
+    from packages.server.src.models import Account, AccountType, Organization, User
+    org = Organization(name='Test Org')
+    db_session.add(org)
+    db_session.flush()
+    user = User(email='owner@example.com', first_name='Test', last_name='Owner',
+                password_hash='x', organization_id=org.id)
+    db_session.add(user)
+    accounts = {}
+    for code, name, account_type in [
+        ('1000', 'Bank', AccountType.ASSET),
+        ('1200', 'Accounts Receivable', AccountType.ASSET),
+        ('2000', 'Accounts Payable', AccountType.LIABILITY),
+        ('3000', 'Owner Equity', AccountType.EQUITY),
+        ('4000', 'Sales', AccountType.INCOME),
+        ('5000', 'Rent', AccountType.EXPENSE),
+    ]:
+        accounts[code] = Account(code=code, name=name, type=account_type, organization_id=org.id)
+        db_session.add(accounts[code])
+    db_session.commit()
+    return org, user, accounts
+
+
+@pytest.fixture
+def client(app, organization):
+    """Test client logged in as the organization's user"""
+    _, user, _ = organization
+    test_client = app.test_client()
+    with test_client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+    return test_client
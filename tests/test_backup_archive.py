@@ -0,0 +1,90 @@
+"""
+Backup archive round-trip tests.
+
+Writes backup archives to a file and to an unseekable stream, with attachments
+deflated on the pool, by the writer, and through the public ZipFile fallback,
+and checks every member with ZipFile.testzip().
+"""
+
+import io
+import json
+import os
+import sys
+import zipfile
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from packages.webapp.src.utils import backup_archive
+
+
+class UnseekableStream(io.RawIOBase):
+    """Write-only stream, like the pipe an encrypted backup is written into"""
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.buffer.write(data)
+
+
+@pytest.fixture
+def backup_files(tmp_path):
+    database_path = tmp_path / 'app.db'
+    database_path.write_bytes(b'SQLite format 3\x00' + os.urandom(4096))
+
+    uploads = tmp_path / 'uploads'
+    (uploads / 'receipts' / '2024').mkdir(parents=True)
+    attachments = {
+        'attachments/uploads/empty.txt': b'',
+        'attachments/uploads/notes.txt': b'Invoice notes\n' * 500,
+        'attachments/uploads/random.bin': os.urandom(64 * 1024),
+        'attachments/uploads/receipts/2024/large.csv': b'date,amount\n' + b'2024-01-01,10.00\n' * 20000,
+    }
+    for arcname, content in attachments.items():
+        path = uploads.joinpath(*arcname.split('/')[2:])
+        path.write_bytes(content)
+    return str(database_path), [str(uploads), str(tmp_path / 'missing')], attachments
+
+
+@pytest.mark.parametrize('precompressed', [True, False])
+@pytest.mark.parametrize('seekable', [True, False])
+def test_backup_zip_round_trip(monkeypatch, tmp_path, backup_files, precompressed, seekable):
+    database_path, attachment_dirs, attachments = backup_files
+    if precompressed and not backup_archive.PRECOMPRESSED_SUPPORTED:
+        pytest.skip('Precompressed members are not supported on this Python version')
+    monkeypatch.setattr(backup_archive, 'PRECOMPRESSED_SUPPORTED', precompressed)
+    # Send the large file through the writer's own compression
+    monkeypatch.setattr(backup_archive, 'INLINE_COMPRESS_LIMIT', 100 * 1024)
+
+    progress = []
+    metadata = {'backup_type': 'test'}
+    if seekable:
+        output = str(tmp_path / 'backup.zip')
+        backup_archive.write_backup_zip(output, database_path, metadata, attachment_dirs,
+                                        max_workers=2, on_progress=lambda *args: progress.append(args))
+        archive = zipfile.ZipFile(output)
+    else:
+        stream = UnseekableStream()
+        backup_archive.write_backup_zip(stream, database_path, metadata, attachment_dirs,
+                                        max_workers=2, on_progress=lambda *args: progress.append(args))
+        archive = zipfile.ZipFile(io.BytesIO(stream.buffer.getvalue()))
+
+    with archive:
+        assert archive.testzip() is None
+        assert sorted(archive.namelist()) == sorted(['database.db', 'backup_metadata.json', *attachments])
+        with open(database_path, 'rb') as f:
+            assert archive.read('database.db') == f.read()
+        for arcname, content in attachments.items():
+            assert archive.read(arcname) == content
+            assert archive.getinfo(arcname).compress_type == zipfile.ZIP_DEFLATED
+        written_metadata = json.loads(archive.read('backup_metadata.json'))
+
+    assert progress[-1] == (len(attachments), len(attachments))
+    assert written_metadata['attachments']['directories_copied'] == [
+        {'source': attachment_dirs[0], 'destination': 'uploads', 'files_copied': len(attachments)}
+    ]
@@ -0,0 +1,70 @@
+"""
+Balance sheet tests: every column balances and agrees with the single-period
+report when earnings span several fiscal years.
+"""
+
+from datetime import date
+
+import pytest
+
+from packages.server.src.models import JournalEntry, JournalLineItem
+
+
+def post(db_session, organization, day, lines):
+    org, user, accounts = organization
+    entry = JournalEntry(entry_number=f'JE-{day.isoformat()}', date=day,
+                         organization_id=org.id, created_by=user.id, status='posted')
+    for code, debit, credit in lines:
+        entry.line_items.append(JournalLineItem(account_id=accounts[code].id, debit=debit, credit=credit))
+    db_session.add(entry)
+    db_session.commit()
+
+
+@pytest.fixture
+def ledger(db_session, organization):
+    org, _, _ = organization
+    org.fiscal_year_start = '07-01'
+    post(db_session, organization, date(2023, 1, 10), [('1000', 500, 0), ('3000', 0, 500)])
+    post(db_session, organization, date(2023, 8, 1), [('1200', 60, 0), ('4000', 0, 60)])
+    post(db_session, organization, date(2024, 3, 1), [('1000', 100, 0), ('4000', 0, 100)])
+    post(db_session, organization, date(2024, 5, 1), [('5000', 25, 0), ('2000', 0, 25)])
+    post(db_session, organization, date(2024, 8, 1), [('1000', 40, 0), ('4000', 0, 40)])
+
+
+@pytest.mark.parametrize('columns, periods', [('monthly', 14), ('quarterly', 8), ('yearly', 3), ('total', 1)])
+def test_comparative_balance_sheet_balances(client, ledger, columns, periods):
+    response = client.get(f'/api/v1/reports/balance-sheet?period=custom&end_date=2024-09-30'
+                          f'&columns={columns}&periods={periods}&compare=prior_year')
+    assert response.status_code == 200
+    totals = response.get_json()['data']['report']['totals']
+
+    for assets, liabilities_equity in zip(totals['assets'], totals['total_liabilities_equity']):
+        assert assets == pytest.approx(liabilities_equity)
+    for accumulated, current, retained in zip(totals['accumulated_earnings'], totals['current_year_earnings'],
+                                              totals['retained_earnings']):
+        assert accumulated + current == pytest.approx(retained)
+
+
+@pytest.mark.parametrize('end_date', ['2023-06-30', '2024-06-30', '2024-09-30'])
+def test_comparative_matches_single_period_report(client, ledger, end_date):
+    single = client.get(f'/api/v1/reports/balance-sheet?period=custom&end_date={end_date}')
+    comparative = client.get(f'/api/v1/reports/balance-sheet?period=custom&end_date={end_date}'
+                             f'&columns=monthly&periods=1')
+    report = single.get_json()['data']['report']
+    totals = comparative.get_json()['data']['report']['totals']
+
+    assert report['total_assets'] == pytest.approx(report['total_liabilities_equity'])
+    assert totals['assets'] == [pytest.approx(report['total_assets'])]
+    assert totals['total_liabilities_equity'] == [pytest.approx(report['total_liabilities_equity'])]
+    assert totals['accumulated_earnings'] == [pytest.approx(report['accumulated_earnings'])]
+    assert totals['current_year_earnings'] == [pytest.approx(report['current_year_earnings'])]
+
+
+def test_earnings_split_at_fiscal_year_end(client, ledger):
+    response = client.get('/api/v1/reports/balance-sheet?period=custom&end_date=2024-09-30')
+    report = response.get_json()['data']['report']
+
+    # FY ending 2024-06-30 earned 60 + 100 - 25; the current one 40 so far
+    assert report['accumulated_earnings'] == pytest.approx(135)
+    assert report['current_year_earnings'] == pytest.approx(40)
+    assert report['total_assets'] == pytest.approx(700)
@@ -0,0 +1,64 @@
+"""
+Background job tests: a job stopped while its handler runs keeps the status
+it was stopped with.
+"""
+
+import uuid
+from datetime import datetime
+
+import pytest
+
+from packages.server.src.database import db
+from packages.server.src.models import Job
+from packages.webapp.src.utils import jobs
+
+
+@jobs.job_handler('test_interrupted')
+def interrupted_handler(context):
+    # Another process finds the heartbeat stale while the handler is still working
+    jobs.recover_jobs(stale_seconds=0)
+    return {'finished': True}
+
+
+@jobs.job_handler('test_cancelled')
+def cancelled_handler(context):
+    # A user cancels the job once its heartbeat has gone stale
+    jobs._update_job(context.job_id, updated_at=datetime(2000, 1, 1))
+    assert jobs.cancel_job(db.session.get(Job, context.job_id))
+    return {'finished': True}
+
+
+def queue_job(db_session, job_type):
+    now = datetime.utcnow()
+    job = Job(id=str(uuid.uuid4()), job_type=job_type, status='queued', progress=0, message='Queued',
+              params='{}', created_at=now, updated_at=now)
+    db_session.add(job)
+    db_session.commit()
+    return job.id
+
+
+@pytest.mark.parametrize('job_type, status', [('test_interrupted', 'failed'), ('test_cancelled', 'cancelled')])
+def test_stopped_job_keeps_its_status(db_session, job_type, status):
+    job_id = queue_job(db_session, job_type)
+
+    jobs._run_job(job_id)
+
+    job = db_session.get(Job, job_id)
+    assert job.status == status
+    assert job.result is None
+    assert job.updated_at is not None
+
+
+def test_finished_job_is_recorded(db_session):
+    @jobs.job_handler('test_progress')
+    def progress_handler(context):
+        context.progress(50, 'Halfway')
+        return {'finished': True}
+
+    job_id = queue_job(db_session, 'test_progress')
+    jobs._run_job(job_id)
+
+    job = db_session.get(Job, job_id)
+    assert job.status == 'completed'
+    assert job.progress == 100
+    assert job.result == '{"finished": true}'
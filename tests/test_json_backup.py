@@ -0,0 +1,71 @@
+"""
+JSON export tests: the export is one snapshot even while another connection
+commits between its page reads.
+"""
+
+import json
+import sqlite3
+
+from sqlalchemy import create_engine
+
+from packages.webapp.src.utils import json_backup
+
+
+def make_database(path):
+    connection = sqlite3.connect(path)
+    # WAL lets the concurrent writer commit while the export holds its snapshot
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('CREATE TABLE entries (id INTEGER PRIMARY KEY, number TEXT)')
+    connection.execute('CREATE TABLE lines (id INTEGER PRIMARY KEY, entry_id INTEGER, amount NUMERIC)')
+    for entry_id in range(1, 6):
+        connection.execute('INSERT INTO entries VALUES (?, ?)', (entry_id, f'JE-{entry_id}'))
+        connection.execute('INSERT INTO lines VALUES (?, ?, ?)', (entry_id, entry_id, 10 * entry_id))
+    connection.commit()
+    connection.close()
+
+
+def test_export_is_a_consistent_snapshot(tmp_path, monkeypatch):
+    database_path = str(tmp_path / 'app.db')
+    make_database(database_path)
+
+    # Commit an entry and its line from another connection after the first page is read
+    read_pages = []
+    iter_table_rows = json_backup.iter_table_rows
+
+    def rows_with_concurrent_write(connection, table_name, key=None, batch_size=None):
+        for index, row in enumerate(iter_table_rows(connection, table_name, key, batch_size)):
+            if table_name == 'entries' and index == 2 and not read_pages:
+                read_pages.append(index)
+                writer = sqlite3.connect(database_path)
+                writer.execute("INSERT INTO entries VALUES (6, 'JE-6')")
+                writer.execute('INSERT INTO lines VALUES (6, 6, 60)')
+                writer.commit()
+                writer.close()
+            yield row
+
+    monkeypatch.setattr(json_backup, 'iter_table_rows', rows_with_concurrent_write)
+
+    progress = []
+    engine = create_engine(f'sqlite:///{database_path}')
+    output = tmp_path / 'export.json'
+    try:
+        manifest = json_backup.write_json_backup(engine, str(output), {'backup_type': 'test'}, batch_size=2,
+                                                 on_progress=lambda *args: progress.append(args))
+    finally:
+        engine.dispose()
+
+    assert read_pages
+    document = json.loads(output.read_text())
+    data = document['database_export']['data']
+    assert [row['id'] for row in data['entries']] == [1, 2, 3, 4, 5]
+    assert [row['id'] for row in data['lines']] == [1, 2, 3, 4, 5]
+    assert manifest['tables']['entries']['rows'] == 5
+    assert manifest['tables']['lines']['rows'] == 5
+    assert manifest['total_rows'] == 10
+    assert document['manifest'] == manifest
+    assert progress == [(1, 2), (2, 2)]
+
+    # The concurrent write did land
+    connection = sqlite3.connect(database_path)
+    assert connection.execute('SELECT COUNT(*) FROM lines').fetchone()[0] == 6
+    connection.close()
@@ -0,0 +1,138 @@
+"""
+Payment allocation tests: instructions are capped at the invoice balance,
+auto mode pays the oldest open invoices with what is left, and releasing a
+payment puts its invoices back to what they owed before.
+"""
+
+from collections import namedtuple
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from packages.server.src.models import Customer, Invoice, InvoiceStatus, Payment, PaymentAllocation, PaymentMethod
+from packages.webapp.src.utils.payment_allocation import (
+    AllocationError, AllocationInstruction, allocate_payment, plan_allocations, release_allocations
+)
+
+
+InvoiceRow = namedtuple('InvoiceRow', ['id', 'invoice_number', 'paid_amount', 'balance', 'status'])
+
+
+def open_invoice(invoice_id, balance, paid_amount='0.00', status=InvoiceStatus.SENT):
+    return InvoiceRow(invoice_id, f'INV-{invoice_id:05d}', Decimal(paid_amount), Decimal(balance), status)
+
+
+def test_instruction_is_capped_at_invoice_balance():
+    invoices = [open_invoice(1, '40.00'), open_invoice(2, '100.00')]
+
+    allocations = plan_allocations(invoices, Decimal('150.00'), [AllocationInstruction(1, Decimal('90.00'))])
+
+    assert [(a.invoice_id, a.amount, a.balance, a.status) for a in allocations] == [
+        (1, Decimal('40.00'), Decimal('0.00'), InvoiceStatus.PAID)
+    ]
+
+
+def test_auto_pays_oldest_open_invoices_with_the_remainder():
+    invoices = [
+        open_invoice(1, '30.00'),
+        open_invoice(2, '50.00', status=InvoiceStatus.DRAFT),
+        open_invoice(3, '60.00', paid_amount='20.00', status=InvoiceStatus.PARTIAL),
+        open_invoice(4, '80.00'),
+    ]
+
+    allocations = plan_allocations(invoices, Decimal('120.00'), [AllocationInstruction(4, Decimal('25.00'))], auto=True)
+
+    # The draft is skipped, and the 5.00 left after the older invoices tops up invoice 4
+    assert [(a.invoice_id, a.amount, a.balance, a.status) for a in allocations] == [
+        (4, Decimal('30.00'), Decimal('50.00'), InvoiceStatus.PARTIAL),
+        (1, Decimal('30.00'), Decimal('0.00'), InvoiceStatus.PAID),
+        (3, Decimal('60.00'), Decimal('0.00'), InvoiceStatus.PAID),
+    ]
+    assert sum(a.amount for a in allocations) == Decimal('120.00')
+
+
+def test_negative_instruction_is_rejected():
+    with pytest.raises(AllocationError):
+        plan_allocations([open_invoice(1, '10.00')], Decimal('10.00'), [AllocationInstruction(1, Decimal('-1.00'))])
+
+
+@pytest.fixture
+def customer_invoices(db_session, organization):
+    """A customer with a sent invoice of 100.00 and an older one of 50.00 already part paid"""
+    org, _, _ = organization
+    customer = Customer(display_name='Acme', organization_id=org.id)
+    db_session.add(customer)
+    db_session.flush()
+    invoices = [
+        Invoice(invoice_number='INV-00001', invoice_date=date(2024, 1, 1), due_date=date(2024, 1, 31),
+                customer_id=customer.id, organization_id=org.id, total=Decimal('50.00'),
+                paid_amount=Decimal('20.00'), balance=Decimal('30.00'), status=InvoiceStatus.PARTIAL),
+        Invoice(invoice_number='INV-00002', invoice_date=date(2024, 2, 1), due_date=date(2024, 2, 29),
+                customer_id=customer.id, organization_id=org.id, total=Decimal('100.00'),
+                paid_amount=Decimal('0.00'), balance=Decimal('100.00'), status=InvoiceStatus.SENT),
+    ]
+    db_session.add_all(invoices)
+    db_session.commit()
+    return customer, invoices
+
+
+def make_payment(db_session, organization, customer, amount):
+    org, user, accounts = organization
+    payment = Payment(payment_number='PMT-00001', payment_date=date(2024, 3, 1), amount=Decimal(amount),
+                      payment_method=PaymentMethod.BANK_TRANSFER, customer_id=customer.id,
+                      deposit_account_id=accounts['1000'].id, organization_id=org.id, created_by=user.id)
+    db_session.add(payment)
+    db_session.flush()
+    return payment
+
+
+def invoice_state(db_session, invoice):
+    db_session.refresh(invoice)
+    return invoice.paid_amount, invoice.balance, invoice.status
+
+
+def test_release_restores_invoice_status(db_session, organization, customer_invoices):
+    customer, (older, newer) = customer_invoices
+    payment = make_payment(db_session, organization, customer, '70.00')
+
+    allocate_payment(payment, auto=True)
+    db_session.commit()
+    assert invoice_state(db_session, older) == (Decimal('50.00'), Decimal('0.00'), InvoiceStatus.PAID)
+    assert invoice_state(db_session, newer) == (Decimal('40.00'), Decimal('60.00'), InvoiceStatus.PARTIAL)
+
+    assert release_allocations(payment) == Decimal('70.00')
+    db_session.commit()
+    assert invoice_state(db_session, older) == (Decimal('20.00'), Decimal('30.00'), InvoiceStatus.PARTIAL)
+    assert invoice_state(db_session, newer) == (Decimal('0.00'), Decimal('100.00'), InvoiceStatus.SENT)
+    assert PaymentAllocation.query.filter_by(payment_id=payment.id).count() == 0
+
+
+def test_update_releases_then_reallocates(db_session, organization, customer_invoices):
+    customer, (older, newer) = customer_invoices
+    payment = make_payment(db_session, organization, customer, '30.00')
+    allocate_payment(payment, [AllocationInstruction(older.id, Decimal('30.00'))])
+    db_session.commit()
+
+    # Editing the payment moves it to the newer invoice for a larger amount
+    release_allocations(payment)
+    payment.amount = Decimal('120.00')
+    allocations = allocate_payment(payment, [AllocationInstruction(newer.id, Decimal('120.00'))])
+    db_session.commit()
+
+    assert [(a.invoice_id, a.amount) for a in allocations] == [(newer.id, Decimal('100.00'))]
+    assert invoice_state(db_session, older) == (Decimal('20.00'), Decimal('30.00'), InvoiceStatus.PARTIAL)
+    assert invoice_state(db_session, newer) == (Decimal('100.00'), Decimal('0.00'), InvoiceStatus.PAID)
+    assert [(a.invoice_id, a.allocated_amount) for a in payment.allocations] == [(newer.id, Decimal('100.00'))]
+
+
+def test_instruction_for_another_customers_invoice_is_rejected(db_session, organization, customer_invoices):
+    org, _, _ = organization
+    customer, (older, _) = customer_invoices
+    other = Customer(display_name='Other', organization_id=org.id)
+    db_session.add(other)
+    db_session.flush()
+    payment = make_payment(db_session, organization, other, '10.00')
+
+    with pytest.raises(AllocationError):
+        allocate_payment(payment, [AllocationInstruction(older.id, Decimal('10.00'))])
@@ -0,0 +1,166 @@
+"""
+Query plan regression tests.
+
+Runs EXPLAIN QUERY PLAN against an empty SQLite schema for the hot reporting and
+listing queries and fails when any of them falls back to a full table scan.
+Keyset pages of the API lists must also be read in index order, without
+sorting the organization's rows.
+"""
+
+import os
+import re
+import sys
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import create_engine, func, select, tuple_
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from packages.server.src.database import db
+from packages.server.src.models import (
+    Account, AccountBalanceSnapshot, AccountType, BankTransaction, Customer, Invoice,
+    InvoiceLineItem, InvoiceStatus, Item, JournalEntry, JournalLineItem, Payment, PaymentAllocation,
+    ReconciliationMatch, TaxCode, Tombstone, Vendor
+)
+from packages.webapp.src.api.utils import SortKey
+from packages.webapp.src.utils.ledger import general_ledger_statement
+
+
+ORG_ID = 1
+START = date(2024, 1, 1)
+END = date(2024, 12, 31)
+SINCE = datetime(2024, 6, 1)
+
+HOT_QUERIES = {
+    'invoices_by_date': select(Invoice.id).where(
+        Invoice.organization_id == ORG_ID,
+        Invoice.invoice_date.between(START, END)
+    ),
+    'invoices_by_status': select(func.count(Invoice.id)).where(
+        Invoice.organization_id == ORG_ID,
+        Invoice.status == InvoiceStatus.SENT
+    ),
+    'customer_invoices': select(Invoice.id).where(Invoice.customer_id == 1),
+    'invoice_line_items': select(InvoiceLineItem.id).where(InvoiceLineItem.invoice_id == 1),
+    'journal_entries_by_date': select(JournalEntry.id).where(
+        JournalEntry.organization_id == ORG_ID,
+        JournalEntry.date.between(START, END)
+    ),
+    'journal_entries_by_source': select(JournalEntry.id).where(
+        JournalEntry.organization_id == ORG_ID,
+        JournalEntry.source_type == 'invoice',
+        JournalEntry.source_id == 1
+    ),
+    'account_ledger_lines': select(JournalLineItem.id).where(JournalLineItem.account_id == 1),
+    'account_balances': select(
+        JournalLineItem.account_id,
+        func.sum(JournalLineItem.debit),
+        func.sum(JournalLineItem.credit)
+    ).join(
+        JournalEntry, JournalLineItem.journal_entry_id == JournalEntry.id
+    ).where(
+        JournalEntry.organization_id == ORG_ID,
+        JournalEntry.date.between(START, END)
+    ).group_by(JournalLineItem.account_id),
+    'balance_snapshot_lookup': select(AccountBalanceSnapshot.debit_total).where(
+        AccountBalanceSnapshot.organization_id == ORG_ID,
+        AccountBalanceSnapshot.account_id == 1,
+        AccountBalanceSnapshot.snapshot_date <= END
+    ).order_by(AccountBalanceSnapshot.snapshot_date.desc()).limit(1),
+    'accounts_by_type': select(Account.id).where(
+        Account.organization_id == ORG_ID,
+        Account.type == AccountType.INCOME
+    ),
+    'active_customers': select(Customer.id).where(
+        Customer.organization_id == ORG_ID,
+        Customer.is_active == True
+    ),
+    'bank_transactions_by_status': select(BankTransaction.id).where(
+        BankTransaction.account_id == 1,
+        BankTransaction.status == 'unmatched'
+    ),
+    'bank_transactions_by_date': select(BankTransaction.id).where(
+        BankTransaction.account_id == 1,
+        BankTransaction.transaction_date.between(START, END)
+    ),
+    'reconciliation_matches_for_line': select(ReconciliationMatch.id).where(
+        ReconciliationMatch.journal_line_item_id == 1
+    ),
+    'payments_by_date': select(Payment.id).where(
+        Payment.organization_id == ORG_ID,
+        Payment.payment_date.between(START, END)
+    ),
+    'invoice_allocations': select(PaymentAllocation.id).where(PaymentAllocation.invoice_id == 1),
+    'invoice_change_feed': select(Invoice.id).where(
+        Invoice.organization_id == ORG_ID,
+        Invoice.updated_at < END,
+        tuple_(Invoice.updated_at, Invoice.id) > (SINCE, 1)
+    ).order_by(Invoice.updated_at, Invoice.id).limit(100),
+    'tombstone_feed': select(Tombstone.record_id).where(
+        Tombstone.organization_id == ORG_ID,
+        Tombstone.resource == 'invoices',
+        Tombstone.id > 1
+    ).order_by(Tombstone.id).limit(100),
+    'general_ledger_lines': general_ledger_statement(ORG_ID, START, END, [1, 2]),
+}
+
+
+def keyset_page(model, sort_by, descending, cursor_value, *criteria):
+    """A later page of an API list: the list's filters, its cursor and its order"""
+    sort = SortKey(model, getattr(model, sort_by), descending, coalesce_nulls=True)
+    return select(model.id).where(*criteria, sort.after(cursor_value, 100)).order_by(*sort.order_by()).limit(21)
+
+
+# Default sort and filters of each keyset-paginated API list
+KEYSET_PAGES = {
+    'customers': keyset_page(Customer, 'display_name', False, 'M',
+                             Customer.organization_id == ORG_ID, Customer.is_active == True),
+    'vendors': keyset_page(Vendor, 'display_name', False, 'M',
+                           Vendor.organization_id == ORG_ID, Vendor.is_active == True),
+    'items': keyset_page(Item, 'name', False, 'M', Item.organization_id == ORG_ID, Item.is_active == True),
+    'accounts': keyset_page(Account, 'code', False, '4000',
+                            Account.organization_id == ORG_ID, Account.is_active == True),
+    'tax_codes': keyset_page(TaxCode, 'name', False, 'M', TaxCode.organization_id == ORG_ID),
+    'invoices': keyset_page(Invoice, 'invoice_date', True, END, Invoice.organization_id == ORG_ID),
+    'payments': keyset_page(Payment, 'payment_date', True, END, Payment.organization_id == ORG_ID),
+    'journal_entries': keyset_page(JournalEntry, 'date', True, END, JournalEntry.organization_id == ORG_ID),
+    'bank_transactions': keyset_page(BankTransaction, 'transaction_date', True, END,
+                                     BankTransaction.account_id == 1),
+}
+
+# "SCAN <table>" without an index search, optionally via a covering index
+FULL_SCAN = re.compile(r'^SCAN (?!\(|CONSTANT ROW)(\w+)')
+
+
+@pytest.fixture(scope='module')
+def engine():
+    engine = create_engine('sqlite://')
+    db.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def query_plan(engine, query):
+    statement = query.compile(engine, compile_kwargs={'literal_binds': True})
+    # Some operators (IS DISTINCT FROM) keep a bound parameter even with literal binds
+    parameters = tuple(statement.params[key] for key in statement.positiontup or ())
+    with engine.connect() as connection:
+        plan = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+    return [row[-1] for row in plan]
+
+
+@pytest.mark.parametrize('name', sorted(HOT_QUERIES))
+def test_hot_query_uses_index(engine, name):
+    details = query_plan(engine, HOT_QUERIES[name])
+    scans = [detail for detail in details if FULL_SCAN.match(detail)]
+    assert not scans, f'{name} performs a full table scan: {details}'
+
+
+@pytest.mark.parametrize('name', sorted(KEYSET_PAGES))
+def test_keyset_page_reads_in_index_order(engine, name):
+    details = query_plan(engine, KEYSET_PAGES[name])
+    assert not [detail for detail in details if FULL_SCAN.match(detail)], \
+        f'{name} keyset page performs a full table scan: {details}'
+    assert not [detail for detail in details if 'TEMP B-TREE' in detail], \
+        f'{name} keyset page sorts every row: {details}'
@@ -0,0 +1,66 @@
+"""
+Document sequence tests: counters start after the numbers already in use,
+hand out consecutive numbers, skip past numbers entered by hand, and give a
+number back when the transaction that took it rolls back.
+"""
+
+from datetime import date
+
+import pytest
+
+from packages.server.src.models import Customer, Invoice
+from packages.webapp.src.utils.sequences import next_number, note_manual_number, peek_number, reserve_numbers
+
+
+@pytest.fixture
+def org_id(db_session, organization):
+    """Organization that already has invoices INV-00007 and a hand-numbered one"""
+    org, _, _ = organization
+    customer = Customer(display_name='Acme', organization_id=org.id)
+    db_session.add(customer)
+    db_session.flush()
+    for number in ['INV-00007', 'INV-2024-A']:
+        db_session.add(Invoice(invoice_number=number, due_date=date(2024, 1, 31),
+                               customer_id=customer.id, organization_id=org.id))
+    db_session.commit()
+    return org.id
+
+
+def test_next_number_continues_after_existing_numbers(db_session, org_id):
+    assert peek_number(org_id, 'invoice') == 'INV-00008'
+    assert next_number(org_id, 'invoice') == 'INV-00008'
+    assert next_number(org_id, 'invoice') == 'INV-00009'
+    # Each document type has its own counter
+    assert next_number(org_id, 'payment') == 'PMT-00001'
+
+
+def test_reserve_numbers_returns_consecutive_numbers(db_session, org_id):
+    assert reserve_numbers(org_id, 'journal', 3) == ['JE000001', 'JE000002', 'JE000003']
+    assert next_number(org_id, 'journal') == 'JE000004'
+
+
+def test_rolled_back_number_is_issued_again(db_session, org_id):
+    assert next_number(org_id, 'invoice') == 'INV-00008'
+    db_session.commit()
+    assert next_number(org_id, 'invoice') == 'INV-00009'
+    db_session.rollback()
+    assert next_number(org_id, 'invoice') == 'INV-00009'
+
+
+@pytest.mark.parametrize('manual_number, expected', [
+    ('INV-00020', 'INV-00021'),
+    # Numbers behind the counter, and ones outside the series, leave it alone
+    ('INV-00003', 'INV-00008'),
+    ('INV-2024-B', 'INV-00008'),
+    ('PMT-00050', 'INV-00008'),
+    (None, 'INV-00008'),
+])
+def test_note_manual_number(db_session, org_id, manual_number, expected):
+    note_manual_number(org_id, 'invoice', manual_number)
+    assert next_number(org_id, 'invoice') == expected
+
+
+def test_note_manual_number_after_counter_exists(db_session, org_id):
+    assert next_number(org_id, 'invoice') == 'INV-00008'
+    note_manual_number(org_id, 'invoice', 'INV-00012')
+    assert reserve_numbers(org_id, 'invoice', 2) == ['INV-00013', 'INV-00014']